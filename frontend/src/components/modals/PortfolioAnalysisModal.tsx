@@ -16,6 +16,13 @@ interface PortfolioAnalysisModalProps {
             asset2: string;
             correlation: number;
         }>;
+        // Componentes conexas de los pares > 0.8 (correlación de retornos diarios)
+        redundancy_groups?: Array<{
+            assets: string[];
+            weight: number;
+            avg_correlation: number;
+            min_correlation: number;
+        }>;
         opinion_text: string;
         alternatives: Array<{
             target_replacement: string;
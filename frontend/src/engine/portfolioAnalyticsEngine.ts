@@ -4,17 +4,152 @@ import { functions } from "../firebase";
 import type { PortfolioItem } from "../types";
 
 export type Period = "1y" | "3y" | "5y" | "10y";
+export type RebalanceFrequency = "daily" | "buy_and_hold" | "monthly" | "quarterly" | "annual";
+// Analítica móvil: window en días hábiles (por defecto 252), step entre ventanas (5), perfil sintético (balanced)
+export type RollingOptions = boolean | { window?: number; step?: number; benchmark?: string };
 
 export interface BacktestRequest {
   portfolio: { isin: string; weight: number }[];
   period: Period;
   benchmarks?: string[];
+  max_points?: number; // LTTB server-side: nº máximo de puntos por serie de gráfico
+  rebalance?: RebalanceFrequency; // por defecto "daily" (returns · w)
+  compare_rebalancing?: boolean; // añade rebalanceComparison por periodo
+  rolling?: RollingOptions; // añade rolling + rollingSeries por periodo
 }
 
 export interface MultiBacktestRequest {
   portfolio: { isin: string; weight: number }[];
   periods: Period[];
   benchmarks?: string[];
+  max_points?: number; // LTTB server-side: nº máximo de puntos por serie de gráfico
+  rebalance?: RebalanceFrequency; // por defecto "daily" (returns · w)
+  compare_rebalancing?: boolean; // añade rebalanceComparison por periodo
+  rolling?: RollingOptions; // añade rolling + rollingSeries por periodo
+}
+
+export interface BatchBacktestRequest {
+  portfolios: { id?: string; portfolio: { isin: string; weight: number }[] }[];
+  periods: Period[];
+  include_series?: boolean; // portfolioSeries por cartera y periodo (admite max_points)
+  max_points?: number;
+}
+
+export interface BatchBacktestResponse {
+  periods?: Period[];
+  portfolios?: ({
+    id: string | number;
+    effectiveISINs: string[];
+    missingISINs: string[];
+  } & { [period: string]: BacktestResponse | unknown })[];
+  error?: string;
+}
+
+export interface ProjectionRequest {
+  portfolio: { isin: string; weight: number }[];
+  horizon_years?: number; // por defecto 20 (pasos mensuales)
+  n_paths?: number; // trayectorias bootstrap (por defecto 10000)
+  block_months?: number; // longitud del bloque (por defecto 12)
+  seed?: number; // semilla fija: misma petición -> mismas bandas
+  max_points?: number;
+}
+
+type ProjectionPercentiles = { p5: number; p25: number; p50: number; p75: number; p95: number };
+
+export interface ProjectionResponse {
+  status?: string;
+  horizon_years?: number;
+  n_paths?: number;
+  block_months?: number;
+  seed?: number;
+  history?: { start: string; end: string; months: number; mean_monthly_return: number; monthly_volatility: number };
+  effectiveISINs?: string[];
+  missingISINs?: string[];
+  percentileSeries?: Record<keyof ProjectionPercentiles, { x: string; y: number }[]>; // base 100
+  final?: ProjectionPercentiles; // patrimonio al horizonte (base 100)
+  cagr?: ProjectionPercentiles; // decimal
+  max_drawdown?: ProjectionPercentiles; // decimal negativo
+  probability_of_loss?: number;
+  warnings?: string[];
+  error?: string;
+}
+
+export interface StressScenarioSpec {
+  id?: string;
+  name?: string;
+  start: string; // YYYY-MM-DD
+  end: string;
+}
+
+export interface StressTestRequest {
+  portfolio: { isin: string; weight: number }[];
+  scenarios?: (string | StressScenarioSpec)[]; // ids de la biblioteca y/o episodios propios (por defecto todos)
+}
+
+export interface StressScenarioResult {
+  id: string;
+  name: string;
+  start: string;
+  end: string;
+  effective_start?: string;
+  effective_end?: string;
+  days?: number;
+  metrics?: { total_return: number; max_drawdown: number; volatility: number; worst_day: number }; // decimales
+  benchmarks?: Record<string, { name: string; return: number }>; // perfiles sintéticos
+  coverage?: { history: number; proxy: number; excluded: number }; // fracción del peso
+  fund_returns?: Record<string, number>;
+  proxied?: string[]; // fondos aproximados por su clase de activo (patas RF/RV)
+  excluded?: string[];
+  warnings?: string[];
+  error?: string;
+}
+
+export interface StressTestResponse {
+  status?: string;
+  scenarios?: StressScenarioResult[];
+  effectiveISINs?: string[];
+  missingISINs?: string[];
+  warnings?: string[];
+  error?: string;
+}
+
+export interface WalkForwardRequest {
+  assets: string[];
+  risk_level: number;
+  locked_assets?: string[];
+  constraints?: Record<string, unknown>; // mismas constraints que optimize_portfolio_quant
+  objective?: string;
+  estimation_window?: number; // retornos diarios de estimación (por defecto 756)
+  rebalance?: "monthly" | "quarterly" | "annual"; // por defecto "quarterly"
+  cost_bps?: number; // coste por unidad de turnover one-way
+  max_points?: number;
+}
+
+export interface WalkForwardResponse {
+  status: string;
+  message?: string;
+  rebalance?: string;
+  estimation_window?: number;
+  used_assets?: string[];
+  missing_assets?: string[];
+  oos_start_date?: string;
+  rebalances?: {
+    date: string;
+    estimation_start: string;
+    solver_path: string | null;
+    weights: Record<string, number>;
+    turnover: number;
+    expected_return: number;
+    expected_volatility: number;
+    realized_volatility: number | null;
+  }[];
+  portfolioSeries?: { x: string; y: number }[];
+  benchmarkSeries?: { equal_weight?: { x: string; y: number }[] };
+  metrics?: Record<string, number>; // calculate_historical_metrics (return, volatility, sharpe, max_drawdown...)
+  benchmarkMetrics?: { equal_weight?: Record<string, number> };
+  turnover?: { total: number; annual: number };
+  warnings?: string[];
+  error?: string;
 }
 
 export interface BacktestResponse {
@@ -34,12 +169,16 @@ export interface BacktestResponse {
   effective_start_date?: string;
   missing_assets?: string[];
   warnings?: string[]; // [NEW] Short history warnings
+  rolling?: { window: number; step: number; benchmark: string | null };
+  rollingSeries?: Record<string, { x: string; y: number }[]>; // volatility, sharpe, drawdown, return, beta, benchmark_*
 }
 
 export interface MultiBacktestResponse {
   allocations?: {
     topHoldings?: { isin: string; name: string; weight: number }[];
     regionAllocation?: { name: string; value: number }[];
+    assetClassAllocation?: { name: string; value: number }[]; // look-through (índice nocturno)
+    sectorAllocation?: { name: string; value: number }[];
   };
   [key: string]: BacktestResponse | unknown;
 }
@@ -71,7 +210,7 @@ function makeKey(req: BacktestRequest | MultiBacktestRequest) {
   const p = 'periods' in req ? (req as MultiBacktestRequest).periods.join(',') : (req as BacktestRequest).period;
   return `${p}|${stablePortfolioKey(req.portfolio)}|${stableBenchmarksKey(
     req.benchmarks
-  )}`;
+  )}|${req.max_points ?? ''}|${req.rebalance ?? ''}|${req.compare_rebalancing ? 1 : 0}|${JSON.stringify(req.rolling ?? null)}`;
 }
 
 function isFresh(ts: number) {
@@ -158,6 +297,65 @@ export async function backtestPortfolioMulti(
   return p;
 }
 
+export async function backtestPortfolioBatch(
+  req: BatchBacktestRequest
+): Promise<BatchBacktestResponse> {
+  // Sin caché local: cada petición agrupa carteras distintas (una sola descarga en backend)
+  try {
+    const fn = httpsCallable<BatchBacktestRequest, unknown>(functions, "backtest_portfolio_batch");
+    const res = await fn(req);
+    return (res as { data: unknown })?.data as BatchBacktestResponse;
+  } catch (e: unknown) {
+    let msg = "Error desconocido llamando al backtest batch.";
+    if (e instanceof Error) msg = e.message;
+    return { error: msg };
+  }
+}
+
+export async function projectPortfolio(
+  req: ProjectionRequest
+): Promise<ProjectionResponse> {
+  // Sin caché local: la semilla fija ya hace la respuesta reproducible en backend
+  try {
+    const fn = httpsCallable<ProjectionRequest, unknown>(functions, "project_portfolio");
+    const res = await fn(req);
+    return (res as { data: unknown })?.data as ProjectionResponse;
+  } catch (e: unknown) {
+    let msg = "Error desconocido llamando a la proyección.";
+    if (e instanceof Error) msg = e.message;
+    return { error: msg };
+  }
+}
+
+export async function stressTestPortfolio(
+  req: StressTestRequest
+): Promise<StressTestResponse> {
+  try {
+    const fn = httpsCallable<StressTestRequest, unknown>(functions, "stress_test_portfolio");
+    const res = await fn(req);
+    return (res as { data: unknown })?.data as StressTestResponse;
+  } catch (e: unknown) {
+    let msg = "Error desconocido llamando al stress test.";
+    if (e instanceof Error) msg = e.message;
+    return { error: msg };
+  }
+}
+
+export async function walkForwardBacktest(
+  req: WalkForwardRequest
+): Promise<WalkForwardResponse> {
+  // Sin caché local: estudio pesado y bajo demanda (re-optimiza en cada rebalanceo)
+  try {
+    const fn = httpsCallable<WalkForwardRequest, unknown>(functions, "walk_forward_backtest", { timeout: 300000 });
+    const res = await fn(req);
+    return (res as { data: unknown })?.data as WalkForwardResponse;
+  } catch (e: unknown) {
+    let msg = "Error desconocido llamando al walk-forward.";
+    if (e instanceof Error) msg = e.message;
+    return { status: "error", error: msg };
+  }
+}
+
 export async function getDashboardAnalytics(
   portfolio: PortfolioItem[],
   opts?: { include1y?: boolean; benchmarks?: string[] }
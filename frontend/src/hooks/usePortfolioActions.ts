@@ -114,15 +114,13 @@ function buildOptimizationPayload(
     const newTotalCapital = totalCapital + (isAddCapital ? extraCap : 0);
 
     const fixedWeights: Record<string, number> = {};
+    const currentWeights: Record<string, number> = {};
     portfolio.forEach(p => {
-        if (p.isLocked) {
-            if (isAddCapital && newTotalCapital > 0) {
-                const money = (p.weight / 100.0) * totalCapital;
-                fixedWeights[p.isin] = money / newTotalCapital;
-            } else {
-                fixedWeights[p.isin] = p.weight / 100.0;
-            }
-        }
+        const w = (isAddCapital && newTotalCapital > 0)
+            ? ((p.weight / 100.0) * totalCapital) / newTotalCapital
+            : p.weight / 100.0;
+        if (w > 0) currentWeights[p.isin] = w;
+        if (p.isLocked) fixedWeights[p.isin] = w;
     });
 
     const payload: OptimizationRequest = {
@@ -134,7 +132,8 @@ function buildOptimizationPayload(
             apply_profile: true,
             optimization_mode: 'rebalance_to_profile',
             lock_mode: isAddCapital ? 'keep_money' : 'keep_weight',
-            fixed_weights: fixedWeights
+            fixed_weights: fixedWeights,
+            current_weights: currentWeights
         }
     };
 
@@ -194,6 +194,11 @@ export interface OptimizationRequest {
         optimization_mode: string;
         lock_mode: string;
         fixed_weights: Record<string, number>;
+        current_weights?: Record<string, number>;
+        turnover_penalty?: number;
+        turnover_cap?: number;
+        resamples?: number | boolean;
+        resample_seed?: number;
     };
     tactical_views?: Record<string, number>;
     save_snapshot?: boolean;
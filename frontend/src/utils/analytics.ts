@@ -146,6 +146,8 @@ export function calcSimpleStats(
     };
 }
 
+// Visualización paramétrica simple; la proyección con bandas de percentiles (block bootstrap
+// de retornos históricos) la calcula el backend: projectPortfolio en engine/portfolioAnalyticsEngine.
 export function generateProjectionPoints(ret: number, vol: number, days: number = 1260) { // ~5 years
     const points: { x: Date, y: number }[] = [];
     let v = 100;
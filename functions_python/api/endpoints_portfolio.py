@@ -4,14 +4,38 @@ from firebase_functions import https_fn, options
 from firebase_admin import firestore
 
 from services.portfolio.optimizer_core import run_optimization
-from services.portfolio.frontier_engine import generate_efficient_frontier
-from services.backtester import run_backtest, run_multi_period_backtest
+from services.portfolio.walk_forward_engine import run_walk_forward
+from services.portfolio.frontier_engine import generate_efficient_frontier, generate_multi_period_frontier
+from services.backtester import run_backtest, run_multi_period_backtest, run_batch_backtest
+from services.projection_engine import run_projection
+from services.stress_engine import run_stress_test
+from services.payload_codec import apply_response_format
 from services.portfolio.analyzer import analyze_portfolio
+from services.portfolio.candidate_pool import query_auto_expand_candidates
+from services.result_cache import ResultCache, build_cache_key, get_data_versions
+from services.data_fetcher import DataFetcher
+from services.telemetry import PipelineTelemetry
+from services.config import (
+    OPTIMIZER_CACHE_COLLECTION,
+    OPTIMIZER_CACHE_TTL_SECONDS,
+    OPTIMIZER_CACHE_MAX_ENTRIES,
+    WALK_FORWARD_ESTIMATION_WINDOW,
+    PROJECTION_DEFAULT_PATHS,
+    PROJECTION_BLOCK_MONTHS,
+    PROJECTION_DEFAULT_SEED,
+)
 
 cors_config = options.CorsOptions(
     cors_origins="*", cors_methods=["GET", "POST", "OPTIONS"]
 )
 
+# Caché de resultados del optimizador (RAM LRU por instancia + Firestore con TTL)
+_optimizer_result_cache = ResultCache(
+    OPTIMIZER_CACHE_COLLECTION,
+    max_entries=OPTIMIZER_CACHE_MAX_ENTRIES,
+    ttl_seconds=OPTIMIZER_CACHE_TTL_SECONDS,
+)
+
 
 # =====================================================================
 # HELPER FUNCTIONS PARA ENDPOINT (ROLES CLAROS)
@@ -127,54 +151,12 @@ def _build_auto_expand_candidates(db) -> dict:
     """
     FASE 3.5: Helper P2 para precargar candidatos de auto-expand.
     Elimina el acceso a BD de optimizer_core manteniendo pura su rutina.
+    Prioriza el pool nocturno (Storage, sin query Firestore); si no existe, query en vivo.
     """
-    from services.portfolio.utils import _to_float
-    candidates = {}
-    fallback_isins = [
-        "LU0340557775", "LU1135865084", "LU0690375182", "LU0203975437", "IE00B2NXKW18"
-    ]
-    try:
-        cfg = db.collection("config").document("auto_complete_candidates").get()
-        if cfg.exists:
-            fallback_isins = cfg.to_dict().get("equity90_isins", fallback_isins)
-    except Exception:
-        pass
-
-    try:
-        docs = (
-            db.collection("funds_v3")
-            .order_by("std_perf.sharpe", direction=firestore.Query.DESCENDING)
-            .limit(50)
-            .stream()
-        )
-        for d in docs:
-            dd = d.to_dict()
-            exp_v2 = dd.get("portfolio_exposure_v2", {})
-            eq_val = _to_float(exp_v2.get("equity", 0.0)) if exp_v2 else _to_float(dd.get("metrics", {}).get("equity"), 0.0)
-            if eq_val >= 90.0:
-                candidates[d.id] = {
-                    "metrics": dd.get("metrics", {}),
-                    "asset_class": dd.get("classification_v2", {}).get("asset_type") or "UNKNOWN",
-                    "classification_v2": dd.get("classification_v2", {}),
-                    "portfolio_exposure_v2": dd.get("portfolio_exposure_v2", {}),
-                }
-    except Exception as e:
-        logger.info(f"⚠️ Error dynamic candidates: {e}")
-
-    if not candidates:
-        refs = [db.collection("funds_v3").document(isin) for isin in fallback_isins]
-        docs = db.get_all(refs)
-        for d in docs:
-            if d.exists:
-                dd = d.to_dict()
-                candidates[d.id] = {
-                    "metrics": dd.get("metrics", {}),
-                    "asset_class": dd.get("classification_v2", {}).get("asset_type") or "UNKNOWN",
-                    "classification_v2": dd.get("classification_v2", {}),
-                    "portfolio_exposure_v2": dd.get("portfolio_exposure_v2", {}),
-                }
-
-    return candidates
+    pool = DataFetcher(db).get_auto_expand_pool()
+    if pool and pool.get("metadata"):
+        return {isin: pool["metadata"].get(isin, {}) for isin in pool["isins"]}
+    return query_auto_expand_candidates(db)
 
 def _build_effective_constraints(req_data: dict) -> dict:
     """
@@ -196,6 +178,38 @@ def _build_effective_constraints(req_data: dict) -> dict:
         
     return strategy_constraints
 
+def _build_request_normalized(assets_list, risk_level, locked_assets, added_challengers, strategy_constraints):
+    """Forma normalizada de la petición (compartida por snapshots y caché de resultados)."""
+    return {
+        "effective_assets": assets_list,
+        "risk_level_normalized": risk_level,
+        "locked_assets_normalized": locked_assets,
+        "challengers_added": added_challengers,
+        "effective_constraints": strategy_constraints,
+    }
+
+def _build_optimizer_cache_key(request_normalized, tactical_views, asset_metadata, data_versions, candidate_funds=None) -> str:
+    """
+    FASE 4.5: Hash canónico de la petición normalizada + versión de datos.
+    Las listas cuyo orden no altera la optimización se ordenan antes de hashear.
+    candidate_funds (auto-expand): su metadata (pool nocturno o funds_v3) entra como huella,
+    así un cambio en los candidatos invalida el resultado aunque la petición sea idéntica.
+    """
+    key_payload = {
+        "request": {
+            **request_normalized,
+            "effective_assets": sorted(request_normalized.get("effective_assets", [])),
+            "locked_assets_normalized": sorted(request_normalized.get("locked_assets_normalized", [])),
+            "challengers_added": sorted(request_normalized.get("challengers_added", [])),
+        },
+        "tactical_views": tactical_views or {},
+        "asset_metadata": asset_metadata or {},
+        "data_versions": data_versions,
+        "candidate_funds_version": build_cache_key(candidate_funds) if candidate_funds else None,
+        "engine": "optimize_quant_v4",
+    }
+    return build_cache_key(key_payload)
+
 # =====================================================================
 
 @https_fn.on_call(
@@ -281,28 +295,63 @@ def optimize_portfolio_quant(request: https_fn.CallableRequest):
         # =====================================================================
         STRATEGY_CONSTRAINTS = _build_effective_constraints(req_data)
         tactical_views = req_data.get("tactical_views", {})
+        request_normalized = _build_request_normalized(
+            assets_list, risk_level, locked_assets, added_challengers, STRATEGY_CONSTRAINTS
+        )
 
         # P2: Pre-fetch candidates para optimización matemática pura sin I/O
+        # (antes de la caché: su metadata forma parte de la clave)
         candidate_funds = None
         if STRATEGY_CONSTRAINTS.get("auto_expand_universe") or float(STRATEGY_CONSTRAINTS.get("equity_floor", 0)) > 0:
             candidate_funds = _build_auto_expand_candidates(db)
 
-        # =====================================================================
-        # FASE 5: DELEGACIÓN AL MOTOR CÚANTITATIVO 
-        # =====================================================================
-        # Aquí 'run_optimization' (Nivel 4) asume el mando total matemático.
-        result = run_optimization(
-            assets_list,
-            risk_level,
-            db,
-            constraints=STRATEGY_CONSTRAINTS,
-            asset_metadata=asset_metadata,
-            locked_assets=locked_assets,
-            tactical_views=tactical_views,
-            candidate_funds=candidate_funds,
-        )
+        # --- CACHÉ DE RESULTADOS (petición normalizada + versión de datos) ---
+        cache_key = None
+        cached_result = None
+        cache_telemetry = PipelineTelemetry()
+        if req_data.get("bypass_cache") is not True:
+            try:
+                with cache_telemetry.phase("cache_lookup"):
+                    data_versions = get_data_versions(db)
+                    cache_key = _build_optimizer_cache_key(
+                        request_normalized, tactical_views, asset_metadata, data_versions, candidate_funds
+                    )
+                    cached_result = _optimizer_result_cache.get(db, cache_key)
+            except Exception as cache_err:
+                logger.warning(f"⚠️ Optimizer cache lookup failed: {cache_err}")
+                cache_key = None
+
+        if cached_result is not None:
+            logger.info(f"⚡ Optimizer cache HIT ({cache_key[:12]})")
+            result = cached_result
+            # Tiempos de esta petición (lookup), no los del cálculo original cacheado
+            result.setdefault("explainability", {})["timings"] = {**cache_telemetry.to_dict(), "cache_hit": True}
+        else:
+            # =====================================================================
+            # FASE 5: DELEGACIÓN AL MOTOR CÚANTITATIVO 
+            # =====================================================================
+            # Aquí 'run_optimization' (Nivel 4) asume el mando total matemático.
+            result = run_optimization(
+                assets_list,
+                risk_level,
+                db,
+                constraints=STRATEGY_CONSTRAINTS,
+                asset_metadata=asset_metadata,
+                locked_assets=locked_assets,
+                tactical_views=tactical_views,
+                candidate_funds=candidate_funds,
+            )
+
+            # Solo se cachean resultados resueltos (nunca errores ni infactibilidades)
+            if cache_key and result.get("status") in ("optimal", "fallback"):
+                _optimizer_result_cache.set(
+                    db, cache_key, result,
+                    meta={"risk_level": risk_level, "n_assets": len(assets_list)},
+                )
+
         result["api_version"] = result.get("api_version", "optimize_quant_v4")
         result["taxonomy_telemetry"] = telemetry
+        result["cache"] = {"hit": cached_result is not None, "key": cache_key[:16] if cache_key else None}
 
         # --- SNAPSHOT INSTRUMENTATION ---
         save_snapshot = req_data.get("save_snapshot") is True or bool(req_data.get("snapshot_label"))
@@ -322,13 +371,8 @@ def optimize_portfolio_quant(request: https_fn.CallableRequest):
                         "locked_assets_raw": req_data.get("locked_assets"),
                         "tactical_views": tactical_views
                     },
-                    "request_normalized": {
-                        "effective_assets": assets_list,
-                        "risk_level_normalized": risk_level,
-                        "locked_assets_normalized": locked_assets,
-                        "challengers_added": added_challengers,
-                        "effective_constraints": STRATEGY_CONSTRAINTS,
-                    },
+                    "request_normalized": request_normalized,
+                    "cache_key": cache_key,
                     "result_summary": {
                         "status": result.get("status"),
                         "solver_path": result.get("solver_path"),
@@ -341,7 +385,9 @@ def optimize_portfolio_quant(request: https_fn.CallableRequest):
                         "sharpe": result.get("metrics", {}).get("sharpe", 0),
                         "explainability": result.get("explainability", {}),
                         "taxonomy_telemetry": telemetry
-                    }
+                    },
+                    "timings": result.get("explainability", {}).get("timings", result.get("timings", {})),
+                    "cache_hit": cached_result is not None,
                 }
                 snapshot_ref.set(snapshot)
                 logger.info(f"📸 Snapshot saved to Firestore: {snapshot_ref.id} (label: {snapshot.get('snapshot_label')})")
@@ -383,7 +429,16 @@ def backtest_portfolio(request: https_fn.CallableRequest):
     period = data.get("period", "3y")
     if not portfolio:
         return {"error": "Cartera vacía"}
-    return run_backtest(portfolio, period, db)
+    return apply_response_format(
+        run_backtest(
+            portfolio, period, db,
+            rebalance=data.get("rebalance", "daily"),
+            compare_rebalancing=data.get("compare_rebalancing") is True,
+            rolling=data.get("rolling"),
+        ),
+        data.get("response_format"),
+        data.get("max_points"),
+    )
 
 
 @https_fn.on_call(
@@ -402,7 +457,136 @@ def backtest_portfolio_multi(request: https_fn.CallableRequest):
     periods = data.get("periods", ["1y", "3y", "5y"])
     if not portfolio:
         return {"error": "Cartera vacía"}
-    return run_multi_period_backtest(portfolio, periods, db)
+    return apply_response_format(
+        run_multi_period_backtest(
+            portfolio, periods, db,
+            rebalance=data.get("rebalance", "daily"),
+            compare_rebalancing=data.get("compare_rebalancing") is True,
+            rolling=data.get("rolling"),
+        ),
+        data.get("response_format"),
+        data.get("max_points"),
+    )
+
+
+@https_fn.on_call(
+    region="europe-west1", memory=options.MemoryOption.GB_2, cors=cors_config
+)
+def backtest_portfolio_batch(request: https_fn.CallableRequest):
+    if not request.auth:
+        raise https_fn.HttpsError(
+            code=https_fn.FunctionsErrorCode.UNAUTHENTICATED,
+            message="Requiere autenticación",
+        )
+
+    db = firestore.client()
+    data = request.data or {}
+    portfolios = data.get("portfolios", [])
+    periods = data.get("periods", ["1y", "3y", "5y"])
+    if not portfolios:
+        return {"error": "Lista de carteras vacía"}
+    return apply_response_format(
+        run_batch_backtest(portfolios, periods, db, include_series=data.get("include_series") is True),
+        data.get("response_format"),
+        data.get("max_points"),
+    )
+
+
+@https_fn.on_call(
+    region="europe-west1", memory=options.MemoryOption.GB_2, cors=cors_config
+)
+def project_portfolio(request: https_fn.CallableRequest):
+    """
+    Proyección de patrimonio (base 100) por block bootstrap de los retornos mensuales
+    históricos de la cartera: bandas de percentiles por mes y distribución al horizonte.
+    """
+    if not request.auth:
+        raise https_fn.HttpsError(
+            code=https_fn.FunctionsErrorCode.UNAUTHENTICATED,
+            message="Requiere autenticación",
+        )
+
+    db = firestore.client()
+    data = request.data or {}
+    portfolio = data.get("portfolio", [])
+    if not portfolio:
+        return {"error": "Cartera vacía"}
+    return apply_response_format(
+        run_projection(
+            portfolio, db,
+            horizon_years=data.get("horizon_years", 20),
+            n_paths=data.get("n_paths", PROJECTION_DEFAULT_PATHS),
+            block_months=data.get("block_months", PROJECTION_BLOCK_MONTHS),
+            seed=data.get("seed", PROJECTION_DEFAULT_SEED),
+        ),
+        data.get("response_format"),
+        data.get("max_points"),
+    )
+
+
+@https_fn.on_call(
+    region="europe-west1", memory=options.MemoryOption.GB_2, cors=cors_config
+)
+def stress_test_portfolio(request: https_fn.CallableRequest):
+    """
+    Stress test histórico: la cartera frente a la biblioteca de episodios (STRESS_SCENARIOS)
+    o una selección / episodios propios, con una sola matriz de precios.
+    """
+    if not request.auth:
+        raise https_fn.HttpsError(
+            code=https_fn.FunctionsErrorCode.UNAUTHENTICATED,
+            message="Requiere autenticación",
+        )
+
+    db = firestore.client()
+    data = request.data or {}
+    portfolio = data.get("portfolio", [])
+    if not portfolio:
+        return {"error": "Cartera vacía"}
+    return run_stress_test(portfolio, db, scenarios=data.get("scenarios"))
+
+
+@https_fn.on_call(
+    region="europe-west1",
+    memory=options.MemoryOption.GB_2,
+    timeout_sec=300,
+    cors=cors_config,
+)
+def walk_forward_backtest(request: https_fn.CallableRequest):
+    """
+    Backtest fuera de muestra del optimizador: re-optimiza en cada rebalanceo sobre una
+    ventana móvil de estimación (mismo contrato de entrada que optimize_portfolio_quant).
+    """
+    if not request.auth:
+        raise https_fn.HttpsError(
+            code=https_fn.FunctionsErrorCode.UNAUTHENTICATED,
+            message="Requiere autenticación",
+        )
+
+    db = firestore.client()
+    data = request.data or {}
+    assets_list = list(data.get("assets", []))
+    if not assets_list:
+        return {"status": "error", "message": "Cartera vacía"}
+    try:
+        risk_level = int(data.get("risk_level", 5))
+        if not (1 <= risk_level <= 10):
+            return {"status": "error", "message": "Nivel de riesgo inválido (debe ser 1-10)"}
+    except (ValueError, TypeError):
+        return {"status": "error", "message": "Nivel de riesgo debe ser numérico"}
+
+    result = run_walk_forward(
+        assets_list,
+        risk_level,
+        db,
+        constraints=_build_effective_constraints(data),
+        asset_metadata=_build_asset_metadata(db, assets_list, data.get("asset_metadata", {})),
+        locked_assets=data.get("locked_assets", []) or [],
+        estimation_window=data.get("estimation_window", WALK_FORWARD_ESTIMATION_WINDOW),
+        rebalance=data.get("rebalance", "quarterly"),
+        cost_bps=float(data.get("cost_bps", 0.0) or 0.0),
+    )
+    return apply_response_format(result, data.get("response_format"), data.get("max_points"))
 
 
 @https_fn.on_call(
@@ -420,6 +604,10 @@ def getEfficientFrontier(request: https_fn.CallableRequest):
         data = request.data or {}
         portfolio = data.get("portfolio", [])
         period = data.get("period", "3y")
+        # periods: lista -> una sola descarga/alineación y un bloque por periodo
+        periods = data.get("periods")
+        # response_format="compact": Σ en triángulo superior float32/base64 (ver docs/CONVENTIONS.md)
+        response_format = data.get("response_format")
 
         if not portfolio:
             logger.info("⚠️ [getEfficientFrontier] Cartera vacía recibida.")
@@ -430,6 +618,15 @@ def getEfficientFrontier(request: https_fn.CallableRequest):
             item["isin"]: (float(item.get("weight", 0)) / 100.0) for item in portfolio
         }
 
+        if periods:
+            logger.info(
+                f"🚀 [getEfficientFrontier] Calculando para {len(assets_list)} activos. Periods: {periods}"
+            )
+            return apply_response_format(
+                generate_multi_period_frontier(assets_list, db, portfolio_weights, periods=periods),
+                response_format,
+            )
+
         logger.info(
             f"🚀 [getEfficientFrontier] Calculando para {len(assets_list)} activos. Period: {period}"
         )
@@ -443,7 +640,7 @@ def getEfficientFrontier(request: https_fn.CallableRequest):
                 f"❌ [getEfficientFrontier] Error en lógica interna: {result['error']}"
             )
 
-        return result
+        return apply_response_format(result, response_format)
 
     except Exception as e:
         logger.exception(f"🔥 [getEfficientFrontier] Error crítico: {e}")
@@ -35,12 +35,12 @@ def scheduleWeeklyResearch(event: scheduler_fn.ScheduledEvent) -> None:
 def runMasterDailyRoutine(event: scheduler_fn.ScheduledEvent) -> None:
     logger.info(f"🚀 [MASTER] Iniciando Rutina Diaria: {event.schedule_time}")
 
-    from services.nav_fetcher import run_daily_fetch
-    from services.analytics import update_daily_metrics, build_global_price_cache
+    from services.nav_fetcher import run_daily_fetch, run_benchmark_fetch
+    from services.analytics import update_daily_metrics, build_global_price_cache, build_auto_expand_pool, build_exposure_index, build_synthetic_benchmarks
 
     db = firestore.client()
 
-    logger.info("⬇️ [PASO 1/2] Iniciando Descarga de NAVs...")
+    logger.info("⬇️ [PASO 1/7] Iniciando Descarga de NAVs...")
     try:
         fetch_result = run_daily_fetch()
         logger.info(f"✅ Descarga completada: {fetch_result}")
@@ -49,19 +49,44 @@ def runMasterDailyRoutine(event: scheduler_fn.ScheduledEvent) -> None:
         logger.info("⛔ Abortando cálculo de métricas para evitar datos corruptos.")
         return
 
-    logger.info("🧮 [PASO 2/3] Recalculando Métricas (Sharpe, Volatilidad, etc)...")
+    logger.info("📈 [PASO 2/7] Ingestando Benchmarks y Proxies (RF/RV)...")
+    try:
+        bench_result = run_benchmark_fetch(db)
+        logger.info(f"✅ Benchmarks: {bench_result}")
+    except Exception as e:
+        logger.info(f"❌ ERROR en ingesta de Benchmarks: {e}")
+
+    logger.info("🧮 [PASO 3/7] Recalculando Métricas (Sharpe, Volatilidad, etc)...")
     try:
         update_daily_metrics(db)
         logger.info("✅ Métricas actualizadas correctamente.")
     except Exception as e:
         logger.info(f"❌ ERROR en cálculo de Métricas: {e}")
 
-    logger.info("📦 [PASO 3/3] Reconstruyendo Caché Global en Cloud Storage...")
+    logger.info("📦 [PASO 4/7] Reconstruyendo Caché Global en Cloud Storage...")
     try:
         build_global_price_cache(db)
     except Exception as e:
         logger.info(f"❌ ERROR al construir Caché Global: {e}")
 
+    logger.info("🎯 [PASO 5/7] Reconstruyendo Pool de Candidatos Auto-Expand...")
+    try:
+        build_auto_expand_pool(db)
+    except Exception as e:
+        logger.info(f"❌ ERROR al construir Pool Auto-Expand: {e}")
+
+    logger.info("🧭 [PASO 6/7] Reconstruyendo Índice de Exposiciones (Look-Through)...")
+    try:
+        build_exposure_index(db)
+    except Exception as e:
+        logger.info(f"❌ ERROR al construir Índice de Exposiciones: {e}")
+
+    logger.info("📐 [PASO 7/7] Reconstruyendo Benchmarks Sintéticos (Perfiles RF/RV)...")
+    try:
+        build_synthetic_benchmarks(db)
+    except Exception as e:
+        logger.info(f"❌ ERROR al construir Benchmarks Sintéticos: {e}")
+
     logger.info("🏁 [MASTER] Rutina Diaria finalizada.")
 
 
@@ -26,6 +26,10 @@ from api.endpoints_portfolio import (
     optimize_portfolio_quant,
     backtest_portfolio,
     backtest_portfolio_multi,
+    backtest_portfolio_batch,
+    project_portfolio,
+    stress_test_portfolio,
+    walk_forward_backtest,
     getEfficientFrontier,
     analyze_portfolio_endpoint
 )
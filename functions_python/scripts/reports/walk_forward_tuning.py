@@ -0,0 +1,131 @@
+"""
+BDB-FONDOS SCRIPT
+
+STATUS: ACTIVE
+CATEGORY: reports
+PURPOSE: Walk-forward del optimizador por perfil de riesgo (calibración de perfiles: vol objetivo vs. realizada fuera de muestra).
+SAFE_MODE: READ_ONLY
+RUN: python -m scripts.reports.walk_forward_tuning --profiles 1-10 --rebalance quarterly,annual
+"""
+import argparse
+import csv
+import os
+import sys
+import time
+
+import firebase_admin
+from firebase_admin import credentials, firestore
+
+# Setup path to import services
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from api.endpoints_portfolio import _build_asset_metadata
+from services.config import RISK_TARGETS, WALK_FORWARD_ESTIMATION_WINDOW
+from services.data_fetcher import DataFetcher
+from services.portfolio.walk_forward_engine import run_walk_forward
+
+
+def get_db():
+    try:
+        firebase_admin.get_app()
+    except ValueError:
+        cred_path = os.path.join(
+            os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
+            "serviceAccountKey.json",
+        )
+        if os.path.exists(cred_path):
+            cred = credentials.Certificate(cred_path)
+            firebase_admin.initialize_app(cred)
+        else:
+            print(f"Error: {cred_path} not found")
+            return None
+    return firestore.client()
+
+
+def _profiles(spec):
+    if "-" in spec:
+        lo, hi = spec.split("-")
+        return list(range(int(lo), int(hi) + 1))
+    return [int(p) for p in spec.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Walk-forward del optimizador por perfil")
+    parser.add_argument("--assets", help="ISINs separados por coma (por defecto: pool nocturno auto-expand)")
+    parser.add_argument("--profiles", default="1-10", help="Perfiles: '1-10' o '3,5,7'")
+    parser.add_argument("--rebalance", default="quarterly", help="Frecuencias separadas por coma")
+    parser.add_argument("--windows", default=str(WALK_FORWARD_ESTIMATION_WINDOW), help="Ventanas de estimación separadas por coma")
+    parser.add_argument("--objective", default=None, help="Objetivo del solver (por defecto el del perfil)")
+    parser.add_argument("--cost-bps", type=float, default=10.0)
+    parser.add_argument("--out", default="walk_forward_tuning.csv")
+    args = parser.parse_args()
+
+    db = get_db()
+    if db is None:
+        return
+
+    # Un único DataFetcher: los precios quedan en PRICE_CACHE para todas las combinaciones
+    fetcher = DataFetcher(db)
+    if args.assets:
+        assets = [a.strip() for a in args.assets.split(",") if a.strip()]
+    else:
+        pool = fetcher.get_auto_expand_pool()
+        if not pool:
+            print("❌ Pool auto-expand no disponible: indica --assets")
+            return
+        assets = list(pool["isins"])
+    asset_metadata = _build_asset_metadata(db, assets, {})
+    print(f"📊 Walk-forward sobre {len(assets)} activos ({len(asset_metadata)} con metadata)")
+
+    constraints = {"objective": args.objective} if args.objective else {}
+    rows = []
+    for window in [int(w) for w in args.windows.split(",")]:
+        for freq in [f.strip() for f in args.rebalance.split(",")]:
+            for profile in _profiles(args.profiles):
+                t0 = time.time()
+                res = run_walk_forward(
+                    assets, profile, db, constraints=dict(constraints), asset_metadata=asset_metadata,
+                    estimation_window=window, rebalance=freq, cost_bps=args.cost_bps, fetcher=fetcher,
+                )
+                if res.get("status") != "ok":
+                    print(f"❌ P{profile} {freq} W={window}: {res.get('message')}")
+                    continue
+
+                m, ew = res["metrics"], res["benchmarkMetrics"]["equal_weight"]
+                ex_ante = [r["expected_volatility"] for r in res["rebalances"]]
+                realized = [r["realized_volatility"] for r in res["rebalances"] if r["realized_volatility"] is not None]
+                row = {
+                    "profile": profile,
+                    "rebalance": freq,
+                    "window": window,
+                    "target_vol": RISK_TARGETS.get(profile),
+                    "ex_ante_vol": sum(ex_ante) / len(ex_ante),
+                    "realized_vol": sum(realized) / len(realized) if realized else None,
+                    "oos_return": m["return"],
+                    "oos_volatility": m["volatility"],
+                    "oos_sharpe": m["sharpe"],
+                    "oos_max_drawdown": m["max_drawdown"],
+                    "ew_return": ew["return"],
+                    "ew_volatility": ew["volatility"],
+                    "annual_turnover": res["turnover"]["annual"],
+                    "rebalances": len(res["rebalances"]),
+                    "fallbacks": sum(1 for r in res["rebalances"] if (r["solver_path"] or "").startswith("fallback_")),
+                    "oos_start": res["oos_start_date"],
+                    "seconds": round(time.time() - t0, 2),
+                }
+                rows.append(row)
+                print(
+                    f"✅ P{profile} {freq} W={window}: vol {row['oos_volatility']:.2%} (obj {row['target_vol']:.2%}), "
+                    f"ret {row['oos_return']:.2%}, sharpe {row['oos_sharpe']:.2f}, turnover {row['annual_turnover']:.2f}/año "
+                    f"[{row['seconds']}s]"
+                )
+
+    if rows:
+        with open(args.out, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+        print(f"💾 {len(rows)} filas en {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -145,6 +145,18 @@ def build_global_price_cache(db):
         blob = bucket.blob("cache/global_prices.json")
         blob.upload_from_string(json_data, content_type="application/json")
 
+        # Publica la versión de datos: invalida los resultados cacheados del optimizador
+        try:
+            db.collection("system_settings").document("price_data_version").set(
+                {
+                    "version": datetime.now().strftime("%Y%m%dT%H%M%S"),
+                    "updated_at": datetime.now(),
+                    "funds_cached": len(master_dict),
+                }
+            )
+        except Exception as v_err:
+            print(f"⚠️ Error publicando versión de precios: {v_err}")
+
         print(
             f"✅ Caché global construida con éxito. {len(master_dict)} fondos cacheados."
         )
@@ -152,3 +164,140 @@ def build_global_price_cache(db):
     except Exception as e:
         print(f"⚠️ Error construyendo caché global: {e}")
         return {"success": False, "error": str(e)}
+
+
+def _load_clean_histories(db, ids, label):
+    """
+    Lectura directa de historico_vl_v2 (no de las cachés RAM de la instancia) y limpieza
+    por activo: una serie corrupta se descarta sin invalidar el resto. {id: Serie}.
+    """
+    from .data_fetcher import DataFetcher
+
+    fetcher = DataFetcher(db)
+    refs = [db.collection("historico_vl_v2").document(i) for i in dict.fromkeys(ids)]
+    cleaned = {}
+    for doc in db.get_all(refs):
+        if not doc.exists:
+            continue
+        try:
+            series = fetcher._parse_doc_history(doc.to_dict())
+            if len(series) > 20:
+                cleaned[doc.id] = fetcher._align_and_clean({doc.id: series})[doc.id]
+        except Exception as e:
+            print(f"⚠️ {label}: descartado {doc.id}: {e}")
+    return cleaned
+
+
+def build_auto_expand_pool(db):
+    """
+    Pool nocturno de candidatos para el auto-expand del optimizador.
+    Selecciona los fondos RV top-Sharpe, valida y alinea su historia a la ventana
+    estándar (5 años) y precalcula μ del bloque candidato. En petición, el
+    optimizador no re-descarga ni re-limpia precios: añade los candidatos a μ y
+    re-estima Σ una sola vez sobre la matriz conjunta.
+    """
+    import json
+    from firebase_admin import storage
+    from .config import BUCKET_NAME, AUTO_EXPAND_POOL_BLOB
+    from .portfolio.candidate_pool import build_candidate_pool, query_auto_expand_candidates
+
+    print("🛠️ Construyendo pool de candidatos auto-expand...")
+    try:
+        metadata = query_auto_expand_candidates(db)
+        if not metadata:
+            print("⚠️ Pool auto-expand: sin candidatos.")
+            return {"success": False, "error": "no_candidates"}
+
+        cleaned = _load_clean_histories(db, list(metadata), "Pool auto-expand")
+        prices = pd.DataFrame(cleaned).sort_index()
+        payload = build_candidate_pool(prices, metadata, version=datetime.now().strftime("%Y%m%dT%H%M%S"))
+        if not payload:
+            print("⚠️ Pool auto-expand: ningún candidato con historia suficiente.")
+            return {"success": False, "error": "no_valid_history"}
+
+        blob = storage.bucket(BUCKET_NAME).blob(AUTO_EXPAND_POOL_BLOB)
+        blob.upload_from_string(json.dumps(payload), content_type="application/json")
+
+        print(f"✅ Pool auto-expand construido: {len(payload['isins'])} candidatos ({payload['start']} → {payload['end']}).")
+        return {"success": True, "candidates": len(payload["isins"])}
+    except Exception as e:
+        print(f"⚠️ Error construyendo pool auto-expand: {e}")
+        return {"success": False, "error": str(e)}
+
+
+def build_exposure_index(db):
+    """
+    Índice nocturno de exposiciones look-through (Storage JSON): por fondo, vectores
+    normalizados de clase de activo, región, sector y top posiciones. En petición el
+    look-through de una cartera es una suma ponderada sin lecturas de funds_v3.
+    """
+    import json
+    from firebase_admin import storage
+    from .config import BUCKET_NAME, EXPOSURE_INDEX_BLOB
+    from .exposure_index import build_exposure_index as build_index_payload
+
+    print("🛠️ Construyendo índice de exposiciones look-through...")
+    try:
+        fields = [
+            "name", "categoryId", "std_perf", "classification_v2", "portfolio_exposure_v2",
+            "holdings", "holdings_top10", "top_holdings",
+        ]
+        docs = db.collection("funds_v3").select(fields).stream()
+        payload = build_index_payload(
+            ((doc.id, doc.to_dict() or {}) for doc in docs),
+            version=datetime.now().strftime("%Y%m%dT%H%M%S"),
+        )
+        if not payload["funds"]:
+            print("⚠️ Índice de exposiciones: sin fondos.")
+            return {"success": False, "error": "no_funds"}
+
+        blob = storage.bucket(BUCKET_NAME).blob(EXPOSURE_INDEX_BLOB)
+        blob.upload_from_string(json.dumps(payload, separators=(",", ":")), content_type="application/json")
+
+        print(f"✅ Índice de exposiciones construido: {len(payload['funds'])} fondos, {len(payload['dims']['sector'])} sectores.")
+        return {"success": True, "funds": len(payload["funds"])}
+    except Exception as e:
+        print(f"⚠️ Error construyendo índice de exposiciones: {e}")
+        return {"success": False, "error": str(e)}
+
+
+def build_synthetic_benchmarks(db):
+    """
+    Artefacto nocturno de benchmarks sintéticos (Storage JSON): patas RF/RV resueltas
+    (ISIN real o proxy) con el mismo hardening del backtester y, por periodo, las métricas
+    de los cinco perfiles. En petición el backtester sólo recorta y correlaciona.
+    """
+    import json
+    from firebase_admin import storage
+    from .config import BUCKET_NAME, SYNTHETIC_BENCHMARKS_BLOB, BENCHMARK_RF_ISIN, BENCHMARK_RV_ISIN, BENCHMARK_PROXIES
+    from .backtester import PERIOD_DAYS_MAP, _clean_price_frame, _resolve_benchmark_curves
+    from .synthetic_benchmarks import build_synthetic_benchmarks as build_benchmarks_payload
+
+    print("🛠️ Construyendo benchmarks sintéticos...")
+    try:
+        # Recién ingeridos en el PASO 2
+        ids = [BENCHMARK_RF_ISIN, BENCHMARK_RV_ISIN] + [p["doc_id"] for p in BENCHMARK_PROXIES.values()]
+        cleaned = _load_clean_histories(db, ids, "Benchmarks sintéticos")
+
+        if not cleaned:
+            print("⚠️ Benchmarks sintéticos: sin series de benchmark ni proxies.")
+            return {"success": False, "error": "no_benchmark_data"}
+
+        curves, sources, missing = _resolve_benchmark_curves(_clean_price_frame(pd.DataFrame(cleaned).sort_index()))
+        payload = build_benchmarks_payload(
+            curves, sources, PERIOD_DAYS_MAP, version=datetime.now().strftime("%Y%m%dT%H%M%S")
+        )
+        if not payload["legs"]:
+            print("⚠️ Benchmarks sintéticos: ninguna pata con historia suficiente.")
+            return {"success": False, "error": "no_valid_history"}
+
+        blob = storage.bucket(BUCKET_NAME).blob(SYNTHETIC_BENCHMARKS_BLOB)
+        blob.upload_from_string(json.dumps(payload, separators=(",", ":")), content_type="application/json")
+
+        if missing:
+            print(f"⚠️ Benchmarks sintéticos parciales, sin datos locales: {missing}")
+        print(f"✅ Benchmarks sintéticos construidos: {sources} hasta {payload.get('last_date')}.")
+        return {"success": True, "legs": sources, "missing": missing}
+    except Exception as e:
+        print(f"⚠️ Error construyendo benchmarks sintéticos: {e}")
+        return {"success": False, "error": str(e)}
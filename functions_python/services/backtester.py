@@ -2,20 +2,28 @@ import pandas as pd
 import numpy as np
 from datetime import timedelta
 from .data_fetcher import DataFetcher
-from .config import BENCHMARK_RF_ISIN, BENCHMARK_RV_ISIN
-import yfinance as yf
+from .config import BENCHMARK_RF_ISIN, BENCHMARK_RV_ISIN, BENCHMARK_PROXIES, BATCH_BACKTEST_MAX_PORTFOLIOS, DAILY_RETURN_CAP
+from .quant_core import calculate_rolling_metrics, calculate_window_metrics
+from .rebalance_engine import REBALANCE_FREQUENCIES, simulate_rebalanced_portfolio
+from .exposure_index import allocation_breakdown, fund_exposure, portfolio_lookthrough
+from .synthetic_benchmarks import precomputed_profile_metrics, profile_levels
 
 # --- HELPER FUNCTIONS (Refactored) ---
 
 
-def _fetch_and_process_data(assets_list, db, periods, fetcher=None):
+def _fetch_and_process_data(assets_list, db, periods, fetcher=None, include_benchmarks=True):
     """
     Fetches, cleans, and aligns data ONCE for the longest requested period.
+    include_benchmarks=False: sólo los fondos (las patas RF/RV vienen del artefacto nocturno).
     """
     if not fetcher:
         fetcher = DataFetcher(db)
 
-    all_assets = list(set(assets_list + [BENCHMARK_RF_ISIN, BENCHMARK_RV_ISIN]))
+    # Benchmarks y proxies: ingeridos por la rutina nocturna (sólo lectura local)
+    all_assets = list(assets_list)
+    if include_benchmarks:
+        proxy_ids = [p["doc_id"] for p in BENCHMARK_PROXIES.values()]
+        all_assets = list(set(all_assets + [BENCHMARK_RF_ISIN, BENCHMARK_RV_ISIN] + proxy_ids))
 
     # Professional standard: Daily Frequency
     price_data_df, synthetic_used = fetcher.get_price_data(
@@ -25,8 +33,14 @@ def _fetch_and_process_data(assets_list, db, periods, fetcher=None):
     if price_data_df.empty:
         raise Exception("No data available for the selected assets.")
 
-    df = price_data_df.copy()
+    return _clean_price_frame(price_data_df.copy()), synthetic_used
 
+
+def _clean_price_frame(df):
+    """
+    Hardening común (backtester y artefacto nocturno de benchmarks sintéticos):
+    mínimo de observaciones, ffill acotado y descarte de series con huecos internos.
+    """
     # Validate columns (assets with very little data)
     missing_assets = []
     keep_assets = []
@@ -65,237 +79,188 @@ def _fetch_and_process_data(assets_list, db, periods, fetcher=None):
     if df.empty:
         raise Exception("Demasiados huecos internos invalidaron el dataset común (empty after dropping missing).")
 
-    return df, synthetic_used
+    return df
 
 
-def _calculate_allocations(portfolio, db, weights_map):
+def _calculate_allocations(portfolio, db, weights_map, fetcher=None):
     """
-    Computes aggregated Holdings and Regions allocation.
+    Computes aggregated Holdings and Regions allocation (look-through).
     This is static regardless of backtest period.
+    Vectores por fondo del índice nocturno de exposiciones (Σ w·v); sólo los fondos
+    ausentes del índice se leen de funds_v3 y se vectorizan al vuelo con la misma lógica.
     """
-    aggregated_holdings = {}
-
-    # Morningstar & V2 Regions Mapping
-    region_stats = {
-        "united_states": 0,
-        "canada": 0,
-        "latin_america": 0,
-        "united_kingdom": 0,
-        "eurozone": 0,
-        "europe_ex_euro": 0,
-        "europe_emerging": 0,
-        "africa": 0,
-        "middle_east": 0,
-        "japan": 0,
-        "australasia": 0,
-        "asia_developed": 0,
-        "asia_emerging": 0,
-        # Canonical V2 Keys added to aggregation
-        "us": 0,
-        "europe": 0,
-        "emerging": 0,
-        "asia_dev": 0,
-    }
-    region_labels = {
-        "united_states": "EE.UU.",
-        "canada": "Canadá",
-        "latin_america": "Latinoamérica",
-        "united_kingdom": "Reino Unido",
-        "eurozone": "Eurozona",
-        "europe_ex_euro": "Europa (No Euro)",
-        "europe_emerging": "Europa Emergente",
-        "africa": "África",
-        "middle_east": "Oriente Medio",
-        "japan": "Japón",
-        "australasia": "Australasia",
-        "asia_developed": "Asia Desarrollada",
-        "asia_emerging": "Asia Emergente",
-        # Canonical V2 Labels
-        "us": "EE.UU.",
-        "europe": "Europa",
-        "emerging": "Mercados Emergentes",
-        "asia_dev": "Asia Desarrollada",
+    weights = {}
+    for p in portfolio:
+        weights[p["isin"]] = weights.get(p["isin"], 0.0) + float(p["weight"]) / 100.0
+
+    index = (fetcher or DataFetcher(db)).get_exposure_index()
+    missing = [isin for isin in weights if not index or isin not in index["row"]]
+    extra = {}
+    if missing:
+        docs = db.get_all([db.collection("funds_v3").document(isin) for isin in missing])
+        extra = {doc.id: fund_exposure(doc.to_dict()) for doc in docs if doc.exists}
+
+    return allocation_breakdown(portfolio_lookthrough(index, weights, extra))
+
+
+PERIOD_DAYS_MAP = {"1y": 365, "3y": 1095, "5y": 1825, "10y": 3650, "max": 10000}
+PROFILE_LABELS = {
+    "conservative": "Conservador",
+    "moderate": "Moderado",
+    "balanced": "Equilibrado",
+    "dynamic": "Dinámico",
+    "aggressive": "Agresivo",
+}
+# Analítica móvil (rolling): ventana en días hábiles, paso entre ventanas y perfil sintético de referencia
+ROLLING_DEFAULTS = {"window": 252, "step": 5, "benchmark": "balanced"}
+
+
+def _rolling_options(rolling):
+    """rolling: True / dict parcial -> opciones completas; None/False -> None. Valores inválidos -> ValueError."""
+    if not rolling:
+        return None
+    opts = dict(ROLLING_DEFAULTS)
+    if isinstance(rolling, dict):
+        opts.update({k: v for k, v in rolling.items() if k in ROLLING_DEFAULTS and v is not None})
+    opts["window"] = int(opts["window"])
+    opts["step"] = int(opts["step"])
+    if opts["window"] < 20 or opts["step"] < 1:
+        raise ValueError("rolling.window debe ser >= 20 y rolling.step >= 1")
+    return opts
+
+
+def _rolling_block(window, opts, rf_rate_annual):
+    """
+    Vol, Sharpe, drawdown, retorno (y beta) móviles de la cartera y de su perfil sintético
+    de referencia, en una llamada al kernel O(T) de quant_core. Series en formato gráfico.
+    """
+    profiles = window["profiles"]
+    bmk_name = opts["benchmark"] if opts["benchmark"] in profiles else next(iter(profiles), None)
+    cumulative = window["cumulative"]
+    base_index = next(iter(profiles.values())).index if profiles else cumulative.index
+    # Nivel base 100 en el inicio de la ventana (las curvas de perfil ya lo incluyen)
+    portfolio = cumulative.reindex(base_index)
+    if len(base_index) and base_index[0] not in cumulative.index:
+        portfolio.iloc[0] = 100.0
+    levels = pd.DataFrame({"portfolio": portfolio})
+    if bmk_name:
+        levels["benchmark"] = profiles[bmk_name]
+
+    rolled = calculate_rolling_metrics(
+        levels, window=opts["window"], step=opts["step"],
+        benchmark=profiles[bmk_name] if bmk_name else None, risk_free_annual=rf_rate_annual,
+    )
+
+    def to_chart(ser):
+        return [{"x": d.strftime("%Y-%m-%d"), "y": round(float(v), 4)} for d, v in ser.dropna().items()]
+
+    series = {}
+    for metric in ("return", "volatility", "sharpe", "drawdown"):
+        series[metric] = to_chart(rolled[metric]["portfolio"])
+        if bmk_name:
+            series[f"benchmark_{metric}"] = to_chart(rolled[metric]["benchmark"])
+    if "beta" in rolled:
+        series["beta"] = to_chart(rolled["beta"]["portfolio"])
+
+    return {
+        "rolling": {"window": opts["window"], "step": opts["step"], "benchmark": bmk_name},
+        "rollingSeries": series,
     }
-    total_region_weight = 0
 
-    def distribute_holdings_fallback(isin, total_weight):
-        if "OTHERS" in aggregated_holdings:
-            aggregated_holdings["OTHERS"]["weight"] += total_weight
-        else:
-            aggregated_holdings["OTHERS"] = {
-                "name": "Otras/No Disponible",
-                "weight": total_weight,
-            }
 
-    # Bulk fetch asset details to avoid N queries (Optimized)
-    doc_refs = [db.collection("funds_v3").document(p["isin"]) for p in portfolio]
-    docs = db.get_all(doc_refs)
+def _resolve_benchmark_curves(df, synthetic_used=()):
+    """
+    Benchmarks (RF/RV): ISIN real, si no su proxy (ambos del almacén local). Sin descargas
+    en petición: si no hay ninguno, la curva queda a None y la respuesta se marca parcial.
+    Devuelve (curves {isin: Serie|None}, sources {isin: columna usada}, missing).
+    """
+    curves, sources, missing = {}, {}, []
+    for isin in (BENCHMARK_RF_ISIN, BENCHMARK_RV_ISIN):
+        proxy_id = BENCHMARK_PROXIES.get(isin, {}).get("doc_id")
+        if isin in df and isin not in synthetic_used and df[isin].notna().any():
+            curves[isin], sources[isin] = df[isin], isin
+        elif proxy_id in df and df[proxy_id].notna().any():
+            curves[isin], sources[isin] = df[proxy_id], proxy_id
+        else:
+            curves[isin] = None
+            missing.append(isin)
+    return curves, sources, missing
 
-    for doc, item in zip(docs, portfolio):
-        isin = item["isin"]
-        w = float(item["weight"]) / 100.0
 
-        real_holdings_found = False
+def _prepare_return_streams(df_master, weights_map, synthetic_used, fetcher, benchmarks=None):
+    """
+    Una sola pasada sobre la ventana más larga: tramo común (dropna), retornos diarios
+    recortados, retorno de la cartera, curvas de benchmark (RF/RV) y tasa libre de riesgo.
+    Cada periodo es un sufijo de este tramo común, así que sus retornos son un sufijo de estos.
+    benchmarks: artefacto nocturno parseado (DataFetcher.get_synthetic_benchmarks) o None.
+    """
+    valid_assets = [c for c in df_master.columns if c in weights_map]
+    if not valid_assets:
+        return {"error": "No valid assets in period"}
 
-        if doc.exists:
-            fd = doc.to_dict()
+    # Find actual common history (each period window is a suffix of it)
+    df = df_master.dropna(subset=valid_assets)
 
-            # 1. HOLDINGS AGGREGATION
-            holdings_list = (
-                fd.get("holdings", [])
-                or fd.get("holdings_top10", [])
-                or fd.get("top_holdings", [])
-            )
+    # Portfolio Return Calculation
+    returns = df[valid_assets].pct_change().dropna()
 
-            if (
-                holdings_list
-                and isinstance(holdings_list, list)
-                and len(holdings_list) > 0
-            ):
-                real_holdings_found = True
-                for h in holdings_list:
-                    h_name = h.get("name", "Unknown")
-                    h_w = float(h.get("weight", 0)) / 100.0
-                    h_isin = h.get("isin", h_name)
-
-                    contrib = w * h_w
-
-                    if h_isin in aggregated_holdings:
-                        aggregated_holdings[h_isin]["weight"] += contrib
-                    else:
-                        aggregated_holdings[h_isin] = {
-                            "name": h_name,
-                            "weight": contrib,
-                        }
-
-                total_known = sum(float(h.get("weight", 0)) for h in holdings_list)
-                if total_known < 100:
-                    others_w = (100 - total_known) / 100.0
-                    contrib_others = w * others_w
-                    if "OTHERS" in aggregated_holdings:
-                        aggregated_holdings["OTHERS"]["weight"] += contrib_others
-                    else:
-                        aggregated_holdings["OTHERS"] = {
-                            "name": "Otras/No Disponible",
-                            "weight": contrib_others,
-                        }
-
-            # 2. REGION AGGREGATION
-            regions = None
-            
-            # [V2-FIRST INTENT]
-            # Priority 1: Canonical V2 portfolio exposure (equity_regions)
-            # Normalizing dict format since V2 uses decimals 0-1, but legacy used 0-100.
-            # We scale them to 0-100 so the parsing loop behaves consistently.
-            portfolio_v2 = fd.get("portfolio_exposure_v2", {})
-            if "equity_regions" in portfolio_v2 and isinstance(portfolio_v2["equity_regions"], dict):
-                regions = {k: v * 100 for k, v in portfolio_v2["equity_regions"].items()}
-
-            # Priority 2: Canonical V2 primary region as 100% fallback
-            if not regions:
-                primary_v2 = fd.get("classification_v2", {}).get("region_primary")
-                if primary_v2 and primary_v2 not in ["UNKNOWN", "NONE", None]:
-                    regions = {primary_v2.lower(): 100.0}
-
-
-            # Unwrap 'detail' if present (Morningstar structure: regions -> detail -> {country: %})
-            if regions and isinstance(regions, dict) and "detail" in regions:
-                regions = regions["detail"]
-
-            if regions and isinstance(regions, dict):
-                # Find Unknown explicitly if present in backend data
-                unknown_in_data = regions.get("Unknown", 0)
-
-                found_any_region = False
-                for r_key, r_val in regions.items():
-                    if r_key == "Unknown":
-                        continue
-                    if r_key == "detail":
-                        continue  # Skip nested detail key if mixup
-
-                    # Map common keys if needed, or rely on region_stats keys
-                    target_key = r_key
-
-                    if target_key in region_stats:
-                        try:
-                            val = float(r_val)
-                            if val > 1.0:
-                                val = val / 100.0
-
-                            contribution = w * val
-                            region_stats[target_key] += contribution
-                            total_region_weight += contribution
-                            found_any_region = True
-                        except:
-                            continue
-
-                if not found_any_region:
-                    # If we had regions but none matched our keys, it might be aggregated as "Global" or similar
-                    pass
-
-        if not real_holdings_found:
-            distribute_holdings_fallback(isin, w)
-
-    # Top Holdings List
-    top_lookthrough = sorted(
-        aggregated_holdings.items(), key=lambda x: x[1]["weight"], reverse=True
-    )[:15]
-    final_top_holdings = [
-        {"isin": h[0], "name": h[1]["name"], "weight": h[1]["weight"] * 100}
-        for h in top_lookthrough
-    ][:10]
-
-    # Region List
-    region_list = []
-    for k, v in region_stats.items():
-        if v > 0.0001:
-            label = region_labels.get(k, k.replace("_", " ").capitalize())
-            real_val = v * 100.0
-            region_list.append({"name": label, "value": round(real_val, 2)})
-
-    # Unclassified / Unknown check
-    total_classified = sum(r["value"] for r in region_list)
-    if total_classified < 99.0:
-        unknown_val = max(0.0, 100.0 - total_classified)
-        region_list.append(
-            {"name": "Desconocido / Otros", "value": round(unknown_val, 2)}
+    # ====================================================================
+    # DEFENSIVE RETURN CLIPPING: Cap daily returns at ±15%
+    # Any daily return >15% on a mutual fund is a data anomaly (split, glitch).
+    # This is the LAST line of defense after data_fetcher despiking.
+    # ====================================================================
+    clipped_count = (returns.abs() > DAILY_RETURN_CAP).sum().sum()
+    if clipped_count > 0:
+        print(
+            f"⚠️ [Backtester] Clipping {clipped_count} extreme daily returns (>±{DAILY_RETURN_CAP * 100}%)"
         )
+        returns = returns.clip(-DAILY_RETURN_CAP, DAILY_RETURN_CAP)
+
+    w_vector = np.array([weights_map.get(c, 0) for c in valid_assets])
+    if w_vector.sum() > 0:
+        w_vector = w_vector / w_vector.sum()
+
+    # Benchmarks (RF/RV): patas del artefacto nocturno si existe; si no, del propio tramo común
+    if benchmarks:
+        curves = benchmarks["legs"]
+        missing_benchmarks = [i for i in (BENCHMARK_RF_ISIN, BENCHMARK_RV_ISIN) if i not in curves]
+    else:
+        curves, _, missing_benchmarks = _resolve_benchmark_curves(df, synthetic_used)
+    if missing_benchmarks:
+        print(f"⚠️ [Backtester] Benchmarks sin datos locales (respuesta parcial): {missing_benchmarks}")
 
     return {
-        "topHoldings": final_top_holdings,
-        "regionAllocation": sorted(region_list, key=lambda x: x["value"], reverse=True),
+        "df": df,
+        "valid_assets": valid_assets,
+        "returns": returns,
+        "weights": w_vector,
+        "port_ret": returns.dot(w_vector),
+        "rf_curve": curves.get(BENCHMARK_RF_ISIN),
+        "rv_curve": curves.get(BENCHMARK_RV_ISIN),
+        "missing_benchmarks": missing_benchmarks,
+        "benchmarks": benchmarks,
+        "rf_rate_annual": fetcher.get_dynamic_risk_free_rate(),
+        "last_date": df_master.index[-1] if len(df_master) > 0 else None,
     }
 
 
-def _compute_metrics(df_master, period, weights_map, synthetic_used, fetcher):
+def _period_window(streams, period, rebalance="daily"):
     """
-    Slices master DataFrame and computes metrics for a specific period.
+    Recorta el tramo común a la ventana de `period` y valida su cobertura.
+    rebalance: "daily" (returns.dot(w), convención histórica) o una frecuencia de
+    rebalance_engine con deriva de pesos desde el inicio de la ventana.
     """
-    period_days_map = {"1y": 365, "3y": 1095, "5y": 1825, "10y": 3650, "max": 10000}
-    lookback = period_days_map.get(period, 1095)
-
-    # Slice Data
-    if len(df_master) > 0:
-        start_date = df_master.index[-1] - timedelta(days=lookback)
-        df = df_master[df_master.index >= start_date].copy()
-    else:
-        df = df_master
+    lookback = PERIOD_DAYS_MAP.get(period, 1095)
+    df = streams["df"]
+    if streams["last_date"] is not None:
+        df = df[df.index >= streams["last_date"] - timedelta(days=lookback)]
 
-    if df.empty:
-        return {"error": "Period selected is outside available history range."}
-
-    valid_assets = [c for c in df.columns if c in weights_map]
-    if not valid_assets:
-        return {"error": "No valid assets in period"}
-        
-    # Find actual common history inside this requested period window
-    df = df.dropna(subset=valid_assets)
     if df.empty:
         return {"error": f"No common history within the requested period '{period}'."}
-        
+
     if period != "max":
         # Check if the valid history actually covers the expected timeframe (85% tolerance)
-        min_required_span = lookback * 0.85 
+        min_required_span = lookback * 0.85
         span_days = (df.index[-1] - df.index[0]).days
         if span_days < min_required_span:
             return {"error": f"Insufficient common history for {period}. Needed ~{int(min_required_span)} días, got {span_days}."}
@@ -308,166 +273,316 @@ def _compute_metrics(df_master, period, weights_map, synthetic_used, fetcher):
             f"Short History Warning: Comparison limited to last {history_days} days."
         )
 
-    # Portfolio Return Calculation
-    df_port = df[valid_assets]
-    returns = df_port.pct_change().dropna()
-
-    # ====================================================================
-    # DEFENSIVE RETURN CLIPPING: Cap daily returns at ±15%
-    # Any daily return >15% on a mutual fund is a data anomaly (split, glitch).
-    # This is the LAST line of defense after data_fetcher despiking.
-    # ====================================================================
-    DAILY_RETURN_CAP = 0.15
-    clipped_count = (returns.abs() > DAILY_RETURN_CAP).sum().sum()
-    if clipped_count > 0:
-        print(
-            f"⚠️ [Backtester] Clipping {clipped_count} extreme daily returns (>±{DAILY_RETURN_CAP * 100}%)"
-        )
-        returns = returns.clip(-DAILY_RETURN_CAP, DAILY_RETURN_CAP)
-
-    w_vector = np.array([weights_map.get(c, 0) for c in df_port.columns])
-    if w_vector.sum() > 0:
-        w_vector = w_vector / w_vector.sum()
+    # Retornos del periodo = sufijo de los retornos del tramo común (sin el primer día)
+    start = df.index[0]
+    returns = streams["returns"][streams["returns"].index > start]
+    port_ret = streams["port_ret"][streams["port_ret"].index > start]
 
-    port_ret = returns.dot(w_vector)
-    
     # Calculate cumulative returns for metrics calculations
-    cumulative = (1 + port_ret).cumprod() * 100
-    
-    days_count = len(cumulative)
-    rf_rate_annual = fetcher.get_dynamic_risk_free_rate()
-    
-    from services.quant_core import calculate_historical_metrics
-    m_port = calculate_historical_metrics(cumulative, risk_free_annual=rf_rate_annual, method="geometric")
-    
-    if m_port:
-        cagr = m_port["return"]
-        vol = m_port["volatility"]
-        sharpe = m_port["sharpe"]
-        max_dd = m_port["max_drawdown"]
+    if rebalance != "daily" and len(returns):
+        cumulative = simulate_rebalanced_portfolio(returns, streams["weights"], [rebalance])[rebalance]["values"]
+        port_ret = cumulative.pct_change().fillna(cumulative.iloc[0] / 100.0 - 1.0)
     else:
-        cagr = vol = sharpe = max_dd = 0.0
+        cumulative = (1 + port_ret).cumprod() * 100
 
-    # DIAGNOSTIC: Log the computed volatility for debugging
-    print(
-        f"📊 [Backtester] Period={period}, Vol={vol:.4f}, CAGR={cagr:.4f}, Days={days_count}"
-    )
-    if vol > 0.30:
-        print(f"⚠️ [Backtester] HIGH VOLATILITY DETECTED: {vol:.4f} for period {period}")
-        # Log top 5 most volatile daily returns to identify the culprit
-        top_rets = port_ret.abs().nlargest(5)
-        for dt, val in top_rets.items():
-            print(f"   🔍 Top return {dt}: {val:.4f} ({val * 100:.2f}%)")
-
-    # Helper for fallback YF
-    def get_yf_series(ticker, start_date, default_index):
-        try:
-            # Just reusing df_master values if they exist would be better, but they might not be in master unless requested
-            # But here we are inside _compute_metrics, logic should be robust.
-            # We rely on previous logic: fetched via YF call or cached?
-            # Let's simplify: call YF here if needed.
-            if ticker in df.columns:
-                return df[ticker]
-
-            yf_data = yf.download(
-                ticker, start=start_date - timedelta(days=10), progress=False
-            )["Close"]
-            if isinstance(yf_data, pd.DataFrame):
-                yf_data = yf_data.iloc[:, 0]
-            yf_data.index = pd.to_datetime(yf_data.index).normalize()
-            if yf_data.index.tz is not None:
-                yf_data.index = yf_data.index.tz_localize(None)
-                
-            # Hardening: Exact calendar match, limited ffill
-            # Excepción: bfill(limit=1) justificado para alinear benchmarks externos (YF) por diferencias de huso/festivo inicial
-            yf_aligned = yf_data.reindex(default_index)
-            return yf_aligned.ffill(limit=5).bfill(limit=1)
-        except Exception as e:
-            print(f"⚠️ [Backtester] Fallo al pedir {ticker} a YF: {e}")
-            return pd.Series(index=default_index, dtype=float).fillna(100.0)
-
-    # Benchmarks (RF/RV)
-    if BENCHMARK_RF_ISIN in df and BENCHMARK_RF_ISIN not in synthetic_used:
-        rf_curve = df[BENCHMARK_RF_ISIN]
-    else:
-        rf_curve = get_yf_series("IEF", df.index[0], df.index)
+    # Perfiles sintéticos: sólo los que tienen todas sus patas (mezcla RF/RV) disponibles
+    profiles = profile_levels(streams["rf_curve"], streams["rv_curve"], df.index)
 
-    if BENCHMARK_RV_ISIN in df and BENCHMARK_RV_ISIN not in synthetic_used:
-        rv_curve = df[BENCHMARK_RV_ISIN]
-    else:
-        rv_curve = get_yf_series("SPY", df.index[0], df.index)
-
-    def norm(s):
-        if len(s) == 0: return s
-        s_clean = s.ffill().bfill()
-        return (s_clean / s_clean.iloc[0] * 100)
-
-    rf_norm = norm(rf_curve)
-    rv_norm = norm(rv_curve)
-
-    profiles = {
-        "conservative": rf_norm,
-        "moderate": rf_norm * 0.75 + rv_norm * 0.25,
-        "balanced": rf_norm * 0.50 + rv_norm * 0.50,
-        "dynamic": rf_norm * 0.25 + rv_norm * 0.75,
-        "aggressive": rv_norm,
+    if streams.get("missing_benchmarks"):
+        warnings.append(
+            f"Partial Benchmarks: no local data for {', '.join(streams['missing_benchmarks'])}; affected profiles omitted."
+        )
+    return {
+        "returns": returns,
+        "port_ret": port_ret,
+        "cumulative": cumulative,
+        "profiles": profiles,
+        # Métricas de perfil del artefacto nocturno si la ventana coincide exactamente
+        "precomputed": precomputed_profile_metrics(streams.get("benchmarks"), period, df.index),
+        "warnings": warnings,
     }
 
-    # Synthetics Metrics
-    synthetics_metrics = []
-    label_map = {
-        "conservative": "Conservador",
-        "moderate": "Moderado",
-        "balanced": "Equilibrado",
-        "dynamic": "Dinámico",
-        "aggressive": "Agresivo",
-    }
-    for name, series in profiles.items():
-        if len(series) < 5:
-            continue
-            
-        m_bmk = calculate_historical_metrics(series, risk_free_annual=rf_rate_annual, method="geometric")
-        if m_bmk:
-            synthetics_metrics.append(
-                {
-                    "name": label_map.get(name, name),
-                    "vol": float(m_bmk["volatility"]),
-                    "ret": float(m_bmk["return"]),
-                    "type": "benchmark",
-                }
-            )
+
+def _compute_period_metrics(df_master, periods, weights_map, synthetic_used, fetcher, rebalance="daily", compare_rebalancing=False, rolling=None, benchmarks=None):
+    """
+    Métricas de todos los periodos en una pasada:
+    1. Flujos de retornos (cartera + benchmarks) una sola vez sobre la ventana más larga.
+    2. Cada periodo recorta un sufijo; las curvas de todos los periodos se apilan en una
+       matriz (NaN antes del inicio de cada ventana) y quant_core.calculate_window_metrics
+       obtiene CAGR, volatilidad, Sharpe y drawdown de todas las columnas a la vez.
+    3. Correlaciones por periodo acumulando sumas de productos por tramos, del periodo
+       más corto al más largo (cada tramo de retornos se recorre una vez).
+    4. compare_rebalancing: cada frecuencia de REBALANCE_FREQUENCIES se simula sobre la
+       misma ventana y entra como columna extra en el mismo kernel (rebalanceComparison).
+    5. rolling (opciones de _rolling_options): analítica móvil por periodo (rollingSeries).
+    6. benchmarks (artefacto nocturno): las métricas de perfil ya calculadas se reutilizan
+       cuando la ventana coincide; en petición sólo queda la correlación con la cartera.
+    Devuelve {period: resultado} con el mismo formato que la versión por periodo.
+    """
+    streams = _prepare_return_streams(df_master, weights_map, synthetic_used, fetcher, benchmarks)
+    if "error" in streams:
+        return {period: {"error": streams["error"]} for period in periods}
+
+    windows = {period: _period_window(streams, period, rebalance) for period in periods}
+    ok = [p for p in periods if "error" not in windows[p]]
+
+    # 2. Kernel vectorizado: (periodo, serie) -> columna de niveles sobre el calendario común
+    index = streams["df"].index
+    columns = {}
+    rebalance_runs = {}
+    for p in ok:
+        columns[(p, "portfolio")] = windows[p]["cumulative"]
+        for name, series in windows[p]["profiles"].items():
+            if len(series) >= 5 and not windows[p]["precomputed"]:
+                columns[(p, name)] = series
+        if compare_rebalancing and len(windows[p]["returns"]):
+            rebalance_runs[p] = simulate_rebalanced_portfolio(windows[p]["returns"], streams["weights"])
+            for freq, run in rebalance_runs[p].items():
+                columns[(p, f"rebalance:{freq}")] = run["values"]
+    levels = pd.DataFrame({k: v.reindex(index) for k, v in columns.items()}, index=index)
+    levels.columns = pd.Index(list(columns), tupleize_cols=False)
+    rf_rate_annual = streams["rf_rate_annual"]
+    window_metrics = calculate_window_metrics(levels, risk_free_annual=rf_rate_annual)
+
+    # 3. Correlaciones: sumas Σr, Σrrᵀ acumuladas desde el final, un tramo por periodo
+    returns = streams["returns"]
+    values = returns.to_numpy(dtype=float)
+    centre = values.mean(axis=0) if len(values) else np.zeros(values.shape[1])
+    centred = values - centre
+    correlations = {}
+    n_acc, s1, s2, pos = 0, np.zeros(values.shape[1]), np.zeros((values.shape[1],) * 2), len(values)
+    for p in sorted(ok, key=lambda q: len(windows[q]["returns"])):
+        start_pos = len(values) - len(windows[p]["returns"])
+        seg = centred[start_pos:pos]
+        n_acc += len(seg)
+        s1 += seg.sum(axis=0)
+        s2 += seg.T @ seg
+        pos = start_pos
+        with np.errstate(invalid="ignore", divide="ignore"):
+            cov = (s2 - np.outer(s1, s1) / max(n_acc, 1)) / max(n_acc - 1, 1)
+            sd = np.sqrt(np.diag(cov))
+            corr = cov / np.outer(sd, sd)
+        corr = np.where(np.isfinite(corr), corr, np.nan)
+        correlations[p] = pd.DataFrame(corr).round(2).fillna(0).values.tolist()
 
     def to_chart(ser):
         return [{"x": d.strftime("%Y-%m-%d"), "y": round(v, 2)} for d, v in ser.items()]
 
-    return {
-        "portfolioSeries": to_chart(cumulative),
-        "benchmarkSeries": {k: to_chart(v) for k, v in profiles.items()},
-        "metrics": {
-            "cagr": cagr,
-            "volatility": vol,
-            "sharpe": sharpe,
-            "maxDrawdown": max_dd,
-            "rf_rate": rf_rate_annual,
-        },
-        "correlationMatrix": returns.corr().round(2).fillna(0).values.tolist(),
-        "effectiveISINs": valid_assets,
-        "synthetics": synthetics_metrics,
-        "warnings": warnings,
-    }
+    results = {}
+    for period in periods:
+        window = windows[period]
+        if "error" in window:
+            results[period] = window
+            continue
+
+        m_port = window_metrics.get((period, "portfolio"))
+        if m_port:
+            cagr = m_port["return"]
+            vol = m_port["volatility"]
+            sharpe = m_port["sharpe"]
+            max_dd = m_port["max_drawdown"]
+        else:
+            cagr = vol = sharpe = max_dd = 0.0
+
+        # DIAGNOSTIC: Log the computed volatility for debugging
+        print(
+            f"📊 [Backtester] Period={period}, Vol={vol:.4f}, CAGR={cagr:.4f}, Days={len(window['cumulative'])}"
+        )
+        if vol > 0.30:
+            print(f"⚠️ [Backtester] HIGH VOLATILITY DETECTED: {vol:.4f} for period {period}")
+            # Log top 5 most volatile daily returns to identify the culprit
+            top_rets = window["port_ret"].abs().nlargest(5)
+            for dt, val in top_rets.items():
+                print(f"   🔍 Top return {dt}: {val:.4f} ({val * 100:.2f}%)")
+
+        # Synthetics Metrics
+        synthetics_metrics = []
+        precomputed = window["precomputed"] or {}
+        for name, series in window["profiles"].items():
+            m_bmk = precomputed.get(name) or window_metrics.get((period, name))
+            if m_bmk:
+                corr = window["port_ret"].corr(series.pct_change().reindex(window["port_ret"].index))
+                synthetics_metrics.append(
+                    {
+                        "name": PROFILE_LABELS.get(name, name),
+                        "vol": float(m_bmk["volatility"]),
+                        "ret": float(m_bmk["return"]),
+                        "correlation": round(float(corr), 4) if np.isfinite(corr) else None,
+                        "type": "benchmark",
+                    }
+                )
+
+        results[period] = {
+            "rebalance": rebalance,
+            "portfolioSeries": to_chart(window["cumulative"]),
+            "benchmarkSeries": {k: to_chart(v) for k, v in window["profiles"].items()},
+            "metrics": {
+                "cagr": cagr,
+                "volatility": vol,
+                "sharpe": sharpe,
+                "maxDrawdown": max_dd,
+                "rf_rate": rf_rate_annual,
+            },
+            "correlationMatrix": correlations[period],
+            "effectiveISINs": streams["valid_assets"],
+            "synthetics": synthetics_metrics,
+            "warnings": window["warnings"],
+        }
+        if rolling:
+            results[period].update(_rolling_block(window, rolling, rf_rate_annual))
+
+        if streams["missing_benchmarks"]:
+            results[period]["partial"] = True
+            results[period]["missing_benchmarks"] = list(streams["missing_benchmarks"])
+
+        if period in rebalance_runs:
+            comparison = {}
+            for freq, run in rebalance_runs[period].items():
+                m = window_metrics.get((period, f"rebalance:{freq}")) or {}
+                comparison[freq] = {
+                    "cagr": m.get("return", 0.0),
+                    "volatility": m.get("volatility", 0.0),
+                    "sharpe": m.get("sharpe", 0.0),
+                    "maxDrawdown": m.get("max_drawdown", 0.0),
+                    "rebalances": run["rebalances"],
+                    "turnover": run["turnover"],
+                    "annualTurnover": run["annual_turnover"],
+                }
+            results[period]["rebalanceComparison"] = comparison
+    return results
 
 
+
+def _batch_period_metrics(df_master, weight_maps, periods, rf_rate_annual, include_series=False):
+    """
+    Métricas de K carteras sobre la misma matriz de precios (rebalanceo diario, returns·w):
+    1. Retornos diarios de la unión de fondos R (T×N) contra el último precio válido de cada
+       fondo (el movimiento de un hueco cae en el primer día tras él), con el mismo recorte ±15%.
+    2. Pesos W (N×K), renormalizados por cartera a sus fondos con datos: P = R·W (T×K).
+    3. Como el tramo común (dropna) de _compute_period_metrics, cada cartera sólo usa las
+       filas con dato en todos sus fondos; la primera fila tras un hueco de la cartera se
+       recalcula contra su última fila común. Nivel = 100·G(t)/G(inicio), con G = Π(1+P).
+    4. Cada periodo es un sufijo de filas comunes; todas las columnas (periodo, cartera)
+       pasan por calculate_window_metrics a la vez.
+    """
+    funds = [c for c in df_master.columns if any(c in wm for wm in weight_maps)]
+    index = df_master.index
+    T = len(index)
+
+    # Mismo ffill acotado que _fetch_and_process_data: un hueco largo queda sin rellenar
+    prices = df_master[funds].sort_index().ffill(limit=5)
+    px = prices.to_numpy(dtype=float)
+    valid = ~np.isnan(px)
+    returns = prices / prices.ffill().shift(1) - 1.0
+    returns = returns.clip(-DAILY_RETURN_CAP, DAILY_RETURN_CAP)
+    R = np.nan_to_num(returns.to_numpy(dtype=float))
+
+    W = np.zeros((len(funds), len(weight_maps)))
+    for k, wm in enumerate(weight_maps):
+        for j, f in enumerate(funds):
+            W[j, k] = wm.get(f, 0.0)
+    totals = W.sum(axis=0)
+    W = np.divide(W, totals, out=np.zeros_like(W), where=totals > 0)
+    held = W > 0
+
+    # Filas comunes de cada cartera (T×K): ningún fondo con peso sin dato
+    common = ((~valid).astype(float) @ held.astype(float)) == 0
+    P = np.where(common, R @ W, 0.0)  # (T×K) en una sola multiplicación
+    for k in range(len(weight_maps)):
+        rows = np.flatnonzero(common[:, k])
+        after_gap = np.diff(rows) > 1
+        if held[:, k].any() and after_gap.any():
+            cur, prev, h = rows[1:][after_gap], rows[:-1][after_gap], held[:, k]
+            gap_ret = np.clip(px[np.ix_(cur, h)] / px[np.ix_(prev, h)] - 1.0, -DAILY_RETURN_CAP, DAILY_RETURN_CAP)
+            P[cur, k] = gap_ret @ W[h, k]
+    G = np.cumprod(1.0 + P, axis=0)
+
+    last_date = index[-1] if T else None
+    columns, layout = {}, {}
+    for period in periods:
+        lookback = PERIOD_DAYS_MAP.get(period, 1095)
+        cut = int(index.searchsorted(last_date - timedelta(days=lookback))) if T else 0
+        for k in range(len(weight_maps)):
+            if not held[:, k].any():
+                layout[(period, k)] = {"error": "No valid assets in period"}
+                continue
+            rows = np.flatnonzero(common[:, k])
+            pos = int(rows.searchsorted(cut))
+            if pos >= len(rows) - 1:
+                layout[(period, k)] = {"error": f"No common history within the requested period '{period}'."}
+                continue
+            w0 = int(rows[pos])
+            span_days = (index[-1] - index[w0]).days
+            if period != "max" and span_days < lookback * 0.85:
+                layout[(period, k)] = {
+                    "error": f"Insufficient common history for {period}. Needed ~{int(lookback * 0.85)} días, got {span_days}."
+                }
+                continue
+            level = np.full(T, np.nan)
+            level[w0 + 1:] = 100.0 * G[w0 + 1:, k] / G[w0, k]
+            level[~common[:, k]] = np.nan
+            columns[(period, k)] = level
+            layout[(period, k)] = {"start": w0, "history_days": len(rows) - pos}
+
+    levels = pd.DataFrame(columns, index=index)
+    levels.columns = pd.Index(list(columns), tupleize_cols=False)
+    window_metrics = calculate_window_metrics(levels, risk_free_annual=rf_rate_annual)
+
+    results = []
+    for k, wm in enumerate(weight_maps):
+        entry = {
+            "effectiveISINs": [f for j, f in enumerate(funds) if W[j, k] > 0],
+            "missingISINs": [i for i in wm if i not in funds],
+        }
+        for period in periods:
+            info = layout[(period, k)]
+            if "error" in info:
+                entry[period] = {"error": info["error"]}
+                continue
+            m = window_metrics.get((period, k)) or {}
+            warnings = []
+            if info["history_days"] < 126:
+                warnings.append(f"Short History Warning: Comparison limited to last {info['history_days']} days.")
+            entry[period] = {
+                "metrics": {
+                    "cagr": m.get("return", 0.0),
+                    "volatility": m.get("volatility", 0.0),
+                    "sharpe": m.get("sharpe", 0.0),
+                    "maxDrawdown": m.get("max_drawdown", 0.0),
+                    "rf_rate": rf_rate_annual,
+                },
+                "startDate": index[info["start"]].strftime("%Y-%m-%d"),
+                "warnings": warnings,
+            }
+            if include_series:
+                ser = levels[(period, k)].dropna()
+                entry[period]["portfolioSeries"] = [
+                    {"x": d.strftime("%Y-%m-%d"), "y": round(v, 2)} for d, v in ser.items()
+                ]
+        results.append(entry)
+    return results
+
 # --- MAIN ENTRYPOINTS ---
 
 
-def run_multi_period_backtest(portfolio, periods, db):
+def run_multi_period_backtest(portfolio, periods, db, rebalance="daily", compare_rebalancing=False, rolling=None):
     """
     Optimized backtest fetching data once.
     Returns dict: { '1y': {metrics...}, '3y': {...}, 'allocations': {...} }
+    rebalance: "daily" (default histórico), "buy_and_hold", "monthly", "quarterly", "annual".
+    compare_rebalancing: añade rebalanceComparison (todas las frecuencias) a cada periodo.
+    rolling: True o {"window", "step", "benchmark"} -> rolling + rollingSeries por periodo.
     """
     try:
         if isinstance(periods, str):
             periods = [periods]
+        rebalance = rebalance or "daily"
+        if rebalance not in REBALANCE_FREQUENCIES:
+            return {"error": f"Frecuencia de rebalanceo no soportada: {rebalance}"}
+        try:
+            rolling = _rolling_options(rolling)
+        except (TypeError, ValueError) as e:
+            return {"error": f"Parámetros rolling inválidos: {e}"}
 
         assets = [p["isin"] for p in portfolio]
         weights_map = {p["isin"]: float(p["weight"]) / 100.0 for p in portfolio}
@@ -475,21 +590,25 @@ def run_multi_period_backtest(portfolio, periods, db):
         # 1. Fetch Data (Max Period implied by taking all avail history, or explicit logic)
         # By default DataFetcher gets all history.
         fetcher = DataFetcher(db)
+        # Perfiles sintéticos precalculados por la rutina nocturna (None -> patas en petición)
+        benchmarks = fetcher.get_synthetic_benchmarks()
         df_master, synthetic_used = _fetch_and_process_data(
-            assets, db, periods, fetcher
+            assets, db, periods, fetcher, include_benchmarks=benchmarks is None
         )
 
         # 2. Compute Allocations (Static)
-        allocations = _calculate_allocations(portfolio, db, weights_map)
+        allocations = _calculate_allocations(portfolio, db, weights_map, fetcher)
 
         results = {"allocations": allocations}
 
-        # 3. Compute Metrics for each period
-        for period in periods:
-            metrics = _compute_metrics(
-                df_master, period, weights_map, synthetic_used, fetcher
+        # 3. Compute Metrics for all periods (single pass over the longest window)
+        results.update(
+            _compute_period_metrics(
+                df_master, periods, weights_map, synthetic_used, fetcher,
+                rebalance=rebalance, compare_rebalancing=compare_rebalancing, rolling=rolling,
+                benchmarks=benchmarks,
             )
-            results[period] = metrics
+        )
 
         return results
 
@@ -501,7 +620,7 @@ def run_multi_period_backtest(portfolio, periods, db):
         return {"error": str(e)}
 
 
-def run_backtest(portfolio, period, db):
+def run_backtest(portfolio, period, db, rebalance="daily", compare_rebalancing=False, rolling=None):
     """
     Legacy Wrapper: Returns single result object (flattened) for compatibility.
     """
@@ -510,7 +629,9 @@ def run_backtest(portfolio, period, db):
             return {"error": "Cartera vacía"}
 
         # Re-use multi logic
-        multi_res = run_multi_period_backtest(portfolio, [period], db)
+        multi_res = run_multi_period_backtest(
+            portfolio, [period], db, rebalance=rebalance, compare_rebalancing=compare_rebalancing, rolling=rolling
+        )
 
         if "error" in multi_res:
             return multi_res
@@ -527,3 +648,49 @@ def run_backtest(portfolio, period, db):
 
     except Exception as e:
         return {"error": str(e)}
+
+
+def run_batch_backtest(portfolios, periods, db, include_series=False):
+    """
+    Backtest de muchas carteras (candidatas / guardadas) con una sola descarga y alineación
+    de precios sobre la unión de sus fondos y un único producto matricial (ver
+    _batch_period_metrics). Rebalanceo diario (convención histórica), sin allocations.
+    portfolios: [{"id": ..., "portfolio": [{"isin", "weight"}]}] o directamente listas de holdings.
+    Devuelve {"periods": [...], "portfolios": [{"id", "effectiveISINs", "missingISINs", <periodo>: {...}}]}.
+    """
+    try:
+        if isinstance(periods, str):
+            periods = [periods]
+        if not portfolios:
+            return {"error": "Lista de carteras vacía"}
+        if len(portfolios) > BATCH_BACKTEST_MAX_PORTFOLIOS:
+            return {"error": f"Máximo {BATCH_BACKTEST_MAX_PORTFOLIOS} carteras por petición"}
+
+        ids, weight_maps = [], []
+        for i, item in enumerate(portfolios):
+            holdings = item.get("portfolio", []) if isinstance(item, dict) else item
+            ids.append(item.get("id", i) if isinstance(item, dict) else i)
+            wm = {}
+            for h in holdings or []:
+                wm[h["isin"]] = wm.get(h["isin"], 0.0) + float(h["weight"]) / 100.0
+            weight_maps.append(wm)
+
+        assets = list(dict.fromkeys(isin for wm in weight_maps for isin in wm))
+        if not assets:
+            return {"error": "Carteras sin activos"}
+
+        fetcher = DataFetcher(db)
+        # Sin patas de benchmark: el batch sólo usa las columnas de los fondos
+        df_master, _ = _fetch_and_process_data(assets, db, periods, fetcher, include_benchmarks=False)
+
+        results = _batch_period_metrics(
+            df_master, weight_maps, periods, fetcher.get_dynamic_risk_free_rate(), include_series=include_series
+        )
+        for pid, entry in zip(ids, results):
+            entry["id"] = pid
+        print(f"📊 [Backtester] Batch: {len(results)} carteras, {len(assets)} fondos, periodos={periods}")
+        return {"periods": list(periods), "portfolios": results}
+
+    except Exception as e:
+        print(f"❌ Error Batch-Backtest: {e}")
+        return {"error": str(e)}
@@ -27,6 +27,9 @@ PRICE_CACHE = {}
 # Autoridad total del backend, NO DEBEN ser sobreescritas por Firestore ni UI.
 TRADING_DAYS = 252
 RISK_FREE_RATE = 0.03
+# Recorte defensivo de retornos diarios (backtester, proyección, stress): un movimiento
+# diario > ±15% en un fondo es una anomalía de datos (split, error) tras el despiking.
+DAILY_RETURN_CAP = 0.15
 
 # ==========================================
 # 2) SOLVER DEFAULTS (Technical Truth / Fallback Policy)
@@ -44,6 +47,142 @@ CUTOFF_DEFAULT = 0.02
 # Mínimo de activos con peso > 0 para considerar la solución "estable"
 MIN_ASSETS_DEFAULT = 8
 
+# Modo cardinalidad (constraints.max_assets / constraints.min_position):
+# peso por debajo del cual un activo se considera fuera del soporte del solver,
+# y nº máximo de re-resoluciones del heurístico de reducción de soporte.
+CARDINALITY_SUPPORT_EPS = 1e-4
+CARDINALITY_MAX_ITERS = 8
+
+# Sensibilidad de restricciones (constraints.sensitivity_grid): pasos de relajación
+# por defecto y nº máximo de restricciones activas que se re-resuelven.
+SENSITIVITY_GRID_DEFAULT = [0.01, 0.025, 0.05]
+SENSITIVITY_MAX_CONSTRAINTS = 5
+
+# Optimización remuestreada (constraints.resamples): nº de bootstraps por defecto,
+# tope de procesos del pool y presupuesto de tiempo (el endpoint corta a 120 s).
+RESAMPLING_DEFAULT_N = 200
+RESAMPLING_MAX_N = 1000
+RESAMPLING_MAX_WORKERS = 8
+RESAMPLING_TIME_BUDGET_S = 90.0
+
+# Objetivos de riesgo de cola (objective="min_cvar" / "min_cdar"): nivel de confianza
+# y tamaño máximo del LP de escenarios (reducción diaria -> semanal -> mensual).
+SCENARIO_RISK_BETA = 0.95
+SCENARIO_MAX_COUNT = 520
+
+# Frontera paramétrica (fallback de CLA): nº total de puntos del barrido adaptativo
+# y nº de objetivos equiespaciados iniciales antes del refinamiento por curvatura.
+FRONTIER_SWEEP_POINTS = 30
+FRONTIER_SWEEP_INITIAL = 6
+
+# ==========================================
+# 2b) RESULT CACHE POLICY (Technical Truth)
+# ==========================================
+# Resultados de optimize_portfolio_quant cacheados por hash de la petición normalizada
+# y versión de datos (risk_profiles + caché global de precios).
+OPTIMIZER_CACHE_COLLECTION = "optimizer_cache"
+OPTIMIZER_CACHE_TTL_SECONDS = 6 * 3600
+OPTIMIZER_CACHE_MAX_ENTRIES = 128
+
+# Artefacto frontera (curva + nube de activos + μ/Σ) compartido entre el optimizador
+# y getEfficientFrontier, por universo + ventana + estimador + versión de precios.
+FRONTIER_CACHE_COLLECTION = "frontier_cache"
+FRONTIER_CACHE_TTL_SECONDS = 6 * 3600
+FRONTIER_CACHE_MAX_ENTRIES = 64
+# Payload (Σ completa) en Storage y puntero en Firestore: con ~350 fondos el artefacto
+# supera el límite de 1 MiB por documento.
+FRONTIER_CACHE_STORAGE_PREFIX = "cache/frontier"
+# Ventana de estimación del optimizador. getEfficientFrontier la expone como periodo
+# "optimizer" para reutilizar el artefacto de una cartera recién optimizada.
+OPTIMIZER_WINDOW_YEARS = 5
+
+# ==========================================
+# 2c) AUTO-EXPAND CANDIDATE POOL (Technical Truth)
+# ==========================================
+# Pool nocturno de candidatos con historia prevalidada y alineada a la ventana
+# estándar del optimizador (Storage JSON, construido tras la caché global de precios).
+AUTO_EXPAND_POOL_BLOB = "cache/auto_expand_pool.json"
+AUTO_EXPAND_POOL_SIZE = 50
+AUTO_EXPAND_WINDOW_YEARS = 5
+AUTO_EXPAND_MIN_OBS = 756  # ~3 años: mismo mínimo que los activos auto del optimizador
+AUTO_EXPAND_MAX_ADDED = 6
+
+# ==========================================
+# 2d) BENCHMARK STORE (Nightly Ingestion)
+# ==========================================
+# Benchmarks RF/RV de los perfiles sintéticos del backtester y sus proxies de mercado.
+# La rutina nocturna los ingiere (EODHD) en historico_vl_v2 como un fondo más, de modo que
+# entran en la caché global de precios. En petición sólo se leen datos locales: si falta
+# un benchmark la respuesta se marca como parcial, nunca se descarga en vivo.
+BENCHMARK_PROXIES = {
+    BENCHMARK_RF_ISIN: {"doc_id": "PROXY_IEF", "eod_ticker": "IEF.US"},
+    BENCHMARK_RV_ISIN: {"doc_id": "PROXY_SPY", "eod_ticker": "SPY.US"},
+}
+BENCHMARK_INGEST_LOOKBACK_DAYS = 7
+BENCHMARK_MIN_HISTORY_POINTS = 250  # por debajo se pide la historia completa
+# Los NAV de fondos se recortan a los últimos NAV_HISTORY_MAX_POINTS (~12 años, límite de
+# 1 MiB por documento). Benchmarks y proxies (4 documentos) conservan la historia desde
+# BENCHMARK_HISTORY_START: son las patas RF/RV con las que el stress test aproxima los
+# episodios anteriores a la historia de los fondos (2008, 2011).
+NAV_HISTORY_MAX_POINTS = 3000
+BENCHMARK_HISTORY_START = "2007-01-01"
+
+# backtest_portfolio_batch: tope de carteras por petición (una sola matriz de precios).
+BATCH_BACKTEST_MAX_PORTFOLIOS = 100
+
+# ==========================================
+# 2e) EXPOSURE INDEX (Nightly Look-Through)
+# ==========================================
+# Vectores normalizados por fondo (clase de activo, región, sector, top posiciones)
+# construidos tras el pool auto-expand. En petición el look-through es Σ w·v sin leer funds_v3.
+EXPOSURE_INDEX_BLOB = "cache/exposure_index.json"
+EXPOSURE_INDEX_MAX_HOLDINGS = 50  # posiciones por fondo; el resto se agrega en OTHERS
+
+# ==========================================
+# 2f) WALK-FORWARD BACKTEST (Optimizer Out-of-Sample)
+# ==========================================
+# Re-optimización en cada fecha de rebalanceo sobre una ventana móvil de estimación
+# (mismas FASES del optimizador) encadenando los retornos fuera de muestra.
+WALK_FORWARD_ESTIMATION_WINDOW = 756  # retornos diarios (~3 años), mínimo de activos auto
+WALK_FORWARD_MIN_OOS_DAYS = 126  # tramo fuera de muestra mínimo para aceptar el estudio
+WALK_FORWARD_MAX_REBALANCES = 120  # tope de re-optimizaciones por petición (timeout del callable)
+
+# ==========================================
+# 2g) SYNTHETIC BENCHMARKS (Nightly Profiles)
+# ==========================================
+# Patas RF/RV ya resueltas (ISIN o proxy) y métricas de los perfiles sintéticos por periodo.
+# El backtester sólo recorta las patas y calcula la correlación con la cartera.
+SYNTHETIC_BENCHMARKS_BLOB = "cache/synthetic_benchmarks.json"
+
+# ==========================================
+# 2h) PROJECTION (Block Bootstrap Monte Carlo)
+# ==========================================
+# Proyección de patrimonio re-muestreando bloques de retornos mensuales históricos de la
+# cartera (colas y dependencia de corto plazo reales). Semilla fija por defecto: reproducible.
+PROJECTION_DEFAULT_PATHS = 10000
+PROJECTION_MAX_PATHS = 50000
+PROJECTION_MAX_HORIZON_YEARS = 40
+PROJECTION_BLOCK_MONTHS = 12  # longitud del bloque (meses consecutivos)
+PROJECTION_MIN_HISTORY_MONTHS = 36  # historia común mínima para aceptar la proyección
+PROJECTION_PERCENTILES = (5, 25, 50, 75, 95)
+PROJECTION_DEFAULT_SEED = 20240101
+
+# ==========================================
+# 2i) STRESS SCENARIOS (Historical Episodes)
+# ==========================================
+# Biblioteca de episodios: retorno de cierre a cierre entre el primer día hábil >= start
+# y end. Todos se evalúan sobre una única matriz de precios; los fondos sin historia
+# suficiente en un episodio se aproximan por su clase de activo con las patas RF/RV.
+STRESS_SCENARIOS = {
+    "gfc_2008": {"name": "Crisis Financiera Global (Lehman)", "start": "2008-09-01", "end": "2009-03-09"},
+    "euro_debt_2011": {"name": "Crisis de Deuda Soberana Europea", "start": "2011-07-01", "end": "2011-10-04"},
+    "china_2015": {"name": "Devaluación China y Caída del Petróleo", "start": "2015-08-10", "end": "2016-02-11"},
+    "fed_q4_2018": {"name": "Endurecimiento Fed Q4 2018", "start": "2018-10-01", "end": "2018-12-24"},
+    "covid_2020": {"name": "COVID-19 (Marzo 2020)", "start": "2020-02-19", "end": "2020-03-23"},
+    "rates_2022": {"name": "Shock de Tipos 2022", "start": "2022-01-03", "end": "2022-10-12"},
+}
+STRESS_MIN_COVERAGE = 0.80  # fracción de días del episodio con dato para usar la historia real
+
 # ==========================================
 # 3) PROFILE POLICY DEFAULTS (DB Seed Only)
 # ==========================================
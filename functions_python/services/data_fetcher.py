@@ -10,6 +10,12 @@ logger = logging.getLogger(__name__)
 # Global RAM Cache for Risk Free Rate
 _rf_cache = {"rate": None, "timestamp": None}
 _global_prices_cache = None
+# Artefactos nocturnos en Storage: pool auto-expand, índice de exposiciones look-through y
+# benchmarks sintéticos ({value, timestamp}; se refrescan como mucho cada hora por instancia)
+_STORAGE_ARTIFACT_RAM_TTL = timedelta(hours=1)
+_auto_expand_pool_cache = {"value": None, "timestamp": None}
+_exposure_index_cache = {"value": None, "timestamp": None}
+_synthetic_benchmarks_cache = {"value": None, "timestamp": None}
 
 
 class DataFetcher:
@@ -18,8 +24,14 @@ class DataFetcher:
     Handles Firestore, Caching, and Pre-processing (Resampling).
     """
 
-    def __init__(self, db_client):
+    def __init__(self, db_client, telemetry=None):
         self.db = db_client
+        # Optional PipelineTelemetry: counts Firestore reads/writes and Storage bytes
+        self.telemetry = telemetry
+
+    def _count(self, key, n=1):
+        if self.telemetry is not None:
+            self.telemetry.count(key, n)
 
     def get_price_data(
         self, assets_list: list, resample_freq="D", strict=True
@@ -37,6 +49,7 @@ class DataFetcher:
         for isin in assets_list:
             if isin in PRICE_CACHE:
                 price_data[isin] = PRICE_CACHE[isin]
+                self._count("ram_cache_hits")
             else:
                 missing_assets.append(isin)
 
@@ -60,7 +73,10 @@ class DataFetcher:
                         logger.info(
                             "⚡ [DataFetcher] Descargando caché global desde Cloud Storage..."
                         )
-                        master_cache = json.loads(blob.download_as_string())
+                        raw_cache = blob.download_as_string()
+                        self._count("storage_reads")
+                        self._count("storage_bytes", len(raw_cache))
+                        master_cache = json.loads(raw_cache)
                         _global_prices_cache = master_cache
 
                 if master_cache:
@@ -98,6 +114,7 @@ class DataFetcher:
                 for isin in missing_assets
             ]
             docs = self.db.get_all(refs)
+            self._count("firestore_reads", len(refs))
 
             for doc in docs:
                 isin = doc.id
@@ -122,6 +139,91 @@ class DataFetcher:
             return pd.DataFrame(), []
 
         # 3. Pandas Alignment & Professional Cleaning
+        df = self._align_and_clean(price_data)
+
+        # Step D: Strict vs Loose
+        if strict:
+            df_final = df.dropna()
+            if len(df_final) < 60:
+                logger.warning(f"⚠️ [DataFetcher] Tras dropna() estricto, la matriz común de {len(df_final.columns)} activos quedó en solo {len(df_final)} observaciones.")
+        else:
+            df_final = df
+
+        return df_final, synthetic_used
+
+    def _load_storage_artifact(self, blob_name, parser, cache, label):
+        """
+        Descarga y parsea un artefacto JSON de Storage con caché RAM de
+        _STORAGE_ARTIFACT_RAM_TTL (también cachea la ausencia: None).
+        parser: dict -> artefacto parseado o None; cache: dict {value, timestamp} del módulo.
+        """
+        now = datetime.now()
+        cached_ts = cache["timestamp"]
+        if cached_ts is not None and now - cached_ts < _STORAGE_ARTIFACT_RAM_TTL:
+            if cache["value"] is not None:
+                self._count("ram_cache_hits")
+            return cache["value"]
+
+        value = None
+        try:
+            import json
+            from firebase_admin import storage
+            from .config import BUCKET_NAME
+
+            blob = storage.bucket(BUCKET_NAME).blob(blob_name)
+            if blob.exists():
+                raw = blob.download_as_string()
+                self._count("storage_reads")
+                self._count("storage_bytes", len(raw))
+                value = parser(json.loads(raw))
+                if value:
+                    logger.info(f"⚡ [DataFetcher] {label} cargado (v{value.get('version')})")
+        except Exception as e:
+            logger.warning(f"⚠️ [DataFetcher] Fallo al leer {label}: {e}")
+
+        cache["value"] = value
+        cache["timestamp"] = now
+        return value
+
+    def get_auto_expand_pool(self):
+        """
+        Pool de candidatos auto-expand precalculado por la rutina nocturna
+        (precios alineados a la ventana estándar + μ/Σ del bloque candidato).
+        Devuelve el pool parseado o None si no existe o no se puede leer.
+        """
+        from .config import AUTO_EXPAND_POOL_BLOB
+        from .portfolio.candidate_pool import parse_candidate_pool
+
+        return self._load_storage_artifact(AUTO_EXPAND_POOL_BLOB, parse_candidate_pool, _auto_expand_pool_cache, "pool auto-expand")
+
+    def get_exposure_index(self):
+        """
+        Índice de exposiciones look-through precalculado por la rutina nocturna
+        (vectores por fondo: clase de activo, región, sector y top posiciones).
+        Devuelve el índice parseado o None si no existe o no se puede leer.
+        """
+        from .config import EXPOSURE_INDEX_BLOB
+        from .exposure_index import parse_exposure_index
+
+        return self._load_storage_artifact(EXPOSURE_INDEX_BLOB, parse_exposure_index, _exposure_index_cache, "índice de exposiciones")
+
+    def get_synthetic_benchmarks(self):
+        """
+        Benchmarks sintéticos precalculados por la rutina nocturna (patas RF/RV resueltas
+        y métricas de perfil por periodo). Devuelve el artefacto parseado o None.
+        """
+        from .config import SYNTHETIC_BENCHMARKS_BLOB
+        from .synthetic_benchmarks import parse_synthetic_benchmarks
+
+        return self._load_storage_artifact(
+            SYNTHETIC_BENCHMARKS_BLOB, parse_synthetic_benchmarks, _synthetic_benchmarks_cache, "benchmarks sintéticos"
+        )
+
+    def _align_and_clean(self, price_data) -> pd.DataFrame:
+        """
+        Alineación a calendario B-day + despiking + ffill(limit=5).
+        Lanza ValueError si algún activo viola el circuit breaker (>40% diario).
+        """
         df = pd.DataFrame(price_data)
         df.index = pd.to_datetime(df.index)
         df = df.sort_index()
@@ -184,15 +286,7 @@ class DataFetcher:
         # Step C2: Fill Gaps (Professional ffill sequence)
         df = df.ffill(limit=5)
 
-        # Step D: Strict vs Loose
-        if strict:
-            df_final = df.dropna()
-            if len(df_final) < 60:
-                logger.warning(f"⚠️ [DataFetcher] Tras dropna() estricto, la matriz común de {len(df_final.columns)} activos quedó en solo {len(df_final)} observaciones.")
-        else:
-            df_final = df
-
-        return df_final, synthetic_used
+        return df
 
     def _parse_doc_history(self, data: dict) -> dict:
         """Parses V3 history or legacy series."""
@@ -231,6 +325,7 @@ class DataFetcher:
         # For now, batch read funds_v3
         refs = [self.db.collection("funds_v3").document(isin) for isin in assets_list]
         docs = self.db.get_all(refs)
+        self._count("firestore_reads", len(refs))
 
         for d in docs:
             if d.exists:
@@ -264,6 +359,7 @@ class DataFetcher:
         try:
             doc_ref = self.db.collection("system_settings").document("risk_free_rate")
             doc = doc_ref.get()
+            self._count("firestore_reads")
             if doc.exists:
                 data = doc.to_dict()
                 last_update = data.get("updated_at")
@@ -333,6 +429,7 @@ class DataFetcher:
                         "cycle": cycle_start.isoformat(),
                     }
                 )
+                self._count("firestore_writes")
             except Exception as w_err:
                 logger.warning(f"⚠️ Error writing DB cache: {w_err}")
 
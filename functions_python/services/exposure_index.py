@@ -0,0 +1,256 @@
+import logging
+
+import numpy as np
+
+from .config import EXPOSURE_INDEX_MAX_HOLDINGS
+
+logger = logging.getLogger(__name__)
+
+# Índice nocturno de exposiciones look-through (Storage JSON, ver analytics.build_exposure_index).
+# Cada fondo es un vector normalizado (fracciones 0-1) por dimensión; la cartera es Σ w_i · v_i.
+ASSET_CLASS_LABELS = {
+    "equity": "Renta Variable",
+    "bond": "Renta Fija",
+    "cash": "Monetario",
+    "other": "Otros",
+}
+
+# Morningstar & V2 Regions Mapping (orden = orden del vector "region" del índice)
+REGION_LABELS = {
+    "united_states": "EE.UU.",
+    "canada": "Canadá",
+    "latin_america": "Latinoamérica",
+    "united_kingdom": "Reino Unido",
+    "eurozone": "Eurozona",
+    "europe_ex_euro": "Europa (No Euro)",
+    "europe_emerging": "Europa Emergente",
+    "africa": "África",
+    "middle_east": "Oriente Medio",
+    "japan": "Japón",
+    "australasia": "Australasia",
+    "asia_developed": "Asia Desarrollada",
+    "asia_emerging": "Asia Emergente",
+    # Canonical V2 Keys
+    "us": "EE.UU.",
+    "europe": "Europa",
+    "emerging": "Mercados Emergentes",
+    "asia_dev": "Asia Desarrollada",
+}
+
+_ASSET_TYPE_TO_CLASS = {"EQUITY": "equity", "FIXED_INCOME": "bond", "MONETARY": "cash"}
+
+OTHERS_HOLDING = "OTHERS"
+OTHERS_HOLDING_NAME = "Otras/No Disponible"
+UNKNOWN_LABEL = "Desconocido / Otros"
+
+
+# =========================================================================
+# 1. VECTORES POR FONDO (a partir del documento funds_v3)
+# =========================================================================
+
+def _fractions(values) -> dict:
+    """
+    {clave: peso} en % (0-100) o en fracción (0-1) -> fracciones positivas.
+    La escala se decide por diccionario (suma > 1.5 => porcentajes), no valor a valor.
+    """
+    clean = {}
+    if not isinstance(values, dict):
+        return clean
+    for key, value in values.items():
+        try:
+            f = float(value)
+        except (TypeError, ValueError):
+            continue
+        if f > 0:
+            clean[key] = clean.get(key, 0.0) + f
+    scale = 100.0 if sum(clean.values()) > 1.5 else 1.0
+    return {k: v / scale for k, v in clean.items()}
+
+
+def fund_exposure(fd: dict) -> dict:
+    """
+    Exposición look-through normalizada de un fondo:
+    - asset_class: portfolio_exposure_v2.economic_exposure (si no, classification_v2.asset_type al 100%).
+    - region: portfolio_exposure_v2.equity_regions (si no, region_primary al 100%); sólo claves de REGION_LABELS.
+    - sector: portfolio_exposure_v2.sectors.
+    - holdings: top EXPOSURE_INDEX_MAX_HOLDINGS posiciones; el resto (y lo no reportado) va a OTHERS.
+    - meta: subconjunto de funds_v3 que usa el analizador (name, categoryId, std_perf.sharpe).
+    """
+    fd = fd or {}
+    exp_v2 = fd.get("portfolio_exposure_v2") or {}
+    class_v2 = fd.get("classification_v2") or {}
+
+    asset_class = _fractions(exp_v2.get("economic_exposure"))
+    if "fixed_income" in asset_class:
+        asset_class["bond"] = asset_class.get("bond", 0.0) + asset_class.pop("fixed_income")
+    asset_class = {k: v for k, v in asset_class.items() if k in ASSET_CLASS_LABELS}
+    if not asset_class and class_v2.get("asset_type") in _ASSET_TYPE_TO_CLASS:
+        asset_class = {_ASSET_TYPE_TO_CLASS[class_v2["asset_type"]]: 1.0}
+
+    regions = exp_v2.get("equity_regions")
+    if isinstance(regions, dict) and "detail" in regions:
+        regions = regions["detail"]
+    region = {k: v for k, v in _fractions(regions).items() if k in REGION_LABELS}
+    if not region:
+        primary = class_v2.get("region_primary")
+        if primary and primary not in ("UNKNOWN", "NONE") and primary.lower() in REGION_LABELS:
+            region = {primary.lower(): 1.0}
+
+    sector = _fractions(exp_v2.get("sectors"))
+
+    holdings, names = {}, {}
+    holdings_list = fd.get("holdings", []) or fd.get("holdings_top10", []) or fd.get("top_holdings", [])
+    if isinstance(holdings_list, list) and holdings_list:
+        for h in holdings_list:
+            h_name = h.get("name", "Unknown")
+            h_id = h.get("isin", h_name)
+            try:
+                h_w = float(h.get("weight", 0)) / 100.0
+            except (TypeError, ValueError):
+                continue
+            holdings[h_id] = holdings.get(h_id, 0.0) + h_w
+            names.setdefault(h_id, h_name)
+        ranked = sorted(holdings.items(), key=lambda x: x[1], reverse=True)
+        holdings = dict(ranked[:EXPOSURE_INDEX_MAX_HOLDINGS])
+        tail = sum(w for _, w in ranked[EXPOSURE_INDEX_MAX_HOLDINGS:])
+        others = max(0.0, 1.0 - sum(w for _, w in ranked)) + tail
+        if others > 0:
+            holdings[OTHERS_HOLDING] = holdings.get(OTHERS_HOLDING, 0.0) + others
+    else:
+        holdings = {OTHERS_HOLDING: 1.0}
+    names[OTHERS_HOLDING] = OTHERS_HOLDING_NAME
+
+    std_perf = fd.get("std_perf") or {}
+    return {
+        "asset_class": asset_class,
+        "region": region,
+        "sector": sector,
+        "holdings": holdings,
+        "names": {k: names[k] for k in holdings},
+        "meta": {
+            "name": fd.get("name"),
+            "categoryId": fd.get("categoryId"),
+            "std_perf": {"sharpe": std_perf.get("sharpe")},
+        },
+    }
+
+
+# =========================================================================
+# 2. ÍNDICE COMPACTO (payload JSON) Y CARGA
+# =========================================================================
+
+def build_exposure_index(fund_docs, version: str) -> dict:
+    """
+    fund_docs: iterable de (isin, documento funds_v3).
+    Payload: vocabularios por dimensión + por fondo vectores densos (6 decimales) y
+    posiciones dispersas [[id, peso], ...]; los nombres de posiciones se guardan una vez.
+    """
+    exposures = {isin: fund_exposure(fd) for isin, fd in fund_docs}
+    dims = {
+        "asset_class": list(ASSET_CLASS_LABELS),
+        "region": list(REGION_LABELS),
+        "sector": sorted({k for e in exposures.values() for k in e["sector"]}),
+    }
+    names, funds = {}, {}
+    for isin, e in exposures.items():
+        for h_id, h_name in e["names"].items():
+            names.setdefault(h_id, h_name)
+        funds[isin] = {
+            **{dim: [round(e[dim].get(k, 0.0), 6) for k in keys] for dim, keys in dims.items()},
+            "holdings": [[h_id, round(w, 6)] for h_id, w in e["holdings"].items()],
+            "meta": e["meta"],
+        }
+    return {"version": version, "dims": dims, "names": names, "funds": funds}
+
+
+def parse_exposure_index(raw: dict) -> dict:
+    """Payload JSON -> matrices (fondos × dimensión) listas para el producto con los pesos."""
+    if not raw or not raw.get("funds"):
+        return None
+    isins = list(raw["funds"])
+    dims = raw["dims"]
+    return {
+        "version": raw.get("version"),
+        "dims": dims,
+        "row": {isin: i for i, isin in enumerate(isins)},
+        "matrices": {
+            dim: np.array([raw["funds"][i][dim] for i in isins], dtype=float).reshape(len(isins), len(keys))
+            for dim, keys in dims.items()
+        },
+        "holdings": {isin: raw["funds"][isin]["holdings"] for isin in isins},
+        "meta": {isin: raw["funds"][isin].get("meta", {}) for isin in isins},
+        "names": raw.get("names", {}),
+    }
+
+
+# =========================================================================
+# 3. LOOK-THROUGH DE CARTERA
+# =========================================================================
+
+def portfolio_lookthrough(index, weights_map: dict, extra: dict = None) -> dict:
+    """
+    Exposición agregada Σ w_i · v_i (w en fracción, sin renormalizar).
+    - index: índice parseado (o None); extra: {isin: fund_exposure(...)} para fondos fuera del índice.
+    - Fondos sin datos en ninguno de los dos: su peso va íntegro a OTHERS en holdings.
+    """
+    extra = extra or {}
+    rows = index["row"] if index else {}
+    covered = [i for i in weights_map if i in rows]
+    out = {"asset_class": {}, "region": {}, "sector": {}, "holdings": {}, "names": {}}
+
+    if covered:
+        w = np.array([weights_map[i] for i in covered], dtype=float)
+        pos = [rows[i] for i in covered]
+        for dim, keys in index["dims"].items():
+            agg = w @ index["matrices"][dim][pos]
+            out[dim] = {k: float(v) for k, v in zip(keys, agg) if v > 0}
+        for isin, wi in zip(covered, w):
+            for h_id, hw in index["holdings"][isin]:
+                out["holdings"][h_id] = out["holdings"].get(h_id, 0.0) + wi * hw
+                out["names"].setdefault(h_id, index["names"].get(h_id, h_id))
+
+    for isin, wi in weights_map.items():
+        if isin in rows:
+            continue
+        e = extra.get(isin)
+        if e is None:
+            out["holdings"][OTHERS_HOLDING] = out["holdings"].get(OTHERS_HOLDING, 0.0) + wi
+            out["names"][OTHERS_HOLDING] = OTHERS_HOLDING_NAME
+            continue
+        for dim in ("asset_class", "region", "sector"):
+            for k, v in e[dim].items():
+                out[dim][k] = out[dim].get(k, 0.0) + wi * v
+        for h_id, hw in e["holdings"].items():
+            out["holdings"][h_id] = out["holdings"].get(h_id, 0.0) + wi * hw
+            out["names"].setdefault(h_id, e["names"].get(h_id, h_id))
+
+    out["covered"] = covered
+    out["missing"] = [i for i in weights_map if i not in rows]
+    return out
+
+
+def _allocation_list(values: dict, labels: dict = None) -> list:
+    """{clave: fracción} -> [{"name", "value" (%)}] por etiqueta, con hueco a 100 en Desconocido / Otros."""
+    merged = {}
+    for k, v in values.items():
+        if v > 0.0001:
+            label = (labels or {}).get(k, str(k).replace("_", " ").capitalize())
+            merged[label] = merged.get(label, 0.0) + v * 100.0
+    out = [{"name": k, "value": round(v, 2)} for k, v in merged.items()]
+    total = sum(r["value"] for r in out)
+    if total < 99.0:
+        out.append({"name": UNKNOWN_LABEL, "value": round(max(0.0, 100.0 - total), 2)})
+    return sorted(out, key=lambda x: x["value"], reverse=True)
+
+
+def allocation_breakdown(look: dict) -> dict:
+    """Formato de allocations del backtester (topHoldings, regionAllocation) + clase de activo y sector."""
+    top = sorted(look["holdings"].items(), key=lambda x: x[1], reverse=True)[:10]
+    return {
+        "topHoldings": [
+            {"isin": h_id, "name": look["names"].get(h_id, h_id), "weight": w * 100} for h_id, w in top
+        ],
+        "regionAllocation": _allocation_list(look["region"], REGION_LABELS),
+        "assetClassAllocation": _allocation_list(look["asset_class"], ASSET_CLASS_LABELS),
+        "sectorAllocation": _allocation_list(look["sector"]),
+    }
@@ -105,7 +105,11 @@ def merge_history(existing_history, new_data):
 
 # --- ORQUESTADOR PRINCIPAL ---
 async def process_batch(db, funds_batch, session, lookback_date):
+    from .config import NAV_HISTORY_MAX_POINTS
+
     tasks = []
+    # Benchmarks/proxies conservan su historia larga (ver run_benchmark_fetch)
+    uncapped = set(benchmark_ingestion_targets())
 
     # 1. PREPARAR PETICIONES (Lógica dinámica .EUFUND)
     for doc in funds_batch:
@@ -181,8 +185,8 @@ async def process_batch(db, funds_batch, session, lookback_date):
         if final_history:
             # Limitar tamaño histórico (ej. últimos 3000 puntos / ~12 años)
             # para no exceder límite de 1MB por doc de Firestore a largo plazo.
-            if len(final_history) > 3000:
-                final_history = final_history[-3000:]
+            if len(final_history) > NAV_HISTORY_MAX_POINTS and isin not in uncapped:
+                final_history = final_history[-NAV_HISTORY_MAX_POINTS:]
 
             ref = db.collection("historico_vl_v2").document(isin)
             batch.set(
@@ -262,6 +266,88 @@ def run_daily_fetch():
     return f"✅ Proceso finalizado. Actualizados: {total_updated}"
 
 
+# --- BENCHMARKS Y PROXIES (RUTINA NOCTURNA) ---
+def benchmark_ingestion_targets():
+    """
+    Documentos de historico_vl_v2 que alimentan los benchmarks del backtester:
+    los ISIN benchmark (ticker .EUFUND) y sus proxies de mercado (config.BENCHMARK_PROXIES).
+    """
+    from .config import BENCHMARK_PROXIES
+
+    targets = {}
+    for isin, proxy in BENCHMARK_PROXIES.items():
+        targets[isin] = f"{isin}.EUFUND"
+        targets[proxy["doc_id"]] = proxy["eod_ticker"]
+    return targets
+
+
+def run_benchmark_fetch(db=None):
+    """
+    Ingesta nocturna de benchmarks/proxies en historico_vl_v2 (mismo formato que los NAVs).
+    Incremental (últimos días) si ya hay historia suficiente desde BENCHMARK_HISTORY_START;
+    si no, historia completa desde esa fecha. Sin el tope de puntos de los NAV de fondos.
+    """
+    from .config import BENCHMARK_HISTORY_START, BENCHMARK_INGEST_LOOKBACK_DAYS, BENCHMARK_MIN_HISTORY_POINTS
+
+    db = db or admin_firestore.client()
+    targets = benchmark_ingestion_targets()
+    refs = [db.collection("historico_vl_v2").document(doc_id) for doc_id in targets]
+    existing = {}
+    for snap in db.get_all(refs):
+        existing[snap.id] = (snap.to_dict() or {}).get("history", []) if snap.exists else []
+
+    lookback_date = (datetime.now() - timedelta(days=BENCHMARK_INGEST_LOOKBACK_DAYS)).strftime("%Y-%m-%d")
+    # Historia ya recortada por el tope antiguo (arranca meses después del inicio) -> rellenar
+    backfill_before = (pd.Timestamp(BENCHMARK_HISTORY_START) + pd.Timedelta(days=31)).strftime("%Y-%m-%d")
+
+    def _from_date(history):
+        if len(history) >= BENCHMARK_MIN_HISTORY_POINTS and history[0]["date"] <= backfill_before:
+            return lookback_date
+        return BENCHMARK_HISTORY_START
+
+    async def runner():
+        async with aiohttp.ClientSession() as session:
+            tasks = [
+                fetch_eodhd_data(session, ticker, _from_date(existing.get(doc_id, [])))
+                for doc_id, ticker in targets.items()
+            ]
+            return await asyncio.gather(*tasks)
+
+    fetched = {ticker: data for ticker, data in asyncio.run(runner())}
+
+    updated, failed = [], []
+    batch = db.batch()
+    for doc_id, ticker in targets.items():
+        new_navs = fetched.get(ticker)
+        if not new_navs:
+            failed.append(doc_id)
+            continue
+        final_history = merge_history(existing.get(doc_id, []), new_navs)
+        if not final_history:
+            continue
+        final_history = [h for h in final_history if h["date"] >= BENCHMARK_HISTORY_START]
+        batch.set(
+            db.collection("historico_vl_v2").document(doc_id),
+            {
+                "isin": doc_id,
+                "history": final_history,
+                "last_updated": datetime.utcnow().isoformat(),
+                "source": "EODHD Benchmark",
+                "eod_ticker": ticker,
+                "kind": "benchmark",
+            },
+            merge=True,
+        )
+        updated.append(doc_id)
+
+    if updated:
+        batch.commit()
+
+    if failed:
+        logging.warning(f"⚠️ [Benchmarks] Sin datos de EODHD para: {failed}")
+    return {"updated": updated, "failed": failed}
+
+
 # --- NUEVA FUNCIÓN: ACTUALIZACIÓN MANUAL (ON-DEMAND) ---
 def update_single_fund_history(db, isin, mode="merge", from_date=None, to_date=None):
     """
@@ -0,0 +1,204 @@
+import base64
+import logging
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Formato de respuesta opt-in (request.data.response_format == "compact").
+# Decodificación documentada en docs/CONVENTIONS.md (sección "Formato compacto").
+COMPACT_FORMAT = "compact"
+MATRIX_ENCODING = "triu_f32_b64"
+SERIES_ENCODING = "date_offsets"
+
+# Claves que se compactan allí donde aparezcan (también dentro de bloques por periodo)
+MATRIX_KEYS = ("covariance_matrix", "correlationMatrix")
+SERIES_KEYS = ("portfolioSeries",)
+SERIES_MAP_KEYS = ("benchmarkSeries", "rollingSeries", "percentileSeries")
+
+
+# =========================================================================
+# 1. MATRICES SIMÉTRICAS: triángulo superior float32 little-endian en base64
+# =========================================================================
+
+def encode_matrix(matrix) -> dict:
+    """
+    Matriz simétrica N×N -> triángulo superior (diagonal incluida) fila a fila,
+    float32 little-endian, base64. N·(N+1)/2 valores en lugar de N².
+    """
+    m = np.asarray(matrix, dtype=np.float64)
+    n = int(m.shape[0]) if m.ndim == 2 else 0
+    tri = m[np.triu_indices(n)] if n else np.empty(0)
+    return {
+        "encoding": MATRIX_ENCODING,
+        "n": n,
+        "data": base64.b64encode(tri.astype("<f4").tobytes()).decode("ascii"),
+    }
+
+
+def decode_matrix(encoded: dict) -> np.ndarray:
+    """Decodificador de referencia (el frontend replica estos pasos con Float32Array)."""
+    n = int(encoded["n"])
+    tri = np.frombuffer(base64.b64decode(encoded["data"]), dtype="<f4").astype(np.float64)
+    m = np.zeros((n, n))
+    iu = np.triu_indices(n)
+    m[iu] = tri
+    m[(iu[1], iu[0])] = tri
+    return m
+
+
+# =========================================================================
+# 2. SERIES TEMPORALES: columnas (fecha base + offsets en días, valores)
+# =========================================================================
+
+def _to_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(str(value)[:10], "%Y-%m-%d").date()
+
+
+def encode_series(points) -> dict:
+    """
+    Lista [{"x": "YYYY-MM-DD", "y": v}] -> {"start", "offsets", "values"}:
+    offsets = días naturales desde start (enteros crecientes), values en el mismo orden.
+    """
+    points = list(points or [])
+    if not points:
+        return {"encoding": SERIES_ENCODING, "start": None, "offsets": [], "values": []}
+    dates = [_to_date(p["x"]) for p in points]
+    start = dates[0]
+    return {
+        "encoding": SERIES_ENCODING,
+        "start": start.isoformat(),
+        "offsets": [(d - start).days for d in dates],
+        "values": [p["y"] for p in points],
+    }
+
+
+def decode_series(encoded: dict) -> list:
+    """Inversa de encode_series: vuelve a la lista [{"x", "y"}] del formato estándar."""
+    if not encoded.get("start"):
+        return []
+    start = _to_date(encoded["start"])
+    return [
+        {"x": (start + timedelta(days=int(o))).isoformat(), "y": v}
+        for o, v in zip(encoded["offsets"], encoded["values"])
+    ]
+
+
+# =========================================================================
+# 3. DOWNSAMPLING DE SERIES (Largest-Triangle-Three-Buckets)
+# =========================================================================
+
+def lttb_indices(x, y, max_points: int) -> np.ndarray:
+    """
+    Índices a conservar según LTTB (Steinarsson 2013): primer y último punto fijos,
+    el resto en max_points-2 cubos; en cada cubo se elige el punto que forma el
+    triángulo de mayor área con el punto elegido anterior y la media del cubo siguiente.
+    Conserva picos y valles (drawdowns) mucho mejor que el muestreo uniforme.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    if max_points >= n or max_points < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, max_points - 1).astype(int)
+    keep = np.empty(max_points, dtype=int)
+    keep[0] = 0
+    keep[-1] = n - 1
+    a = 0
+    for b in range(max_points - 2):
+        lo, hi = edges[b], edges[b + 1]
+        nlo, nhi = hi, (edges[b + 2] if b + 2 < len(edges) else n)
+        avg_x = x[nlo:nhi].mean()
+        avg_y = y[nlo:nhi].mean()
+        area = np.abs(
+            (x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a])
+        )
+        a = lo + int(np.argmax(area))
+        keep[b + 1] = a
+    return keep
+
+
+def downsample_points(points, max_points: int) -> list:
+    """Aplica LTTB a una serie [{"x": "YYYY-MM-DD", "y": v}] (eje x = días)."""
+    points = list(points or [])
+    if not max_points or len(points) <= max_points:
+        return points
+    x = np.array([np.datetime64(str(p["x"])[:10], "D") for p in points]).astype(np.int64)
+    y = np.array([np.nan if p["y"] is None else p["y"] for p in points], dtype=np.float64)
+    y = np.where(np.isfinite(y), y, np.nanmean(y) if np.isfinite(y).any() else 0.0)
+    return [points[i] for i in lttb_indices(x, y, int(max_points))]
+
+
+def _downsample(node, max_points):
+    if isinstance(node, list):
+        return [_downsample(v, max_points) for v in node]
+    if not isinstance(node, dict):
+        return node
+    out = {}
+    for key, value in node.items():
+        if key in SERIES_KEYS and isinstance(value, list):
+            out[key] = downsample_points(value, max_points)
+        elif key in SERIES_MAP_KEYS and isinstance(value, dict):
+            out[key] = {k: downsample_points(v, max_points) for k, v in value.items()}
+        else:
+            out[key] = _downsample(value, max_points)
+    return out
+
+
+# =========================================================================
+# 4. APLICACIÓN A RESPUESTAS DE CALLABLES
+# =========================================================================
+
+def _compact(node):
+    if isinstance(node, list):
+        return [_compact(v) for v in node]
+    if not isinstance(node, dict):
+        return node
+    out = {}
+    for key, value in node.items():
+        if key in MATRIX_KEYS and isinstance(value, list):
+            out[key] = encode_matrix(value)
+        elif key in SERIES_KEYS and isinstance(value, list):
+            out[key] = encode_series(value)
+        elif key in SERIES_MAP_KEYS and isinstance(value, dict):
+            out[key] = {k: encode_series(v) for k, v in value.items()}
+        else:
+            out[key] = _compact(value)
+    return out
+
+
+def apply_response_format(result, response_format=None, max_points=None):
+    """
+    Post-proceso opcional de respuestas de callables (las de error no se tocan):
+    - max_points: cada serie de gráfico (portfolioSeries, benchmarkSeries) se reduce
+      con LTTB a como mucho max_points puntos. Las métricas ya se calcularon con la
+      serie completa; sólo cambia lo que se dibuja.
+    - response_format == "compact": codifica matrices y series conocidas (a cualquier
+      profundidad) y marca payload_format="compact".
+    """
+    if not isinstance(result, dict) or result.get("status") == "error" or "error" in result:
+        return result
+    try:
+        max_points = int(max_points) if max_points else None
+    except (TypeError, ValueError):
+        max_points = None
+    if max_points and max_points >= 3:
+        try:
+            result = _downsample(result, max_points)
+        except Exception as e:
+            logger.warning(f"⚠️ [PayloadCodec] Downsampling LTTB fallido, se devuelven series completas: {e}")
+    if response_format != COMPACT_FORMAT:
+        return result
+    try:
+        compact = _compact(result)
+        compact["payload_format"] = COMPACT_FORMAT
+        return compact
+    except Exception as e:
+        logger.warning(f"⚠️ [PayloadCodec] No se pudo compactar la respuesta, se devuelve estándar: {e}")
+        return result
@@ -1,12 +1,59 @@
 import logging
 logger = logging.getLogger(__name__)
+import numpy as np
 import pandas as pd
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
 
 from firebase_admin import firestore
 
 from services.data_fetcher import DataFetcher
+from services.exposure_index import allocation_breakdown, fund_exposure, portfolio_lookthrough
 from services.portfolio.utils import _to_float
 
+HIGH_CORRELATION_THRESHOLD = 0.8
+
+
+def correlation_overlap(returns: pd.DataFrame, weights: dict = None, threshold: float = HIGH_CORRELATION_THRESHOLD):
+    """
+    Solapamiento por correlación de retornos diarios alineados (no de precios):
+    - Pares con correlación > threshold extraídos del triángulo superior con una máscara
+      (mismo orden que el recorrido fila a fila de la matriz).
+    - Grupos de redundancia: componentes conexas del grafo de pares (A~B y B~C => {A, B, C}),
+      con su peso en cartera y la correlación media / mínima dentro del grupo.
+    Devuelve (corr DataFrame, pairs, groups ordenados por peso).
+    """
+    cols = list(returns.columns)
+    n = len(cols)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        corr = np.corrcoef(returns.to_numpy(dtype=float), rowvar=False).reshape(n, n) if n else np.empty((0, 0))
+    corr_df = pd.DataFrame(corr, index=cols, columns=cols)
+
+    iu, ju = np.triu_indices(n, k=1)
+    vals = corr[iu, ju]
+    hit = vals > threshold
+    iu, ju, vals = iu[hit], ju[hit], vals[hit]
+    pairs = [
+        {"asset1": cols[i], "asset2": cols[j], "correlation": float(v)}
+        for i, j, v in zip(iu, ju, vals)
+    ]
+
+    groups = []
+    if len(vals):
+        _, labels = connected_components(coo_matrix((np.ones(len(vals)), (iu, ju)), shape=(n, n)), directed=False)
+        weights = weights or {}
+        for label in np.unique(labels[iu]):
+            members = np.flatnonzero(labels == label)
+            sub = corr[np.ix_(members, members)][np.triu_indices(len(members), k=1)]
+            groups.append({
+                "assets": [cols[m] for m in members],
+                "weight": round(float(sum(weights.get(cols[m], 0.0) for m in members)), 4),
+                "avg_correlation": round(float(sub.mean()), 4),
+                "min_correlation": round(float(sub.min()), 4),
+            })
+        groups.sort(key=lambda g: (-g["weight"], -len(g["assets"])))
+    return corr_df, pairs, groups
+
 
 def analyze_portfolio(portfolio_weights: dict, db) -> dict:
     """
@@ -114,40 +161,40 @@ def analyze_portfolio(portfolio_weights: dict, db) -> dict:
     port_vol = metrics.get("volatility", 0.0)
     port_sharpe = metrics.get("sharpe", 0.0)
 
-    # 3. Compute Correlation
-    corr_matrix = df.corr()
-
-    high_corr_pairs = []
-    for i in range(len(corr_matrix.columns)):
-        for j in range(i + 1, len(corr_matrix.columns)):
-            val = corr_matrix.iloc[i, j]
-            if val > 0.8:  # threshold for high correlation
-                high_corr_pairs.append(
-                    {
-                        "asset1": corr_matrix.columns[i],
-                        "asset2": corr_matrix.columns[j],
-                        "correlation": float(val),
-                    }
-                )
+    # 3. Compute Correlation (retornos diarios del tramo común)
+    corr_matrix, high_corr_pairs, redundancy_groups = correlation_overlap(
+        df.pct_change().dropna(), valid_weights
+    )
 
     # Format correlation matrix for JSON response
-    corr_json = {}
-    for col in corr_matrix.columns:
-        corr_json[col] = {
-            row: float(corr_matrix.loc[row, col]) for row in corr_matrix.index
-        }
+    corr_json = {
+        col: {row: float(v) for row, v in values.items()}
+        for col, values in corr_matrix.to_dict().items()
+    }
 
     # Fetch metadata for generating opinion and searching alternatives
+    # Índice nocturno de exposiciones primero (meta + look-through); funds_v3 sólo para los ausentes
+    # (fetchers sin índice, p.ej. inyectados en jobs/tests: todo sale de funds_v3)
+    get_exposure_index = getattr(fetcher, "get_exposure_index", None)
+    exposure_index = get_exposure_index() if callable(get_exposure_index) else None
     asset_metadata = {}
-    try:
-        refs = [db.collection("funds_v3").document(isin) for isin in universe]
-        docs = db.get_all(refs)
-        for d in docs:
-            if d.exists:
-                dd = d.to_dict() or {}
-                asset_metadata[d.id] = dd
-    except Exception as e:
-        logger.warning(f"Error fetching metadata: {e}")
+    extra_exposure = {}
+    if exposure_index:
+        asset_metadata = {isin: exposure_index["meta"][isin] for isin in universe if isin in exposure_index["row"]}
+    missing_meta = [isin for isin in universe if isin not in asset_metadata]
+    if missing_meta:
+        try:
+            refs = [db.collection("funds_v3").document(isin) for isin in missing_meta]
+            docs = db.get_all(refs)
+            for d in docs:
+                if d.exists:
+                    dd = d.to_dict() or {}
+                    asset_metadata[d.id] = dd
+                    extra_exposure[d.id] = fund_exposure(dd)
+        except Exception as e:
+            logger.warning(f"Error fetching metadata: {e}")
+
+    lookthrough = allocation_breakdown(portfolio_lookthrough(exposure_index, valid_weights, extra_exposure))
 
     # 4. Generate Opinion
     opinion = []
@@ -174,6 +221,14 @@ def analyze_portfolio(portfolio_weights: dict, db) -> dict:
         opinion.append(
             f"Alerta de concentración: Hemos detectado fondos con alta correlación entre sí (>0.80): {pairs_str}. Esto significa que tienden a moverse en la misma dirección y reducen el beneficio de la diversificación. Considera sustituir uno de ellos."
         )
+        clusters = [g for g in redundancy_groups if len(g["assets"]) > 2]
+        if clusters:
+            clusters_str = "; ".join(
+                f"{', '.join(g['assets'])} ({g['weight'] * 100:.0f}% de la cartera)" for g in clusters
+            )
+            opinion.append(
+                f"Grupos redundantes: {clusters_str}. Cada grupo se comporta prácticamente como un único fondo."
+            )
     else:
         opinion.append(
             "La cartera presenta una buena diversificación; no se han detectado fondos con correlaciones excesivamente altas entre sí."
@@ -274,8 +329,10 @@ def analyze_portfolio(portfolio_weights: dict, db) -> dict:
         },
         "correlation_matrix": corr_json,
         "high_correlation_pairs": high_corr_pairs,
+        "redundancy_groups": redundancy_groups,
         "opinion_text": " ".join(opinion),
         "alternatives": alternatives,
+        "lookthrough": lookthrough,
     }
 
     return result
@@ -0,0 +1,176 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+import pandas as pd
+
+from services.config import (
+    AUTO_EXPAND_POOL_SIZE,
+    AUTO_EXPAND_WINDOW_YEARS,
+    AUTO_EXPAND_MIN_OBS,
+    AUTO_EXPAND_MAX_ADDED,
+)
+from services.quant_core import (
+    get_covariance_matrix,
+    get_expected_returns,
+)
+from .utils import _to_float
+
+FALLBACK_POOL_ISINS = [
+    "LU0340557775", "LU1135865084", "LU0690375182", "LU0203975437", "IE00B2NXKW18"
+]
+
+
+def _candidate_metadata(dd: dict) -> dict:
+    return {
+        "metrics": dd.get("metrics", {}),
+        "asset_class": dd.get("classification_v2", {}).get("asset_type") or "UNKNOWN",
+        "classification_v2": dd.get("classification_v2", {}),
+        "portfolio_exposure_v2": dd.get("portfolio_exposure_v2", {}),
+    }
+
+
+def query_auto_expand_candidates(db, limit: int = AUTO_EXPAND_POOL_SIZE) -> dict:
+    """
+    Candidatos de alta RV (equity >= 90%) ordenados por Sharpe.
+    Fallback: lista configurada en config/auto_complete_candidates (o la estática).
+    Devuelve {isin: metadata} en el formato que consume el optimizador.
+    """
+    from firebase_admin import firestore
+
+    candidates = {}
+    fallback_isins = FALLBACK_POOL_ISINS
+    try:
+        cfg = db.collection("config").document("auto_complete_candidates").get()
+        if cfg.exists:
+            fallback_isins = cfg.to_dict().get("equity90_isins", fallback_isins)
+    except Exception:
+        pass
+
+    try:
+        docs = (
+            db.collection("funds_v3")
+            .order_by("std_perf.sharpe", direction=firestore.Query.DESCENDING)
+            .limit(limit)
+            .stream()
+        )
+        for d in docs:
+            dd = d.to_dict()
+            exp_v2 = dd.get("portfolio_exposure_v2", {})
+            eq_val = _to_float(exp_v2.get("equity", 0.0)) if exp_v2 else _to_float(dd.get("metrics", {}).get("equity"), 0.0)
+            if eq_val >= 90.0:
+                candidates[d.id] = _candidate_metadata(dd)
+    except Exception as e:
+        logger.info(f"⚠️ Error dynamic candidates: {e}")
+
+    if not candidates:
+        refs = [db.collection("funds_v3").document(isin) for isin in fallback_isins]
+        for d in db.get_all(refs):
+            if d.exists:
+                candidates[d.id] = _candidate_metadata(d.to_dict())
+
+    return candidates
+
+
+def build_candidate_pool(prices: pd.DataFrame, metadata: dict, version: str,
+                         window_years: int = AUTO_EXPAND_WINDOW_YEARS,
+                         min_obs: int = AUTO_EXPAND_MIN_OBS) -> dict:
+    """
+    Construye el payload JSON del pool a partir de precios ya limpios (B-day).
+    - Recorta a la ventana estándar del optimizador (últimos `window_years`).
+    - Descarta series con < min_obs observaciones o >5% de huecos tras ffill(limit=5).
+    - Alinea todas las series a un índice común y precalcula μ (mean). Σ no se guarda: el
+      optimizador la re-estima sobre la matriz conjunta (base + candidatos).
+    El ranking prioriza historia más larga y, a igualdad, mejor Sharpe.
+    """
+    if prices.empty:
+        return {}
+
+    start = prices.index[-1] - pd.Timedelta(days=365 * window_years)
+    window = prices[prices.index >= start].ffill(limit=5)
+
+    counts = window.count()
+    gap_threshold = len(window) * 0.05
+    valid = [c for c in window.columns if counts[c] >= min_obs and window[c].isnull().sum() <= gap_threshold]
+    if not valid:
+        return {}
+
+    # Ventana común: arranca en la primera fecha con todas las series válidas
+    first_valid = window[valid].apply(lambda col: col.first_valid_index()).max()
+    aligned = window.loc[window.index >= first_valid, valid].ffill(limit=5).dropna(axis=1)
+    if aligned.empty or len(aligned) < min_obs:
+        return {}
+
+    def _sharpe(isin):
+        return _to_float((metadata.get(isin, {}).get("metrics") or {}).get("sharpe"), 0.0)
+
+    ranked = sorted(aligned.columns, key=lambda c: (-int(counts[c]), -_sharpe(c)))
+    aligned = aligned[ranked]
+
+    mu = get_expected_returns(aligned, method="mean")
+
+    return {
+        "version": version,
+        "start": aligned.index[0].strftime("%Y-%m-%d"),
+        "end": aligned.index[-1].strftime("%Y-%m-%d"),
+        "dates": [d.strftime("%Y-%m-%d") for d in aligned.index],
+        "isins": ranked,
+        "prices": {c: [round(float(v), 6) for v in aligned[c].values] for c in ranked},
+        "mu": {c: float(mu[c]) for c in ranked},
+        "metadata": {c: metadata.get(c, {}) for c in ranked},
+    }
+
+
+def parse_candidate_pool(raw: dict) -> dict:
+    """Convierte el payload JSON en estructuras pandas listas para el optimizador."""
+    if not raw or not raw.get("isins"):
+        return None
+    isins = raw["isins"]
+    index = pd.to_datetime(raw["dates"])
+    return {
+        "version": raw.get("version"),
+        "start": raw.get("start"),
+        "end": raw.get("end"),
+        "isins": isins,
+        "metadata": raw.get("metadata", {}),
+        "prices": pd.DataFrame({c: raw["prices"][c] for c in isins}, index=index),
+        "mu": pd.Series(raw["mu"])[isins],
+    }
+
+
+def extend_moments_with_pool(df: pd.DataFrame, mu: pd.Series, S: pd.DataFrame, pool: dict,
+                             exclude=(), allowed=None, max_added: int = AUTO_EXPAND_MAX_ADDED):
+    """
+    Auto-expand incremental: añade hasta `max_added` candidatos del pool a μ/Σ existentes
+    sin re-descargar ni re-limpiar precios.
+    Estimador: el mismo que la vía lenta (media histórica + Ledoit-Wolf sobre la ventana de
+    la petición). `mu` debe ser la media histórica de `df`, no un posterior Black-Litterman.
+    - Precios del pool reindexados a la ventana de la petición (sin descarga ni re-limpieza).
+    - μ del bloque candidato: precalculada si la ventana coincide con la del pool, si no se
+      estima sobre el tramo alineado; μ del universo base no se toca.
+    - Σ: Ledoit-Wolf una sola vez sobre la matriz conjunta (base + candidatos). Bloques
+      encogidos por separado con un bloque cruzado muestral no forman una estimación coherente.
+    Devuelve (added, df_ext, mu_ext, S_ext); added vacío si ningún candidato cubre la ventana.
+    """
+    exclude = set(exclude)
+    ranked = [c for c in pool["isins"] if c not in exclude and (allowed is None or c in allowed)]
+    if not ranked:
+        return [], df, mu, S
+
+    aligned = pool["prices"][ranked].reindex(df.index).ffill(limit=5)
+    covered = [c for c in ranked if aligned[c].notna().all()]
+    added = covered[:max_added]
+    if not added:
+        return [], df, mu, S
+    cand = aligned[added]
+
+    same_window = len(df.index) == len(pool["prices"].index) and df.index.equals(pool["prices"].index)
+    mu_c = pool["mu"][added] if same_window else get_expected_returns(cand, method="mean")
+
+    base = list(S.index)
+    S_ext = get_covariance_matrix(pd.concat([df[base], cand], axis=1))
+
+    mu_ext = pd.concat([mu[base], mu_c[added]])
+    df_ext = pd.concat([df, cand], axis=1)
+    logger.info(f"⚡ [CandidatePool] Auto-expand incremental: +{len(added)} activos (ventana pool={'sí' if same_window else 'no'})")
+    return added, df_ext, mu_ext, S_ext
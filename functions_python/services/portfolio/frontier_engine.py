@@ -1,9 +1,411 @@
 import logging
 logger = logging.getLogger(__name__)
+import time
+import cvxpy as cp
 import pandas as pd
 import numpy as np
 from pypfopt import CLA
 from services.data_fetcher import DataFetcher
+from services.config import (
+    FRONTIER_SWEEP_POINTS,
+    FRONTIER_SWEEP_INITIAL,
+    FRONTIER_CACHE_COLLECTION,
+    FRONTIER_CACHE_TTL_SECONDS,
+    FRONTIER_CACHE_MAX_ENTRIES,
+    FRONTIER_CACHE_STORAGE_PREFIX,
+    OPTIMIZER_WINDOW_YEARS,
+)
+from services.quant_core import get_expected_returns, get_covariance_matrix
+from services.result_cache import ResultCache, build_cache_key, get_price_data_version
+
+
+def _turn_angles(pts):
+    """Cambio de dirección (rad) en cada punto interior de la curva normalizada."""
+    angles = np.zeros(len(pts))
+    for i in range(1, len(pts) - 1):
+        a = pts[i] - pts[i - 1]
+        b = pts[i + 1] - pts[i]
+        na, nb = np.linalg.norm(a), np.linalg.norm(b)
+        if na > 0 and nb > 0:
+            angles[i] = float(np.arccos(np.clip(a @ b / (na * nb), -1.0, 1.0)))
+    return angles
+
+
+def parametric_frontier_sweep(mu, S, points=FRONTIER_SWEEP_POINTS, initial_points=FRONTIER_SWEEP_INITIAL, weight_bounds=(0.0, 1.0)):
+    """
+    Frontera eficiente con un único problema compilado (DPP):
+        min ‖Lᵀw‖²  s.a.  μᵀw ≥ r,  Σw = 1,  lb ≤ w ≤ ub      (r = cp.Parameter, Σ = L·Lᵀ)
+    1. Solve en frío con r = min(μ) (restricción inactiva) -> cartera de mínima varianza (GMV).
+    2. Re-solves con warm start: sólo cambia r, la canonicalización está cacheada.
+    3. Colocación adaptativa: tras una rejilla inicial GMV..max(μ), cada nuevo objetivo se
+       inserta en el tramo con mayor giro de la curva (vol, ret normalizados) ponderado por
+       su longitud, donde la frontera se dobla más.
+    Devuelve (points [{"x": vol, "y": ret}] ordenados por retorno, stats).
+    """
+    mu_v = np.asarray(mu, dtype=float)
+    S_v = np.asarray(S, dtype=float)
+    n = len(mu_v)
+    try:
+        L = np.linalg.cholesky(S_v + 1e-12 * np.eye(n))
+    except np.linalg.LinAlgError:
+        vals, vecs = np.linalg.eigh(S_v)
+        L = vecs * np.sqrt(np.clip(vals, 0.0, None))
+
+    r = cp.Parameter()
+    w = cp.Variable(n)
+    problem = cp.Problem(
+        cp.Minimize(cp.sum_squares(L.T @ w)),
+        [mu_v @ w >= r, cp.sum(w) == 1, w >= weight_bounds[0], w <= weight_bounds[1]],
+    )
+
+    stats = {"cold_solves": 0, "warm_solves": 0, "failed": 0, "solve_ms": 0.0}
+    solved = {}
+
+    def _solve(target):
+        r.value = float(target)
+        t0 = time.perf_counter()
+        try:
+            problem.solve(warm_start=stats["cold_solves"] > 0)
+            ok = problem.status in ("optimal", "optimal_inaccurate") and w.value is not None
+        except Exception:
+            ok = False
+        stats["solve_ms"] += (time.perf_counter() - t0) * 1000.0
+        stats["warm_solves" if stats["cold_solves"] else "cold_solves"] += 1
+        if not ok:
+            stats["failed"] += 1
+            return None
+        wv = np.asarray(w.value, dtype=float)
+        point = (float(np.sqrt(max(wv @ S_v @ wv, 0.0))), float(mu_v @ wv))
+        solved[float(target)] = point
+        return point
+
+    gmv = _solve(float(mu_v.min()))
+    if gmv is None:
+        return [], stats
+    r_lo = gmv[1]
+    solved.clear()
+    solved[r_lo] = gmv
+    r_hi = float(mu_v.max()) - 1e-9 * max(1.0, abs(float(mu_v.max())))
+    if r_hi <= r_lo + 1e-10:
+        return [{"x": gmv[0], "y": gmv[1]}], stats
+
+    for target in np.linspace(r_lo, r_hi, max(2, initial_points))[1:]:
+        _solve(target)
+
+    dead = set()
+    budget = 2 * points
+    while len(solved) < points and budget > 0:
+        budget -= 1
+        targets = sorted(solved)
+        pts = np.array([solved[t] for t in targets])
+        span = np.maximum(pts.max(axis=0) - pts.min(axis=0), 1e-12)
+        norm = pts / span
+        angles = _turn_angles(norm)
+        best, best_score = None, -1.0
+        for i in range(len(targets) - 1):
+            mid = 0.5 * (targets[i] + targets[i + 1])
+            if mid in dead or targets[i + 1] - targets[i] < 1e-9:
+                continue
+            length = float(np.linalg.norm(norm[i + 1] - norm[i]))
+            score = length * (0.05 + angles[i] + angles[i + 1])
+            if score > best_score:
+                best, best_score = mid, score
+        if best is None:
+            break
+        if _solve(best) is None:
+            dead.add(best)
+
+    frontier = [{"x": v, "y": ret} for v, ret in sorted(solved.values(), key=lambda p: p[1])]
+    stats["solve_ms"] = round(stats["solve_ms"], 2)
+    return frontier, stats
+
+
+# =========================================================================
+# ARTEFACTO FRONTERA COMPARTIDO (optimizador + getEfficientFrontier)
+# =========================================================================
+
+# Estimador canónico de la frontera: cambiarlo invalida las entradas cacheadas
+FRONTIER_ESTIMATOR = {"mu": "mean", "cov": "ledoit_wolf", "curve": "cla_50|sweep"}
+
+_frontier_cache = ResultCache(
+    FRONTIER_CACHE_COLLECTION,
+    max_entries=FRONTIER_CACHE_MAX_ENTRIES,
+    ttl_seconds=FRONTIER_CACHE_TTL_SECONDS,
+    storage_prefix=FRONTIER_CACHE_STORAGE_PREFIX,
+)
+
+
+def frontier_cache_key(df, price_version) -> str:
+    """
+    Clave del artefacto: universo (ordenado) + ventana alineada + huella de precios
+    (primera y última fila) + estimador + versión de datos de precios.
+    """
+    ordered = sorted(df.columns)
+    first = df[ordered].iloc[0]
+    last = df[ordered].iloc[-1]
+    return build_cache_key({
+        "universe": ordered,
+        "window": {
+            "start": df.index[0].strftime("%Y-%m-%d"),
+            "end": df.index[-1].strftime("%Y-%m-%d"),
+            "observations": len(df),
+        },
+        "fingerprint": [[round(float(a), 6), round(float(b), 6)] for a, b in zip(first, last)],
+        "estimator": FRONTIER_ESTIMATOR,
+        "data_version": price_version,
+    })
+
+
+def _efficient_only(frontier_points):
+    """GEOMETRIC FILTER: elimina la mitad ineficiente de la parábola (curva que retrocede)."""
+    frontier_points = sorted(frontier_points, key=lambda p: p["y"])
+    min_vol_idx = min(range(len(frontier_points)), key=lambda i: frontier_points[i]["x"])
+    efficient_only = []
+    current_max_x = -1.0
+    for p in frontier_points[min_vol_idx:]:
+        # Strict monotonic increasing check for X, allowing a tiny epsilon for float comparisons
+        if p["x"] >= current_max_x - 1e-5:
+            efficient_only.append(p)
+            current_max_x = max(current_max_x, p["x"])
+    return efficient_only
+
+
+def build_frontier_artifact(mu, S) -> dict:
+    """
+    Curva eficiente (CLA, 50 puntos; barrido paramétrico si CLA degenera), nube de
+    activos y μ/Σ, con el universo ordenado alfabéticamente (independiente del orden
+    de la petición).
+    """
+    ordered = sorted(mu.index)
+    mu = mu.reindex(ordered)
+    S = S.reindex(index=ordered, columns=ordered)
+
+    frontier_points = []
+    engine = None
+    if len(ordered) >= 2:
+        try:
+            # Engine A: CLA (Fast & Analytic, works best for clean matrices)
+            cla = CLA(mu, S)
+            frontier_ret, frontier_vol, _ = cla.efficient_frontier(points=50)
+            for v_raw, r_raw in zip(frontier_vol, frontier_ret):
+                v, r = float(v_raw), float(r_raw)
+                if np.isnan(v) or np.isnan(r) or v <= 0:
+                    continue
+                frontier_points.append({"x": round(v, 4), "y": round(r, 4)})
+            if len(frontier_points) < 3:
+                raise ValueError("CLA generated a trivial or degenerate frontier.")
+            engine = "cla"
+        except Exception as exc:
+            logger.info(
+                f"⚠️ [Senior EF] Engine A (CLA) Failed: {exc}. Attempting Engine B (Parametric Sweep)..."
+            )
+            frontier_points = []
+            try:
+                # Engine B: barrido paramétrico (un solo problema compilado + warm starts)
+                sweep_points, sweep_stats = parametric_frontier_sweep(mu, S)
+                frontier_points = [{"x": round(p["x"], 4), "y": round(p["y"], 4)} for p in sweep_points]
+                engine = "parametric_sweep" if frontier_points else None
+                logger.info(
+                    f"✨ [Senior EF] Engine B (Parametric Sweep): {len(frontier_points)} points. Stats: {sweep_stats}"
+                )
+            except Exception as eval_exc:
+                logger.info(f"❌ [Senior EF] Complete Mathematical Failure on Curving: {eval_exc}")
+
+    if frontier_points:
+        frontier_points = _efficient_only(frontier_points)
+    else:
+        logger.info("⚠️ [Senior EF] No frontier curve (needs >= 2 assets and a solvable problem).")
+
+    # Individual Asset Points (Scatter): Vol = sqrt(diag(S))
+    asset_points = [
+        {"label": t, "x": round(float(np.sqrt(S.loc[t, t])), 4), "y": round(float(mu[t]), 4)}
+        for t in ordered
+    ]
+
+    return {
+        "frontier": frontier_points,
+        "assets": asset_points,
+        "engine": engine,
+        "math_data": {
+            "ordered_isins": ordered,
+            "expected_returns": {k: float(v) for k, v in mu.items()},
+            "covariance_matrix": S.values.tolist(),
+        },
+    }
+
+
+def get_frontier_artifact(db, df, mu=None, S=None, telemetry=None):
+    """
+    Devuelve (artefacto, hit). En miss estima μ (media aritmética) y Σ (Ledoit-Wolf)
+    si no se pasan, construye el artefacto y lo guarda (RAM + Storage con puntero en
+    Firestore, best effort).
+    Llamadores con μ/Σ no canónicos (p.ej. Black-Litterman) no deben usar esta función.
+    """
+    key = frontier_cache_key(df, get_price_data_version(db))
+    cached = _frontier_cache.get(db, key)
+    if cached is not None:
+        if telemetry is not None:
+            telemetry.count("frontier_cache_hits")
+        logger.info(f"⚡ [Senior EF] Frontier artifact cache hit ({key[:12]})")
+        return cached, True
+
+    if mu is None or S is None:
+        mu = get_expected_returns(df, method="mean")
+        S = get_covariance_matrix(df)
+    artifact = build_frontier_artifact(mu, S)
+    _frontier_cache.set(db, key, artifact, meta={"assets": len(df.columns), "observations": len(df)})
+    return artifact, False
+
+
+# =========================================================================
+# ENDPOINT: getEfficientFrontier (uno o varios periodos)
+# =========================================================================
+
+FRONTIER_PERIOD_DAYS = {
+    "1y": 365,
+    "3y": 1095,
+    "5y": 1825,
+    "ytd": 252,
+    "max": 10000,
+}
+
+# Periodo explícito con la ventana de estimación del optimizador: misma entrada de caché
+# que el artefacto escrito por run_optimization para el mismo universo.
+OPTIMIZER_FRONTIER_PERIOD = "optimizer"
+
+
+def _frontier_lookback_days(period):
+    if period == OPTIMIZER_FRONTIER_PERIOD:
+        return 365 * OPTIMIZER_WINDOW_YEARS
+    return FRONTIER_PERIOD_DAYS.get(period, 1095)
+
+
+def _fetch_frontier_prices(assets_list, db):
+    """Descarga única de precios diarios (historia completa) ordenada por fecha."""
+    fetcher = DataFetcher(db)
+    # We rely on strict truncating to identify true data start date (preventing hockey stick)
+    price_data, synthetic_used = fetcher.get_price_data(
+        assets_list, resample_freq="D", strict=False
+    )
+
+    df = pd.DataFrame(price_data)
+    df.index = pd.to_datetime(df.index)
+
+    # SANITIZACIÓN PROFESIONAL (Evitar distorsión de covarianza)
+    return df.sort_index(), synthetic_used
+
+
+def _frontier_window(df, period):
+    """
+    --- TIME HORIZON: STRICT COMMON PERIOD ---
+    Recorta la matriz completa a la ventana de `period`, empezando no antes de la
+    fecha en que todos los activos tienen datos, y fuerza el tramo común sin NaNs.
+    """
+    if not df.empty:
+        lookback_days = _frontier_lookback_days(period)
+        ideal_start = df.index[-1] - pd.Timedelta(days=lookback_days)
+
+        first_valid_indices = df.apply(lambda col: col.first_valid_index()).dropna()
+        if not first_valid_indices.empty:
+            actual_start = first_valid_indices.max()
+            final_start = max(ideal_start, actual_start)
+        else:
+            final_start = ideal_start
+
+        logger.info(
+            f"📈 [Senior EF] Strict Window ({period}): {final_start.date()} to {df.index[-1].date()}"
+        )
+
+        df = df[df.index >= final_start]
+
+    # Forward fill para huecos intermedios (festivos), y obligar a tramo común eliminando NaNs iniciales
+    return df.ffill(limit=5).dropna()
+
+
+def _frontier_block(df_full, period, db, portfolio_weights=None):
+    """Frontera + nube de activos + punto de cartera para un periodo sobre la matriz ya descargada."""
+    df = _frontier_window(df_full, period)
+
+    if df.empty or len(df) < 60:
+        actual_start_str = df.index[0].strftime('%Y-%m-%d') if not df.empty else "N/A"
+        logger.info(f"⚠️ [Senior EF] Insufficient history ({period}): {len(df)} points.")
+        err_msg = f"El tramo común estricto encontrado es demasiado corto ({len(df)} días). Se requieren al menos 60 días laborables para calcular la frontera."
+        return {
+            "status": "error",
+            "message": err_msg,
+            "error": err_msg,
+            "effective_start_date": actual_start_str,
+            "observations": len(df),
+            "points": len(df),
+            "assets_found": list(df.columns),
+            "assets": [],
+            "frontier": [],
+            "math_data": {}
+        }
+
+    effective_start_date = df.index[0].strftime('%Y-%m-%d')
+    observations = len(df)
+
+    logger.info(
+        f"📈 [Senior EF] Data Processed ({period}). Shape: {df.shape}, Assets: {list(df.columns)}"
+    )
+
+    # 2-4. Artefacto compartido (curva + nube de activos + μ/Σ), cacheado por
+    # universo + ventana + estimador + versión de precios
+    artifact, cache_hit = get_frontier_artifact(db, df)
+    frontier_points = artifact["frontier"]
+    asset_points = artifact["assets"]
+    math_data = artifact["math_data"]
+
+    # Reordenar a df.columns: el artefacto se guarda con el universo ordenado
+    mu = pd.Series(math_data["expected_returns"]).reindex(df.columns)
+    S = pd.DataFrame(
+        math_data["covariance_matrix"],
+        index=math_data["ordered_isins"],
+        columns=math_data["ordered_isins"],
+    ).reindex(index=df.columns, columns=df.columns)
+    asset_by_label = {p["label"]: p for p in asset_points}
+    asset_points = [asset_by_label[t] for t in df.columns if t in asset_by_label]
+
+    logger.info(
+        f"✅ [Senior EF] Inputs ready ({period}, {'cache hit' if cache_hit else 'computed'}). "
+        f"Mu Range: [{mu.min():.4f}, {mu.max():.4f}]"
+    )
+
+    # 5. CURRENT PORTFOLIO POINT (Canonical Math Engine)
+    portfolio_point = None
+    if portfolio_weights:
+        try:
+            from services.quant_core import calculate_portfolio_metrics
+
+            # Normalize weights to sum exactly 1.0 before calculation
+            raw_total = sum(float(w) for w in portfolio_weights.values())
+            if raw_total > 0:
+                norm_weights = {k: float(v)/raw_total for k, v in portfolio_weights.items()}
+
+                # rf_rate relies on 0.0 for pure plot coordinates without excess return translation
+                metrics = calculate_portfolio_metrics(norm_weights, mu, S, rf_rate=0.0)
+                portfolio_point = {"x": round(metrics["volatility"], 4), "y": round(metrics["return"], 4)}
+                logger.info(f"✅ [Senior EF] Coherent Point via quant_core: {portfolio_point}")
+        except Exception as e_p:
+            logger.warning(f"⚠️ Portfolio point calc failed: {e_p}")
+
+    return {
+        "status": "success",
+        "frontier": frontier_points,
+        "assets": asset_points,
+        "portfolio": portfolio_point,
+        "effective_start_date": effective_start_date,
+        "observations": observations,
+        "math_data": {
+            "ordered_isins": list(df.columns),
+            "expected_returns": {
+                k: float(v) for k, v in mu.to_dict().items()
+            },
+            "covariance_matrix": S.values.tolist(),
+        },
+        "cache": {"hit": cache_hit, "engine": artifact.get("engine")},
+    }
 
 
 def generate_efficient_frontier(assets_list, db, portfolio_weights=None, period="3y"):
@@ -18,6 +420,9 @@ def generate_efficient_frontier(assets_list, db, portfolio_weights=None, period=
        shrinkage with exact symmetry enforcement).
     4. Black-Litterman is NOT applied here (Frontier is objective, BL is subjective).
     5. Portfolio Point: Calculated via `quant_core` for exact coherence with optimizer.
+    6. Curve + asset scatter come from the shared frontier artifact (`frontier_cache`),
+       also written by the optimizer; only the portfolio point is computed per request.
+       Pass period="optimizer" (the optimizer's estimation window) to share its entry.
     """
     try:
         logger.info(
@@ -25,245 +430,57 @@ def generate_efficient_frontier(assets_list, db, portfolio_weights=None, period=
         )
 
         # 1. Senior Data Alignment
-        fetcher = DataFetcher(db)
-        # We rely on strict truncating to identify true data start date (preventing hockey stick)
-        price_data, synthetic_used = fetcher.get_price_data(
-            assets_list, resample_freq="D", strict=False
-        )
-
-        df = pd.DataFrame(price_data)
-        df.index = pd.to_datetime(df.index)
-
-        # SANITIZACIÓN PROFESIONAL (Evitar distorsión de covarianza)
-        df = df.sort_index()
-
-        # --- TIME HORIZON: STRICT COMMON PERIOD ---
-        if not df.empty:
-            # 1. Definir ventana ideal según parámetro 'period'
-            period_days_map = {
-                "1y": 365,
-                "3y": 1095,
-                "5y": 1825,
-                "ytd": 252,
-                "max": 10000,
-            }
-            lookback_days = period_days_map.get(period, 1095)
-            ideal_start = df.index[-1] - pd.Timedelta(days=lookback_days)
-
-            first_valid_indices = df.apply(lambda col: col.first_valid_index()).dropna()
-            if not first_valid_indices.empty:
-                actual_start = first_valid_indices.max()
-                final_start = max(ideal_start, actual_start)
-            else:
-                final_start = ideal_start
-
-            logger.info(
-                f"📈 [Senior EF] Strict Window: {final_start.date()} to {df.index[-1].date()}"
-            )
-
-            df = df[df.index >= final_start]
-
-        # Forward fill para huecos intermedios (festivos), y obligar a tramo común eliminando NaNs iniciales
-        df = df.ffill(limit=5).dropna()
-
-        if df.empty or len(df) < 60:
-            actual_start_str = df.index[0].strftime('%Y-%m-%d') if not df.empty else "N/A"
-            logger.info(f"⚠️ [Senior EF] Insufficient history: {len(df)} points.")
-            err_msg = f"El tramo común estricto encontrado es demasiado corto ({len(df)} días). Se requieren al menos 60 días laborables para calcular la frontera."
-            return {
-                "status": "error",
-                "message": err_msg,
-                "error": err_msg,
-                "effective_start_date": actual_start_str,
-                "observations": len(df),
-                "points": len(df),
-                "assets_found": list(df.columns),
-                "assets": [],
-                "frontier": [],
-                "math_data": {}
-            }
-
-        effective_start_date = df.index[0].strftime('%Y-%m-%d')
-        observations = len(df)
-
-        # Calculamos retornos diarios
-        returns = df.pct_change().dropna(how="all")
+        df_full, _ = _fetch_frontier_prices(assets_list, db)
+        result = _frontier_block(df_full, period, db, portfolio_weights)
 
         logger.info(
-            f"📈 [Senior EF] Data Processed. Shape: {df.shape}, Assets: {list(df.columns)}"
+            f"🏁 [DEBUG] Returning {result['status']} with {len(result['frontier'])} fp, {len(result['assets'])} ap."
         )
+        return result
 
-        # 2. Canonical Math Engine
-        from services.quant_core import get_expected_returns, get_covariance_matrix
-        
-        # [CONVENTION] Method 'mean' (Arithmetic) matches current optimizer logic
-        mu = get_expected_returns(df, method="mean")
+    except Exception as e:
+        logger.info(f"❌ [DEBUG] CRITICAL Frontier Error: {e}")
+        import traceback
 
-        # [CONVENTION] quant_core already handles Shrinkage fallback and guarantees Symmetry
-        S = get_covariance_matrix(df)
+        traceback.print_exc()
+        return {"status": "error", "message": str(e), "error": str(e)}
 
+
+def generate_multi_period_frontier(assets_list, db, portfolio_weights=None, periods=("1y", "3y", "5y")):
+    """
+    Varios periodos en una sola petición: una descarga y una alineación de precios,
+    y cada periodo recorta su ventana sobre la misma matriz y consulta el artefacto
+    cacheado antes de estimar. Los periodos se calculan en serie: el coste está en CLA
+    (Python puro, retiene el GIL) y con hilos no se medía ninguna mejora.
+    Devuelve {"status", "periods": {period: bloque de generate_efficient_frontier}}.
+    """
+    try:
+        if isinstance(periods, str):
+            periods = [periods]
+        periods = list(dict.fromkeys(periods))  # sin duplicados, orden de la petición
         logger.info(
-            f"✅ [Senior EF] Inputs ready. Mu Range: [{mu.min():.4f}, {mu.max():.4f}]"
+            f"🚀 [Senior EF] Multi-period frontier for {len(assets_list)} assets. Periods: {periods}"
         )
 
-        # 3. Double-Engine Generator (CLA + Convex Fallback for Collinear Portfolios)
-        frontier_points = []
-        if len(df.columns) >= 2:
-            logger.info("⚙️ [Senior EF] Running Optimization Engines...")
-            try:
-                # Engine A: CLA (Fast & Analytic, works best for clean matrices)
-                cla = CLA(mu, S)
-                # Generate curve points (explicit 50 points for smooth line)
-                frontier_ret, frontier_vol, frontier_weights = cla.efficient_frontier(
-                    points=50
-                )
-                for v_raw, r_raw, w_raw in zip(
-                    frontier_vol, frontier_ret, frontier_weights
-                ):
-                    try:
-                        v = float(v_raw)
-                        # [FIX] Use exact Engine Target (Arithmetic Mean) for Y Coordinate
-                        r = float(r_raw)
-                        if np.isnan(v) or np.isnan(r) or v <= 0:
-                            continue
-                        frontier_points.append(
-                            {"x": round(v, 4), "y": round(r, 4)}
-                        )
-                    except:
-                        continue
-                # Sort horizontally to avoid zigzag lines (now sorting by Return 'y' for Monotonic Frontier)
-                frontier_points = sorted(frontier_points, key=lambda p: p["y"])
-
-                if len(frontier_points) < 3:
-                    raise ValueError("CLA generated a trivial or degenerate frontier.")
+        df_full, _ = _fetch_frontier_prices(assets_list, db)
 
-                logger.info(
-                    f"✨ [Senior EF] Engine A (CLA) Success: {len(frontier_points)} points generated."
-                )
-
-            except Exception as exc:
-                logger.info(
-                    f"⚠️ [Senior EF] Engine A (CLA) Failed: {exc}. Attempting Engine B (Convex Optimization Fallback)..."
-                )
-                try:
-                    # Engine B: Quadratic Programming Solver (Extremely robust for large 25-asset portfolios with duplicates)
-                    from pypfopt import EfficientFrontier as RobustEF
-
-                    min_r = float(mu.min()) * 0.99
-                    max_r = float(mu.max()) * 0.99
-
-                    if max_r > min_r:
-                        import gc
-
-                        target_returns = np.linspace(min_r, max_r, 15)
-                        for tr in target_returns:
-                            try:
-                                # We reinstantiate EF each loop to solve fresh
-                                ef = RobustEF(mu, S)
-                                ef.efficient_return(target_return=tr)
-                                ret, vol, _ = ef.portfolio_performance()
-                                frontier_points.append(
-                                    {"x": round(float(vol), 4), "y": round(float(ret), 4)}
-                                )
-                            except:
-                                pass  # Infeasible segment of the frontier
-                            finally:
-                                gc.collect()
-
-                    if frontier_points:
-                        logger.info(
-                            f"✨ [Senior EF] Engine B (Robust Solver) Partial Success: {len(frontier_points)} points generated."
-                        )
-                    else:
-                        logger.info(
-                            "❌ [Senior EF] Engine B also failed. No frontier curve will be drawn."
-                        )
-
-                except Exception as eval_exc:
-                    logger.info(
-                        f"❌ [Senior EF] Complete Mathematical Failure on Curving: {eval_exc}"
-                    )
-
-        # GEOMETRIC FILTER: Eliminate inefficient half of the parabola (Back-bending curve)
-        if frontier_points:
-            # Sort vertically by Return
-            frontier_points = sorted(frontier_points, key=lambda p: p["y"])
-            # Find Global Minimum Volatility (GMV) point
-            min_vol_idx = min(
-                range(len(frontier_points)), key=lambda i: frontier_points[i]["x"]
-            )
-
-            efficient_only = []
-            current_max_x = -1.0
-            for p in frontier_points[min_vol_idx:]:
-                # Strict monotonic increasing check for X, allowing a tiny epsilon for float comparisons
-                if p["x"] >= current_max_x - 1e-5:
-                    efficient_only.append(p)
-                    current_max_x = max(current_max_x, p["x"])
-
-            frontier_points = efficient_only
-            logger.info(
-                f"📐 [Senior EF] Geometric Filter Applied. Final efficient points: {len(frontier_points)}"
-            )
-
-        else:
-            logger.info(
-                "⚠️ [Senior EF] Not enough assets for a frontier curve (needs >= 2). Skipping curve."
-            )
-
-        # 4. Individual Asset Points (Scatter)
-        asset_points = []
-        for ticker in df.columns:
-            try:
-                # Vol = sqrt(diag(S))
-                v = float(np.sqrt(S.loc[ticker, ticker]))
-                r = float(mu[ticker])
-                asset_points.append(
-                    {"label": ticker, "x": round(v, 4), "y": round(r, 4)}
-                )
-            except:
-                continue
-
-        # 5. CURRENT PORTFOLIO POINT (Canonical Math Engine)
-        portfolio_point = None
-        if portfolio_weights:
+        blocks = {}
+        for p in periods:
             try:
-                from services.quant_core import calculate_portfolio_metrics
-                
-                # Normalize weights to sum exactly 1.0 before calculation
-                raw_total = sum(float(w) for w in portfolio_weights.values())
-                if raw_total > 0:
-                    norm_weights = {k: float(v)/raw_total for k, v in portfolio_weights.items()}
-                    
-                    # rf_rate relies on 0.0 for pure plot coordinates without excess return translation
-                    metrics = calculate_portfolio_metrics(norm_weights, mu, S, rf_rate=0.0)
-                    portfolio_point = {"x": round(metrics["volatility"], 4), "y": round(metrics["return"], 4)}
-                    logger.info(f"✅ [Senior EF] Coherent Point via quant_core: {portfolio_point}")
+                blocks[p] = _frontier_block(df_full, p, db, portfolio_weights)
             except Exception as e_p:
-                logger.warning(f"⚠️ Portfolio point calc failed: {e_p}")
-
-        result = {
-            "status": "success",
-            "frontier": frontier_points,
-            "assets": asset_points,
-            "portfolio": portfolio_point,
-            "effective_start_date": effective_start_date,
-            "observations": observations,
-            "math_data": {
-                "ordered_isins": list(df.columns),
-                "expected_returns": {
-                    k: float(v) for k, v in mu.to_dict().items()
-                },
-                "covariance_matrix": S.values.tolist(),
-            },
+                logger.warning(f"⚠️ [Senior EF] Period {p} failed: {e_p}")
+                blocks[p] = {"status": "error", "message": str(e_p), "error": str(e_p)}
+
+        ok = [p for p in periods if blocks[p].get("status") == "success"]
+        logger.info(f"🏁 [Senior EF] Multi-period done: {len(ok)}/{len(periods)} periods OK.")
+        return {
+            "status": "success" if ok else "error",
+            "periods": {p: blocks[p] for p in periods},
         }
-        logger.info(
-            f"🏁 [DEBUG] Returning success with {len(frontier_points)} fp, {len(asset_points)} ap."
-        )
-        return result
 
     except Exception as e:
-        logger.info(f"❌ [DEBUG] CRITICAL Frontier Error: {e}")
+        logger.info(f"❌ [DEBUG] CRITICAL Multi-period Frontier Error: {e}")
         import traceback
 
         traceback.print_exc()
@@ -7,17 +7,28 @@ import pandas as pd
 import numpy as np
 from pypfopt import (
     EfficientFrontier,
+    EfficientCVaR,
+    EfficientCDaR,
     risk_models,
     objective_functions,
-    CLA,
 )
 
 from services.data_fetcher import DataFetcher
+from services.telemetry import PipelineTelemetry
 from services.config import (
+    OPTIMIZER_WINDOW_YEARS,
     RISK_TARGETS,
     MAX_WEIGHT_DEFAULT,
     CUTOFF_DEFAULT,
     RISK_BUCKETS_LABELS,
+    CARDINALITY_SUPPORT_EPS,
+    CARDINALITY_MAX_ITERS,
+    SENSITIVITY_GRID_DEFAULT,
+    SENSITIVITY_MAX_CONSTRAINTS,
+    RESAMPLING_DEFAULT_N,
+    RESAMPLING_MAX_N,
+    SCENARIO_RISK_BETA,
+    SCENARIO_MAX_COUNT,
 )
 
 from .utils import (
@@ -31,9 +42,15 @@ from services.quant_core import (
     get_covariance_matrix,
     get_expected_returns,
     calculate_portfolio_metrics,
+    build_return_scenarios,
+    calculate_scenario_risk,
 )
 
 from services.portfolio.suitability_engine import is_fund_eligible_for_profile
+from services.portfolio.candidate_pool import extend_moments_with_pool
+from services.portfolio.risk_parity_engine import risk_parity_allocation
+from services.portfolio.resampling_engine import RESAMPLE_KINDS, resampled_optimization
+from services.portfolio.frontier_engine import build_frontier_artifact, get_frontier_artifact
 
 FALLBACK_CANDIDATES_DEFAULT = [
     "LU0340557775",  # Morgan Stanley Global Opportunity (Activo)
@@ -47,7 +64,7 @@ FALLBACK_CANDIDATES_DEFAULT = [
 # INTERNAL PIPELINE HELPERS
 # =========================================================================
 
-def _build_optimization_context(db, constraints):
+def _build_optimization_context(db, constraints, telemetry=None):
     """
     FASE 1: Construcción de contexto y políticas base.
     [PRECEDENCIA]: Firestore (risk_profiles) manda sobre todo lo demás.
@@ -62,6 +79,8 @@ def _build_optimization_context(db, constraints):
 
     try:
         risk_profile_doc = db.collection("system_settings").document("risk_profiles").get()
+        if telemetry is not None:
+            telemetry.count("firestore_reads")
         if risk_profile_doc.exists:
             raw_dic = risk_profile_doc.to_dict()
             current_risk_buckets = {int(k): v for k, v in raw_dic.items()}
@@ -70,6 +89,8 @@ def _build_optimization_context(db, constraints):
             logger.info("⚠️ [Optimizer] Perfiles no encontrados en DB. Auto-inicializando...")
             db_save = {str(k): v for k, v in RISK_BUCKETS_LABELS.items()}
             db.collection("system_settings").document("risk_profiles").set(db_save)
+            if telemetry is not None:
+                telemetry.count("firestore_writes")
             current_risk_buckets = RISK_BUCKETS_LABELS
     except Exception as e:
         logger.info(f"⚠️ [Optimizer] Fallo al leer perfiles de riesgo: {e}. Usando locales.")
@@ -108,12 +129,12 @@ def _apply_suitability_filter(assets_list, asset_metadata, risk_level, apply_pro
             logger.info(f"🚫 [Suitability Excluded] {isin}: {reason}")
     return filtered_list
 
-def _build_candidate_universe(db, assets_list, asset_metadata, constraints, candidate_funds=None, locked_assets=None):
+def _build_candidate_universe(db, assets_list, asset_metadata, constraints, candidate_funds=None, locked_assets=None, telemetry=None):
     """
     FASE 3: Historico de Datos y Expansión Básica.
     [LEGADO]: Incluye lógica de auto-expandir basada en base de datos si fallan historiales.
     """
-    fetcher = DataFetcher(db)
+    fetcher = DataFetcher(db, telemetry=telemetry)
     price_data, synthetic_used = fetcher.get_price_data(
         assets_list, resample_freq="D", strict=False
     )
@@ -121,7 +142,7 @@ def _build_candidate_universe(db, assets_list, asset_metadata, constraints, cand
     df = pd.DataFrame(price_data)
     df.index = pd.to_datetime(df.index)
 
-    target_years = 5
+    target_years = OPTIMIZER_WINDOW_YEARS
     ideal_start_date = df.index[-1] - pd.Timedelta(days=365 * target_years) if not df.empty else None
 
     if not df.empty:
@@ -199,7 +220,13 @@ def _build_candidate_universe(db, assets_list, asset_metadata, constraints, cand
         else:
             candidates_list = FALLBACK_CANDIDATES_DEFAULT
 
-        valid_cands, _ = fetcher.get_price_data(candidates_list, resample_freq="D", strict=True)
+        pool = fetcher.get_auto_expand_pool()
+        if pool:
+            # Historia prevalidada y ya alineada por la rutina nocturna (sin descarga)
+            allowed = set(candidate_funds) if candidate_funds else set(pool["isins"])
+            valid_cands = {c: pool["prices"][c] for c in pool["isins"] if c in allowed}
+        else:
+            valid_cands, _ = fetcher.get_price_data(candidates_list, resample_freq="D", strict=True)
         valid_cands_sorted = sorted(valid_cands.items(), key=lambda x: len(x[1]), reverse=True)
         for isin, p_series in valid_cands_sorted:
             if len(p_series) >= 756:
@@ -211,7 +238,7 @@ def _build_candidate_universe(db, assets_list, asset_metadata, constraints, cand
         df = pd.DataFrame(price_data)
         df.index = pd.to_datetime(df.index)
 
-        ideal_start_date = df.index[-1] - pd.Timedelta(days=365 * 5)
+        ideal_start_date = df.index[-1] - pd.Timedelta(days=365 * OPTIMIZER_WINDOW_YEARS)
         first_valid_indices = df.apply(lambda col: col.first_valid_index()).dropna()
 
         if not first_valid_indices.empty:
@@ -262,62 +289,54 @@ def _build_expected_returns_and_cov(df, universe, asset_metadata, tactical_views
     return mu, S
 
 
-def _build_frontier_curve(mu, S):
+def _build_frontier_curve(mu, S, db=None, df=None, telemetry=None):
     """
     FASE 5: Generación de la Frontera Eficiente Teórica (para pintado en UI).
+    Con df (μ/Σ canónicos, sin vistas BL) se usa el artefacto compartido con
+    getEfficientFrontier; si no, se construye sin caché.
     """
-    frontier_points = []
     try:
-        cla = CLA(mu, S)
-        f_ret, f_vol, _ = cla.efficient_frontier(points=50)
-        for v_raw, r_raw in zip(f_vol, f_ret):
-            if np.isnan(v_raw) or np.isnan(r_raw):
-                continue
-            frontier_points.append({"x": round(float(v_raw), 4), "y": round(float(r_raw), 4)})
-
-        if frontier_points:
-            frontier_points = sorted(frontier_points, key=lambda p: p["y"])
-            min_vol_idx = min(range(len(frontier_points)), key=lambda i: frontier_points[i]["x"])
-            efficient_only = []
-            current_max_x = -1.0
-            for p in frontier_points[min_vol_idx:]:
-                if p["x"] >= current_max_x - 1e-5:
-                    efficient_only.append(p)
-                    current_max_x = max(current_max_x, p["x"])
-            frontier_points = efficient_only
+        if df is not None:
+            artifact, _ = get_frontier_artifact(db, df, mu=mu, S=S, telemetry=telemetry)
+        else:
+            artifact = build_frontier_artifact(mu, S)
+        return artifact["frontier"]
     except Exception as e_cla:
         logger.info(f"⚠️ Frontier gen warning: {e_cla}")
-        
-    return frontier_points
+        return []
 
 
-def _apply_standard_constraints(ef_inst, constraints, lock_mode, apply_profile, risk_level_i, locked_assets, fixed_weights, asset_metadata, current_risk_buckets, eq_v, bd_v, cs_v, al_v, ot_v):
+def _collect_standard_constraints(universe, constraints, lock_mode, apply_profile, risk_level_i, locked_assets, fixed_weights, asset_metadata, current_risk_buckets, eq_v, bd_v, cs_v, al_v, ot_v):
     """
-    FASE 6: Inyección de Restricciones Efectivas al Solver (PyPortfolioOpt).
-    [PRECEDENCIA EFECTIVA EN SOLVER]:
-    Toda restricción inyectada aquí es matemáticamente 'dura'. Si hay conflicto, el solver fallará.
-    Jerarquía de construcción de constraints:
-    - Nivel 1: Locked Assets & Lock Mode (Bloqueos de peso por isin dictan límites precisos)
-    - Nivel 4: Restricciones adicionales (Geografías y grupos custom)
-    - Nivel 3: Risk Profile Buckets (Bandas permitidas por tipo de activo base)
+    FASE 6a: Restricciones efectivas como datos etiquetados.
+    Cada restricción es lineal en w: {"label", "kind", "vec", "sense", "rhs"} con
+    sense in ("==", ">=", "<="), lo que permite inyectarla, leer su dual tras el
+    solve y re-resolver con el lado derecho relajado.
     """
-    universe = ef_inst.tickers
+    specs = []
+    n = len(universe)
+
+    def _spec(label, kind, vec, sense, rhs):
+        specs.append({"label": label, "kind": kind, "vec": np.asarray(vec, dtype=float), "sense": sense, "rhs": float(rhs)})
+
     for isin in locked_assets or []:
         if isin in universe:
             idx = universe.index(isin)
+            unit = np.zeros(n)
+            unit[idx] = 1.0
 
             if lock_mode in ["keep_weight", "keep_money"] and isin in fixed_weights:
                 fw_val = float(fixed_weights[isin])
                 fw_val = min(max(fw_val, 0.0), 1.0)
-                ef_inst.add_constraint(lambda w, i=idx, fw=fw_val: w[i] == fw)
+                _spec(f"lock:{isin}", "lock", unit, "==", fw_val)
             elif lock_mode == "min_keep" and isin in fixed_weights:
                 fw_val = float(fixed_weights[isin])
                 fw_val = min(max(fw_val, 0.0), 1.0)
-                ef_inst.add_constraint(lambda w, i=idx, fw=fw_val: w[i] >= fw)
+                _spec(f"lock:{isin}", "lock", unit, ">=", fw_val)
             elif lock_mode == "free":
                 pass
             else:
-                ef_inst.add_constraint(lambda w, i=idx: w[i] >= 0.01)
+                _spec(f"lock:{isin}", "lock", unit, ">=", 0.01)
 
     if constraints and asset_metadata:
         try:
@@ -333,11 +352,9 @@ def _apply_standard_constraints(ef_inst, constraints, lock_mode, apply_profile,
                     us_vec_l.append(_to_float(regs.get("americas", 0.0), 0.0) / 100.0)
 
                 if eu_target > 0:
-                    eu_vec_np = np.array(eu_vec_l)
-                    ef_inst.add_constraint(lambda w: w @ eu_vec_np >= eu_target)
+                    _spec("geo:europe_min", "geo", eu_vec_l, ">=", eu_target)
                 if us_cap < 1.0:
-                    us_vec_np = np.array(us_vec_l)
-                    ef_inst.add_constraint(lambda w: w @ us_vec_np <= us_cap)
+                    _spec("geo:americas_max", "geo", us_vec_l, "<=", us_cap)
 
             emerging_cap = float((constraints.get("emerging", 1.0) or 1.0))
             if apply_profile and risk_level_i <= 3:
@@ -349,8 +366,7 @@ def _apply_standard_constraints(ef_inst, constraints, lock_mode, apply_profile,
                     regs = m.get("regions", {}) or {}
                     em_vec_l.append(_to_float(regs.get("emerging", 0.0), 0.0) / 100.0)
 
-                em_vec_np = np.array(em_vec_l)
-                ef_inst.add_constraint(lambda w: w @ em_vec_np <= emerging_cap)
+                _spec("geo:emerging_max", "geo", em_vec_l, "<=", emerging_cap)
         except Exception as e_geo:
             logger.info(f"⚠️ Geo Constraint Warning: {e_geo}")
 
@@ -368,41 +384,67 @@ def _apply_standard_constraints(ef_inst, constraints, lock_mode, apply_profile,
                         group_data = m.get(group_type, {}) or {}
                         vec_l.append(_to_float(group_data.get(group_name, 0.0), 0.0) / 100.0)
 
-                    vec_np = np.array(vec_l)
                     if min_val > 0.001:
-                        ef_inst.add_constraint(lambda w, v=vec_np, m=min_val: w @ v >= m)
+                        _spec(f"group:{group_type}.{group_name}_min", "group", vec_l, ">=", min_val)
                     if max_val < 0.999:
-                        ef_inst.add_constraint(lambda w, v=vec_np, m=max_val: w @ v <= m)
+                        _spec(f"group:{group_type}.{group_name}_max", "group", vec_l, "<=", max_val)
         except Exception as e_grp:
             logger.info(f"⚠️ Generic Group Constraint Warning: {e_grp}")
 
     if apply_profile and risk_level_i in current_risk_buckets:
         bucket_cfg = current_risk_buckets[risk_level_i]
-        if "RV" in bucket_cfg:
-            ef_inst.add_constraint(lambda w: w @ eq_v >= bucket_cfg["RV"][0])
-            ef_inst.add_constraint(lambda w: w @ eq_v <= bucket_cfg["RV"][1])
-        if "RF" in bucket_cfg:
-            ef_inst.add_constraint(lambda w: w @ bd_v >= bucket_cfg["RF"][0])
-            ef_inst.add_constraint(lambda w: w @ bd_v <= bucket_cfg["RF"][1])
-        if "Monetario" in bucket_cfg:
-            ef_inst.add_constraint(lambda w: w @ cs_v >= bucket_cfg["Monetario"][0])
-            ef_inst.add_constraint(lambda w: w @ cs_v <= bucket_cfg["Monetario"][1])
-        if "Alternativos" in bucket_cfg:
-            ef_inst.add_constraint(lambda w: w @ al_v >= bucket_cfg["Alternativos"][0])
-            ef_inst.add_constraint(lambda w: w @ al_v <= bucket_cfg["Alternativos"][1])
-        if "Otros" in bucket_cfg:
-            ef_inst.add_constraint(lambda w: w @ ot_v >= bucket_cfg["Otros"][0])
-            ef_inst.add_constraint(lambda w: w @ ot_v <= bucket_cfg["Otros"][1])
+        for label, vec in (("RV", eq_v), ("RF", bd_v), ("Monetario", cs_v), ("Alternativos", al_v), ("Otros", ot_v)):
+            if label in bucket_cfg:
+                _spec(f"bucket:{label}_min", "bucket", vec, ">=", bucket_cfg[label][0])
+                _spec(f"bucket:{label}_max", "bucket", vec, "<=", bucket_cfg[label][1])
+
+    return specs
+
+
+def _apply_standard_constraints(ef_inst, constraints, lock_mode, apply_profile, risk_level_i, locked_assets, fixed_weights, asset_metadata, current_risk_buckets, eq_v, bd_v, cs_v, al_v, ot_v, rhs_overrides=None):
+    """
+    FASE 6: Inyección de Restricciones Efectivas al Solver (PyPortfolioOpt).
+    [PRECEDENCIA EFECTIVA EN SOLVER]:
+    Toda restricción inyectada aquí es matemáticamente 'dura'. Si hay conflicto, el solver fallará.
+    Jerarquía de construcción de constraints:
+    - Nivel 1: Locked Assets & Lock Mode (Bloqueos de peso por isin dictan límites precisos)
+    - Nivel 4: Restricciones adicionales (Geografías y grupos custom)
+    - Nivel 3: Risk Profile Buckets (Bandas permitidas por tipo de activo base)
+    rhs_overrides ({label: rhs}) permite re-resolver con restricciones relajadas (what-if).
+    Las especificaciones quedan en ef_inst._standard_constraint_specs con su restricción
+    cvxpy ("constraint") para leer los duales tras el solve.
+    """
+    specs = _collect_standard_constraints(
+        list(ef_inst.tickers), constraints, lock_mode, apply_profile, risk_level_i, locked_assets,
+        fixed_weights, asset_metadata, current_risk_buckets, eq_v, bd_v, cs_v, al_v, ot_v
+    )
+    for spec in specs:
+        rhs = float((rhs_overrides or {}).get(spec["label"], spec["rhs"]))
+        spec["rhs"] = rhs
+        vec = spec["vec"]
+        if spec["sense"] == "==":
+            ef_inst.add_constraint(lambda w, v=vec, r=rhs: w @ v == r)
+        elif spec["sense"] == ">=":
+            ef_inst.add_constraint(lambda w, v=vec, r=rhs: w @ v >= r)
+        else:
+            ef_inst.add_constraint(lambda w, v=vec, r=rhs: w @ v <= r)
+        spec["constraint"] = ef_inst._constraints[-1]
+
+    ef_inst._standard_constraint_specs = specs
+    return specs
 
 def _check_feasibility_and_autoexpand(
     db, fetcher, price_data, universe, assets_list, apply_profile, equity_floor, max_weight, 
     eq_vec, locked_assets, constraints, asset_metadata, min_weight, gamma,
     bd_vec, cs_vec, al_vec, ot_vec, lock_mode, risk_level_i, fixed_weights, current_risk_buckets,
-    candidate_funds=None
+    candidate_funds=None, df=None, mu_base=None, S_base=None
 ):
     """
     FASE 7: Predicción de Factibilidad (Floor Checks).
     [LEGADO]: Incluye lógica de inyección de fondos de alta RV si no se cumple el equity floor.
+    Tras la expansión, μ/Σ se estiman siempre con media histórica + Ledoit-Wolf sobre la
+    ventana de `df` (vía pool o descarga). La vía rápida exige `mu_base`/`S_base` con ese
+    mismo estimador: con vistas tácticas (BL) el llamador no los pasa y se usa la descarga.
     """
     added_assets = []
     solver_path = None
@@ -446,54 +488,91 @@ def _check_feasibility_and_autoexpand(
                 }, None, None, None, None, None, None, None, None, None, None, None
 
             logger.info("⚠️ Auto-Expanding Universe...")
-            if candidate_funds:
-                candidates_list = list(candidate_funds.keys())
-            else:
-                candidates_list = FALLBACK_CANDIDATES_DEFAULT
-
-            valid_added = []
             seen = set(universe) | set(assets_list)
-            potential = [c for c in candidates_list if c not in seen]
-            if potential:
-                p_check, _ = fetcher.get_price_data(potential, resample_freq="D", strict=True)
-                valid_added_with_len = []
-                for isin, p_s in p_check.items():
-                    if len(p_s) >= 756:
-                        valid_added_with_len.append((isin, len(p_s)))
-                
-                # Sort by history length descending to prefer 5+ years
-                valid_added = [isin for isin, _ in sorted(valid_added_with_len, key=lambda x: x[1], reverse=True)]
 
-            if not valid_added:
-                return False, {
-                    "api_version": "optimizer_v4",
-                    "status": "auto_expand_failed",
-                    "weights": {},
-                }, None, None, None, None, None, None, None, None, None, None, None
-
-            added_assets = valid_added[:6]
-            price_data.update({k: p_check[k] for k in added_assets})
-
-            for isin in added_assets:
-                if candidate_funds and isin in candidate_funds:
-                    asset_metadata[isin] = candidate_funds[isin]
+            # Vía rápida: pool nocturno pre-alineado -> se extienden μ/Σ sin re-estimar el universo
+            pool = fetcher.get_auto_expand_pool() if (df is not None and mu_base is not None and S_base is not None) else None
+            if pool:
+                added_assets, history, mu, S = extend_moments_with_pool(
+                    df, mu_base, S_base, pool, exclude=seen,
+                    allowed=set(candidate_funds) if candidate_funds else None,
+                )
+                for isin in added_assets:
+                    if candidate_funds and isin in candidate_funds:
+                        asset_metadata[isin] = candidate_funds[isin]
+                    else:
+                        asset_metadata[isin] = pool["metadata"].get(isin) or {
+                            "metrics": {},
+                            "asset_class": "UNKNOWN",
+                            "classification_v2": {},
+                            "portfolio_exposure_v2": {},
+                        }
+
+            if not added_assets:
+                if candidate_funds:
+                    candidates_list = list(candidate_funds.keys())
                 else:
-                    asset_metadata[isin] = {
-                        "metrics": {},
-                        "asset_class": "UNKNOWN",
-                        "classification_v2": {},
-                        "portfolio_exposure_v2": {},
-                    }
-
-            df = pd.DataFrame(price_data).sort_index().ffill(limit=5)
-            universe = list(df.columns)
-            mu = get_expected_returns(df, method="ema")
-            S = get_covariance_matrix(df)
+                    candidates_list = FALLBACK_CANDIDATES_DEFAULT
+
+                valid_added = []
+                potential = [c for c in candidates_list if c not in seen]
+                if potential:
+                    p_check, _ = fetcher.get_price_data(potential, resample_freq="D", strict=True)
+                    valid_added_with_len = []
+                    for isin, p_s in p_check.items():
+                        if len(p_s) >= 756:
+                            valid_added_with_len.append((isin, len(p_s)))
+                    
+                    # Sort by history length descending to prefer 5+ years
+                    valid_added = [isin for isin, _ in sorted(valid_added_with_len, key=lambda x: x[1], reverse=True)]
+
+                if not valid_added:
+                    return False, {
+                        "api_version": "optimizer_v4",
+                        "status": "auto_expand_failed",
+                        "weights": {},
+                    }, None, None, None, None, None, None, None, None, None, None, None
+
+                if df is not None:
+                    # Misma ventana que el universo base (y que la vía del pool)
+                    cand = pd.DataFrame({k: p_check[k] for k in valid_added})
+                    cand.index = pd.to_datetime(cand.index)
+                    cand = cand.sort_index().reindex(df.index).ffill(limit=5)
+                    valid_added = [c for c in valid_added if cand[c].notna().all()]
+                    if not valid_added:
+                        return False, {
+                            "api_version": "optimizer_v4",
+                            "status": "auto_expand_failed",
+                            "weights": {},
+                        }, None, None, None, None, None, None, None, None, None, None, None
+
+                added_assets = valid_added[:6]
+                price_data.update({k: p_check[k] for k in added_assets})
+
+                for isin in added_assets:
+                    if candidate_funds and isin in candidate_funds:
+                        asset_metadata[isin] = candidate_funds[isin]
+                    else:
+                        asset_metadata[isin] = {
+                            "metrics": {},
+                            "asset_class": "UNKNOWN",
+                            "classification_v2": {},
+                            "portfolio_exposure_v2": {},
+                        }
+
+                if df is not None:
+                    history = pd.concat([df, cand[added_assets]], axis=1)
+                else:
+                    history = pd.DataFrame(price_data).sort_index().ffill(limit=5)
+                mu = get_expected_returns(history, method="mean")
+                S = get_covariance_matrix(history)
+
+            universe = list(mu.index)
             eq_vec, bd_vec, cs_vec, al_vec, ot_vec, _ = _allocation_vectors(universe, asset_metadata)
 
-            ef = EfficientFrontier(mu, S, weight_bounds=(min_weight, max_weight))
-            if constraints.get("objective") != "min_deviation":
-                ef.add_objective(objective_functions.L2_reg, gamma=gamma)
+            _, kind, _ = _primary_objective_spec(constraints, apply_profile, risk_level_i)
+            scenarios = _build_scenarios(history[universe]) if kind in SCENARIO_OBJECTIVES else None
+            ef = _new_objective_optimizer(kind, mu, S, (min_weight, max_weight), gamma, scenarios=scenarios)
             
             _apply_standard_constraints(
                 ef, constraints, lock_mode, apply_profile, risk_level_i, locked_assets, 
@@ -503,7 +582,190 @@ def _check_feasibility_and_autoexpand(
             
     return True, {}, added_assets, solver_path, ef, mu, S, universe, eq_vec, bd_vec, cs_vec, al_vec, ot_vec
 
-def _run_solver(ef, mu, S, constraints, risk_level_i, rf_rate, max_weight, gamma, apply_profile, universe, lock_mode, locked_assets, fixed_weights, asset_metadata, current_risk_buckets, eq_vec, bd_vec, cs_vec, al_vec, ot_vec):
+def _primary_objective_spec(constraints, apply_profile, risk_level_i):
+    """
+    Resuelve el objetivo primario (Nivel 6) a una especificación reutilizable:
+    (solver_path, kind, target_vol). Permite re-resolver el mismo objetivo sobre
+    instancias nuevas del solver (p.ej. refinamiento de cardinalidad).
+    """
+    if constraints.get("objective") == "min_deviation":
+        return "min_deviation_custom", "min_deviation", None
+    if constraints.get("objective") in SCENARIO_OBJECTIVES:
+        return f"{constraints['objective']}_scenarios", constraints["objective"], None
+    if apply_profile:
+        target_vol = float(RISK_TARGETS.get(risk_level_i, 0.05))
+        return f"efficient_risk_profile_{target_vol:.3f}", "efficient_risk", target_vol
+    if constraints.get("objective") == "max_sharpe":
+        return "max_sharpe_custom", "max_sharpe", None
+    target_vol = float(RISK_TARGETS.get(risk_level_i, 0.05)) + 0.015
+    return f"efficient_risk_{target_vol:.3f}", "efficient_risk", target_vol
+
+
+def _objective_spec_for_path(solver_path, constraints, apply_profile, risk_level_i):
+    """Especificación del objetivo que produjo `solver_path` (incluye fallbacks resueltos)."""
+    if solver_path == "fallback_relaxed_sharpe":
+        return solver_path, "max_sharpe", None
+    if solver_path == "fallback_min_vol":
+        return solver_path, "min_volatility", None
+    return _primary_objective_spec(constraints, apply_profile, risk_level_i)
+
+
+SCENARIO_OBJECTIVES = ("min_cvar", "min_cdar")
+
+
+def _build_scenarios(df):
+    """Escenarios históricos reducidos (diario -> semanal -> mensual) para los LP de CVaR / CDaR."""
+    scenarios, freq = build_return_scenarios(df, max_scenarios=SCENARIO_MAX_COUNT)
+    scenarios.attrs["frequency"] = freq
+    return scenarios
+
+
+def _new_objective_optimizer(kind, mu, S, weight_bounds, gamma, scenarios=None):
+    """
+    Instancia el optimizador convexo adecuado para `kind`:
+    - min_cvar / min_cdar: LP sobre escenarios (EfficientCVaR / EfficientCDaR), sin L2.
+    - resto: EfficientFrontier media-varianza (+ L2_reg para efficient_risk / max_sharpe).
+    """
+    if kind in SCENARIO_OBJECTIVES:
+        cls = EfficientCVaR if kind == "min_cvar" else EfficientCDaR
+        opt = cls(mu, scenarios, beta=SCENARIO_RISK_BETA, weight_bounds=weight_bounds)
+        opt.returns.attrs.update(scenarios.attrs)
+        return opt
+    ef = EfficientFrontier(mu, S, weight_bounds=weight_bounds)
+    if kind in ("efficient_risk", "max_sharpe"):
+        ef.add_objective(objective_functions.L2_reg, gamma=gamma)
+    return ef
+
+
+def _build_rebalance_context(constraints, universe):
+    """
+    Cartera actual para re-optimización incremental (Nivel 5: directrices de rebalanceo).
+    Fuente: constraints.current_weights (fracciones). Devuelve None si no llega: sin cartera
+    de partida no hay rotación que medir ni controlar.
+    """
+    current = constraints.get("current_weights") or {}
+    if not current:
+        return None
+
+    w0 = np.array([min(max(_to_float(current.get(t, 0.0)), 0.0), 1.0) for t in universe])
+    if w0.sum() <= 0:
+        return None
+
+    cap = constraints.get("turnover_cap")
+    return {
+        "w0": w0,
+        "turnover_penalty": float(constraints.get("turnover_penalty") or 0.0),
+        "turnover_cap": float(cap) if cap is not None else None,
+    }
+
+
+def _turnover_penalty_error(constraints, apply_profile, risk_level_i):
+    """
+    turnover_penalty con objetivo primario max_sharpe: pypfopt homogeneiza el problema
+    (w -> k·w con k arbitrario), así que penalty·Σt dejaría de ser un coste por unidad de
+    rotación. Se rechaza la petición (turnover_cap sí es homogeneizable y se admite).
+    """
+    if _to_float(constraints.get("turnover_penalty") or 0.0) <= 0:
+        return None
+    _, kind, _ = _primary_objective_spec(constraints, apply_profile, risk_level_i)
+    if kind == "max_sharpe":
+        return "turnover_penalty no es compatible con objective='max_sharpe' (problema homogeneizado); usa turnover_cap u otro objetivo"
+    return None
+
+
+def _apply_rebalance_controls(ef, rebalance, enforce_cap=True, kind=None):
+    """
+    Inyecta la cartera actual en el problema convexo:
+    - Rotación L1 linealizada: t >= |w - w0| con t >= 0 auxiliar.
+      Forma `expr <= constante` para que max_sharpe pueda homogeneizarla (w0 -> k·w0).
+    - turnover_penalty: coste proporcional a la rotación en el objetivo. No se aplica si
+      kind == "max_sharpe" (p.ej. fallback_relaxed_sharpe): escalaría con k.
+    - turnover_cap: rotación total máxima como restricción dura (se relaja en fallbacks).
+    """
+    if not rebalance:
+        return
+    import cvxpy as cp
+
+    w0 = rebalance["w0"]
+    penalty = rebalance["turnover_penalty"] if kind != "max_sharpe" else 0.0
+    cap = rebalance["turnover_cap"] if enforce_cap else None
+    if penalty <= 0 and cap is None:
+        return
+
+    t = cp.Variable(len(w0), nonneg=True)
+    ef.add_constraint(lambda w: w - t <= w0)
+    ef.add_constraint(lambda w: -w - t <= -w0)
+    if cap is not None:
+        ef.add_constraint(lambda w: cp.sum(t) <= cap)
+    if penalty > 0:
+        ef.add_objective(lambda w: penalty * cp.sum(t))
+
+
+def _solve_objective(ef, kind, target_vol, constraints, rf_rate, universe):
+    """Ejecuta el objetivo `kind` sobre una instancia ya restringida (EfficientFrontier / CVaR / CDaR)."""
+    if kind == "min_deviation":
+        import cvxpy as cp
+        target_dict = constraints.get("target_weights", {})
+        target_arr = np.array([target_dict.get(t, 0.0) for t in universe])
+
+        def tracking_error_objective(w, w_target):
+            return cp.sum_squares(w - w_target)
+
+        return ef.convex_objective(tracking_error_objective, w_target=target_arr)
+    if kind == "efficient_risk":
+        return ef.efficient_risk(target_vol)
+    if kind == "max_sharpe":
+        return ef.max_sharpe(risk_free_rate=rf_rate)
+    if kind == "min_cvar":
+        return ef.min_cvar()
+    if kind == "min_cdar":
+        return ef.min_cdar()
+    return ef.min_volatility()
+
+
+RISK_PARITY_OBJECTIVES = ("hrp", "erc")
+
+
+def _solve_risk_parity(method, S, universe, max_weight, apply_profile, risk_level_i, current_risk_buckets, eq_vec, bd_vec, cs_vec, al_vec, ot_vec, lock_mode, locked_assets, fixed_weights, constraints=None, asset_metadata=None):
+    """
+    FASE 8 (ruta sin QP): Hierarchical Risk Parity / Equal Risk Contribution.
+    - Respeta las bandas del perfil (RISK_BUCKETS_LABELS) vía presupuesto de riesgo por bucket.
+    - Locks con peso (keep_weight / keep_money / min_keep) se tratan como pesos fijos.
+    - Restricciones geo / grupos no se imponen: se verifican a posteriori y se avisa.
+    Devuelve (raw_weights: dict, report: dict). Lanza ValueError si las bandas son infactibles.
+    """
+    bucket_vectors = {"RV": eq_vec, "RF": bd_vec, "Monetario": cs_vec, "Alternativos": al_vec, "Otros": ot_vec}
+    bucket_bands = None
+    if apply_profile and risk_level_i in current_risk_buckets:
+        bucket_bands = {k: tuple(v) for k, v in current_risk_buckets[risk_level_i].items() if k in bucket_vectors}
+
+    fixed = {}
+    if lock_mode in ["keep_weight", "keep_money", "min_keep"]:
+        for t in locked_assets or []:
+            if t in universe and t in fixed_weights:
+                fixed[t] = min(1.0, max(0.0, float(fixed_weights[t])))
+
+    weights, report = risk_parity_allocation(
+        S.loc[universe, universe], method=method, bucket_vectors=bucket_vectors, bucket_bands=bucket_bands,
+        max_weight=max_weight, fixed_weights=fixed,
+    )
+    raw_weights = {t: float(weights[t]) for t in universe}
+
+    report["warnings"] = []
+    w_arr = np.array([raw_weights[t] for t in universe])
+    for spec in _collect_standard_constraints(
+        universe, constraints or {}, lock_mode, False, risk_level_i, locked_assets, fixed_weights,
+        asset_metadata, current_risk_buckets, eq_vec, bd_vec, cs_vec, al_vec, ot_vec,
+    ):
+        if spec["kind"] not in ("geo", "group"):
+            continue
+        val = float(w_arr @ spec["vec"])
+        if (spec["sense"] == ">=" and val < spec["rhs"] - 1e-6) or (spec["sense"] == "<=" and val > spec["rhs"] + 1e-6):
+            report["warnings"].append(f"{method}: {spec['label']} no impuesta ({val:.2%} vs {spec['rhs']:.2%})")
+    return raw_weights, report
+
+
+def _run_solver(ef, mu, S, constraints, risk_level_i, rf_rate, max_weight, gamma, apply_profile, universe, lock_mode, locked_assets, fixed_weights, asset_metadata, current_risk_buckets, eq_vec, bd_vec, cs_vec, al_vec, ot_vec, telemetry=None, rebalance=None):
     """
     FASE 8: Ejecución Matemática Final.
     [PRECEDENCIA CANÓNICA] Nivel 6: Objetivo del Solver.
@@ -512,32 +774,20 @@ def _run_solver(ef, mu, S, constraints, risk_level_i, rf_rate, max_weight, gamma
     """
     solver_path = None
     raw_weights = None
+
+    def _record(ef_run, path, ok):
+        if telemetry is not None:
+            telemetry.record_solver(ef_run, path, succeeded=ok)
     
     try:
-        if constraints.get("objective") == "min_deviation":
-            solver_path = "min_deviation_custom"
-            import cvxpy as cp
-            target_dict = constraints.get("target_weights", {})
-            target_arr = np.array([target_dict.get(t, 0.0) for t in universe])
-
-            def tracking_error_objective(w, w_target):
-                return cp.sum_squares(w - w_target)
-
-            raw_weights = ef.convex_objective(tracking_error_objective, w_target=target_arr)
-        elif apply_profile:
-            target_vol = float(RISK_TARGETS.get(risk_level_i, 0.05))
-            solver_path = f"efficient_risk_profile_{target_vol:.3f}"
-            raw_weights = ef.efficient_risk(target_vol)
-        elif constraints.get("objective") == "max_sharpe":
-            solver_path = "max_sharpe_custom"
-            raw_weights = ef.max_sharpe(risk_free_rate=rf_rate)
-        else:
-            base_target = float(RISK_TARGETS.get(risk_level_i, 0.05))
-            target_vol = base_target + 0.015
-            solver_path = f"efficient_risk_{target_vol:.3f}"
-            raw_weights = ef.efficient_risk(target_vol)
+        solver_path, kind, target_vol = _primary_objective_spec(constraints, apply_profile, risk_level_i)
+        _apply_rebalance_controls(ef, rebalance, kind=kind)
+        raw_weights = _solve_objective(ef, kind, target_vol, constraints, rf_rate, universe)
+        _record(ef, solver_path, True)
     except Exception as e1:
         logger.info(f"⚠️ Optimization Failed: {e1}. Trying Relaxed Fallbacks...")
+        _record(ef, solver_path, False)
+        ef_relaxed = ef_minvol = None
         try:
             logger.info("⚠️ Fallback 1: Relaxed Sharpe")
             ef_relaxed = EfficientFrontier(mu, S, weight_bounds=(0.0, max_weight))
@@ -548,11 +798,14 @@ def _run_solver(ef, mu, S, constraints, risk_level_i, rf_rate, max_weight, gamma
                 locked_assets, fixed_weights, asset_metadata, current_risk_buckets, 
                 eq_vec, bd_vec, cs_vec, al_vec, ot_vec
             )
+            _apply_rebalance_controls(ef_relaxed, rebalance, enforce_cap=False, kind="max_sharpe")
             
             raw_weights = ef_relaxed.max_sharpe(risk_free_rate=rf_rate)
             ef = ef_relaxed
             solver_path = "fallback_relaxed_sharpe"
+            _record(ef, solver_path, True)
         except Exception:
+            _record(ef_relaxed, "fallback_relaxed_sharpe", False)
             try:
                 logger.info("⚠️ Fallback 2: Min Volatility")
                 ef_minvol = EfficientFrontier(mu, S, weight_bounds=(0.0, max_weight))
@@ -566,14 +819,306 @@ def _run_solver(ef, mu, S, constraints, risk_level_i, rf_rate, max_weight, gamma
                 raw_weights = ef_minvol.min_volatility()
                 ef = ef_minvol
                 solver_path = "fallback_min_vol"
-            except Exception as e_crit:
-                logger.info(f"❌ ALL PATHS FAILED: {e_crit}")
-                solver_path = "fallback_equal_weight"
-                raw_weights = None
+                _record(ef, solver_path, True)
+            except Exception as e_minvol:
+                _record(ef_minvol, "fallback_min_vol", False)
+                try:
+                    # Fallback 3: HRP determinista (sin QP), conserva bandas del perfil y locks
+                    logger.info(f"⚠️ Fallback 3: HRP ({e_minvol})")
+                    raw_weights, _ = _solve_risk_parity(
+                        "hrp", S, universe, max_weight, apply_profile, risk_level_i, current_risk_buckets,
+                        eq_vec, bd_vec, cs_vec, al_vec, ot_vec, lock_mode, locked_assets, fixed_weights,
+                    )
+                    ef = None
+                    solver_path = "fallback_hrp"
+                    _record(None, solver_path, True)
+                except Exception as e_crit:
+                    logger.info(f"❌ ALL PATHS FAILED: {e_crit}")
+                    _record(None, "fallback_hrp", False)
+                    solver_path = "fallback_equal_weight"
+                    raw_weights = None
                 
     return ef, raw_weights, solver_path
 
 
+def _enforce_cardinality(ef, raw_weights, solver_path, mu, S, constraints, risk_level_i, rf_rate, min_weight, max_weight, gamma, apply_profile, universe, lock_mode, locked_assets, fixed_weights, asset_metadata, current_risk_buckets, eq_vec, bd_vec, cs_vec, al_vec, ot_vec, max_assets, min_position, telemetry=None, rebalance=None):
+    """
+    FASE 8b: Modo Cardinalidad (max N fondos / posición mínima X%).
+    Heurístico de reducción iterativa de soporte (sin MIQP):
+    1. Parte de la solución densa del solver (mismo objetivo / solver_path).
+    2. En cada iteración descarta la mitad del exceso (los pesos más pequeños) fijando
+       su cota a (0, 0) y re-resuelve el QP con TODAS las restricciones (Niveles 1, 3 y 4).
+    3. Re-solve final con cota inferior = min_position sobre el soporte elegido.
+    Los activos bloqueados nunca se descartan, ni el último activo de un bucket con mínimo > 0.
+    Si una re-resolución es infactible se conserva la última solución factible y se avisa.
+    """
+    _, kind, target_vol = _objective_spec_for_path(solver_path, constraints, apply_profile, risk_level_i)
+    protected = {t for t in (locked_assets or []) if t in universe}
+    eps = CARDINALITY_SUPPORT_EPS
+
+    guarded = []
+    if apply_profile and risk_level_i in current_risk_buckets:
+        bucket_cfg = current_risk_buckets[risk_level_i]
+        for label, vec in (("RV", eq_vec), ("RF", bd_vec), ("Monetario", cs_vec), ("Alternativos", al_vec), ("Otros", ot_vec)):
+            band = bucket_cfg.get(label)
+            if band and float(band[0]) > 0:
+                guarded.append(vec)
+    idx_of = {t: i for i, t in enumerate(universe)}
+
+    def _is_last_of_guarded_bucket(t, remaining):
+        i = idx_of[t]
+        for vec in guarded:
+            if vec[i] > 0 and not any(vec[idx_of[r]] > 0 for r in remaining if r != t):
+                return True
+        return False
+
+    def _resolve(support, floor):
+        support = set(support)
+        bounds = []
+        for t in universe:
+            if t not in support:
+                bounds.append((0.0, 0.0))
+            elif t in protected:
+                bounds.append((0.0, max_weight))
+            else:
+                bounds.append((max(min_weight, floor), max_weight))
+        ef_c = None
+        try:
+            ef_c = _new_objective_optimizer(kind, mu, S, bounds, gamma, scenarios=getattr(ef, "returns", None))
+            _apply_standard_constraints(
+                ef_c, constraints, lock_mode, apply_profile, risk_level_i,
+                locked_assets, fixed_weights, asset_metadata, current_risk_buckets,
+                eq_vec, bd_vec, cs_vec, al_vec, ot_vec
+            )
+            if solver_path != "fallback_min_vol":
+                _apply_rebalance_controls(ef_c, rebalance, enforce_cap=not solver_path.startswith("fallback_"), kind=kind)
+            w_c = _solve_objective(ef_c, kind, target_vol, constraints, rf_rate, universe)
+            if telemetry is not None:
+                telemetry.record_solver(ef_c, f"cardinality_{solver_path}", succeeded=True)
+            return ef_c, w_c
+        except Exception as e:
+            logger.info(f"⚠️ [Cardinality] Re-solve infactible ({len(support)} activos): {e}")
+            if telemetry is not None:
+                telemetry.record_solver(ef_c, f"cardinality_{solver_path}", succeeded=False)
+            return None
+
+    w = {t: float(raw_weights.get(t, 0.0)) for t in universe}
+    support = [t for t in universe if w[t] > eps or t in protected]
+    report = {
+        "max_assets": max_assets,
+        "min_position": min_position,
+        "dense_support": len(support),
+        "iterations": 0,
+        "dropped": [],
+        "warnings": [],
+    }
+
+    for _ in range(CARDINALITY_MAX_ITERS):
+        excess = len(support) - max_assets if max_assets else 0
+        below = [t for t in support if t not in protected and w[t] < min_position] if min_position > 0 else []
+        n_drop = max((excess + 1) // 2 if excess > 0 else 0, (len(below) + 1) // 2)
+        if n_drop == 0:
+            break
+
+        remaining = list(support)
+        dropped = []
+        for t in sorted((t for t in support if t not in protected), key=lambda t: w[t]):
+            if len(dropped) >= n_drop:
+                break
+            if _is_last_of_guarded_bucket(t, remaining):
+                continue
+            remaining.remove(t)
+            dropped.append(t)
+        if not dropped:
+            report["warnings"].append("Cardinalidad: no quedan activos descartables sin violar buckets o bloqueos")
+            break
+
+        res = _resolve(remaining, floor=0.0)
+        report["iterations"] += 1
+        if res is None:
+            report["warnings"].append(f"Cardinalidad: soporte de {len(remaining)} activos infactible; se conserva la última solución factible")
+            break
+        ef, raw_weights = res
+        w = {t: float(raw_weights.get(t, 0.0)) for t in universe}
+        report["dropped"].extend(dropped)
+        support = [t for t in remaining if w[t] > eps or t in protected]
+
+    # Re-solve final: posición mínima como cota inferior dura sobre el soporte elegido
+    if min_position > 0 and any(w[t] < min_position for t in support if t not in protected):
+        res = _resolve(support, floor=min_position)
+        report["iterations"] += 1
+        if res is None:
+            report["warnings"].append(f"Cardinalidad: posición mínima {min_position:.2%} infactible con las restricciones actuales")
+        else:
+            ef, raw_weights = res
+            w = {t: float(raw_weights.get(t, 0.0)) for t in universe}
+            support = [t for t in support if w[t] > eps or t in protected]
+
+    if max_assets and len(support) > max_assets:
+        report["warnings"].append(f"Cardinalidad: no se alcanzó max_assets={max_assets} (soporte final {len(support)})")
+
+    report["final_support"] = len(support)
+    report["satisfied"] = (not max_assets or len(support) <= max_assets) and all(
+        w[t] >= min_position - 1e-6 for t in support if t not in protected
+    )
+    return ef, raw_weights, report
+
+
+def _solved_constraint(ef, constr):
+    """
+    Restricción del problema resuelto que corresponde a `constr`. max_sharpe reconstruye
+    las restricciones (rhs·k) conservando la expresión en w, así que se localiza por la
+    identidad de esa expresión en vez de por posición.
+    """
+    import cvxpy as cp
+
+    if any(c is constr for c in ef._constraints):
+        return constr
+    exprs = {id(a) for a in constr.args if not isinstance(a, cp.Constant)}
+    for c in ef._constraints:
+        if any(id(a) in exprs for a in c.args):
+            return c
+    return None
+
+
+def _constraint_shadow_prices(ef, solver_path, constraints, apply_profile, risk_level_i, rf_rate):
+    """
+    FASE 8c: Precios sombra de las restricciones (buckets, geo, grupos, locks).
+    Lee el dual de cada restricción en el solve final y lo traduce a impacto marginal
+    en la métrica que optimiza el objetivo, por unidad de lado derecho (rhs):
+    - efficient_risk -> rentabilidad esperada; min_volatility -> volatilidad;
+    - max_sharpe -> Sharpe (problema homogeneizado: dual escalado por k);
+    - min_deviation -> error de seguimiento cuadrático.
+    - min_cvar / min_cdar -> CVaR / CDaR por periodo de escenario (LP, dual exacto).
+    Con L2_reg activo el dual mide el objetivo regularizado ("regularized_return" u
+    "objective"); la rejilla de relajación da los deltas exactos de Sharpe/volatilidad.
+    Aproximación local de primer orden.
+    """
+    specs = getattr(ef, "_standard_constraint_specs", None)
+    if not specs or getattr(ef, "_opt", None) is None or ef.weights is None:
+        return []
+
+    _, kind, _ = _objective_spec_for_path(solver_path, constraints, apply_profile, risk_level_i)
+    w = np.asarray(ef.weights, dtype=float)
+    mu_v = np.asarray(ef.expected_returns, dtype=float) if ef.expected_returns is not None else None
+    cov = np.asarray(ef.cov_matrix, dtype=float)
+    vol = float(np.sqrt(max(w @ cov @ w, 1e-12)))
+
+    # max_sharpe reescribe las restricciones con rhs escalado por k = Σy
+    scale = 1.0
+    if kind == "max_sharpe":
+        scale = float(np.sum(ef._w.value))
+        sharpe = float((w @ mu_v - rf_rate) / vol) if mu_v is not None else 0.0
+
+    regularized = kind in ("efficient_risk", "max_sharpe") and len(ef._additional_objectives) > 0
+    if kind == "efficient_risk":
+        metric = "regularized_return" if regularized else "expected_return"
+    elif kind == "max_sharpe":
+        # Con L2 sin escalar por k el valor óptimo ya no es 1/Sharpe²: se reporta el objetivo
+        metric = "objective" if regularized else "sharpe"
+    else:
+        metric = {"min_volatility": "volatility", "min_deviation": "tracking_sq", "min_cvar": "cvar", "min_cdar": "cdar"}[kind]
+    lower_is_better = metric in ("volatility", "tracking_sq", "objective", "cvar", "cdar")
+
+    report = []
+    for spec in specs:
+        if not np.any(spec["vec"]):
+            continue  # 0·w frente a rhs: restricción trivial, dual no informativo
+        solved = _solved_constraint(ef, spec["constraint"]) if spec.get("constraint") is not None else None
+        dual = getattr(solved, "dual_value", None)
+        if dual is None:
+            continue
+        dual = float(np.sum(dual))
+
+        # d(objetivo*)/d(rhs): -dual para '<=' y '==', +dual para '>='
+        d_obj = (dual if spec["sense"] == ">=" else -dual) * scale
+        if metric in ("expected_return", "regularized_return"):
+            d_metric = -d_obj
+        elif metric == "volatility":
+            d_metric = d_obj / (2.0 * vol)
+        elif metric == "sharpe":
+            d_metric = -0.5 * sharpe ** 3 * d_obj
+        else:
+            d_metric = d_obj
+
+        activity = float(w @ spec["vec"])
+        if spec["sense"] == "<=":
+            slack, relax_dir = spec["rhs"] - activity, 1.0
+        elif spec["sense"] == ">=":
+            slack, relax_dir = activity - spec["rhs"], -1.0
+        else:
+            # Igualdad (lock): se relaja en la dirección que mejora el objetivo
+            better_up = d_metric < 0 if lower_is_better else d_metric > 0
+            slack, relax_dir = 0.0, 1.0 if better_up else -1.0
+
+        report.append({
+            "label": spec["label"],
+            "kind": spec["kind"],
+            "sense": spec["sense"],
+            "rhs": round(spec["rhs"], 6),
+            "activity": round(activity, 6),
+            "binding": bool(slack < 1e-4 and abs(dual) > 1e-7),
+            "dual": dual,
+            "metric": metric,
+            "d_metric_d_rhs": d_metric,
+            "relax_direction": "increase" if relax_dir > 0 else "decrease",
+            "metric_change_per_pct": d_metric * relax_dir * 0.01,
+        })
+    return report
+
+
+def _relaxation_grid(ef, solver_path, shadow_prices, grid, mu, S, constraints, risk_level_i, rf_rate, gamma, apply_profile, universe, lock_mode, locked_assets, fixed_weights, asset_metadata, current_risk_buckets, eq_vec, bd_vec, cs_vec, al_vec, ot_vec, telemetry=None, rebalance=None):
+    """
+    FASE 8c (opcional): Re-solve paramétrico local para una rejilla de relajaciones.
+    Solo para las restricciones activas de mayor impacto marginal; conserva cotas,
+    objetivo y resto de restricciones del solve final.
+    """
+    _, kind, target_vol = _objective_spec_for_path(solver_path, constraints, apply_profile, risk_level_i)
+    binding = sorted(
+        (sp for sp in shadow_prices if sp["binding"]),
+        key=lambda sp: abs(sp["metric_change_per_pct"]), reverse=True,
+    )[:SENSITIVITY_MAX_CONSTRAINTS]
+    if not binding:
+        return []
+
+    bounds = list(zip(ef._lower_bounds, ef._upper_bounds))
+    base = calculate_portfolio_metrics(dict(zip(universe, np.asarray(ef.weights, dtype=float))), mu, S, rf_rate)
+
+    results = []
+    for sp in binding:
+        sign = 1.0 if sp["relax_direction"] == "increase" else -1.0
+        for step in grid:
+            rhs = min(max(sp["rhs"] + sign * float(step), 0.0), 1.0)
+            entry = {"label": sp["label"], "step": float(step), "rhs": round(rhs, 6)}
+            ef_g = None
+            try:
+                ef_g = _new_objective_optimizer(kind, mu, S, bounds, gamma, scenarios=getattr(ef, "returns", None))
+                _apply_standard_constraints(
+                    ef_g, constraints, lock_mode, apply_profile, risk_level_i,
+                    locked_assets, fixed_weights, asset_metadata, current_risk_buckets,
+                    eq_vec, bd_vec, cs_vec, al_vec, ot_vec, rhs_overrides={sp["label"]: rhs},
+                )
+                if solver_path != "fallback_min_vol":
+                    _apply_rebalance_controls(ef_g, rebalance, enforce_cap=not solver_path.startswith("fallback_"), kind=kind)
+                w_g = _solve_objective(ef_g, kind, target_vol, constraints, rf_rate, universe)
+                m = calculate_portfolio_metrics(dict(w_g), mu, S, rf_rate)
+                entry.update({
+                    "status": "optimal",
+                    "return": m["return"], "volatility": m["volatility"], "sharpe": m["sharpe"],
+                    "delta_return": m["return"] - base["return"],
+                    "delta_volatility": m["volatility"] - base["volatility"],
+                    "delta_sharpe": m["sharpe"] - base["sharpe"],
+                })
+                if telemetry is not None:
+                    telemetry.record_solver(ef_g, f"sensitivity_{solver_path}", succeeded=True)
+            except Exception as e:
+                entry.update({"status": "infeasible", "error": str(e)[:120]})
+                if telemetry is not None:
+                    telemetry.record_solver(ef_g, f"sensitivity_{solver_path}", succeeded=False)
+            results.append(entry)
+    return results
+
+
 def _postprocess_weights(ef, raw_weights, cutoff, universe, apply_profile, risk_level_i, current_risk_buckets, eq_vec, bd_vec, cs_vec, al_vec, ot_vec, lock_mode, locked_assets, fixed_weights):
     """
     FASE 9: Limpieza, Degradación Graciosa y Asignación Final.
@@ -584,7 +1129,10 @@ def _postprocess_weights(ef, raw_weights, cutoff, universe, apply_profile, risk_
     - Se pierden Nivel 4 y Nivel 5.
     """
     weights = {}
-    if raw_weights is not None:
+    if raw_weights is not None and ef is None:
+        # Rutas sin QP (HRP / ERC): pesos ya cumplen bandas y topes, no se recortan
+        weights = _normalize({t: float(raw_weights.get(t, 0.0)) for t in universe})
+    elif raw_weights is not None:
         cleaned = ef.clean_weights(cutoff=cutoff)
         weights = _normalize({t: float(cleaned.get(t, 0.0)) for t in universe})
     else:
@@ -652,20 +1200,28 @@ def run_optimization(
     asset_metadata = asset_metadata or {}
     locked_assets = locked_assets or []
     logger.info(f"📥 [Optimizer] Risk: {risk_level}, Assets: {len(assets_list)}, Meta: {len(asset_metadata)}")
+    telemetry = PipelineTelemetry()
 
     try:
         # FASE 1: Contexto Global
-        (apply_profile, optimization_mode, lock_mode, fixed_weights, 
-         current_risk_buckets, equity_floor, bond_cap, cash_cap) = _build_optimization_context(db, constraints)
+        with telemetry.phase("fase_1_context"):
+            (apply_profile, optimization_mode, lock_mode, fixed_weights, 
+             current_risk_buckets, equity_floor, bond_cap, cash_cap) = _build_optimization_context(db, constraints, telemetry)
+
+        penalty_error = _turnover_penalty_error(constraints, apply_profile, int(risk_level))
+        if penalty_error:
+            return {"api_version": "optimizer_v4", "status": "error", "message": penalty_error, "error": penalty_error, "timings": telemetry.to_dict()}
 
         # FASE 2: Suitability Filter
-        assets_list = _apply_suitability_filter(assets_list, asset_metadata, risk_level, apply_profile, locked_assets)
+        with telemetry.phase("fase_2_suitability"):
+            assets_list = _apply_suitability_filter(assets_list, asset_metadata, risk_level, apply_profile, locked_assets)
 
         # FASE 3: Universe Construction (Price Data & Expansions)
-        (fetcher, price_data, synthetic_used, df, universe, missing_assets, 
-         eq_vec, bd_vec, cs_vec, al_vec, ot_vec) = _build_candidate_universe(
-             db, assets_list, asset_metadata, constraints, candidate_funds, locked_assets
-         )
+        with telemetry.phase("fase_3_universe"):
+            (fetcher, price_data, synthetic_used, df, universe, missing_assets, 
+             eq_vec, bd_vec, cs_vec, al_vec, ot_vec) = _build_candidate_universe(
+                 db, assets_list, asset_metadata, constraints, candidate_funds, locked_assets, telemetry
+             )
 
         if df.empty or len(df) < 60:
             actual_start_str = df.index[0].strftime('%Y-%m-%d') if not df.empty else "N/A"
@@ -674,20 +1230,26 @@ def run_optimization(
                 "status": "error",
                 "message": f"El tramo común estricto encontrado es demasiado corto ({len(df)} días). Se requieren al menos 60 días laborables para optimizar.",
                 "effective_start_date": actual_start_str,
-                "observations": len(df)
+                "observations": len(df),
+                "timings": telemetry.to_dict(),
             }
 
         effective_start_date = df.index[0].strftime('%Y-%m-%d')
         observations = len(df)
 
         # FASE 4: Returns & Covariances (Markowitz & BL)
-        mu, S = _build_expected_returns_and_cov(df, universe, asset_metadata, tactical_views)
+        with telemetry.phase("fase_4_estimation"):
+            mu, S = _build_expected_returns_and_cov(df, universe, asset_metadata, tactical_views)
         
         # FASE 5: Efficient Frontier Reference
-        frontier_points = _build_frontier_curve(mu, S)
+        with telemetry.phase("fase_5_frontier"):
+            frontier_points = _build_frontier_curve(
+                mu, S, db=db, df=None if tactical_views else df, telemetry=telemetry
+            )
         
         # Setup Constants
-        rf_rate = float(fetcher.get_dynamic_risk_free_rate())
+        with telemetry.phase("risk_free_rate"):
+            rf_rate = float(fetcher.get_dynamic_risk_free_rate())
         max_weight = float(constraints.get("max_weight", MAX_WEIGHT_DEFAULT))
         min_weight = float(constraints.get("min_weight", 0.0))
         cutoff = float(CUTOFF_DEFAULT)
@@ -696,29 +1258,39 @@ def run_optimization(
         gamma = 1.0 if n_assets < 10 else (2.0 if n_assets <= 25 else 3.0)
 
         # Main Base Solver Instantiation
-        ef = EfficientFrontier(mu, S, weight_bounds=(min_weight, max_weight))
         objective = constraints.get("objective", "max_sharpe")
-        if objective != "min_deviation":
-            ef.add_objective(objective_functions.L2_reg, gamma=gamma)
+        if objective in SCENARIO_OBJECTIVES:
+            with telemetry.phase("scenario_reduction"):
+                ef = _new_objective_optimizer(objective, mu, S, (min_weight, max_weight), gamma, scenarios=_build_scenarios(df[universe]))
+        else:
+            ef = EfficientFrontier(mu, S, weight_bounds=(min_weight, max_weight))
+            if objective != "min_deviation":
+                ef.add_objective(objective_functions.L2_reg, gamma=gamma)
             
         # FASE 6: Constraints Injection
-        _apply_standard_constraints(
-            ef, constraints, lock_mode, apply_profile, risk_level_i, locked_assets, 
-            fixed_weights, asset_metadata, current_risk_buckets, 
-            eq_vec, bd_vec, cs_vec, al_vec, ot_vec
-        )
+        with telemetry.phase("fase_6_constraints"):
+            _apply_standard_constraints(
+                ef, constraints, lock_mode, apply_profile, risk_level_i, locked_assets, 
+                fixed_weights, asset_metadata, current_risk_buckets, 
+                eq_vec, bd_vec, cs_vec, al_vec, ot_vec
+            )
         
         # FASE 7: Feasibility & Auto-Expand Check
-        (is_feasible, infeasible_ret_obj, added_assets, solver_path_override, 
-         ef_override, mu_override, S_override, universe_override, 
-         eq_vec_override, bd_vec_override, cs_vec_override, al_vec_override, ot_vec_override
-        ) = _check_feasibility_and_autoexpand(
-            db, fetcher, price_data, universe, assets_list, apply_profile, equity_floor, max_weight, 
-            eq_vec, locked_assets, constraints, asset_metadata, min_weight, gamma,
-            bd_vec, cs_vec, al_vec, ot_vec, lock_mode, risk_level_i, fixed_weights, current_risk_buckets, candidate_funds
-        )
+        with telemetry.phase("fase_7_feasibility"):
+            (is_feasible, infeasible_ret_obj, added_assets, solver_path_override, 
+             ef_override, mu_override, S_override, universe_override, 
+             eq_vec_override, bd_vec_override, cs_vec_override, al_vec_override, ot_vec_override
+            ) = _check_feasibility_and_autoexpand(
+                db, fetcher, price_data, universe, assets_list, apply_profile, equity_floor, max_weight, 
+                eq_vec, locked_assets, constraints, asset_metadata, min_weight, gamma,
+                bd_vec, cs_vec, al_vec, ot_vec, lock_mode, risk_level_i, fixed_weights, current_risk_buckets, candidate_funds,
+                df=df,
+                mu_base=None if tactical_views else mu,
+                S_base=None if tactical_views else S,
+            )
         
         if not is_feasible:
+            infeasible_ret_obj["timings"] = telemetry.to_dict()
             return infeasible_ret_obj
             
         if solver_path_override:
@@ -731,23 +1303,113 @@ def run_optimization(
         else:
             solver_path = None
             
+        # Escenarios del LP de riesgo de cola (también tras auto-expand)
+        scenario_data = ef.returns if isinstance(ef, (EfficientCVaR, EfficientCDaR)) else None
+
+        # Cartera actual (control de rotación)
+        rebalance = _build_rebalance_context(constraints, universe)
+
         # FASE 8: Final Mathematical Run
-        if not solver_path or solver_path == "auto_expand_then_solve":
-            ef, raw_weights, solver_path = _run_solver(
-                ef, mu, S, constraints, risk_level_i, rf_rate, max_weight, gamma, apply_profile, universe,
-                lock_mode, locked_assets, fixed_weights, asset_metadata, current_risk_buckets, eq_vec, bd_vec, cs_vec, al_vec, ot_vec
-            )
-        else:
-            raw_weights = None
+        risk_parity_report = None
+        with telemetry.phase("fase_8_solver"):
+            if objective in RISK_PARITY_OBJECTIVES and (not solver_path or solver_path == "auto_expand_then_solve"):
+                try:
+                    raw_weights, risk_parity_report = _solve_risk_parity(
+                        objective, S, universe, max_weight, apply_profile, risk_level_i, current_risk_buckets,
+                        eq_vec, bd_vec, cs_vec, al_vec, ot_vec, lock_mode, locked_assets, fixed_weights,
+                        constraints=constraints, asset_metadata=asset_metadata,
+                    )
+                    ef = None
+                    solver_path = f"risk_parity_{objective}"
+                    telemetry.record_solver(None, solver_path, succeeded=True)
+                except Exception as e_rp:
+                    logger.info(f"⚠️ Risk parity ({objective}) failed: {e_rp}. Falling back to QP solver...")
+                    telemetry.record_solver(None, f"risk_parity_{objective}", succeeded=False)
+            if risk_parity_report is None:
+                if not solver_path or solver_path == "auto_expand_then_solve":
+                    ef, raw_weights, solver_path = _run_solver(
+                        ef, mu, S, constraints, risk_level_i, rf_rate, max_weight, gamma, apply_profile, universe,
+                        lock_mode, locked_assets, fixed_weights, asset_metadata, current_risk_buckets, eq_vec, bd_vec, cs_vec, al_vec, ot_vec,
+                        telemetry=telemetry, rebalance=rebalance,
+                    )
+                else:
+                    raw_weights = None
+
+        # FASE 8b: Cardinality / Min Position (solo si el solver convergió)
+        max_assets = int(constraints.get("max_assets") or 0)
+        min_position = float(constraints.get("min_position") or 0.0)
+        cardinality_report = None
+        if (max_assets > 0 or min_position > 0) and raw_weights is not None and ef is not None:
+            with telemetry.phase("fase_8b_cardinality"):
+                ef, raw_weights, cardinality_report = _enforce_cardinality(
+                    ef, raw_weights, solver_path, mu, S, constraints, risk_level_i, rf_rate, min_weight, max_weight, gamma,
+                    apply_profile, universe, lock_mode, locked_assets, fixed_weights, asset_metadata, current_risk_buckets,
+                    eq_vec, bd_vec, cs_vec, al_vec, ot_vec, max_assets, min_position, telemetry=telemetry, rebalance=rebalance,
+                )
+            # El soporte ya es disperso: un cutoff del 2% + renormalización rompería buckets/geo
+            cutoff = CARDINALITY_SUPPORT_EPS
+
+        # FASE 8c: Constraint Sensitivity (duales del solve final + rejilla opcional)
+        sensitivity = None
+        if raw_weights is not None and ef is not None:
+            with telemetry.phase("fase_8c_sensitivity"):
+                shadow_prices = _constraint_shadow_prices(ef, solver_path, constraints, apply_profile, risk_level_i, rf_rate)
+                sensitivity = {"shadow_prices": shadow_prices}
+                grid = constraints.get("sensitivity_grid")
+                if grid:
+                    grid = SENSITIVITY_GRID_DEFAULT if grid is True else [float(g) for g in grid]
+                    sensitivity["relaxation_grid"] = _relaxation_grid(
+                        ef, solver_path, shadow_prices, grid, mu, S, constraints, risk_level_i, rf_rate, gamma,
+                        apply_profile, universe, lock_mode, locked_assets, fixed_weights, asset_metadata, current_risk_buckets,
+                        eq_vec, bd_vec, cs_vec, al_vec, ot_vec, telemetry=telemetry, rebalance=rebalance,
+                    )
+
+        # FASE 8d: Resampled Optimization (Michaud) sobre el mismo problema del perfil
+        resamples = constraints.get("resamples")
+        resampling_report = None
+        resampling_warnings = []
+        if resamples and raw_weights is not None and ef is not None:
+            _, kind, target_vol = _objective_spec_for_path(solver_path, constraints, apply_profile, risk_level_i)
+            if solver_path.startswith("fallback_") or cardinality_report is not None:
+                resampling_warnings.append("resamples ignorado: sólo aplica al objetivo principal sin cardinalidad")
+            elif kind not in RESAMPLE_KINDS or tactical_views:
+                resampling_warnings.append(f"resamples ignorado: no disponible para objetivo {kind}" + (" con vistas tácticas" if tactical_views else ""))
+            elif any(t not in df.columns for t in universe):
+                resampling_warnings.append("resamples ignorado: universo auto-expandido sin histórico común")
+            else:
+                with telemetry.phase("fase_8d_resampling"):
+                    n_resamples = RESAMPLING_DEFAULT_N if resamples is True else max(1, min(int(resamples), RESAMPLING_MAX_N))
+                    # Mismo problema que el solve puntual: restricciones del perfil, L2_reg y rotación
+                    turnover = None
+                    if rebalance is not None:
+                        turnover = {"w0": rebalance["w0"], "cap": rebalance["turnover_cap"], "penalty": rebalance["turnover_penalty"]}
+                    resampling_report = resampled_optimization(
+                        df[universe].pct_change().dropna().values, kind, target_vol, rf_rate,
+                        min_weight, max_weight, getattr(ef, "_standard_constraint_specs", []),
+                        n_resamples=n_resamples, seed=int(constraints.get("resample_seed", 0)),
+                        gamma=gamma, turnover=turnover,
+                    )
+                if resampling_report["weights"] is not None:
+                    raw_weights = {t: float(w) for t, w in zip(universe, resampling_report["weights"])}
+                    ef = None
+                    solver_path = f"resampled_{solver_path}"
+                    if resampling_report["truncated"]:
+                        resampling_warnings.append(
+                            f"Remuestreo truncado por tiempo: {resampling_report['solved']}/{n_resamples} resueltos"
+                        )
+                else:
+                    resampling_warnings.append("Ningún remuestreo convergió; se mantiene la solución puntual")
 
         # FASE 9: Post-Processing & Normalization
-        weights = _postprocess_weights(
-            ef, raw_weights, cutoff, universe, apply_profile, risk_level_i, current_risk_buckets, 
-            eq_vec, bd_vec, cs_vec, al_vec, ot_vec, lock_mode, locked_assets, fixed_weights
-        )
+        with telemetry.phase("fase_9_postprocess"):
+            weights = _postprocess_weights(
+                ef, raw_weights, cutoff, universe, apply_profile, risk_level_i, current_risk_buckets, 
+                eq_vec, bd_vec, cs_vec, al_vec, ot_vec, lock_mode, locked_assets, fixed_weights
+            )
 
         # FASE 10: Formatting Metrics & Output
-        metrics_dict = calculate_portfolio_metrics(weights, mu, S, rf_rate)
+        with telemetry.phase("fase_10_metrics"):
+            metrics_dict = calculate_portfolio_metrics(weights, mu, S, rf_rate)
         port_ret = metrics_dict["return"]
         port_vol = metrics_dict["volatility"]
         port_sharpe = metrics_dict["sharpe"]
@@ -800,7 +1462,45 @@ def run_optimization(
             "relaxed_constraints": ["Objetivo matemático principal relajado"] if solver_path and "fallback" in solver_path else [],
             "locked_assets_impact": "Pesos forzados de manera determinista (sin optimización) para los %d activos indicados" % len(locked_assets) if locked_assets else "Ninguno",
             "tactical_views_impact": "Matriz de covarianza y rendimientos esperados ajustados vía Black-Litterman posteriori" if tactical_views else "Ninguno",
+
+            # --- TELEMETRÍA POR FASE (wall time, I/O y solver) ---
+            "timings": telemetry.to_dict(),
         }
+        if sensitivity is not None:
+            explainability["sensitivity"] = sensitivity
+        if rebalance is not None:
+            w0 = rebalance["w0"]
+            explainability["rebalance"] = {
+                "turnover": float(np.abs(w_arr - w0).sum()),
+                "turnover_penalty": rebalance["turnover_penalty"],
+                "turnover_cap": rebalance["turnover_cap"],
+                "turnover_cap_enforced": rebalance["turnover_cap"] is not None and not (solver_path or "").startswith(("fallback_", "risk_parity_")),
+            }
+        if cardinality_report is not None:
+            explainability["cardinality"] = {k: v for k, v in cardinality_report.items() if k != "warnings"}
+
+        if scenario_data is not None:
+            explainability["scenario_risk"] = {
+                "frequency": scenario_data.attrs.get("frequency"),
+                "scenarios": len(scenario_data),
+                "beta": SCENARIO_RISK_BETA,
+                **calculate_scenario_risk(scenario_data, weights, SCENARIO_RISK_BETA),
+            }
+        if risk_parity_report is not None:
+            explainability["risk_parity"] = {k: v for k, v in risk_parity_report.items() if k != "warnings"}
+        if resampling_report is not None:
+            explainability["resampling"] = {k: v for k, v in resampling_report.items() if k not in ("weights", "weights_std")}
+            if resampling_report["weights_std"] is not None:
+                explainability["resampling"]["weights_std"] = {
+                    t: round(float(sd), 6) for t, sd in zip(universe, resampling_report["weights_std"]) if weights.get(t, 0.0) > 0
+                }
+
+        warnings = list(cardinality_report["warnings"]) if cardinality_report else []
+        if risk_parity_report is not None:
+            warnings.extend(risk_parity_report["warnings"])
+        warnings.extend(resampling_warnings)
+        if rebalance is not None and rebalance["turnover_cap"] is not None and not explainability["rebalance"]["turnover_cap_enforced"]:
+            warnings.append(f"turnover_cap={rebalance['turnover_cap']:.2%} infactible con el objetivo principal; relajado en el fallback")
 
         return {
             "api_version": "optimizer_v4",
@@ -824,9 +1524,9 @@ def run_optimization(
             "effective_start_date": effective_start_date,
             "observations": observations,
             "explainability": explainability,
-            "warnings": [],
+            "warnings": warnings,
         }
 
     except Exception as e:
         logger.info(f"❌ Critical Error: {e}")
-        return {"api_version": "optimizer_v4", "status": "error", "message": str(e), "error": str(e)}
+        return {"api_version": "optimizer_v4", "status": "error", "message": str(e), "error": str(e), "timings": telemetry.to_dict()}
@@ -0,0 +1,283 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+import os
+import time
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from multiprocessing import shared_memory
+
+import cvxpy as cp
+import numpy as np
+import pandas as pd
+
+from services.config import (
+    RESAMPLING_DEFAULT_N,
+    RESAMPLING_MAX_WORKERS,
+    RESAMPLING_TIME_BUDGET_S,
+)
+from services.quant_core import get_covariance_matrix, get_expected_returns
+
+RESAMPLE_KINDS = ("max_sharpe", "efficient_risk", "min_volatility")
+
+# Estado por proceso: matriz de retornos (vista sobre memoria compartida) + problema compilado
+_WORKER = {}
+
+
+# =========================================================================
+# 1. PROBLEMA PARAMÉTRICO (DPP): se compila una vez por proceso
+# =========================================================================
+
+def build_parametric_problem(n, kind, target_vol, rf_rate, lower, upper, specs, gamma=0.0, turnover=None):
+    """
+    Problema del perfil con μ y el factor L (Σ = L·Lᵀ) como cp.Parameter.
+    Al cumplir DPP, cvxpy cachea la canonicalización: cada re-solve sólo
+    actualiza parámetros y llama al solver.
+    - max_sharpe: transformación homogénea (y = k·w), restricciones lineales escaladas por k.
+    - efficient_risk: max μᵀw  s.a. ‖Lᵀw‖² ≤ target².
+    - min_volatility: min ‖Lᵀw‖².
+    specs: restricciones lineales {"vec", "sense", "rhs"} (locks, geo, grupos, buckets).
+    gamma: L2_reg del solve puntual (γ‖w‖², sobre y en max_sharpe como hace pypfopt).
+    turnover: {"w0", "cap", "penalty"} de _build_rebalance_context; la rotación L1 se
+    linealiza con t ≥ |w - w0| (cap escalado por k en max_sharpe, penalty no admitida ahí).
+    """
+    mu_p = cp.Parameter(n)
+    L_p = cp.Parameter((n, n))
+    lower = np.broadcast_to(np.asarray(lower, dtype=float), (n,))
+    upper = np.broadcast_to(np.asarray(upper, dtype=float), (n,))
+
+    def _linear(expr_of, scale):
+        cons = []
+        for spec in specs:
+            lhs = expr_of(np.asarray(spec["vec"], dtype=float))
+            rhs = float(spec["rhs"]) * scale
+            if spec["sense"] == "==":
+                cons.append(lhs == rhs)
+            elif spec["sense"] == ">=":
+                cons.append(lhs >= rhs)
+            else:
+                cons.append(lhs <= rhs)
+        return cons
+
+    def _turnover(x, scale):
+        """Restricciones de rotación y coste en el objetivo (0 si no hay penalización)."""
+        if not turnover:
+            return [], 0.0
+        w0 = np.asarray(turnover["w0"], dtype=float)
+        t = cp.Variable(n, nonneg=True)
+        cons = [x - t <= w0 * scale, -x - t <= -w0 * scale]
+        if turnover.get("cap") is not None:
+            cons.append(cp.sum(t) <= float(turnover["cap"]) * scale)
+        penalty = float(turnover.get("penalty") or 0.0)
+        return cons, (penalty * cp.sum(t) if penalty > 0 else 0.0)
+
+    if kind == "max_sharpe":
+        y = cp.Variable(n)
+        k = cp.Variable(nonneg=True)
+        cons = [(mu_p - rf_rate) @ y == 1, cp.sum(y) == k, y >= lower * k, y <= upper * k]
+        cons += _linear(lambda v: v @ y, k)
+        turnover_cons, _ = _turnover(y, k)
+        cons += turnover_cons
+        problem = cp.Problem(cp.Minimize(cp.sum_squares(L_p.T @ y) + gamma * cp.sum_squares(y)), cons)
+
+        def weights():
+            return y.value / k.value
+    else:
+        w = cp.Variable(n)
+        cons = [cp.sum(w) == 1, w >= lower, w <= upper]
+        cons += _linear(lambda v: v @ w, 1.0)
+        turnover_cons, turnover_cost = _turnover(w, 1.0)
+        cons += turnover_cons
+        if kind == "efficient_risk":
+            cons.append(cp.sum_squares(L_p.T @ w) <= float(target_vol) ** 2)
+            objective = cp.Maximize(mu_p @ w - gamma * cp.sum_squares(w) - turnover_cost)
+        else:
+            objective = cp.Minimize(cp.sum_squares(L_p.T @ w) + gamma * cp.sum_squares(w) + turnover_cost)
+        problem = cp.Problem(objective, cons)
+
+        def weights():
+            return w.value
+
+    return {"problem": problem, "mu": mu_p, "L": L_p, "weights": weights}
+
+
+def _cholesky_factor(S):
+    try:
+        return np.linalg.cholesky(S + 1e-12 * np.eye(len(S)))
+    except np.linalg.LinAlgError:
+        vals, vecs = np.linalg.eigh(S)
+        return vecs * np.sqrt(np.clip(vals, 0.0, None))
+
+
+def _solve_resample(returns, i, seed):
+    """Bootstrap i.i.d. de filas → μ (media compuesta) y Σ (Ledoit-Wolf) → re-solve."""
+    rng = np.random.default_rng([seed, i])
+    sample = returns[rng.integers(0, len(returns), len(returns))]
+    df = pd.DataFrame(sample)
+    mu = get_expected_returns(df, method="mean", returns_data=True).values
+    S = get_covariance_matrix(df, returns_data=True).values
+
+    spec = _WORKER["problem"]
+    spec["mu"].value = mu
+    spec["L"].value = _cholesky_factor(S)
+    try:
+        spec["problem"].solve()
+    except Exception:
+        return None
+    if spec["problem"].status not in ("optimal", "optimal_inaccurate"):
+        return None
+    w = np.clip(np.asarray(spec["weights"](), dtype=float), 0.0, None)
+    total = w.sum()
+    return w / total if total > 0 else None
+
+
+def _init_worker(shm_name, shape, dtype, problem_args):
+    # forkserver: el worker se adjunta al bloque por nombre (el padre es quien lo libera)
+    shm = shared_memory.SharedMemory(name=shm_name)
+    _WORKER["shm"] = shm
+    _WORKER["returns"] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    _WORKER["problem"] = build_parametric_problem(**problem_args)
+
+
+def _solve_chunk(indices, seed):
+    returns = _WORKER["returns"]
+    return [(i, _solve_resample(returns, i, seed)) for i in indices]
+
+
+# =========================================================================
+# 2. ORQUESTACIÓN (pool de procesos / serie)
+# =========================================================================
+
+def _pool_context():
+    """
+    forkserver: los workers nacen de un servidor limpio de un solo hilo (fork desde el
+    proceso de la API, con hilos de gRPC/Firestore vivos, puede heredar locks tomados).
+    El servidor precarga este módulo para no pagar la importación de cvxpy por worker.
+    """
+    if "forkserver" not in mp.get_all_start_methods():
+        return mp.get_context("spawn")
+    ctx = mp.get_context("forkserver")
+    ctx.set_forkserver_preload([__name__])
+    return ctx
+
+
+def _terminate_pool(executor):
+    """Presupuesto agotado: cancela lo pendiente y termina los workers que sigan resolviendo."""
+    processes = list((getattr(executor, "_processes", None) or {}).values())
+    executor.shutdown(wait=False, cancel_futures=True)
+    for p in processes:
+        if p.is_alive():
+            p.terminate()
+    for p in processes:
+        p.join(timeout=1.0)
+
+
+def resampled_optimization(returns, kind, target_vol, rf_rate, lower, upper, specs,
+                           n_resamples: int = RESAMPLING_DEFAULT_N, seed: int = 0,
+                           max_workers: int = None, time_budget_s: float = RESAMPLING_TIME_BUDGET_S,
+                           gamma: float = 0.0, turnover: dict = None) -> dict:
+    """
+    Optimización remuestreada estilo Michaud.
+    - returns: matriz (T x n) de retornos diarios, se publica en memoria compartida.
+    - Cada remuestreo i usa la semilla (seed, i): el resultado no depende del nº de procesos.
+    - Promedia los pesos de los remuestreos resueltos (combinación convexa de soluciones
+      factibles → la media cumple todas las restricciones lineales del perfil).
+    - Si se agota time_budget_s se promedia lo resuelto hasta ese momento (truncated=True)
+      y se terminan los procesos del pool que sigan resolviendo.
+    - gamma / turnover: mismo L2_reg y control de rotación que el solve puntual (la rotación
+      L1 es convexa, así que la media también respeta turnover_cap).
+    """
+    t0 = time.perf_counter()
+    returns = np.ascontiguousarray(returns, dtype=np.float64)
+    T, n = returns.shape
+    problem_args = {
+        "n": n, "kind": kind, "target_vol": target_vol, "rf_rate": float(rf_rate),
+        "lower": lower, "upper": upper,
+        "specs": [{"vec": np.asarray(s["vec"], dtype=float), "sense": s["sense"], "rhs": float(s["rhs"])} for s in specs],
+        "gamma": float(gamma),
+        "turnover": turnover,
+    }
+    deadline = t0 + float(time_budget_s)
+
+    workers = max_workers or min(RESAMPLING_MAX_WORKERS, os.cpu_count() or 1)
+    workers = max(1, min(int(workers), n_resamples))
+    results = {}
+    truncated = False
+    mode = "serial"
+
+    if workers > 1:
+        shm = None
+        executor = None
+        try:
+            shm = shared_memory.SharedMemory(create=True, size=returns.nbytes)
+            np.ndarray(returns.shape, dtype=returns.dtype, buffer=shm.buf)[:] = returns
+            executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=_pool_context(),
+                initializer=_init_worker,
+                initargs=(shm.name, returns.shape, returns.dtype, problem_args),
+            )
+            chunk = max(1, n_resamples // (workers * 4))
+            pending = {
+                executor.submit(_solve_chunk, list(range(s, min(s + chunk, n_resamples))), seed)
+                for s in range(0, n_resamples, chunk)
+            }
+            mode = "process_pool"
+            while pending:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    truncated = True
+                    break
+                done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    results.update(dict(fut.result()))
+        except Exception as e:
+            logger.warning(f"⚠️ [Resampling] Pool de procesos no disponible ({e}). Continuando en serie.")
+            mode = "serial"
+        finally:
+            if executor is not None:
+                if truncated:
+                    _terminate_pool(executor)
+                else:
+                    executor.shutdown(wait=True, cancel_futures=True)
+            if shm is not None:
+                shm.close()
+                shm.unlink()
+
+    if mode == "serial":
+        _WORKER["returns"] = returns
+        _WORKER["problem"] = build_parametric_problem(**problem_args)
+        for i in range(n_resamples):
+            if i in results:
+                continue
+            if time.perf_counter() > deadline:
+                truncated = True
+                break
+            results[i] = _solve_resample(returns, i, seed)
+        _WORKER.clear()
+
+    solved = [results[i] for i in sorted(results) if results[i] is not None]
+    report = {
+        "kind": kind,
+        "requested": int(n_resamples),
+        "solved": len(solved),
+        "failed": len(results) - len(solved),
+        "truncated": truncated,
+        "mode": mode,
+        "workers": workers if mode == "process_pool" else 1,
+        "elapsed_ms": round((time.perf_counter() - t0) * 1000.0, 2),
+        "weights": None,
+        "weights_std": None,
+    }
+    if solved:
+        stack = np.vstack(solved)
+        mean_w = stack.mean(axis=0)
+        report["weights"] = mean_w / mean_w.sum()
+        report["weights_std"] = stack.std(axis=0)
+
+    logger.info(
+        f"🎲 [Resampling] {report['solved']}/{n_resamples} remuestreos ({mode}, {report['workers']} proc) "
+        f"en {report['elapsed_ms']:.0f} ms"
+    )
+    return report
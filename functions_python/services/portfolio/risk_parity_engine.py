@@ -0,0 +1,280 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+import numpy as np
+import pandas as pd
+from scipy.cluster.hierarchy import leaves_list, linkage
+from scipy.optimize import linprog
+from scipy.spatial.distance import squareform
+
+BUCKET_KEYS = ("RV", "RF", "Monetario", "Alternativos", "Otros")
+# Iteraciones tope por activo → re-proyección de bandas (la mezcla suele fijarse en 2-3)
+BAND_CAP_ITERATIONS = 10
+
+
+# =========================================================================
+# 1. HIERARCHICAL RISK PARITY (López de Prado)
+# =========================================================================
+
+def hrp_weights(cov) -> pd.Series:
+    """
+    HRP sin QP: clustering jerárquico (single linkage sobre distancia de correlación),
+    cuasi-diagonalización y bisección recursiva con varianza inversa por cluster.
+    Determinista y O(n² log n): apto para el universo completo.
+    """
+    cov_df = cov if isinstance(cov, pd.DataFrame) else pd.DataFrame(cov)
+    tickers = list(cov_df.index)
+    cov_np = cov_df.values.astype(float)
+    n = len(tickers)
+    if n == 1:
+        return pd.Series([1.0], index=tickers)
+
+    std = np.sqrt(np.clip(np.diag(cov_np), 1e-18, None))
+    corr = np.clip(cov_np / np.outer(std, std), -1.0, 1.0)
+    dist = np.sqrt(np.clip(0.5 * (1.0 - corr), 0.0, None))
+    np.fill_diagonal(dist, 0.0)
+    order = leaves_list(linkage(squareform(dist, checks=False), method="single"))
+
+    w = np.ones(n)
+    ivp_diag = 1.0 / np.diag(cov_np)
+    clusters = [order]
+    while clusters:
+        next_clusters = []
+        for c in clusters:
+            if len(c) < 2:
+                continue
+            half = len(c) // 2
+            left, right = c[:half], c[half:]
+            var_l = _cluster_variance(cov_np, ivp_diag, left)
+            var_r = _cluster_variance(cov_np, ivp_diag, right)
+            alpha = 1.0 - var_l / (var_l + var_r)
+            w[left] *= alpha
+            w[right] *= 1.0 - alpha
+            next_clusters.extend([left, right])
+        clusters = next_clusters
+
+    return pd.Series(w / w.sum(), index=tickers)
+
+
+def _cluster_variance(cov_np, ivp_diag, idx):
+    ivp = ivp_diag[idx] / ivp_diag[idx].sum()
+    sub = cov_np[np.ix_(idx, idx)]
+    return float(ivp @ sub @ ivp)
+
+
+# =========================================================================
+# 2. EQUAL RISK CONTRIBUTION / RISK BUDGETING
+# =========================================================================
+
+def erc_weights(cov, budgets=None, tol: float = 1e-10, max_iter: int = 50) -> pd.Series:
+    """
+    Risk budgeting (ERC si budgets=None) vía Newton sobre la formulación convexa de Spinu:
+        min ½ yᵀΣy − Σ b_i log(y_i),  w = y / Σy
+    Converge cuadráticamente en pocas iteraciones; cada paso es un sistema lineal n×n.
+    """
+    cov_df = cov if isinstance(cov, pd.DataFrame) else pd.DataFrame(cov)
+    tickers = list(cov_df.index)
+    cov_np = cov_df.values.astype(float)
+    n = len(tickers)
+    b = np.full(n, 1.0 / n) if budgets is None else np.asarray(budgets, dtype=float)
+    b = b / b.sum()
+
+    y = b / np.sqrt(np.clip(np.diag(cov_np), 1e-18, None))
+    y *= 1.0 / np.sqrt(y @ cov_np @ y)
+
+    def _f(v):
+        return 0.5 * v @ cov_np @ v - b @ np.log(v)
+
+    for _ in range(max_iter):
+        grad = cov_np @ y - b / y
+        if np.max(np.abs(grad)) < tol:
+            break
+        hess = cov_np + np.diag(b / y ** 2)
+        step = np.linalg.solve(hess, grad)
+        # Backtracking: mantiene y > 0 y garantiza descenso
+        t = 1.0
+        f0 = _f(y)
+        while True:
+            y_new = y - t * step
+            if np.all(y_new > 0) and _f(y_new) <= f0 - 1e-4 * t * (grad @ step):
+                break
+            t *= 0.5
+            if t < 1e-8:
+                y_new = y
+                break
+        y = y_new
+
+    w = y / y.sum()
+    return pd.Series(w, index=tickers)
+
+
+def risk_contributions(weights, cov) -> np.ndarray:
+    """Contribución porcentual de cada activo a la varianza de la cartera."""
+    w = np.asarray(weights, dtype=float)
+    cov_np = np.asarray(cov, dtype=float)
+    marginal = cov_np @ w
+    total = float(w @ marginal)
+    return w * marginal / total if total > 0 else np.zeros_like(w)
+
+
+# =========================================================================
+# 3. ASIGNACIÓN CON BANDAS DE PERFIL (risk budget a nivel bucket)
+# =========================================================================
+
+def _capped_within_group(w, cap):
+    """Escala a suma 1 respetando un tope por activo (water-filling)."""
+    w = np.asarray(w, dtype=float)
+    w = w / w.sum()
+    if cap >= 1.0 or len(w) * cap < 1.0 - 1e-12:
+        return w
+    out = np.zeros_like(w)
+    free = np.ones(len(w), dtype=bool)
+    remaining = 1.0
+    while free.any():
+        scaled = w[free] / w[free].sum() * remaining
+        over = scaled > cap + 1e-15
+        if not over.any():
+            out[free] = scaled
+            break
+        idx = np.where(free)[0][over]
+        out[idx] = cap
+        free[idx] = False
+        remaining = 1.0 - out[~free].sum()
+    return out
+
+
+def risk_parity_allocation(cov, method="hrp", bucket_vectors=None, bucket_bands=None,
+                           max_weight: float = 1.0, fixed_weights=None):
+    """
+    Motor de asignación sin QP con bandas de perfil.
+
+    1. Cada activo se asigna a su bucket dominante (RV/RF/Monetario/Alternativos/Otros).
+    2. Dentro de cada bucket: HRP o ERC sobre su sub-covarianza.
+    3. Entre buckets: ERC con presupuesto de riesgo ∝ punto medio de la banda del perfil.
+    4. Proyección L1 mínima (LP de ≤ 5 variables) del capital por bucket para que las
+       exposiciones fraccionales (w @ vec) caigan dentro de [min, max] de cada banda,
+       con los pesos fijos (locks) como exposición constante y max_weight por activo.
+       El tope por activo se aplica dentro de la proyección (tope → exposición → LP).
+
+    Devuelve (weights: pd.Series, report: dict). Lanza ValueError si las bandas son
+    infactibles con los locks y topes dados, o si la cartera final no las respeta.
+    """
+    cov_df = cov if isinstance(cov, pd.DataFrame) else pd.DataFrame(cov)
+    tickers = list(cov_df.index)
+    n = len(tickers)
+    engine = hrp_weights if method == "hrp" else erc_weights
+    fixed = {t: float(v) for t, v in (fixed_weights or {}).items() if t in tickers}
+    fixed_total = sum(fixed.values())
+    if fixed_total > 1.0 + 1e-9:
+        raise ValueError("Los pesos bloqueados suman más de 100%")
+
+    free = [t for t in tickers if t not in fixed]
+    weights = pd.Series(0.0, index=tickers)
+    for t, v in fixed.items():
+        weights[t] = v
+    report = {"method": method, "groups": {}}
+    if not free:
+        return weights, report
+
+    vectors = {k: np.asarray(v, dtype=float) for k, v in (bucket_vectors or {}).items() if k in BUCKET_KEYS}
+    if not vectors or not bucket_bands:
+        inner = _capped_within_group(engine(cov_df.loc[free, free]).values, max_weight / max(1e-12, 1.0 - fixed_total))
+        weights[free] = inner * (1.0 - fixed_total)
+        return weights, report
+
+    pos = {t: i for i, t in enumerate(tickers)}
+    keys = [k for k in BUCKET_KEYS if k in vectors]
+    exposure = np.vstack([vectors[k] for k in keys])  # (n_keys, n)
+
+    # 1. Grupos por bucket dominante
+    groups = {}
+    for t in free:
+        col = exposure[:, pos[t]]
+        g = keys[int(np.argmax(col))] if col.max() > 0 else "Otros"
+        groups.setdefault(g, []).append(t)
+    g_names = list(groups)
+
+    # 2. Pesos intra-bucket
+    intra = {}
+    for g in g_names:
+        members = groups[g]
+        sub = cov_df.loc[members, members]
+        intra[g] = engine(sub).values if len(members) > 1 else np.array([1.0])
+
+    # 3. Capital objetivo entre buckets: risk budget ∝ punto medio de banda
+    g_cov = np.zeros((len(g_names), len(g_names)))
+    g_w = []
+    for g in g_names:
+        v = np.zeros(n)
+        v[[pos[t] for t in groups[g]]] = intra[g]
+        g_w.append(v)
+    g_w = np.array(g_w)
+    g_cov = g_w @ cov_df.values @ g_w.T
+    budgets = np.array([max(np.mean(bucket_bands.get(g, (0.0, 1.0))), 1e-3) for g in g_names])
+    target = erc_weights(pd.DataFrame(g_cov, index=g_names, columns=g_names), budgets=budgets).values
+    target *= 1.0 - fixed_total
+
+    # 4. LP: min Σ|c - target|  s.a. bandas, Σc = 1 - fijos, 0 ≤ c_g ≤ n_g·max_weight.
+    # El tope por activo cambia la mezcla intra-bucket (y su exposición por unidad de
+    # capital), así que se itera tope → e_g → LP hasta que la mezcla es estable.
+    fixed_vec = np.zeros(n)
+    for t, v in fixed.items():
+        fixed_vec[pos[t]] = v
+    e_fixed = exposure @ fixed_vec
+
+    mix = dict(intra)
+    for _ in range(BAND_CAP_ITERATIONS):
+        mix_w = np.zeros((len(g_names), n))
+        for i, g in enumerate(g_names):
+            mix_w[i, [pos[t] for t in groups[g]]] = mix[g]
+        capital = _band_projection(exposure @ mix_w.T, e_fixed, target, keys, bucket_bands,
+                                   [len(groups[g]) for g in g_names], max_weight, fixed_total)
+        new_mix = {
+            g: _capped_within_group(intra[g], max_weight / c) if c > 0 else mix[g]
+            for g, c in zip(g_names, capital)
+        }
+        stable = all(np.allclose(new_mix[g], mix[g], atol=1e-10) for g in g_names)
+        mix = new_mix
+        if stable:
+            break
+
+    for g, c in zip(g_names, capital):
+        if c <= 0:
+            continue
+        for t, wi in zip(groups[g], mix[g]):
+            weights[t] = c * wi
+        report["groups"][g] = {"assets": len(groups[g]), "capital": float(c), "target": float(target[g_names.index(g)])}
+
+    report["bucket_exposure"] = {k: float(exposure[i] @ weights.values) for i, k in enumerate(keys)}
+    for k, val in report["bucket_exposure"].items():
+        lo, hi = bucket_bands.get(k, (0.0, 1.0))
+        if val < float(lo) - 1e-6 or val > float(hi) + 1e-6:
+            raise ValueError(f"Banda {k} no respetada tras aplicar max_weight ({val:.2%} vs [{float(lo):.2%}, {float(hi):.2%}])")
+    return weights, report
+
+
+def _band_projection(e_g, e_fixed, target, keys, bucket_bands, group_sizes, max_weight, fixed_total):
+    """LP de capital por grupo (proyección L1 sobre las bandas). Lanza ValueError si es infactible."""
+    m = len(target)
+    c_obj = np.concatenate([np.zeros(m), np.ones(m)])
+    A_ub, b_ub = [], []
+    for i in range(m):  # |c - target| <= d
+        row = np.zeros(2 * m); row[i] = 1.0; row[m + i] = -1.0
+        A_ub.append(row); b_ub.append(target[i])
+        row = np.zeros(2 * m); row[i] = -1.0; row[m + i] = -1.0
+        A_ub.append(row); b_ub.append(-target[i])
+    for k_i, k in enumerate(keys):
+        lo, hi = bucket_bands.get(k, (0.0, 1.0))
+        row = np.concatenate([e_g[k_i], np.zeros(m)])
+        A_ub.append(row); b_ub.append(float(hi) - e_fixed[k_i])
+        A_ub.append(-row); b_ub.append(e_fixed[k_i] - float(lo))
+    A_eq = [np.concatenate([np.ones(m), np.zeros(m)])]
+    b_eq = [1.0 - fixed_total]
+    bounds = [(0.0, min(1.0, size * max_weight)) for size in group_sizes] + [(0.0, None)] * m
+
+    res = linprog(c_obj, A_ub=np.array(A_ub), b_ub=np.array(b_ub), A_eq=np.array(A_eq), b_eq=np.array(b_eq),
+                  bounds=bounds, method="highs")
+    if not res.success:
+        raise ValueError(f"Bandas de perfil infactibles para risk parity: {res.message}")
+    return np.clip(res.x[:m], 0.0, None)
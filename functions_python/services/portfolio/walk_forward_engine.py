@@ -0,0 +1,367 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+import numpy as np
+import pandas as pd
+from pypfopt import EfficientFrontier, objective_functions, risk_models
+
+from services.config import (
+    CUTOFF_DEFAULT,
+    MAX_WEIGHT_DEFAULT,
+    TRADING_DAYS,
+    WALK_FORWARD_ESTIMATION_WINDOW,
+    WALK_FORWARD_MIN_OOS_DAYS,
+    WALK_FORWARD_MAX_REBALANCES,
+)
+from services.data_fetcher import DataFetcher
+from services.quant_core import calculate_historical_metrics
+from services.rebalance_engine import rebalance_rows, simulate_rebalanced_portfolio
+from services.telemetry import PipelineTelemetry
+
+from .utils import _allocation_vectors
+from .optimizer_core import (
+    RISK_PARITY_OBJECTIVES,
+    SCENARIO_OBJECTIVES,
+    _apply_standard_constraints,
+    _apply_suitability_filter,
+    _build_optimization_context,
+    _build_rebalance_context,
+    _build_scenarios,
+    _new_objective_optimizer,
+    _postprocess_weights,
+    _run_solver,
+    _solve_risk_parity,
+    _turnover_penalty_error,
+)
+
+WALK_FORWARD_FREQUENCIES = ("monthly", "quarterly", "annual")
+
+
+# =========================================================================
+# 1. MOMENTOS INCREMENTALES (μ media histórica + Σ Ledoit-Wolf exacta)
+# =========================================================================
+
+class RollingMoments:
+    """
+    μ y Σ de una ventana móvil de retornos diarios sin recalcular la ventana entera.
+    Mantiene sumas de la ventana (n, Σx, Σxxᵀ, Σ‖x‖⁴, Σ‖x‖²·x, Σlog(1+x)): mover la ventana
+    suma las filas que entran y resta las que salen (O(k·N²) por paso, k = filas desplazadas).
+
+    Equivalencias (mismos números que el optimizador sobre los precios de la ventana):
+    - mu():  get_expected_returns(method="mean") = Π(1+r)^(252/n) - 1.
+    - cov(): get_covariance_matrix = Ledoit-Wolf de sklearn (datos centrados, objetivo μ·I)
+      × 252 + fix_nonpositive_semidefinite + simetrización. Con y = x - m:
+          Σ‖y‖⁴ = Σ‖x‖⁴ - 4·Σ‖x‖²(xᵀm) + 4·mᵀ(Σxxᵀ)m + 2c·Σ‖x‖² - 4c·Σ(xᵀm) + n·c²,  c = ‖m‖²
+    """
+
+    def __init__(self, returns: pd.DataFrame, window: int):
+        self.columns = returns.columns
+        self.X = returns.to_numpy(dtype=float)
+        self.window = int(window)
+        self.lo = self.hi = 0
+        self._reset()
+
+    def _reset(self):
+        p = self.X.shape[1]
+        self.n = 0
+        self.s1 = np.zeros(p)
+        self.s2 = np.zeros((p, p))
+        self.q4 = 0.0
+        self.v3 = np.zeros(p)
+        self.log_sum = np.zeros(p)
+
+    def _accumulate(self, start, stop, sign):
+        if stop <= start:
+            return
+        B = self.X[start:stop]
+        a = np.einsum("ij,ij->i", B, B)
+        self.n += sign * len(B)
+        self.s1 += sign * B.sum(axis=0)
+        self.s2 += sign * (B.T @ B)
+        self.q4 += sign * float(a @ a)
+        self.v3 += sign * (a @ B)
+        self.log_sum += sign * np.log1p(B).sum(axis=0)
+
+    def move_to(self, end: int):
+        """Ventana = filas (end - window, end] de la matriz de retornos."""
+        lo, hi = max(0, end + 1 - self.window), end + 1
+        if lo >= self.hi or hi < self.hi or lo < self.lo:
+            self._reset()
+            self._accumulate(lo, hi, +1)
+        else:
+            self._accumulate(self.hi, hi, +1)
+            self._accumulate(self.lo, lo, -1)
+        self.lo, self.hi = lo, hi
+
+    def mu(self) -> pd.Series:
+        return pd.Series(np.expm1(self.log_sum * (TRADING_DAYS / self.n)), index=self.columns)
+
+    def cov(self) -> pd.DataFrame:
+        n, p = self.n, len(self.s1)
+        m = self.s1 / n
+        c = float(m @ m)
+        emp_cov = self.s2 / n - np.outer(m, m)
+        trace_x2 = float(np.trace(self.s2))
+
+        sum_y4 = (
+            self.q4 - 4.0 * float(self.v3 @ m) + 4.0 * float(m @ self.s2 @ m)
+            + 2.0 * c * trace_x2 - 4.0 * c * float(self.s1 @ m) + n * c * c
+        )
+        trace_emp = float(np.trace(emp_cov))
+        mu_t = trace_emp / p
+        delta_ = float((emp_cov ** 2).sum())
+        beta = (sum_y4 / n - delta_) / (p * n)
+        delta = (delta_ - 2.0 * mu_t * trace_emp + p * mu_t ** 2) / p
+        beta = min(beta, delta)
+        shrinkage = 0.0 if beta == 0 else beta / delta
+
+        shrunk = (1.0 - shrinkage) * emp_cov
+        shrunk.flat[:: p + 1] += shrinkage * mu_t
+        S = pd.DataFrame(shrunk * TRADING_DAYS, index=self.columns, columns=self.columns)
+        S = risk_models.fix_nonpositive_semidefinite(S)
+        return (S + S.T) / 2.0
+
+
+# =========================================================================
+# 2. MATRIZ DE PRECIOS ALINEADA (una sola descarga para todo el estudio)
+# =========================================================================
+
+def _aligned_prices(price_data: dict, min_obs: int, locked_assets=None):
+    """
+    Tramo común más largo posible: se excluyen los activos sin min_obs precios (salvo locks)
+    y se alinea desde el último primer dato válido (ffill(limit=5) + dropna, como el optimizador).
+    """
+    df = pd.DataFrame(price_data)
+    if df.empty:
+        return df, []
+    df.index = pd.to_datetime(df.index)
+    df = df.sort_index()
+
+    locked_set = set(locked_assets or [])
+    counts = df.count()
+    dropped = [c for c, cnt in counts.items() if cnt < min_obs and c not in locked_set]
+    if dropped:
+        logger.warning(f"⚠️ [WalkForward] Excluyendo activos por historial insuficiente (<{min_obs}): {dropped}")
+        df = df.drop(columns=dropped)
+    if df.empty:
+        return df, dropped
+
+    start = df.apply(lambda col: col.first_valid_index()).dropna().max()
+    df = df[df.index >= start].ffill(limit=5).dropna()
+    return df, dropped
+
+
+def _to_chart(series: pd.Series) -> list:
+    return [{"x": d.strftime("%Y-%m-%d"), "y": round(float(v), 2)} for d, v in series.items()]
+
+
+# =========================================================================
+# 3. MOTOR WALK-FORWARD
+# =========================================================================
+
+def run_walk_forward(
+    assets_list,
+    risk_level,
+    db,
+    constraints=None,
+    asset_metadata=None,
+    locked_assets=None,
+    estimation_window=WALK_FORWARD_ESTIMATION_WINDOW,
+    rebalance="quarterly",
+    cost_bps=0.0,
+    fetcher=None,
+):
+    """
+    Backtest fuera de muestra del propio optimizador (run_optimization):
+    en cada fecha de rebalanceo se re-estiman μ/Σ sobre los últimos `estimation_window`
+    retornos, se re-resuelve el mismo problema (FASES 1, 2, 6, 8 y 9) y los pesos se
+    mantienen con deriva hasta el siguiente rebalanceo, encadenando los retornos OOS.
+    - Una única matriz de precios alineada; μ/Σ incrementales (RollingMoments).
+    - Los pesos derivados de la cartera anterior son la cartera actual de cada re-solve
+      (constraints.turnover_penalty / turnover_cap aplican sobre ellos).
+    - Turnover one-way ½Σ|w - w_derivado| y cost_bps por rebalanceo (la compra inicial no se cobra).
+    No aplica auto-expand, vistas tácticas, cardinalidad, sensibilidad ni remuestreo.
+    fetcher: DataFetcher reutilizable entre estudios (jobs locales de calibración).
+    """
+    constraints = constraints or {}
+    asset_metadata = asset_metadata or {}
+    locked_assets = locked_assets or []
+    telemetry = PipelineTelemetry()
+
+    if rebalance not in WALK_FORWARD_FREQUENCIES:
+        return {"api_version": "walk_forward_v1", "status": "error", "message": f"rebalance debe ser uno de {list(WALK_FORWARD_FREQUENCIES)}"}
+    window = int(estimation_window)
+    if window < 60:
+        return {"api_version": "walk_forward_v1", "status": "error", "message": "estimation_window mínimo: 60 retornos"}
+    logger.info(f"📥 [WalkForward] Risk: {risk_level}, Assets: {len(assets_list)}, Window: {window}, Rebalance: {rebalance}")
+
+    try:
+        # FASE 1-2: Contexto y suitability (una vez para todo el estudio)
+        with telemetry.phase("fase_1_context"):
+            (apply_profile, _, lock_mode, fixed_weights,
+             current_risk_buckets, _, _, _) = _build_optimization_context(db, constraints, telemetry)
+        penalty_error = _turnover_penalty_error(constraints, apply_profile, int(risk_level))
+        if penalty_error:
+            return {"api_version": "walk_forward_v1", "status": "error", "message": penalty_error}
+        with telemetry.phase("fase_2_suitability"):
+            assets_list = _apply_suitability_filter(assets_list, asset_metadata, risk_level, apply_profile, locked_assets)
+
+        # FASE 3: Matriz de precios alineada
+        with telemetry.phase("fase_3_universe"):
+            fetcher = fetcher or DataFetcher(db, telemetry=telemetry)
+            price_data, _ = fetcher.get_price_data(assets_list, resample_freq="D", strict=False)
+            df, _ = _aligned_prices(price_data, window + WALK_FORWARD_MIN_OOS_DAYS + 1, locked_assets)
+
+        returns = df.pct_change().iloc[1:]
+        T = len(returns)
+        if df.shape[1] < 2 or T < window + WALK_FORWARD_MIN_OOS_DAYS:
+            return {
+                "api_version": "walk_forward_v1",
+                "status": "error",
+                "message": f"Historia común insuficiente: {T} retornos para {df.shape[1]} activos (se requieren {window} de estimación + {WALK_FORWARD_MIN_OOS_DAYS} fuera de muestra y al menos 2 activos).",
+                "effective_start_date": df.index[0].strftime("%Y-%m-%d") if not df.empty else "N/A",
+                "observations": len(df),
+                "timings": telemetry.to_dict(),
+            }
+
+        universe = list(df.columns)
+        missing_assets = [a for a in assets_list if a not in universe]
+        eq_vec, bd_vec, cs_vec, al_vec, ot_vec, _ = _allocation_vectors(universe, asset_metadata)
+
+        rf_rate = float(fetcher.get_dynamic_risk_free_rate())
+        max_weight = float(constraints.get("max_weight", MAX_WEIGHT_DEFAULT))
+        min_weight = float(constraints.get("min_weight", 0.0))
+        risk_level_i = int(risk_level)
+        n_assets = len(universe)
+        gamma = 1.0 if n_assets < 10 else (2.0 if n_assets <= 25 else 3.0)
+        objective = constraints.get("objective", "max_sharpe")
+
+        # Fechas de re-optimización (filas de `returns` tras cuyo cierre se resuelve)
+        solve_rows = [window - 1] + [int(r) for r in rebalance_rows(returns.index, rebalance) if window - 1 < r < T - 1]
+        warnings = []
+        if len(solve_rows) > WALK_FORWARD_MAX_REBALANCES:
+            solve_rows = solve_rows[-WALK_FORWARD_MAX_REBALANCES:]
+            warnings.append(f"Estudio truncado a los últimos {WALK_FORWARD_MAX_REBALANCES} rebalanceos")
+        first = solve_rows[0]
+
+        def _solve(mu, S, row, rebalance_ctx):
+            """FASES 6, 8 y 9 del optimizador sobre los momentos de la ventana."""
+            if objective in RISK_PARITY_OBJECTIVES:
+                try:
+                    raw_weights, _ = _solve_risk_parity(
+                        objective, S, universe, max_weight, apply_profile, risk_level_i, current_risk_buckets,
+                        eq_vec, bd_vec, cs_vec, al_vec, ot_vec, lock_mode, locked_assets, fixed_weights,
+                        constraints=constraints, asset_metadata=asset_metadata,
+                    )
+                    telemetry.record_solver(None, f"risk_parity_{objective}", succeeded=True)
+                    return raw_weights, None, f"risk_parity_{objective}"
+                except Exception as e_rp:
+                    logger.info(f"⚠️ [WalkForward] Risk parity ({objective}) failed: {e_rp}. Falling back to QP solver...")
+                    telemetry.record_solver(None, f"risk_parity_{objective}", succeeded=False)
+
+            if objective in SCENARIO_OBJECTIVES:
+                scenarios = _build_scenarios(df.iloc[row + 1 - window: row + 2])
+                ef = _new_objective_optimizer(objective, mu, S, (min_weight, max_weight), gamma, scenarios=scenarios)
+            else:
+                ef = EfficientFrontier(mu, S, weight_bounds=(min_weight, max_weight))
+                if objective != "min_deviation":
+                    ef.add_objective(objective_functions.L2_reg, gamma=gamma)
+            _apply_standard_constraints(
+                ef, constraints, lock_mode, apply_profile, risk_level_i, locked_assets,
+                fixed_weights, asset_metadata, current_risk_buckets, eq_vec, bd_vec, cs_vec, al_vec, ot_vec,
+            )
+            ef, raw_weights, solver_path = _run_solver(
+                ef, mu, S, constraints, risk_level_i, rf_rate, max_weight, gamma, apply_profile, universe,
+                lock_mode, locked_assets, fixed_weights, asset_metadata, current_risk_buckets,
+                eq_vec, bd_vec, cs_vec, al_vec, ot_vec, telemetry=telemetry, rebalance=rebalance_ctx,
+            )
+            return raw_weights, ef, solver_path
+
+        # FASE 4-9 por fecha + encadenado fuera de muestra con deriva de pesos
+        moments = RollingMoments(returns, window)
+        X = moments.X
+        cost = float(cost_bps) / 10000.0
+        values = np.empty(T - first)  # posición 0 = base al cierre del primer solve
+        values[0] = 1.0
+        records = []
+        w_drift = None
+        with telemetry.phase("fase_8_walk_forward"):
+            for i, row in enumerate(solve_rows):
+                moments.move_to(row)
+                mu, S = moments.mu(), moments.cov()
+
+                rebalance_constraints = constraints
+                if w_drift is not None:
+                    rebalance_constraints = {**constraints, "current_weights": dict(zip(universe, w_drift))}
+                rebalance_ctx = _build_rebalance_context(rebalance_constraints, universe)
+
+                raw_weights, ef, solver_path = _solve(mu, S, row, rebalance_ctx)
+                weights = _postprocess_weights(
+                    ef, raw_weights, float(CUTOFF_DEFAULT), universe, apply_profile, risk_level_i, current_risk_buckets,
+                    eq_vec, bd_vec, cs_vec, al_vec, ot_vec, lock_mode, locked_assets, fixed_weights,
+                )
+                w = np.array([weights.get(t, 0.0) for t in universe])
+                turnover = 0.5 * float(np.abs(w - w_drift).sum()) if w_drift is not None else 0.0
+
+                end = solve_rows[i + 1] if i + 1 < len(solve_rows) else T - 1
+                growth = np.cumprod(1.0 + X[row + 1: end + 1], axis=0)
+                seg = growth @ w
+                start_value = values[row - first] * (1.0 - cost * turnover)
+                values[row + 1 - first: end + 1 - first] = start_value * seg
+                w_drift = w * growth[-1] / seg[-1]
+
+                records.append({
+                    "date": returns.index[row].strftime("%Y-%m-%d"),
+                    "estimation_start": returns.index[row + 1 - window].strftime("%Y-%m-%d"),
+                    "solver_path": solver_path,
+                    "weights": {t: round(float(x), 6) for t, x in zip(universe, w) if x > 0},
+                    "turnover": round(turnover, 6),
+                    "expected_return": float(w @ mu.values),
+                    "expected_volatility": float(np.sqrt(max(w @ S.values @ w, 0.0))),
+                })
+
+        # Métricas OOS y baseline equiponderado con la misma frecuencia y costes
+        with telemetry.phase("fase_10_metrics"):
+            oos_index = returns.index[first:]
+            series = pd.Series(100.0 * values, index=oos_index)
+            equal_weight = simulate_rebalanced_portfolio(returns.iloc[first + 1:], np.ones(n_assets), [rebalance], cost_bps)[rebalance]
+            ew_series = pd.concat([pd.Series([100.0], index=oos_index[:1]), equal_weight["values"]])
+
+            total_turnover = float(sum(r["turnover"] for r in records))
+            years = max((oos_index[-1] - oos_index[0]).days / 365.25, 1e-9)
+            for i, rec in enumerate(records):
+                lo = solve_rows[i] - first
+                hi = (solve_rows[i + 1] if i + 1 < len(solve_rows) else T - 1) - first
+                seg_ret = np.diff(values[lo: hi + 1]) / values[lo: hi]
+                rec["realized_volatility"] = float(seg_ret.std(ddof=1) * np.sqrt(TRADING_DAYS)) if len(seg_ret) > 1 else None
+
+        failed = sum(1 for r in records if (r["solver_path"] or "").startswith("fallback_"))
+        if failed:
+            warnings.append(f"{failed}/{len(records)} rebalanceos resueltos por una ruta de fallback")
+
+        return {
+            "api_version": "walk_forward_v1",
+            "status": "ok",
+            "rebalance": rebalance,
+            "estimation_window": window,
+            "cost_bps": float(cost_bps),
+            "used_assets": universe,
+            "missing_assets": missing_assets,
+            "effective_start_date": df.index[0].strftime("%Y-%m-%d"),
+            "observations": len(df),
+            "oos_start_date": oos_index[0].strftime("%Y-%m-%d"),
+            "rebalances": records,
+            "portfolioSeries": _to_chart(series),
+            "benchmarkSeries": {"equal_weight": _to_chart(ew_series)},
+            "metrics": calculate_historical_metrics(series, rf_rate),
+            "benchmarkMetrics": {"equal_weight": calculate_historical_metrics(ew_series, rf_rate)},
+            "turnover": {"total": total_turnover, "annual": total_turnover / years},
+            "rf_rate": rf_rate,
+            "warnings": warnings,
+            "timings": telemetry.to_dict(),
+        }
+
+    except Exception as e:
+        logger.info(f"❌ [WalkForward] Critical Error: {e}")
+        return {"api_version": "walk_forward_v1", "status": "error", "message": str(e), "error": str(e), "timings": telemetry.to_dict()}
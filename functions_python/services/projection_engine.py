@@ -0,0 +1,182 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+from .backtester import _fetch_and_process_data
+from .config import (
+    DAILY_RETURN_CAP,
+    PROJECTION_BLOCK_MONTHS,
+    PROJECTION_DEFAULT_PATHS,
+    PROJECTION_DEFAULT_SEED,
+    PROJECTION_MAX_HORIZON_YEARS,
+    PROJECTION_MAX_PATHS,
+    PROJECTION_MIN_HISTORY_MONTHS,
+    PROJECTION_PERCENTILES,
+)
+from .data_fetcher import DataFetcher
+
+# Días con dato mínimos para aceptar un mes como observación mensual completa
+_MIN_DAYS_PER_MONTH = 15
+
+
+# =========================================================================
+# 1. RETORNOS MENSUALES HISTÓRICOS DE LA CARTERA
+# =========================================================================
+
+def monthly_portfolio_returns(df_master: pd.DataFrame, weights_map: dict) -> pd.Series:
+    """
+    Retornos mensuales de la cartera con la convención del backtester (returns·w diario
+    sobre la historia común, recorte ±15%), compuestos por mes natural. Los meses con
+    menos de _MIN_DAYS_PER_MONTH días (primero/último parciales) se descartan.
+    """
+    valid = [c for c in df_master.columns if weights_map.get(c, 0) > 0]
+    if not valid:
+        return pd.Series(dtype=float)
+    returns = df_master[valid].dropna().pct_change().dropna()
+    returns = returns.clip(-DAILY_RETURN_CAP, DAILY_RETURN_CAP)
+    w = np.array([weights_map[c] for c in valid], dtype=float)
+    port_ret = returns.dot(w / w.sum())
+
+    months = port_ret.index.to_period("M")
+    growth = (1.0 + port_ret).groupby(months).agg(["prod", "count"])
+    growth = growth[growth["count"] >= _MIN_DAYS_PER_MONTH]
+    return growth["prod"] - 1.0
+
+
+# =========================================================================
+# 2. BLOCK BOOTSTRAP VECTORIZADO
+# =========================================================================
+
+def block_bootstrap_paths(returns, horizon: int, n_paths: int, block: int, rng: np.random.Generator) -> np.ndarray:
+    """
+    Bootstrap por bloques circular (Politis-Romano con bloque fijo): cada trayectoria
+    concatena bloques de `block` meses consecutivos con inicio uniforme, envolviendo al
+    final de la historia. Conserva colas gruesas y la dependencia de corto plazo
+    (volatility clustering) que un paramétrico i.i.d. pierde. Sin bucles por trayectoria:
+    una matriz de índices (n_paths × horizon) y una sola indexación.
+    """
+    r = np.asarray(returns, dtype=float)
+    T = len(r)
+    block = int(max(1, min(block, T)))
+    n_blocks = -(-horizon // block)
+    starts = rng.integers(0, T, size=(n_paths, n_blocks))
+    idx = (starts[:, :, None] + np.arange(block)) % T
+    return r[idx.reshape(n_paths, n_blocks * block)[:, :horizon]]
+
+
+def project_wealth(returns, horizon: int, n_paths: int, block: int, seed: int, percentiles=PROJECTION_PERCENTILES) -> dict:
+    """
+    Patrimonio base 100 de n_paths trayectorias bootstrap y sus bandas de percentiles por
+    paso. Devuelve {"bands": (Q × horizon+1), "final": (n_paths,), "max_drawdown": (n_paths,)}.
+    """
+    rng = np.random.default_rng(seed)
+    sims = block_bootstrap_paths(returns, horizon, n_paths, block, rng)
+    wealth = np.empty((n_paths, horizon + 1))
+    wealth[:, 0] = 100.0
+    np.cumprod(1.0 + sims, axis=1, out=wealth[:, 1:])
+    wealth[:, 1:] *= 100.0
+    peaks = np.maximum.accumulate(wealth, axis=1)
+    return {
+        "bands": np.percentile(wealth, percentiles, axis=0),
+        "final": wealth[:, -1],
+        "max_drawdown": (wealth / peaks - 1.0).min(axis=1),
+    }
+
+
+# =========================================================================
+# 3. ORQUESTADOR
+# =========================================================================
+
+def run_projection(portfolio, db, horizon_years=20, n_paths=PROJECTION_DEFAULT_PATHS, block_months=PROJECTION_BLOCK_MONTHS, seed=PROJECTION_DEFAULT_SEED, fetcher=None):
+    """
+    Proyección de la cartera por block bootstrap de sus retornos mensuales históricos:
+    1. Precios alineados (mismo DataFetcher/hardening que el backtester) y retornos mensuales.
+    2. n_paths trayectorias de horizon_years·12 pasos mensuales (vectorizado, semilla fija:
+       la misma petición devuelve siempre las mismas bandas).
+    3. Bandas de percentiles por mes (percentileSeries), distribución final, CAGR y
+       drawdown máximo por percentil y probabilidad de pérdida al horizonte.
+    portfolio: [{"isin", "weight"}] (pesos en %).
+    """
+    t0 = time.time()
+    try:
+        horizon_years = int(horizon_years)
+        n_paths = int(n_paths)
+        block_months = int(block_months)
+        seed = int(seed)
+    except (TypeError, ValueError):
+        return {"error": "Parámetros de proyección inválidos (horizon_years, n_paths, block_months, seed)"}
+    if not (1 <= horizon_years <= PROJECTION_MAX_HORIZON_YEARS):
+        return {"error": f"horizon_years debe estar entre 1 y {PROJECTION_MAX_HORIZON_YEARS}"}
+    if not (100 <= n_paths <= PROJECTION_MAX_PATHS):
+        return {"error": f"n_paths debe estar entre 100 y {PROJECTION_MAX_PATHS}"}
+    if block_months < 1:
+        return {"error": "block_months debe ser >= 1"}
+
+    try:
+        weights_map = {}
+        for h in portfolio or []:
+            weights_map[h["isin"]] = weights_map.get(h["isin"], 0.0) + float(h["weight"]) / 100.0
+        if not weights_map:
+            return {"error": "Cartera vacía"}
+
+        fetcher = fetcher or DataFetcher(db)
+        df_master, _ = _fetch_and_process_data(list(weights_map), db, ["max"], fetcher, include_benchmarks=False)
+        monthly = monthly_portfolio_returns(df_master, weights_map)
+        if len(monthly) < PROJECTION_MIN_HISTORY_MONTHS:
+            return {
+                "error": f"Historia común insuficiente para proyectar: {len(monthly)} meses (mínimo {PROJECTION_MIN_HISTORY_MONTHS})."
+            }
+        t_data = time.time()
+
+        horizon = horizon_years * 12
+        sim = project_wealth(monthly.to_numpy(), horizon, n_paths, block_months, seed)
+        t_sim = time.time()
+
+        warnings = []
+        if block_months > len(monthly) // 3:
+            warnings.append(
+                f"Block Size Warning: bloque de {block_months} meses frente a {len(monthly)} meses de historia (pocas combinaciones distintas)."
+            )
+
+        dates = pd.date_range(df_master.index[-1], periods=horizon + 1, freq=pd.DateOffset(months=1))
+        x = [d.strftime("%Y-%m-%d") for d in dates]
+        labels = [f"p{int(q)}" for q in PROJECTION_PERCENTILES]
+        final = sim["final"]
+        cagr = (final / 100.0) ** (1.0 / horizon_years) - 1.0
+
+        print(
+            f"🎲 [Projection] {n_paths} trayectorias x {horizon} meses (bloque {block_months}, semilla {seed}) "
+            f"en {t_sim - t_data:.3f}s sobre {len(monthly)} meses de historia"
+        )
+        return {
+            "api_version": "projection_v1",
+            "status": "ok",
+            "horizon_years": horizon_years,
+            "step": "monthly",
+            "n_paths": n_paths,
+            "block_months": block_months,
+            "seed": seed,
+            "history": {
+                "start": str(monthly.index[0]),
+                "end": str(monthly.index[-1]),
+                "months": int(len(monthly)),
+                "mean_monthly_return": float(monthly.mean()),
+                "monthly_volatility": float(monthly.std(ddof=1)),
+            },
+            "effectiveISINs": [c for c in df_master.columns if weights_map.get(c, 0) > 0],
+            "missingISINs": [i for i in weights_map if i not in df_master.columns],
+            "percentileSeries": {
+                label: [{"x": d, "y": round(float(v), 2)} for d, v in zip(x, band)]
+                for label, band in zip(labels, sim["bands"])
+            },
+            "final": dict(zip(labels, np.round(np.percentile(final, PROJECTION_PERCENTILES), 2).tolist())),
+            "cagr": dict(zip(labels, np.round(np.percentile(cagr, PROJECTION_PERCENTILES), 4).tolist())),
+            "max_drawdown": dict(zip(labels, np.round(np.percentile(sim["max_drawdown"], PROJECTION_PERCENTILES), 4).tolist())),
+            "probability_of_loss": round(float((final < 100.0).mean()), 4),
+            "warnings": warnings,
+            "timings": {"data_s": round(t_data - t0, 3), "simulation_s": round(t_sim - t_data, 3)},
+        }
+    except Exception as e:
+        print(f"❌ Error Projection: {e}")
+        return {"error": str(e)}
@@ -27,18 +27,19 @@ TRADING_DAYS_PER_YEAR = 252
 # 1. COVARIANCE ESTIMATION
 # =============================================================================
 
-def get_covariance_matrix(df_prices: pd.DataFrame, frequency=TRADING_DAYS_PER_YEAR) -> pd.DataFrame:
+def get_covariance_matrix(df_prices: pd.DataFrame, frequency=TRADING_DAYS_PER_YEAR, returns_data=False) -> pd.DataFrame:
     """
     Canonical method for Computing Covariance matrix.
     Convention: Uses Ledoit-Wolf Shrinkage to improve mathematical conditioning 
     of the matrix, falling back to sample covariance if shrinkage fails.
+    returns_data=True: input is already a daily returns matrix (e.g. bootstrap resamples).
     
     Output: Annualized Covariance DataFrame.
     """
     try:
-        S = risk_models.CovarianceShrinkage(df_prices, frequency=frequency).ledoit_wolf()
+        S = risk_models.CovarianceShrinkage(df_prices, returns_data=returns_data, frequency=frequency).ledoit_wolf()
     except Exception:
-        S = risk_models.sample_cov(df_prices, frequency=frequency)
+        S = risk_models.sample_cov(df_prices, returns_data=returns_data, frequency=frequency)
         
     S = risk_models.fix_nonpositive_semidefinite(S)
     
@@ -52,22 +53,23 @@ def get_covariance_matrix(df_prices: pd.DataFrame, frequency=TRADING_DAYS_PER_YE
 # 2. RETURN ESTIMATION
 # =============================================================================
 
-def get_expected_returns(df_prices: pd.DataFrame, frequency=TRADING_DAYS_PER_YEAR, method="ema") -> pd.Series:
+def get_expected_returns(df_prices: pd.DataFrame, frequency=TRADING_DAYS_PER_YEAR, method="ema", returns_data=False) -> pd.Series:
     """
     Canonical expected returns calculation.
     Convention: 
     - method="ema": Exponential moving average. Gives more weight to recent prices.
     - method="mean": Standard arithmetic mean of historical returns.
     - method="capm": Capital Asset Pricing Model implied returns.
+    returns_data=True: input is already a daily returns matrix.
     
     Output: Annualized Expected Returns Series.
     """
     if method == "ema":
-        return expected_returns.ema_historical_return(df_prices, frequency=frequency, span=frequency)
+        return expected_returns.ema_historical_return(df_prices, returns_data=returns_data, frequency=frequency, span=frequency)
     elif method == "mean":
-        return expected_returns.mean_historical_return(df_prices, frequency=frequency)
+        return expected_returns.mean_historical_return(df_prices, returns_data=returns_data, frequency=frequency)
     else:
-        return expected_returns.capm_return(df_prices, frequency=frequency)
+        return expected_returns.capm_return(df_prices, returns_data=returns_data, frequency=frequency)
 
 
 # =============================================================================
@@ -221,3 +223,219 @@ def calculate_historical_metrics(df_series: pd.Series, risk_free_annual=0.0, met
         "points": len(df)
     }
 
+
+
+# =============================================================================
+# 5. SCENARIO REDUCTION & TAIL RISK (CVaR / CDaR LP objectives)
+# =============================================================================
+
+def build_return_scenarios(df_prices: pd.DataFrame, max_scenarios: int = 520, frequencies=("D", "W-FRI", "ME")):
+    """
+    Scenario reduction for LP risk objectives.
+    Convention:
+    - Aggregates prices to the first frequency (daily -> weekly -> month-end) whose
+      number of period returns fits `max_scenarios`, so 10y of daily data becomes
+      ~520 weekly scenarios instead of ~2,500 daily rows (LP size ~ scenarios x assets).
+    - Scenarios are simple period returns over the common window (rows with NaN dropped).
+    - If even the coarsest frequency exceeds the cap, the most recent `max_scenarios` are kept.
+
+    Output: (scenarios DataFrame, frequency label).
+    """
+    scenarios = pd.DataFrame()
+    freq = frequencies[0]
+    for freq in frequencies:
+        if freq == "D":
+            scenarios = df_prices.pct_change().dropna(how="any")
+        else:
+            scenarios = df_prices.resample(freq).last().pct_change().dropna(how="any")
+        if len(scenarios) <= max_scenarios:
+            return scenarios, freq
+    return scenarios.iloc[-max_scenarios:], freq
+
+
+def calculate_scenario_risk(scenarios: pd.DataFrame, weights_dict: dict, beta: float = 0.95) -> dict:
+    """
+    Historical tail metrics of a fixed holding over return scenarios (per period, as positive losses).
+    Conventions match PyPortfolioOpt's EfficientCVaR / EfficientCDaR LP values (Rockafellar-Uryasev):
+    - CVaR = VaR + E[(loss - VaR)+] / (1 - beta), VaR = beta-quantile of scenario losses.
+    - Drawdowns on uncompounded cumulative returns; CDaR is the same functional over drawdowns.
+    """
+    w_vec = np.array([weights_dict.get(t, 0.0) for t in scenarios.columns])
+    port = scenarios.values @ w_vec
+    if len(port) == 0:
+        return {"var": 0.0, "cvar": 0.0, "max_drawdown": 0.0, "cdar": 0.0}
+
+    def _tail(losses):
+        ordered = np.sort(losses)[::-1]
+        k = max(1, int(np.ceil(len(losses) * (1.0 - beta))))
+        q = ordered[k - 1]
+        return float(q), float(q + np.clip(losses - q, 0.0, None).sum() / (len(losses) * (1.0 - beta)))
+
+    var, cvar = _tail(-port)
+    cum = np.concatenate([[0.0], np.cumsum(port)])
+    drawdowns = (np.maximum.accumulate(cum) - cum)[1:]
+    _, cdar = _tail(drawdowns)
+
+    return {
+        "var": var,
+        "cvar": cvar,
+        "max_drawdown": float(drawdowns.max()),
+        "cdar": cdar,
+    }
+
+
+# =============================================================================
+# 6. WINDOW METRICS KERNEL (multi-period backtests)
+# =============================================================================
+
+def calculate_window_metrics(levels: pd.DataFrame, risk_free_annual=0.0) -> dict:
+    """
+    Vectorized equivalent of calculate_historical_metrics(method="geometric") for many
+    price-like columns in one pass (e.g. portfolio + synthetic profiles x periods).
+    Conventions:
+    - Each column is evaluated from its first valid value to the last row: leading NaNs
+      mark the start of its window. Columns with interior gaps fall back to the scalar path.
+    - Volatility: column sums of centred daily returns (ddof=1), annualized with sqrt(252).
+    - Max drawdown: running maximum (np.fmax.accumulate skips the leading NaNs).
+
+    Output: {column: metrics dict (same keys as calculate_historical_metrics) or None}.
+    """
+    if levels.empty:
+        return {c: None for c in levels.columns}
+
+    L = levels.to_numpy(dtype=float)
+    T = L.shape[0]
+    valid = np.isfinite(L)
+    points = valid.sum(axis=0)
+    first = np.argmax(valid, axis=0)
+    contiguous = (points > 0) & (points == T - first)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        R = L[1:] / L[:-1] - 1.0
+        n_ret = points - 1
+        mean = np.nansum(R, axis=0) / np.maximum(n_ret, 1)
+        var = np.nansum((R - mean) ** 2, axis=0) / np.maximum(n_ret - 1, 1)
+        vol = np.maximum(np.sqrt(var) * np.sqrt(TRADING_DAYS_PER_YEAR), 0.0)
+
+        start_level = L[first, np.arange(L.shape[1])]
+        total_ret = L[-1] / start_level - 1.0
+        days = np.array([(levels.index[-1] - levels.index[f]).days for f in first], dtype=float)
+        years = np.maximum(days / 365.25, 0.1)
+        ann_ret = (1.0 + total_ret) ** (1.0 / years) - 1.0
+
+        run_max = np.fmax.accumulate(L, axis=0)
+        max_dd = np.nanmin(L / run_max - 1.0, axis=0)
+
+        var_95 = np.nanpercentile(R, 5, axis=0) if T > 1 else np.full(L.shape[1], np.nan)
+        tail = np.where(R <= var_95, R, np.nan)
+        tail_count = np.isfinite(tail).sum(axis=0)
+        cvar_95 = np.where(tail_count > 0, np.nansum(tail, axis=0) / np.maximum(tail_count, 1), var_95)
+
+    out = {}
+    for j, col in enumerate(levels.columns):
+        if not contiguous[j]:
+            out[col] = calculate_historical_metrics(levels[col], risk_free_annual=risk_free_annual, method="geometric")
+            continue
+        if points[j] < 5:
+            out[col] = None
+            continue
+        sharpe = (ann_ret[j] - risk_free_annual) / vol[j] if vol[j] > 1e-6 else 0.0
+        out[col] = {
+            "return": float(ann_ret[j]),
+            "volatility": float(vol[j]),
+            "sharpe": float(sharpe),
+            "max_drawdown": float(max_dd[j]),
+            "var_95_daily": float(var_95[j]),
+            "cvar_95_daily": float(cvar_95[j]),
+            "years": float(years[j]),
+            "points": int(points[j]),
+        }
+    return out
+
+
+# =============================================================================
+# 7. ROLLING METRICS KERNEL (O(T) windowed cumulative statistics)
+# =============================================================================
+
+def calculate_rolling_metrics(levels: pd.DataFrame, window: int = TRADING_DAYS_PER_YEAR, step: int = 1,
+                              benchmark: pd.Series = None, risk_free_annual=0.0) -> dict:
+    """
+    Rolling metrics over `window` daily returns for many price-like columns in O(T):
+    cumulative sums of r, r² (and r·b, b, b² for beta) differenced at both ends of each window.
+    - return: geometric, annualized with calendar years (same convention as calculate_window_metrics).
+    - volatility: ddof=1, annualized with sqrt(252). sharpe = (return - rf) / volatility.
+    - drawdown: current level vs the running maximum inside the window.
+    - beta: cov(r, r_bmk) / var(r_bmk) over the same window (only when benchmark is given).
+    Windows ending every `step` rows, anchored on the last row. Windows with any NaN -> NaN.
+
+    Output: {"dates": window end dates, metric: DataFrame (dates x columns)}.
+    """
+    w = max(int(window), 2)
+    step = max(int(step), 1)
+    L = levels.to_numpy(dtype=float)
+    T = L.shape[0]
+    if T <= w:
+        empty = pd.DataFrame(columns=levels.columns, dtype=float)
+        out = {"dates": levels.index[:0], "return": empty, "volatility": empty, "sharpe": empty, "drawdown": empty}
+        if benchmark is not None:
+            out["beta"] = empty
+        return out
+
+    def csum(x):
+        return np.concatenate([np.zeros((1,) + x.shape[1:]), np.cumsum(x, axis=0)])
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        R = L[1:] / L[:-1] - 1.0  # fila i = retorno del nivel i+1
+    valid = np.isfinite(R)
+    Rz = np.where(valid, R, 0.0)
+    Rz = (Rz - Rz.sum(axis=0) / np.maximum(valid.sum(axis=0), 1)) * valid  # centrado: estabilidad numérica
+
+    ends = np.arange(T - 1, w - 1, -step)[::-1]  # fila de nivel que cierra cada ventana
+    starts = ends - w
+    C1, C2, CN = csum(Rz), csum(Rz ** 2), csum(valid.astype(float))
+    full = (CN[ends] - CN[starts]) == w
+    s1 = C1[ends] - C1[starts]
+    s2 = C2[ends] - C2[starts]
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        var = np.maximum((s2 - s1 ** 2 / w) / (w - 1), 0.0)
+        vol = np.sqrt(var * TRADING_DAYS_PER_YEAR)
+
+        days = (levels.index[ends] - levels.index[starts]).days.to_numpy(dtype=float)
+        years = np.maximum(days / 365.25, 0.1)[:, None]
+        total = L[ends] / L[starts] - 1.0
+        ann = (1.0 + total) ** (1.0 / years) - 1.0
+        sharpe = np.where(vol > 1e-6, (ann - risk_free_annual) / vol, 0.0)
+
+        run_max = levels.rolling(w + 1).max().to_numpy(dtype=float)[ends]
+        drawdown = L[ends] / run_max - 1.0
+
+    def frame(values, mask):
+        return pd.DataFrame(np.where(mask, values, np.nan), index=levels.index[ends], columns=levels.columns)
+
+    out = {
+        "dates": levels.index[ends],
+        "return": frame(ann, full),
+        "volatility": frame(vol, full),
+        "sharpe": frame(sharpe, full),
+        "drawdown": frame(drawdown, full),
+    }
+
+    if benchmark is not None:
+        b = benchmark.reindex(levels.index).to_numpy(dtype=float)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            rb = b[1:] / b[:-1] - 1.0
+        b_valid = np.isfinite(rb)
+        rbz = np.where(b_valid, rb, 0.0)
+        rbz = (rbz - rbz.sum() / max(b_valid.sum(), 1)) * b_valid
+        CB, CBB, CBN = csum(rbz), csum(rbz ** 2), csum(b_valid.astype(float))
+        CXB = csum(Rz * rbz[:, None])
+        sb = CB[ends] - CB[starts]
+        var_b = (CBB[ends] - CBB[starts] - sb ** 2 / w) / (w - 1)
+        cov = (CXB[ends] - CXB[starts] - s1 * sb[:, None] / w) / (w - 1)
+        b_full = ((CBN[ends] - CBN[starts]) == w) & (var_b > 1e-12)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            beta = cov / var_b[:, None]
+        out["beta"] = frame(beta, full & b_full[:, None])
+
+    return out
@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+
+# "daily" = convención histórica del backtester (returns.dot(w): rebalanceo diario a pesos objetivo)
+REBALANCE_FREQUENCIES = ("buy_and_hold", "monthly", "quarterly", "annual", "daily")
+_PERIOD_CODES = {"monthly": "M", "quarterly": "Q", "annual": "Y"}
+
+
+def rebalance_rows(index: pd.DatetimeIndex, frequency: str) -> np.ndarray:
+    """
+    Filas (posiciones en index) tras cuyo cierre se vuelve a pesos objetivo: el último
+    día hábil de cada mes / trimestre / año, sin incluir la última fila de la serie.
+    """
+    code = _PERIOD_CODES.get(frequency)
+    if code is None or len(index) < 2:
+        return np.array([], dtype=int)
+    labels = index.to_period(code).asi8
+    return np.flatnonzero(labels[:-1] != labels[1:])
+
+
+def simulate_rebalanced_portfolio(returns: pd.DataFrame, weights, frequencies=REBALANCE_FREQUENCIES, cost_bps: float = 0.0) -> dict:
+    """
+    Backtest vectorizado con deriva de pesos entre rebalanceos (sin bucles por día).
+    - returns: retornos diarios (T x N) ya alineados y limpios; weights: pesos objetivo (N).
+    - Entre dos rebalanceos la cartera es buy-and-hold: con G = crecimiento acumulado de
+      cada activo y a(t) el último ancla (inicio o rebalanceo) anterior a t,
+          crecimiento del tramo(t) = Σ w_i · G_i(t) / G_i(a(t))
+      y el valor en cada ancla es el producto acumulado de los crecimientos de tramo.
+    - Turnover (one-way) en cada rebalanceo = ½ Σ |w_derivado - w|; cost_bps se cobra sobre él.
+    Devuelve {frequency: {"values": Series base 100 (índice de returns), "rebalances",
+    "turnover" (suma one-way), "annual_turnover"}}.
+    """
+    w = np.asarray(weights, dtype=float)
+    if w.sum() > 0:
+        w = w / w.sum()
+    R = returns.to_numpy(dtype=float)
+    T = len(R)
+    G = np.vstack([np.ones((1, R.shape[1])), np.cumprod(1.0 + R, axis=0)])  # fila 0 = base
+    years = max((returns.index[-1] - returns.index[0]).days / 365.25, 1e-9) if T else 1e-9
+    cost = float(cost_bps) / 10000.0
+
+    out = {}
+    for freq in frequencies:
+        if freq == "daily":
+            values = np.cumprod(1.0 + R @ w) if T else np.array([])
+            out[freq] = {
+                "values": pd.Series(100.0 * values, index=returns.index),
+                "rebalances": max(T - 1, 0),
+                "turnover": None,
+                "annual_turnover": None,
+            }
+            continue
+
+        # Anclas en coordenadas de G (fila k de G = cierre tras el retorno k-1)
+        anchors = np.concatenate([[0], rebalance_rows(returns.index, freq) + 1]) if freq != "buy_and_hold" else np.array([0])
+        rows = np.arange(1, T + 1)
+        anchor_of_row = anchors[np.searchsorted(anchors, rows, side="left") - 1]
+
+        drift = G[rows] / G[anchor_of_row]          # (T x N) crecimiento desde el ancla
+        seg_growth = drift @ w                       # crecimiento del tramo en cada fila
+
+        # Valor en cada ancla: producto de los crecimientos de tramo al cierre de cada rebalanceo
+        reb = anchors[1:]
+        turnover = np.zeros(len(reb))
+        if len(reb):
+            drifted = (drift[reb - 1] * w) / seg_growth[reb - 1][:, None]
+            turnover = 0.5 * np.abs(drifted - w).sum(axis=1)
+        anchor_values = np.concatenate([[1.0], np.cumprod(seg_growth[reb - 1] * (1.0 - cost * turnover))])
+
+        values = anchor_values[np.searchsorted(anchors, anchor_of_row)] * seg_growth
+        out[freq] = {
+            "values": pd.Series(100.0 * values, index=returns.index),
+            "rebalances": int(len(reb)),
+            "turnover": float(turnover.sum()),
+            "annual_turnover": float(turnover.sum() / years),
+        }
+    return out
@@ -0,0 +1,184 @@
+import hashlib
+import json
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def _json_default(obj):
+    """Serializador tolerante para tipos numpy / Firestore en payloads cacheados."""
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if hasattr(obj, "isoformat"):
+        return obj.isoformat()
+    return str(obj)
+
+
+def build_cache_key(payload: dict) -> str:
+    """
+    Hash canónico (SHA-256) de un payload normalizado.
+    El orden de las claves no altera el hash (sort_keys); el orden de listas sí,
+    por lo que el llamador debe ordenar las listas cuyo orden sea irrelevante.
+    """
+    canonical = json.dumps(
+        payload, sort_keys=True, separators=(",", ":"), default=_json_default
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def get_price_data_version(db) -> str:
+    """
+    Versión publicada por la rutina nocturna al reconstruir la caché global de precios.
+    Si no existe, se usa la fecha UTC (invalidación diaria como mínimo).
+    """
+    version = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    try:
+        pv_doc = db.collection("system_settings").document("price_data_version").get()
+        if pv_doc.exists:
+            published = (pv_doc.to_dict() or {}).get("version")
+            if published:
+                version = str(published)
+    except Exception as e:
+        logger.warning(f"⚠️ [ResultCache] No se pudo leer la versión de precios: {e}")
+    return version
+
+
+def get_data_versions(db) -> dict:
+    """
+    Versiones de los datos que invalidan cualquier resultado cacheado:
+    - risk_profiles: update_time del documento system_settings/risk_profiles.
+    - price_data: ver get_price_data_version.
+    """
+    versions = {"risk_profiles": None}
+    try:
+        rp_doc = db.collection("system_settings").document("risk_profiles").get()
+        if rp_doc.exists:
+            update_time = getattr(rp_doc, "update_time", None)
+            versions["risk_profiles"] = str(update_time) if update_time else "exists"
+    except Exception as e:
+        logger.warning(f"⚠️ [ResultCache] No se pudo leer la versión de risk_profiles: {e}")
+
+    versions["price_data"] = get_price_data_version(db)
+    return versions
+
+
+class ResultCache:
+    """
+    Caché de resultados en dos niveles:
+    1. LRU en RAM de la instancia (instantáneo, se pierde en cold start).
+    2. Colección Firestore con TTL (compartida entre instancias y reintentos).
+
+    Los valores se guardan serializados en JSON, de modo que cada lectura
+    devuelve una copia independiente que el llamador puede mutar.
+    El LRU se protege con un lock (peticiones concurrentes en la misma instancia).
+    storage_prefix: el payload va a Storage ({prefix}/{key}.json) y el documento de
+    Firestore guarda sólo el puntero (payloads que superan el límite de 1 MiB por documento).
+    """
+
+    def __init__(self, collection: str, max_entries: int = 128, ttl_seconds: int = 6 * 3600, storage_prefix: str = None):
+        self.collection = collection
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.storage_prefix = storage_prefix
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _storage_blob(self, key):
+        from firebase_admin import storage
+        from .config import BUCKET_NAME
+
+        return storage.bucket(BUCKET_NAME).blob(f"{self.storage_prefix}/{key}.json")
+
+    def _now(self):
+        return datetime.now(timezone.utc)
+
+    def _remember(self, key, payload_json, expires_at):
+        with self._lock:
+            self._lru[key] = (payload_json, expires_at)
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.max_entries:
+                self._lru.popitem(last=False)
+
+    def get(self, db, key: str):
+        """Devuelve el valor cacheado (dict) o None si no existe o ha expirado."""
+        now = self._now()
+
+        # 1. RAM LRU
+        with self._lock:
+            entry = self._lru.get(key)
+            if entry is not None:
+                payload_json, expires_at = entry
+                if expires_at > now:
+                    self._lru.move_to_end(key)
+                else:
+                    self._lru.pop(key, None)
+                    entry = None
+        if entry is not None:
+            return json.loads(payload_json)
+
+        # 2. Firestore
+        if db is None:
+            return None
+        try:
+            doc = db.collection(self.collection).document(key).get()
+            if not doc.exists:
+                return None
+            data = doc.to_dict() or {}
+            expires_at = data.get("expires_at")
+            if expires_at is None:
+                return None
+            if expires_at.tzinfo is None:
+                expires_at = expires_at.replace(tzinfo=timezone.utc)
+            if expires_at <= now:
+                return None
+            if data.get("payload_blob"):
+                payload_json = self._storage_blob(key).download_as_string()
+                if isinstance(payload_json, bytes):
+                    payload_json = payload_json.decode("utf-8")
+            else:
+                payload_json = data.get("payload")
+            if not payload_json:
+                return None
+            self._remember(key, payload_json, expires_at)
+            return json.loads(payload_json)
+        except Exception as e:
+            logger.warning(f"⚠️ [ResultCache] Fallo al leer {self.collection}/{key[:12]}: {e}")
+            return None
+
+    def set(self, db, key: str, value: dict, meta: dict = None):
+        """Guarda el valor en RAM y en Firestore (best effort, nunca lanza)."""
+        try:
+            payload_json = json.dumps(value, default=_json_default)
+        except Exception as e:
+            logger.warning(f"⚠️ [ResultCache] Resultado no serializable, no se cachea: {e}")
+            return
+
+        expires_at = self._now() + timedelta(seconds=self.ttl_seconds)
+        self._remember(key, payload_json, expires_at)
+
+        if db is None:
+            return
+        try:
+            doc = {"created_at": self._now(), "expires_at": expires_at}
+            if self.storage_prefix:
+                blob = self._storage_blob(key)
+                blob.upload_from_string(payload_json, content_type="application/json")
+                doc["payload_blob"] = blob.name
+            else:
+                doc["payload"] = payload_json
+            if meta:
+                doc["meta"] = meta
+            db.collection(self.collection).document(key).set(doc)
+        except Exception as e:
+            logger.warning(f"⚠️ [ResultCache] Fallo al escribir {self.collection}/{key[:12]}: {e}")
+
+    def clear(self):
+        with self._lock:
+            self._lru.clear()
@@ -0,0 +1,263 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+from .backtester import PROFILE_LABELS, _fetch_and_process_data, _resolve_benchmark_curves
+from .config import BENCHMARK_RF_ISIN, BENCHMARK_RV_ISIN, DAILY_RETURN_CAP, STRESS_MIN_COVERAGE, STRESS_SCENARIOS
+from .data_fetcher import DataFetcher
+from .exposure_index import fund_exposure
+from .synthetic_benchmarks import PROFILE_RF_WEIGHTS
+
+# Carga de cada clase de activo sobre las patas (RV, RF) del proxy; monetario = retorno 0
+_CLASS_LEG_LOADINGS = {"equity": (1.0, 0.0), "bond": (0.0, 1.0), "cash": (0.0, 0.0), "other": (0.5, 0.5)}
+
+
+# =========================================================================
+# 1. ESCENARIOS Y PROXIES POR CLASE DE ACTIVO
+# =========================================================================
+
+def resolve_scenarios(scenarios=None) -> list:
+    """
+    ids de STRESS_SCENARIOS y/o episodios propios {"id", "name", "start", "end"} -> lista
+    [{"id", "name", "start", "end"}] con fechas ISO. None/[] = biblioteca completa.
+    Lanza ValueError con ids desconocidos o fechas inválidas.
+    """
+    out = []
+    for item in scenarios or list(STRESS_SCENARIOS):
+        if isinstance(item, str):
+            if item not in STRESS_SCENARIOS:
+                raise ValueError(f"Escenario desconocido: {item}")
+            spec = {"id": item, **STRESS_SCENARIOS[item]}
+        elif isinstance(item, dict):
+            spec = {
+                "id": str(item.get("id") or f"custom_{len(out) + 1}"),
+                "name": item.get("name") or "Escenario personalizado",
+                "start": item.get("start"),
+                "end": item.get("end"),
+            }
+        else:
+            raise ValueError(f"Escenario inválido: {item!r}")
+        try:
+            start, end = pd.Timestamp(spec["start"]), pd.Timestamp(spec["end"])
+        except (TypeError, ValueError):
+            raise ValueError(f"Fechas inválidas en el escenario {spec['id']}")
+        if pd.isna(start) or pd.isna(end) or end <= start:
+            raise ValueError(f"Fechas inválidas en el escenario {spec['id']}")
+        out.append({**spec, "start": start.strftime("%Y-%m-%d"), "end": end.strftime("%Y-%m-%d")})
+    return out
+
+
+def class_leg_loadings(asset_class: dict):
+    """{clase: fracción} -> (carga RV, carga RF) normalizada a la exposición conocida; None sin clase."""
+    known = {k: float(v) for k, v in (asset_class or {}).items() if k in _CLASS_LEG_LOADINGS and v > 0}
+    total = sum(known.values())
+    if total <= 0:
+        return None
+    rv = sum(v * _CLASS_LEG_LOADINGS[k][0] for k, v in known.items()) / total
+    rf = sum(v * _CLASS_LEG_LOADINGS[k][1] for k, v in known.items()) / total
+    return rv, rf
+
+
+def _fund_loadings(isins, db, fetcher) -> dict:
+    """
+    Cargas (RV, RF) por fondo a partir de su clase de activo: índice nocturno de
+    exposiciones y, para los fondos fuera del índice, funds_v3 (misma vía que las allocations).
+    """
+    index = fetcher.get_exposure_index()
+    loadings = {}
+    missing = []
+    for isin in isins:
+        if index and isin in index["row"]:
+            row = index["matrices"]["asset_class"][index["row"][isin]]
+            loadings[isin] = class_leg_loadings(dict(zip(index["dims"]["asset_class"], row)))
+        else:
+            missing.append(isin)
+    if missing and db is not None:
+        docs = db.get_all([db.collection("funds_v3").document(isin) for isin in missing])
+        for doc in docs:
+            if doc.exists:
+                loadings[doc.id] = class_leg_loadings(fund_exposure(doc.to_dict())["asset_class"])
+    return {isin: loadings.get(isin) for isin in isins}
+
+
+# =========================================================================
+# 2. KERNEL VECTORIZADO (todos los escenarios en una pasada)
+# =========================================================================
+
+def stress_test_matrix(prices: pd.DataFrame, weights_map: dict, loadings: dict, rv_curve, rf_curve, scenarios: list, min_coverage: float = STRESS_MIN_COVERAGE) -> list:
+    """
+    Una matriz de precios (T×N, calendario común) y S episodios:
+    1. Retornos diarios R (NaN = sin dato, recorte ±DAILY_RETURN_CAP) y de las patas RV/RF.
+    2. Máscara M (S×T) de filas de cada episodio; cobertura por fondo = M·1[dato] / días.
+    3. Por episodio, cada fondo usa su historia (cobertura >= min_coverage), su proxy por
+       clase de activo (P = patas·cargas, si las patas cubren el episodio) o queda excluido
+       (peso renormalizado entre los cubiertos).
+    4. Retorno diario de la cartera en todos los episodios a la vez: R·Wₕᵀ + P·Wₚᵀ (T×S),
+       con rebalanceo diario (convención del backtester); nivel, drawdown y volatilidad por columna.
+    Devuelve una entrada por escenario (o {"error"} si el episodio no tiene datos).
+    """
+    index = prices.index
+    funds = list(weights_map)
+    T, S = len(index), len(scenarios)
+    w = np.array([weights_map[f] for f in funds], dtype=float)
+
+    cap = DAILY_RETURN_CAP
+    R = prices.reindex(columns=funds).pct_change(fill_method=None).clip(-cap, cap).to_numpy(dtype=float)
+    legs = np.column_stack([
+        c.reindex(index).pct_change(fill_method=None).clip(-cap, cap).to_numpy(dtype=float)
+        if c is not None else np.full(T, np.nan)
+        for c in (rv_curve, rf_curve)
+    ]) if T else np.empty((0, 2))
+    L = np.array([loadings.get(f) or (np.nan, np.nan) for f in funds], dtype=float).reshape(len(funds), 2)
+
+    # 2. Máscara de episodios: retornos de cierre (primer día hábil >= start) a cierre (<= end)
+    M = np.zeros((S, T), dtype=bool)
+    for s, sc in enumerate(scenarios):
+        base = int(index.searchsorted(pd.Timestamp(sc["start"])))
+        last = int(index.searchsorted(pd.Timestamp(sc["end"]), side="right"))
+        M[s, base + 1:last] = True
+    days = M.sum(axis=1)
+    Mf = M.astype(float)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        coverage = (Mf @ ~np.isnan(R)) / days[:, None]
+        leg_coverage = (Mf @ ~np.isnan(legs)) / days[:, None]
+
+    # 3. Fuente por (escenario, fondo): historia, proxy o excluido
+    use_hist = coverage >= min_coverage
+    leg_ok = leg_coverage >= min_coverage
+    has_class = ~np.isnan(L).any(axis=1)
+    L0 = np.nan_to_num(L)
+    proxy_ok = has_class[None, :] & np.all(leg_ok[:, None, :] | (L0[None, :, :] == 0), axis=2)
+    use_proxy = ~use_hist & proxy_ok
+
+    W_hist = use_hist * w
+    W_proxy = use_proxy * w
+    covered = W_hist.sum(axis=1) + W_proxy.sum(axis=1)
+    scale = np.divide(1.0, covered, out=np.zeros_like(covered), where=covered > 0)[:, None]
+
+    # 4. Retornos de la cartera (T×S) en un único par de productos matriciales
+    R0, P = np.nan_to_num(R), np.nan_to_num(legs) @ L0.T
+    port = np.where(M.T, R0 @ (W_hist * scale).T + P @ (W_proxy * scale).T, 0.0)
+    wealth = np.cumprod(1.0 + port, axis=0) if T else np.ones((1, S))
+    drawdown = (wealth / np.maximum.accumulate(wealth, axis=0) - 1.0).min(axis=0)
+    n = np.maximum(days, 2)
+    s1, s2 = port.sum(axis=0), (port ** 2).sum(axis=0)
+    vol = np.sqrt(np.maximum(s2 - s1 ** 2 / n, 0.0) / (n - 1) * 252)
+    worst = np.where(M.T, port, np.inf).min(axis=0) if T else np.zeros(S)
+
+    # Retornos acumulados por fondo (fuente elegida) y de las patas en cada episodio
+    fund_hist = np.expm1(Mf @ np.log1p(R0))
+    fund_proxy = np.expm1(Mf @ np.log1p(P))
+    leg_total = np.expm1(Mf @ np.log1p(np.nan_to_num(legs)))
+
+    results = []
+    for s, sc in enumerate(scenarios):
+        entry = {"id": sc["id"], "name": sc["name"], "start": sc["start"], "end": sc["end"]}
+        if days[s] == 0:
+            results.append({**entry, "error": "Sin datos en el calendario para el episodio."})
+            continue
+        if covered[s] <= 0:
+            results.append({**entry, "error": "Ningún fondo con historia ni proxy en el episodio."})
+            continue
+
+        rows = np.flatnonzero(M[s])
+        proxied = [f for i, f in enumerate(funds) if use_proxy[s, i]]
+        excluded = [f for i, f in enumerate(funds) if not use_hist[s, i] and not use_proxy[s, i]]
+        warnings = []
+        if excluded:
+            warnings.append(f"Sin historia ni proxy en el episodio (peso renormalizado): {', '.join(excluded)}")
+
+        benchmarks = {}
+        for name, w_rf in PROFILE_RF_WEIGHTS.items():
+            if (w_rf > 0 and not leg_ok[s, 1]) or (w_rf < 1 and not leg_ok[s, 0]):
+                continue
+            # Perfiles buy-and-hold desde el inicio del episodio: retorno = mezcla de retornos de las patas
+            benchmarks[name] = {
+                "name": PROFILE_LABELS.get(name, name),
+                "return": round(float(w_rf * leg_total[s, 1] + (1 - w_rf) * leg_total[s, 0]), 4),
+            }
+
+        results.append({
+            **entry,
+            "effective_start": index[rows[0] - 1].strftime("%Y-%m-%d"),
+            "effective_end": index[rows[-1]].strftime("%Y-%m-%d"),
+            "days": int(days[s]),
+            "metrics": {
+                "total_return": round(float(wealth[-1, s] - 1.0), 4),
+                "max_drawdown": round(float(drawdown[s]), 4),
+                "volatility": round(float(vol[s]), 4),
+                "worst_day": round(float(worst[s]), 4),
+            },
+            "benchmarks": benchmarks,
+            "coverage": {
+                "history": round(float(W_hist[s].sum()), 4),
+                "proxy": round(float(W_proxy[s].sum()), 4),
+                "excluded": round(float(w.sum() - covered[s]), 4),
+            },
+            "fund_returns": {
+                f: round(float(fund_hist[s, i] if use_hist[s, i] else fund_proxy[s, i]), 4)
+                for i, f in enumerate(funds) if use_hist[s, i] or use_proxy[s, i]
+            },
+            "proxied": proxied,
+            "excluded": excluded,
+            "warnings": warnings,
+        })
+    return results
+
+
+# =========================================================================
+# 3. ORQUESTADOR
+# =========================================================================
+
+def run_stress_test(portfolio, db, scenarios=None, fetcher=None):
+    """
+    Stress test histórico de una cartera contra la biblioteca de episodios (o una
+    selección / episodios propios): una sola descarga y alineación de precios (fondos +
+    patas RF/RV del almacén local) y un único cálculo vectorizado para todos los episodios.
+    portfolio: [{"isin", "weight"}] (pesos en %).
+    """
+    t0 = time.time()
+    try:
+        specs = resolve_scenarios(scenarios)
+    except ValueError as e:
+        return {"error": str(e)}
+
+    try:
+        weights_map = {}
+        for h in portfolio or []:
+            weights_map[h["isin"]] = weights_map.get(h["isin"], 0.0) + float(h["weight"]) / 100.0
+        weights_map = {k: v for k, v in weights_map.items() if v > 0}
+        if not weights_map:
+            return {"error": "Cartera vacía"}
+
+        fetcher = fetcher or DataFetcher(db)
+        df_master, synthetic_used = _fetch_and_process_data(list(weights_map), db, [], fetcher)
+        curves, sources, missing_benchmarks = _resolve_benchmark_curves(df_master, synthetic_used)
+        loadings = _fund_loadings(list(weights_map), db, fetcher)
+        t_data = time.time()
+
+        results = stress_test_matrix(
+            df_master, weights_map, loadings, curves[BENCHMARK_RV_ISIN], curves[BENCHMARK_RF_ISIN], specs
+        )
+        t_calc = time.time()
+
+        warnings = []
+        if missing_benchmarks:
+            warnings.append(
+                f"Partial Benchmarks: no local data for {', '.join(missing_benchmarks)}; proxies y perfiles afectados omitidos."
+            )
+        print(f"🌪️ [Stress] {len(specs)} escenarios x {len(weights_map)} fondos en {t_calc - t_data:.3f}s")
+        return {
+            "api_version": "stress_v1",
+            "status": "ok",
+            "scenarios": results,
+            "effectiveISINs": [i for i in weights_map if i in df_master.columns],
+            "missingISINs": [i for i in weights_map if i not in df_master.columns],
+            "benchmark_sources": sources,
+            "warnings": warnings,
+            "timings": {"data_s": round(t_data - t0, 3), "calc_s": round(t_calc - t_data, 3)},
+        }
+    except Exception as e:
+        print(f"❌ Error Stress Test: {e}")
+        return {"error": str(e)}
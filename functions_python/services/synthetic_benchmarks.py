@@ -0,0 +1,134 @@
+import logging
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from .config import BENCHMARK_RF_ISIN, BENCHMARK_RV_ISIN
+from .payload_codec import encode_series
+from .quant_core import calculate_window_metrics
+
+logger = logging.getLogger(__name__)
+
+# Perfiles sintéticos del backtester: peso de la pata RF (el resto en RV).
+# Mezcla buy-and-hold de las dos patas normalizadas a 100 en el inicio de cada ventana.
+PROFILE_RF_WEIGHTS = {
+    "conservative": 1.0,
+    "moderate": 0.75,
+    "balanced": 0.50,
+    "dynamic": 0.25,
+    "aggressive": 0.0,
+}
+
+# Métricas de perfil que no dependen de la tasa libre de riesgo del día de la petición
+PROFILE_METRIC_KEYS = ("return", "volatility", "max_drawdown")
+
+
+# =========================================================================
+# 1. CURVAS DE PERFIL (compartido por el backtester y el artefacto nocturno)
+# =========================================================================
+
+def profile_levels(rf_curve, rv_curve, index) -> dict:
+    """
+    {perfil: Serie base 100 sobre index}. Sólo los perfiles con todas sus patas
+    disponibles (rf_curve / rv_curve a None = pata sin datos locales).
+    """
+    def norm(s):
+        if len(s) == 0:
+            return s
+        s_clean = s.ffill().bfill()
+        return s_clean / s_clean.iloc[0] * 100
+
+    rf_norm = norm(rf_curve.reindex(index)) if rf_curve is not None else None
+    rv_norm = norm(rv_curve.reindex(index)) if rv_curve is not None else None
+
+    profiles = {}
+    for name, w_rf in PROFILE_RF_WEIGHTS.items():
+        if (w_rf > 0 and rf_norm is None) or (w_rf < 1 and rv_norm is None):
+            continue
+        if w_rf == 1.0:
+            profiles[name] = rf_norm
+        elif w_rf == 0.0:
+            profiles[name] = rv_norm
+        else:
+            profiles[name] = rf_norm * w_rf + rv_norm * (1 - w_rf)
+    return profiles
+
+
+# =========================================================================
+# 2. ARTEFACTO NOCTURNO (Storage JSON) Y CARGA
+# =========================================================================
+
+def build_synthetic_benchmarks(curves: dict, sources: dict, period_days: dict, version: str) -> dict:
+    """
+    curves: {BENCHMARK_RF_ISIN / BENCHMARK_RV_ISIN: Serie limpia o None} (ya resueltas a ISIN o proxy).
+    Payload: cada pata una vez (fecha base + offsets, valores completos) y, por periodo,
+    la ventana [start, end] sobre el calendario común de las patas con las métricas de
+    cada perfil (retorno, volatilidad, drawdown) calculadas con el mismo kernel que el backtester.
+    """
+    legs = {k: v.dropna() for k, v in curves.items() if v is not None and v.notna().any()}
+    payload = {"version": version, "legs": {}, "missing": [k for k in curves if k not in legs], "periods": {}}
+    if not legs:
+        return payload
+
+    for isin, series in legs.items():
+        payload["legs"][isin] = {
+            "source": sources.get(isin, isin),
+            **encode_series({"x": d, "y": float(v)} for d, v in series.items()),
+        }
+
+    calendar = pd.DataFrame(legs).dropna().index
+    if calendar.empty:
+        return payload
+    last = calendar[-1]
+    payload["last_date"] = last.strftime("%Y-%m-%d")
+
+    for period, days in period_days.items():
+        window = calendar[calendar >= last - timedelta(days=days)]
+        profiles = profile_levels(legs.get(BENCHMARK_RF_ISIN), legs.get(BENCHMARK_RV_ISIN), window)
+        metrics = calculate_window_metrics(pd.DataFrame(profiles, index=window)) if profiles else {}
+        payload["periods"][period] = {
+            "start": window[0].strftime("%Y-%m-%d"),
+            "end": window[-1].strftime("%Y-%m-%d"),
+            "points": int(len(window)),
+            "metrics": {
+                name: {k: m[k] for k in PROFILE_METRIC_KEYS} for name, m in metrics.items() if m
+            },
+        }
+    return payload
+
+
+def parse_synthetic_benchmarks(raw: dict) -> dict:
+    """Payload JSON -> {"version", "legs": {isin: Serie}, "sources", "missing", "periods"}."""
+    if not raw or not raw.get("legs"):
+        return None
+    legs, sources = {}, {}
+    for isin, leg in raw["legs"].items():
+        index = pd.to_datetime(leg["start"]) + pd.to_timedelta(np.asarray(leg["offsets"], dtype=int), unit="D")
+        legs[isin] = pd.Series(np.asarray(leg["values"], dtype=float), index=index)
+        sources[isin] = leg.get("source", isin)
+    return {
+        "version": raw.get("version"),
+        "legs": legs,
+        "sources": sources,
+        "missing": list(raw.get("missing", [])),
+        "periods": raw.get("periods", {}),
+    }
+
+
+def precomputed_profile_metrics(store, period: str, index) -> dict:
+    """
+    Métricas de perfil del artefacto si la ventana del backtest es exactamente la del
+    artefacto (mismo inicio, fin y nº de puntos); si no, None y se calculan en petición.
+    """
+    if not store or len(index) == 0:
+        return None
+    entry = store["periods"].get(period)
+    if (
+        not entry
+        or entry["points"] != len(index)
+        or entry["start"] != index[0].strftime("%Y-%m-%d")
+        or entry["end"] != index[-1].strftime("%Y-%m-%d")
+    ):
+        return None
+    return entry["metrics"]
@@ -0,0 +1,71 @@
+import logging
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class PipelineTelemetry:
+    """
+    Instrumentación ligera para pipelines por fases (optimizer FASE 1-10, etc.).
+
+    - phase(name): context manager que mide el wall time de cada fase.
+    - count(key, n): contadores de coste (lecturas/escrituras Firestore, bytes Storage...).
+    - record_solver(ef, path): iteraciones y tiempo del solver cvxpy subyacente.
+
+    No tiene dependencias externas y nunca lanza: un fallo de instrumentación
+    no debe romper el cálculo que mide.
+    """
+
+    COUNTER_KEYS = (
+        "firestore_reads",
+        "firestore_writes",
+        "storage_reads",
+        "storage_bytes",
+        "ram_cache_hits",
+    )
+
+    def __init__(self):
+        self._t0 = time.perf_counter()
+        self.phases = []
+        self.counters = {k: 0 for k in self.COUNTER_KEYS}
+        self.solver_runs = []
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            self.phases.append(
+                {"phase": name, "ms": round((time.perf_counter() - start) * 1000.0, 2)}
+            )
+
+    def count(self, key: str, n: int = 1):
+        try:
+            self.counters[key] = self.counters.get(key, 0) + int(n)
+        except Exception:
+            pass
+
+    def record_solver(self, ef, solver_path: str, succeeded: bool = True):
+        """Extrae solver_stats del cp.Problem interno de PyPortfolioOpt (si existe)."""
+        entry = {"solver_path": solver_path, "succeeded": bool(succeeded)}
+        try:
+            opt = getattr(ef, "_opt", None)
+            stats = getattr(opt, "solver_stats", None) if opt is not None else None
+            if stats is not None:
+                entry["solver"] = getattr(stats, "solver_name", None)
+                entry["iterations"] = getattr(stats, "num_iters", None)
+                solve_time = getattr(stats, "solve_time", None)
+                entry["solve_ms"] = round(solve_time * 1000.0, 2) if solve_time is not None else None
+        except Exception as e:
+            logger.debug(f"Telemetry solver stats unavailable: {e}")
+        self.solver_runs.append(entry)
+
+    def to_dict(self) -> dict:
+        return {
+            "total_ms": round((time.perf_counter() - self._t0) * 1000.0, 2),
+            "phases": list(self.phases),
+            "io": dict(self.counters),
+            "solver_runs": list(self.solver_runs),
+        }
@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+from unittest.mock import MagicMock
+
+# Universo sintético compartido por los tests del optimizador: clases de activo en
+# rotación, exposición económica y volatilidad diaria por clase.
+TYPES = ["EQUITY", "FIXED_INCOME", "MONETARY", "MIXED"]
+EXPOSURE = {
+    "EQUITY": {"equity": 100.0},
+    "FIXED_INCOME": {"bond": 100.0},
+    "MONETARY": {"cash": 100.0},
+    "MIXED": {"equity": 50.0, "bond": 50.0},
+}
+DAILY_VOL = {"EQUITY": 0.012, "FIXED_INCOME": 0.004, "MONETARY": 0.0005, "MIXED": 0.007}
+
+
+def synthetic_universe(n_funds, n_days=1400, seed=1, start="2019-01-01"):
+    """n_funds fondos F0..Fn (clase = TYPES[i % 4]) -> (prices {isin: Serie}, metadata)."""
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(start, periods=n_days)
+    prices, metadata = {}, {}
+    for i in range(n_funds):
+        t = TYPES[i % 4]
+        prices[f"F{i}"] = pd.Series(100 * np.cumprod(1 + rng.normal(0.0003, DAILY_VOL[t], n_days)), index=dates)
+        metadata[f"F{i}"] = {
+            "classification_v2": {"asset_type": t, "risk_bucket": "MEDIUM", "is_suitable_low_risk": True},
+            "portfolio_exposure_v2": {"economic_exposure": EXPOSURE[t]},
+        }
+    return prices, metadata
+
+
+def mock_db():
+    """Firestore simulado sin documentos (risk buckets por defecto)."""
+    db = MagicMock()
+    doc = MagicMock()
+    doc.exists = False
+    db.collection().document().get.return_value = doc
+    return db
+
+
+def mock_fetcher(prices, rf_rate=0.02):
+    """DataFetcher simulado que sirve `prices` desde memoria."""
+    fetcher = MagicMock()
+    fetcher.get_price_data.side_effect = lambda assets, **kw: ({a: prices[a] for a in assets if a in prices}, [])
+    fetcher.get_dynamic_risk_free_rate.return_value = rf_rate
+    return fetcher
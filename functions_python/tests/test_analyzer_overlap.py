@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+
+from services.portfolio.analyzer import correlation_overlap
+
+
+def _returns(n_funds=60, n_days=756, seed=2):
+    rng = np.random.default_rng(seed)
+    factors = rng.normal(0, 0.01, (n_days, 3))
+    data = {}
+    for i in range(n_funds):
+        if i < 3:  # cluster A: F0-F2 casi réplicas del factor 0
+            data[f"F{i}"] = factors[:, 0] + rng.normal(0, 0.002, n_days)
+        elif i < 5:  # cluster B: F3-F4 sobre el factor 1
+            data[f"F{i}"] = factors[:, 1] + rng.normal(0, 0.002, n_days)
+        else:
+            data[f"F{i}"] = rng.normal(0, 0.01, n_days)
+    return pd.DataFrame(data, index=pd.bdate_range("2021-01-01", periods=n_days))
+
+
+def test_overlap_matches_nested_loop_and_groups_clusters():
+    rets = _returns()
+    weights = {c: 1 / 60 for c in rets.columns}
+
+    corr, pairs, groups = correlation_overlap(rets, weights)
+
+    ref = rets.corr()
+    expected = [
+        (ref.columns[i], ref.columns[j])
+        for i in range(60) for j in range(i + 1, 60) if ref.iloc[i, j] > 0.8
+    ]
+    assert [(p["asset1"], p["asset2"]) for p in pairs] == expected
+    np.testing.assert_allclose(corr.values, ref.values, atol=1e-12)
+
+    assert [g["assets"] for g in groups] == [["F0", "F1", "F2"], ["F3", "F4"]]
+    assert groups[0]["weight"] == round(3 / 60, 4) and groups[0]["min_correlation"] > 0.8
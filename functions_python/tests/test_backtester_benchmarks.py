@@ -0,0 +1,124 @@
+import numpy as np
+import pandas as pd
+from unittest.mock import MagicMock
+
+from services import backtester
+from services.backtester import _compute_period_metrics
+from services.config import BENCHMARK_PROXIES, BENCHMARK_RF_ISIN, BENCHMARK_RV_ISIN
+from services.quant_core import calculate_historical_metrics
+from services.synthetic_benchmarks import profile_levels
+
+
+def _master(columns, n_days=900, seed=3):
+    rng = np.random.default_rng(seed)
+    idx = pd.bdate_range("2021-01-01", periods=n_days)
+    data = {c: 100 * np.cumprod(1 + rng.normal(0.0003, 0.008, n_days)) for c in columns}
+    return pd.DataFrame(data, index=idx)
+
+
+def _fetcher():
+    fetcher = MagicMock()
+    fetcher.get_dynamic_risk_free_rate.return_value = 0.02
+    return fetcher
+
+
+def test_missing_benchmark_uses_local_proxy():
+    rv_proxy = BENCHMARK_PROXIES[BENCHMARK_RV_ISIN]["doc_id"]
+    df = _master(["F1", "F2", BENCHMARK_RF_ISIN, rv_proxy])
+    res = _compute_period_metrics(df, ["1y"], {"F1": 0.5, "F2": 0.5}, [], _fetcher())["1y"]
+
+    assert "partial" not in res
+    assert list(res["benchmarkSeries"]) == ["conservative", "moderate", "balanced", "dynamic", "aggressive"]
+    expected = df[rv_proxy].loc[res["benchmarkSeries"]["aggressive"][0]["x"]:]
+    assert res["benchmarkSeries"]["aggressive"][-1]["y"] == round(expected.iloc[-1] / expected.iloc[0] * 100, 2)
+
+
+def test_missing_benchmarks_give_partial_response_without_download():
+    assert not hasattr(backtester, "yf")
+    df = _master(["F1", "F2", BENCHMARK_RF_ISIN])
+    res = _compute_period_metrics(df, ["1y", "3y"], {"F1": 0.5, "F2": 0.5}, [], _fetcher())
+
+    for period in ("1y", "3y"):
+        assert res[period]["partial"] is True
+        assert res[period]["missing_benchmarks"] == [BENCHMARK_RV_ISIN]
+        assert list(res[period]["benchmarkSeries"]) == ["conservative"]
+        assert [s["name"] for s in res[period]["synthetics"]] == ["Conservador"]
+        assert any("Partial Benchmarks" in w for w in res[period]["warnings"])
+
+
+def test_rolling_series_in_period_results():
+    df = _master(["F1", "F2", BENCHMARK_RF_ISIN, BENCHMARK_RV_ISIN], n_days=1200)
+    res = _compute_period_metrics(
+        df, ["3y"], {"F1": 0.5, "F2": 0.5}, [], _fetcher(),
+        rolling={"window": 252, "step": 5, "benchmark": "balanced"},
+    )["3y"]
+
+    assert res["rolling"] == {"window": 252, "step": 5, "benchmark": "balanced"}
+    series = res["rollingSeries"]
+    assert {"volatility", "sharpe", "drawdown", "return", "beta", "benchmark_volatility"} <= set(series)
+    assert series["volatility"][-1]["x"] == res["portfolioSeries"][-1]["x"]
+    assert all(p["y"] <= 0 for p in series["drawdown"])
+
+
+def test_nightly_synthetic_benchmarks_match_on_the_fly_profiles():
+    import json
+    from services.backtester import PERIOD_DAYS_MAP, _clean_price_frame, _resolve_benchmark_curves
+    from services.synthetic_benchmarks import build_synthetic_benchmarks, parse_synthetic_benchmarks
+
+    df = _master(["F1", "F2", BENCHMARK_RF_ISIN, BENCHMARK_RV_ISIN], n_days=1200)
+    curves, sources, _ = _resolve_benchmark_curves(_clean_price_frame(df[[BENCHMARK_RF_ISIN, BENCHMARK_RV_ISIN]]))
+    raw = build_synthetic_benchmarks(curves, sources, PERIOD_DAYS_MAP, version="v1")
+    store = parse_synthetic_benchmarks(json.loads(json.dumps(raw)))
+    weights = {"F1": 0.5, "F2": 0.5}
+
+    live = _compute_period_metrics(df, ["1y", "3y"], weights, [], _fetcher())
+    nightly = _compute_period_metrics(df[["F1", "F2"]], ["1y", "3y"], weights, [], _fetcher(), benchmarks=store)
+
+    for period in ("1y", "3y"):
+        assert nightly[period]["benchmarkSeries"] == live[period]["benchmarkSeries"]
+        assert "partial" not in nightly[period]
+        for a, b in zip(nightly[period]["synthetics"], live[period]["synthetics"]):
+            assert a["name"] == b["name"] and -1 <= a["correlation"] <= 1
+            assert abs(a["vol"] - b["vol"]) < 1e-12 and abs(a["ret"] - b["ret"]) < 1e-12
+    assert len(nightly["1y"]["synthetics"]) == 5
+
+
+def test_single_pass_period_metrics_match_per_period_reference():
+    # Inicios escalonados (tramo común más corto que la matriz) y retornos fuera de ±15%
+    df = _master(["F1", "F2", "F3", BENCHMARK_RF_ISIN, BENCHMARK_RV_ISIN], n_days=1500, seed=8)
+    df.iloc[:120, 1] = np.nan
+    df.iloc[:300, 2] = np.nan
+    df.iloc[1100:, 0] *= 1.3
+    df.iloc[1300:, 2] *= 0.75
+    weights = {"F1": 0.5, "F2": 0.3, "F3": 0.2}
+    periods = ["1y", "3y", "5y", "max"]
+
+    res = _compute_period_metrics(df, periods, weights, [], _fetcher())
+
+    funds = list(weights)
+    w = np.array([weights[f] for f in funds])
+    common = df.dropna(subset=funds)
+    all_returns = common[funds].pct_change().dropna().clip(-0.15, 0.15)
+    assert (common[funds].pct_change().abs() > 0.15).any().any()
+    for period in periods:
+        cutoff = common.index[-1] - pd.Timedelta(days=backtester.PERIOD_DAYS_MAP[period])
+        window = common[common.index >= cutoff]
+        returns = all_returns[all_returns.index > window.index[0]]
+        port_ret = returns @ w
+        out = res[period]
+
+        corr = returns.corr().values
+        assert np.all(np.abs(np.array(out["correlationMatrix"]) - corr) <= 0.005 + 1e-9)
+
+        ref = calculate_historical_metrics((1 + port_ret).cumprod() * 100, risk_free_annual=0.02)
+        for key, ref_key in (("cagr", "return"), ("volatility", "volatility"), ("sharpe", "sharpe"), ("maxDrawdown", "max_drawdown")):
+            assert abs(out["metrics"][key] - ref[ref_key]) < 1e-10
+
+        profiles = profile_levels(window[BENCHMARK_RF_ISIN], window[BENCHMARK_RV_ISIN], window.index)
+        assert len(out["synthetics"]) == len(profiles)
+        for synth, series in zip(out["synthetics"], profiles.values()):
+            ref = calculate_historical_metrics(series, risk_free_annual=0.02)
+            assert abs(synth["vol"] - ref["volatility"]) < 1e-10
+            assert abs(synth["ret"] - ref["return"]) < 1e-10
+            expected = port_ret.corr(series.pct_change().reindex(port_ret.index))
+            assert synth["correlation"] == round(float(expected), 4)
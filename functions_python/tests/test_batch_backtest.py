@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+from unittest.mock import MagicMock
+
+from services.backtester import _batch_period_metrics, _compute_period_metrics
+
+
+def test_batch_matches_single_portfolio_backtests():
+    rng = np.random.default_rng(11)
+    idx = pd.bdate_range("2017-01-01", periods=1600)
+    funds = [f"F{i}" for i in range(8)]
+    df = pd.DataFrame({f: 100 * np.cumprod(1 + rng.normal(0.0003, 0.01, len(idx))) for f in funds}, index=idx)
+    df.iloc[:700, 0] = np.nan  # F0 empieza tarde: su cartera no cubre 5y
+    # Huecos internos > 5 días (el ffill acotado deja filas sin dato) con salto al reanudar
+    df.iloc[910:, 2] *= 1.08
+    df.iloc[900:910, 2] = np.nan
+    df.iloc[1450:1460, 5] = np.nan
+
+    fetcher = MagicMock()
+    fetcher.get_dynamic_risk_free_rate.return_value = 0.02
+    weight_maps = [{"F0": 0.5, "F1": 0.5}, {"F2": 0.2, "F3": 0.3, "F4": 0.5}, {"F5": 1.0, "NOPE": 0.3}]
+    periods = ["1y", "3y", "5y"]
+
+    batch = _batch_period_metrics(df, weight_maps, periods, 0.02)
+
+    assert batch[2]["missingISINs"] == ["NOPE"] and batch[2]["effectiveISINs"] == ["F5"]
+    assert "error" in batch[0]["5y"] and "error" not in batch[0]["1y"]
+    clean = df.ffill(limit=5)  # df_master de _fetch_and_process_data
+    for wm, res in zip(weight_maps, batch):
+        single = _compute_period_metrics(clean, periods, wm, [], fetcher)
+        for p in periods:
+            if "error" in single[p]:
+                assert "error" in res[p]
+                continue
+            for key in ("cagr", "volatility", "sharpe", "maxDrawdown"):
+                assert abs(res[p]["metrics"][key] - single[p]["metrics"][key]) < 1e-10
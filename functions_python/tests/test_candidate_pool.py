@@ -0,0 +1,133 @@
+import json
+
+import numpy as np
+import pandas as pd
+from unittest.mock import MagicMock, patch
+
+from services.portfolio.candidate_pool import (
+    build_candidate_pool,
+    extend_moments_with_pool,
+    parse_candidate_pool,
+)
+from services.portfolio.optimizer_core import _new_objective_optimizer, run_optimization
+from services.quant_core import get_covariance_matrix, get_expected_returns
+
+DATES = pd.bdate_range("2019-01-01", periods=1400)
+
+
+def _prices(names, vol, seed):
+    rng = np.random.default_rng(seed)
+    rets = rng.normal(0.0004, vol, size=(len(DATES), len(names)))
+    return pd.DataFrame(100 * np.cumprod(1 + rets, axis=0), index=DATES, columns=names)
+
+
+def _pool(names=("EQ1", "EQ2", "EQ3"), seed=11):
+    prices = _prices(list(names), 0.012, seed)
+    prices.loc[: DATES[900], "EQ3"] = np.nan  # < 756 obs en la ventana de 5 años
+    meta = {n: {"metrics": {"sharpe": i}, "portfolio_exposure_v2": {"economic_exposure": {"equity": 100.0}}}
+            for i, n in enumerate(names)}
+    raw = build_candidate_pool(prices, meta, version="20260101T000000")
+    return parse_candidate_pool(json.loads(json.dumps(raw)))
+
+
+def test_pool_is_validated_aligned_and_roundtrips():
+    pool = _pool()
+
+    assert pool["isins"] == ["EQ2", "EQ1"]  # EQ3 descartado; empate de historia -> Sharpe
+    assert pool["prices"].notna().all().all()
+    assert pool["start"] >= (DATES[-1] - pd.Timedelta(days=365 * 5)).strftime("%Y-%m-%d")
+    assert "cov" not in pool
+    np.testing.assert_allclose(pool["mu"].values, get_expected_returns(pool["prices"], method="mean").values, atol=1e-6)
+
+
+def test_extend_moments_appends_rows_and_columns():
+    pool = _pool()
+    base = _prices(["B1", "B2"], 0.004, seed=5).loc[pool["prices"].index]
+    mu, S = get_expected_returns(base, method="mean"), get_covariance_matrix(base)
+
+    added, df_ext, mu_ext, S_ext = extend_moments_with_pool(base, mu, S, pool, exclude={"EQ1"})
+
+    assert added == ["EQ2"]
+    assert list(S_ext.index) == ["B1", "B2", "EQ2"] == list(mu_ext.index)
+    # Σ: un único Ledoit-Wolf sobre la matriz conjunta (mismo estimador que la vía lenta);
+    # μ del candidato viene precalculada en el pool
+    np.testing.assert_allclose(S_ext.values, get_covariance_matrix(df_ext).values, atol=1e-10)
+    assert abs(mu_ext["EQ2"] - pool["mu"]["EQ2"]) < 1e-12
+    assert (mu_ext[["B1", "B2"]] == mu).all()
+    assert np.all(np.linalg.eigvalsh(S_ext.values) >= -1e-10)
+    assert "EQ2" in df_ext.columns
+
+
+def test_auto_expand_uses_pool_without_refetching():
+    pool = _pool()
+    bonds = _prices(["B1", "B2", "B3"], 0.003, seed=2)
+    metadata = {
+        b: {
+            "classification_v2": {"asset_type": "FIXED_INCOME", "risk_bucket": "LOW", "is_suitable_low_risk": True},
+            "portfolio_exposure_v2": {"economic_exposure": {"bond": 100.0}},
+        }
+        for b in bonds.columns
+    }
+    fetcher = MagicMock()
+    fetcher.get_price_data.side_effect = lambda assets, **kw: ({a: bonds[a] for a in assets if a in bonds}, [])
+    fetcher.get_dynamic_risk_free_rate.return_value = 0.0
+    fetcher.get_auto_expand_pool.return_value = pool
+
+    with patch("services.portfolio.optimizer_core.DataFetcher", return_value=fetcher):
+        res = run_optimization(
+            list(bonds.columns), 5, MagicMock(),
+            constraints={"equity_floor": 0.3, "auto_expand_universe": True, "max_weight": 0.5},
+            asset_metadata=metadata,
+        )
+
+    assert set(res["added_assets"]) == {"EQ1", "EQ2"}
+    assert fetcher.get_price_data.call_count == 1
+    assert set(res["used_assets"]) >= {"EQ1", "EQ2"}
+
+
+def test_pool_and_download_paths_estimate_the_same_moments():
+    equities = _prices(["EQ1", "EQ2"], 0.012, seed=11)
+    bonds = _prices(["B1", "B2", "B3"], 0.003, seed=2)
+    prices = pd.concat([bonds, equities], axis=1)
+    eq_meta = {"metrics": {}, "portfolio_exposure_v2": {"economic_exposure": {"equity": 100.0}}}
+    metadata = {
+        b: {
+            "classification_v2": {"asset_type": "FIXED_INCOME", "risk_bucket": "LOW", "is_suitable_low_risk": True},
+            "portfolio_exposure_v2": {"economic_exposure": {"bond": 100.0}},
+        }
+        for b in bonds.columns
+    }
+    raw = build_candidate_pool(equities, {c: eq_meta for c in equities.columns}, version="20260101T000000")
+    pool = parse_candidate_pool(json.loads(json.dumps(raw)))
+
+    def _moments(pool_value):
+        fetcher = MagicMock()
+        fetcher.get_price_data.side_effect = lambda assets, **kw: ({a: prices[a] for a in assets if a in prices}, [])
+        fetcher.get_dynamic_risk_free_rate.return_value = 0.0
+        fetcher.get_auto_expand_pool.return_value = pool_value
+        seen = []
+
+        def _record(kind, mu, S, *args, **kwargs):
+            seen.append((mu, S))
+            return _new_objective_optimizer(kind, mu, S, *args, **kwargs)
+
+        with patch("services.portfolio.optimizer_core.DataFetcher", return_value=fetcher), \
+                patch("services.portfolio.optimizer_core._new_objective_optimizer", side_effect=_record):
+            res = run_optimization(
+                list(bonds.columns), 5, MagicMock(),
+                constraints={"equity_floor": 0.3, "auto_expand_universe": True, "max_weight": 0.5},
+                asset_metadata=metadata,
+                candidate_funds={c: eq_meta for c in equities.columns},
+            )
+        assert set(res["added_assets"]) == {"EQ1", "EQ2"}
+        mu, S = next(m for m in seen if "EQ1" in m[0].index)
+        names = sorted(mu.index)
+        return mu[names], S.loc[names, names]
+
+    mu_pool, S_pool = _moments(pool)
+    mu_dl, S_dl = _moments(None)
+
+    # Mismo estimador (media histórica + Ledoit-Wolf) y misma ventana en ambas vías;
+    # la tolerancia sólo cubre el redondeo de precios del payload del pool
+    np.testing.assert_allclose(mu_pool.values, mu_dl.values, rtol=1e-5, atol=1e-8)
+    np.testing.assert_allclose(S_pool.values, S_dl.values, rtol=1e-5, atol=1e-8)
@@ -0,0 +1,68 @@
+import pytest
+from unittest.mock import patch
+
+from conftest import mock_db, mock_fetcher, synthetic_universe
+from services.portfolio.optimizer_core import run_optimization
+
+N_FUNDS = 20
+
+
+@pytest.fixture
+def dummy_db():
+    return mock_db()  # sin documentos: risk buckets por defecto
+
+
+@pytest.fixture
+def universe():
+    """20 fondos sintéticos con 5.5 años de historia (supera el mínimo de 756 obs)."""
+    return synthetic_universe(N_FUNDS)
+
+
+def _run(universe, dummy_db, constraints, locked_assets=None):
+    prices, metadata = universe
+    with patch("services.portfolio.optimizer_core.DataFetcher", return_value=mock_fetcher(prices)):
+        return run_optimization(
+            assets_list=list(prices),
+            risk_level=5,
+            db=dummy_db,
+            constraints=constraints,
+            asset_metadata=metadata,
+            locked_assets=locked_assets,
+        )
+
+
+def test_max_assets_and_min_position_respected(universe, dummy_db):
+    res = _run(universe, dummy_db, {"max_assets": 6, "min_position": 0.05})
+
+    assert res["status"] == "optimal"
+    held = {k: v for k, v in res["weights"].items() if v > 0}
+    assert 0 < len(held) <= 6
+    assert all(v >= 0.05 - 1e-4 for v in held.values())
+    assert abs(sum(res["weights"].values()) - 1.0) < 1e-6
+
+    card = res["explainability"]["cardinality"]
+    assert card["satisfied"] is True
+    assert card["final_support"] == len(held)
+
+    # Las bandas del perfil siguen cumpliéndose tras la reducción de soporte
+    rv_min, rv_max = res["explainability"]["profile_limits"]["RV"]
+    assert rv_min - 1e-4 <= res["portfolio_allocation"]["RV"] <= rv_max + 1e-4
+
+
+def test_cardinality_keeps_locked_assets(universe, dummy_db):
+    res = _run(universe, dummy_db, {"max_assets": 6}, locked_assets=["F2"])
+
+    held = {k for k, v in res["weights"].items() if v > 0}
+    assert "F2" in held
+    assert len(held) <= 6
+    assert "F2" not in res["explainability"]["cardinality"]["dropped"]
+
+
+def test_infeasible_cardinality_keeps_last_feasible_solution(universe, dummy_db):
+    """4 fondos con tope del 20% no suman 100%: se avisa y se conserva una cartera válida."""
+    res = _run(universe, dummy_db, {"max_assets": 4})
+
+    assert res["status"] == "optimal"
+    assert res["explainability"]["cardinality"]["satisfied"] is False
+    assert any("max_assets=4" in w for w in res["warnings"])
+    assert all(v <= 0.20 + 1e-4 for v in res["weights"].values())
@@ -0,0 +1,68 @@
+import json
+from unittest.mock import MagicMock
+
+import pytest
+
+from services.backtester import _calculate_allocations
+from services.exposure_index import (
+    allocation_breakdown,
+    build_exposure_index,
+    fund_exposure,
+    parse_exposure_index,
+    portfolio_lookthrough,
+)
+
+FUNDS = {
+    "EQ1": {
+        "name": "Global Equity",
+        "categoryId": "CAT_EQ",
+        "std_perf": {"sharpe": 0.9},
+        "classification_v2": {"asset_type": "EQUITY"},
+        "portfolio_exposure_v2": {
+            "economic_exposure": {"equity": 100.0},
+            "equity_regions": {"us": 0.6, "europe": 0.4},  # V2 en fracciones
+            "sectors": {"technology": 30.0, "healthcare": 20.0},  # en %
+        },
+        "holdings": [{"isin": "AAPL", "name": "Apple", "weight": 6.0}, {"isin": "MSFT", "name": "Microsoft", "weight": 4.0}],
+    },
+    "BD1": {
+        "name": "Euro Bonds",
+        "classification_v2": {"asset_type": "FIXED_INCOME", "region_primary": "EUROPE"},
+        "portfolio_exposure_v2": {"economic_exposure": {"bond": 90.0, "cash": 10.0}},
+    },
+}
+
+
+def _index():
+    return parse_exposure_index(json.loads(json.dumps(build_exposure_index(FUNDS.items(), version="v1"))))
+
+
+def test_lookthrough_is_weighted_sum_of_fund_vectors():
+    index = _index()
+    extra = {"MIX": fund_exposure({"holdings": [{"isin": "AAPL", "name": "Apple", "weight": 50.0}]})}
+    look = portfolio_lookthrough(index, {"EQ1": 0.5, "BD1": 0.3, "MIX": 0.1, "GHOST": 0.1}, extra)
+    out = allocation_breakdown(look)
+
+    assert look["covered"] == ["EQ1", "BD1"] and look["missing"] == ["MIX", "GHOST"]
+    assert look["region"] == pytest.approx({"us": 0.3, "europe": 0.5})
+    assert look["asset_class"] == pytest.approx({"equity": 0.5, "bond": 0.27, "cash": 0.03})
+    assert look["sector"] == pytest.approx({"technology": 0.15, "healthcare": 0.10})
+
+    holdings = {h["isin"]: h["weight"] for h in out["topHoldings"]}
+    assert holdings["AAPL"] == pytest.approx(0.5 * 6.0 + 0.1 * 50.0)
+    assert holdings["OTHERS"] == pytest.approx(0.5 * 90.0 + 30.0 + 0.1 * 50.0 + 10.0)
+    assert {"name": "Europa", "value": 50.0} in out["regionAllocation"]
+    assert {"name": "Desconocido / Otros", "value": 20.0} in out["regionAllocation"]
+
+
+def test_backtest_allocations_skip_fund_reads_when_indexed():
+    db = MagicMock()
+    fetcher = MagicMock()
+    fetcher.get_exposure_index.return_value = _index()
+    portfolio = [{"isin": "EQ1", "weight": 70}, {"isin": "BD1", "weight": 30}]
+
+    alloc = _calculate_allocations(portfolio, db, {}, fetcher)
+
+    db.get_all.assert_not_called()
+    assert alloc["topHoldings"][0] == {"isin": "OTHERS", "name": "Otras/No Disponible", "weight": pytest.approx(93.0)}
+    assert alloc["regionAllocation"][0] == {"name": "Europa", "value": 58.0}
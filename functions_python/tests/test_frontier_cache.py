@@ -0,0 +1,73 @@
+import pandas as pd
+from unittest.mock import patch
+
+from conftest import mock_db, mock_fetcher, synthetic_universe
+from services.portfolio import frontier_engine
+from services.portfolio.frontier_engine import (
+    OPTIMIZER_FRONTIER_PERIOD,
+    frontier_cache_key,
+    generate_efficient_frontier,
+    generate_multi_period_frontier,
+)
+from services.portfolio.optimizer_core import run_optimization
+
+
+def _prices(n_funds=8, n_days=1400, seed=2):
+    return synthetic_universe(n_funds, n_days, seed=seed)
+
+
+def test_frontier_endpoint_reuses_optimizer_artifact():
+    frontier_engine._frontier_cache.clear()
+    prices, metadata = _prices()
+    db, fetcher = mock_db(), mock_fetcher(prices)
+
+    with patch("services.portfolio.optimizer_core.DataFetcher", return_value=fetcher):
+        opt = run_optimization(list(prices), 5, db, constraints={}, asset_metadata=metadata)
+    assert opt["frontier"]
+
+    # Orden distinto en la petición y ventana del optimizador: mismo universo y ventana -> misma entrada
+    assets = list(reversed(list(prices)))
+    with patch("services.portfolio.frontier_engine.DataFetcher", return_value=fetcher):
+        ef = generate_efficient_frontier(
+            assets, db, portfolio_weights=opt["weights"], period=OPTIMIZER_FRONTIER_PERIOD
+        )
+
+    assert ef["status"] == "success"
+    assert ef["cache"]["hit"] is True
+    assert ef["frontier"] == opt["frontier"]
+    assert ef["math_data"]["ordered_isins"] == assets
+    assert [p["label"] for p in ef["assets"]] == assets
+    assert ef["portfolio"] is not None
+
+
+def test_frontier_cache_key_tracks_universe_window_and_prices():
+    prices, _ = _prices(4, 300)
+    df = pd.DataFrame(prices)
+
+    base = frontier_cache_key(df, "v1")
+    assert frontier_cache_key(df[list(reversed(df.columns))], "v1") == base
+    assert frontier_cache_key(df, "v2") != base
+    assert frontier_cache_key(df.iloc[1:], "v1") != base
+
+    bumped = df.copy()
+    bumped.iloc[-1, 0] *= 1.01
+    assert frontier_cache_key(bumped, "v1") != base
+
+
+def test_multi_period_frontier_fetches_once_and_matches_single_period():
+    frontier_engine._frontier_cache.clear()
+    prices, _ = _prices(6, 1400, seed=5)
+    db, fetcher = mock_db(), mock_fetcher(prices)
+    weights = {a: 1.0 / len(prices) for a in prices}
+
+    with patch("services.portfolio.frontier_engine.DataFetcher", return_value=fetcher):
+        multi = generate_multi_period_frontier(list(prices), db, weights, periods=["1y", "3y", "5y"])
+        assert fetcher.get_price_data.call_count == 1
+        single = generate_efficient_frontier(list(prices), db, weights, period="3y")
+
+    assert multi["status"] == "success" and list(multi["periods"]) == ["1y", "3y", "5y"]
+    obs = [multi["periods"][p]["observations"] for p in ("1y", "3y", "5y")]
+    assert obs == sorted(obs) and len(set(obs)) == 3
+    block = multi["periods"]["3y"]
+    assert single["cache"]["hit"] is True
+    assert block["frontier"] == single["frontier"] and block["portfolio"] == single["portfolio"]
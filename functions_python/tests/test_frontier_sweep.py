@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+from pypfopt import EfficientFrontier
+
+from services.portfolio.frontier_engine import parametric_frontier_sweep
+from services.quant_core import get_covariance_matrix, get_expected_returns
+
+
+def _moments(n_assets=12, n_days=800, seed=0):
+    rng = np.random.default_rng(seed)
+    rets = rng.normal(0.0003, 0.01, (n_days, n_assets)) * np.linspace(0.3, 1.5, n_assets)
+    df = pd.DataFrame(
+        100 * np.cumprod(1 + rets, axis=0),
+        index=pd.bdate_range("2020-01-01", periods=n_days),
+        columns=[f"A{i}" for i in range(n_assets)],
+    )
+    return get_expected_returns(df, method="mean"), get_covariance_matrix(df)
+
+
+def test_sweep_matches_point_solves_with_single_cold_solve():
+    mu, S = _moments()
+    points, stats = parametric_frontier_sweep(mu, S, points=20, initial_points=5)
+
+    assert len(points) == 20
+    assert stats["cold_solves"] == 1 and stats["failed"] == 0
+
+    gmv = EfficientFrontier(mu, S)
+    gmv.min_volatility()
+    assert abs(points[0]["x"] - gmv.portfolio_performance()[1]) < 1e-4
+
+    ys = [p["y"] for p in points]
+    xs = [p["x"] for p in points]
+    assert ys == sorted(ys) and all(b >= a - 1e-6 for a, b in zip(xs, xs[1:]))
+
+    for p in points[1:-1:4]:
+        ef = EfficientFrontier(mu, S)
+        ef.efficient_return(p["y"])
+        assert abs(ef.portfolio_performance()[1] - p["x"]) < 1e-4
@@ -0,0 +1,65 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+from services.payload_codec import apply_response_format, decode_matrix, decode_series
+
+
+def _series(n=300, seed=0):
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range("2016-01-01", periods=n)
+    values = 100 * np.cumprod(1 + rng.normal(0.0003, 0.01, n))
+    return [{"x": d.strftime("%Y-%m-%d"), "y": round(float(v), 2)} for d, v in zip(dates, values)]
+
+
+def test_compact_round_trip_and_size():
+    rng = np.random.default_rng(1)
+    a = rng.normal(size=(40, 40))
+    cov = (a @ a.T / 40).tolist()
+    corr = np.round(np.corrcoef(rng.normal(size=(40, 200))), 2).tolist()
+    result = {
+        "status": "success",
+        "math_data": {"ordered_isins": [f"F{i}" for i in range(40)], "covariance_matrix": cov},
+        "3y": {
+            "portfolioSeries": _series(),
+            "benchmarkSeries": {"balanced": _series(seed=2), "empty": []},
+            "correlationMatrix": corr,
+        },
+    }
+
+    compact = apply_response_format(result, "compact")
+    assert compact["payload_format"] == "compact"
+    assert len(json.dumps(compact)) < len(json.dumps(result)) / 2
+
+    np.testing.assert_allclose(decode_matrix(compact["math_data"]["covariance_matrix"]), cov, rtol=1e-6, atol=1e-7)
+    np.testing.assert_allclose(decode_matrix(compact["3y"]["correlationMatrix"]), corr, atol=1e-6)
+    assert decode_series(compact["3y"]["portfolioSeries"]) == result["3y"]["portfolioSeries"]
+    assert decode_series(compact["3y"]["benchmarkSeries"]["balanced"]) == result["3y"]["benchmarkSeries"]["balanced"]
+    assert decode_series(compact["3y"]["benchmarkSeries"]["empty"]) == []
+
+    # Opt-in: formato estándar y errores intactos
+    assert apply_response_format(result, None) is result
+    err = {"status": "error", "message": "x", "math_data": {"covariance_matrix": [[1.0]]}}
+    assert apply_response_format(err, "compact") is err
+
+
+def test_lttb_max_points_keeps_extremes_and_metrics():
+    points = _series(5000, seed=3)
+    points[2500]["y"] = 400.0  # pico aislado
+    points[3700]["y"] = 20.0   # valle aislado
+    result = {
+        "5y": {"portfolioSeries": points, "benchmarkSeries": {"balanced": _series(40)}, "metrics": {"cagr": 0.05}},
+    }
+
+    out = apply_response_format(result, None, max_points=300)
+    ds = out["5y"]["portfolioSeries"]
+    assert len(ds) == 300
+    assert ds[0] == points[0] and ds[-1] == points[-1]
+    assert {"x": points[2500]["x"], "y": 400.0} in ds and {"x": points[3700]["x"], "y": 20.0} in ds
+    assert [p["x"] for p in ds] == sorted(p["x"] for p in ds)
+    assert out["5y"]["benchmarkSeries"]["balanced"] == result["5y"]["benchmarkSeries"]["balanced"]
+    assert out["5y"]["metrics"] == result["5y"]["metrics"]
+
+    compact = apply_response_format(result, "compact", max_points=300)
+    assert decode_series(compact["5y"]["portfolioSeries"]) == ds
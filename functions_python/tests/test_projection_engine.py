@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+from unittest.mock import MagicMock
+
+from services.projection_engine import block_bootstrap_paths, run_projection
+
+
+def test_block_bootstrap_draws_consecutive_historical_blocks():
+    history = np.arange(50, dtype=float)
+    paths = block_bootstrap_paths(history, 30, 200, 6, np.random.default_rng(0))
+
+    assert paths.shape == (200, 30)
+    # Dentro de cada bloque los meses son consecutivos (circulares) en la historia
+    blocks = paths.reshape(200, 5, 6)
+    assert np.all(np.diff(blocks, axis=2) % 50 == 1)
+
+
+def test_projection_is_reproducible_with_ordered_bands():
+    rng = np.random.default_rng(4)
+    idx = pd.bdate_range("2015-01-01", periods=2000)
+    px = pd.DataFrame(
+        {c: 100 * np.cumprod(1 + rng.normal(0.0003, 0.009, len(idx))) for c in ("F1", "F2")}, index=idx
+    )
+    fetcher = MagicMock()
+    fetcher.get_price_data.return_value = (px, [])
+    portfolio = [{"isin": "F1", "weight": 60}, {"isin": "F2", "weight": 40}, {"isin": "GHOST", "weight": 0}]
+
+    res = run_projection(portfolio, None, horizon_years=10, n_paths=2000, seed=7, fetcher=fetcher)
+    again = run_projection(portfolio, None, horizon_years=10, n_paths=2000, seed=7, fetcher=fetcher)
+
+    assert res["status"] == "ok" and res["percentileSeries"] == again["percentileSeries"]
+    bands = res["percentileSeries"]
+    assert len(bands["p50"]) == 121 and bands["p50"][0] == {"x": "2022-08-31", "y": 100.0}
+    assert all(a["y"] <= b["y"] for a, b in zip(bands["p5"], bands["p95"]))
+    assert res["final"]["p50"] == bands["p50"][-1]["y"]
+    assert res["missingISINs"] == ["GHOST"] and 0 <= res["probability_of_loss"] <= 1
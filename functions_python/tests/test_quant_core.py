@@ -1,7 +1,7 @@
 import pytest
 import pandas as pd
 import numpy as np
-from services.quant_core import get_expected_returns, get_covariance_matrix, calculate_historical_metrics
+from services.quant_core import get_expected_returns, get_covariance_matrix, calculate_historical_metrics, calculate_window_metrics, calculate_rolling_metrics
 
 @pytest.fixture
 def dummy_prices():
@@ -56,3 +56,49 @@ def test_calculate_historical_metrics(dummy_prices):
     metrics_arith = calculate_historical_metrics(series_a, method="arithmetic")
     assert metrics_arith is not None
     assert metrics["return"] != metrics_arith["return"]  # Should differ usually
+
+def test_calculate_window_metrics_matches_scalar_path(dummy_prices):
+    """Kernel vectorizado == calculate_historical_metrics por columna (ventanas por NaN iniciales)."""
+    levels = pd.DataFrame({
+        "A_full": dummy_prices["A"],
+        "A_last60": dummy_prices["A"].where(dummy_prices.index >= dummy_prices.index[40]),
+        "B_last3": dummy_prices["B"].where(dummy_prices.index >= dummy_prices.index[97]),
+    })
+    out = calculate_window_metrics(levels, risk_free_annual=0.02)
+
+    assert out["B_last3"] is None  # < 5 puntos, igual que la ruta escalar
+    for col in ("A_full", "A_last60"):
+        ref = calculate_historical_metrics(levels[col], risk_free_annual=0.02)
+        for key, value in ref.items():
+            assert out[col][key] == pytest.approx(value, rel=1e-10, abs=1e-12)
+
+
+def test_calculate_rolling_metrics_matches_per_window_path():
+    """O(T) rolling kernel == scalar metrics recomputed on each window (10y x 50 funds)."""
+    rng = np.random.default_rng(0)
+    idx = pd.bdate_range("2015-01-01", periods=2520)
+    levels = pd.DataFrame(100 * np.cumprod(1 + rng.normal(0.0003, 0.01, (2520, 50)), axis=0), index=idx)
+    levels.iloc[:300, 3] = np.nan
+    bmk = pd.Series(100 * np.cumprod(1 + rng.normal(0.0003, 0.008, 2520)), index=idx)
+
+    out = calculate_rolling_metrics(levels, window=252, step=1, benchmark=bmk, risk_free_annual=0.02)
+
+    assert out["volatility"].shape == (2520 - 252, 50)
+    assert out["volatility"][3].loc[:idx[551]].isna().all() and out["volatility"][3].loc[idx[552]:].notna().all()
+    for end in (700, 2519):
+        seg = levels[0].iloc[end - 252:end + 1]
+        m = calculate_historical_metrics(seg, risk_free_annual=0.02, method="geometric")
+        r, rb = seg.pct_change().dropna(), bmk.iloc[end - 252:end + 1].pct_change().dropna()
+        row = idx[end]
+        assert out["volatility"].loc[row, 0] == pytest.approx(m["volatility"], rel=1e-10)
+        assert out["return"].loc[row, 0] == pytest.approx(m["return"], rel=1e-10)
+        assert out["sharpe"].loc[row, 0] == pytest.approx(m["sharpe"], rel=1e-10)
+        assert out["drawdown"].loc[row, 0] == pytest.approx(seg.iloc[-1] / seg.max() - 1)
+        assert out["beta"].loc[row, 0] == pytest.approx(np.cov(r, rb)[0, 1] / np.var(rb, ddof=1), rel=1e-10)
+
+    # step: ventanas ancladas en la última fila
+    stepped = calculate_rolling_metrics(levels, window=252, step=21)
+    assert stepped["dates"][-1] == idx[-1]
+    np.testing.assert_allclose(
+        stepped["volatility"].to_numpy(), out["volatility"].loc[stepped["dates"]].to_numpy(), rtol=1e-12
+    )
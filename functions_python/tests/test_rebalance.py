@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+from unittest.mock import MagicMock, patch
+from pypfopt import EfficientFrontier
+
+from services.portfolio.optimizer_core import (
+    _apply_rebalance_controls,
+    _build_rebalance_context,
+    run_optimization,
+)
+from services.quant_core import get_covariance_matrix, get_expected_returns
+
+
+def _prices(n_assets=6, n_days=1400, seed=3):
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range("2019-01-01", periods=n_days)
+    vols = np.linspace(0.003, 0.012, n_assets)
+    rets = rng.normal(0.0004, vols, size=(n_days, n_assets))
+    return pd.DataFrame(100 * np.cumprod(1 + rets, axis=0), index=dates, columns=[f"F{i}" for i in range(n_assets)])
+
+
+def _metadata(columns):
+    return {
+        t: {
+            "classification_v2": {"asset_type": "MIXED", "risk_bucket": "MEDIUM", "is_suitable_low_risk": True},
+            "portfolio_exposure_v2": {"economic_exposure": {"equity": 50.0, "bond": 50.0}},
+        }
+        for t in columns
+    }
+
+
+def test_rebalance_context_requires_current_weights():
+    universe = ["A", "B", "C"]
+    ctx = _build_rebalance_context({"current_weights": {"A": 0.5, "B": 0.5}, "turnover_cap": 0.1}, universe)
+    assert ctx["w0"].tolist() == [0.5, 0.5, 0.0]
+    assert ctx["turnover_cap"] == 0.1
+
+    # target_weights es el objetivo de min_deviation, no la cartera actual
+    assert _build_rebalance_context({"objective": "min_deviation", "target_weights": {"C": 1.0}}, universe) is None
+    assert _build_rebalance_context({}, universe) is None
+
+
+def test_turnover_penalty_reduces_turnover():
+    df = _prices()
+    mu, S = get_expected_returns(df, method="mean"), get_covariance_matrix(df)
+    w0 = np.full(len(mu), 1.0 / len(mu))
+
+    turnovers = []
+    for penalty in (0.0, 0.01):
+        ef = EfficientFrontier(mu, S, weight_bounds=(0.0, 0.5))
+        _apply_rebalance_controls(ef, {"w0": w0, "turnover_penalty": penalty, "turnover_cap": None}, kind="min_volatility")
+        w = np.array(list(ef.min_volatility().values()))
+        turnovers.append(np.abs(w - w0).sum())
+
+    assert turnovers[1] < turnovers[0] - 0.05
+
+
+def test_turnover_cap_survives_max_sharpe_transform():
+    """La rotación linealizada se homogeneiza correctamente en max_sharpe (w -> w/k)."""
+    df = _prices()
+    mu, S = get_expected_returns(df, method="mean"), get_covariance_matrix(df)
+    w0 = np.full(len(mu), 1.0 / len(mu))
+
+    ef = EfficientFrontier(mu, S, weight_bounds=(0.0, 0.5))
+    _apply_rebalance_controls(ef, {"w0": w0, "turnover_penalty": 0.0, "turnover_cap": 0.10})
+    w = np.array(list(ef.max_sharpe(risk_free_rate=0.0).values()))
+
+    assert abs(w.sum() - 1.0) < 1e-6
+    assert np.abs(w - w0).sum() <= 0.10 + 1e-4
+
+
+def test_run_optimization_reports_turnover():
+    df = _prices()
+    metadata = _metadata(df.columns)
+    fetcher = MagicMock()
+    fetcher.get_price_data.side_effect = lambda assets, **kw: ({a: df[a] for a in assets}, [])
+    fetcher.get_dynamic_risk_free_rate.return_value = 0.0
+    current = {t: 1.0 / len(df.columns) for t in df.columns}
+
+    with patch("services.portfolio.optimizer_core.DataFetcher", return_value=fetcher):
+        res = run_optimization(
+            list(df.columns), 5, MagicMock(),
+            constraints={"apply_profile": False, "objective": "max_sharpe", "max_weight": 0.5,
+                         "current_weights": current, "turnover_cap": 0.15},
+            asset_metadata=metadata,
+        )
+
+    reb = res["explainability"]["rebalance"]
+    assert res["solver_path"] == "max_sharpe_custom"
+    assert reb["turnover_cap_enforced"] is True
+    assert reb["turnover"] <= 0.15 + 0.02  # tolerancia del cutoff de limpieza
+
+
+def test_turnover_penalty_rejected_for_max_sharpe():
+    """max_sharpe homogeneiza w -> k·w: la penalización no tendría unidades de rotación."""
+    df = _prices()
+    current = {t: 1.0 / len(df.columns) for t in df.columns}
+    res = run_optimization(
+        list(df.columns), 5, MagicMock(),
+        constraints={"apply_profile": False, "objective": "max_sharpe", "current_weights": current, "turnover_penalty": 0.01},
+        asset_metadata=_metadata(df.columns),
+    )
+    assert res["status"] == "error"
+    assert "turnover_penalty" in res["message"]
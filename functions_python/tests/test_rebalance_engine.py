@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+
+from services.rebalance_engine import rebalance_rows, simulate_rebalanced_portfolio
+
+
+def _returns(n_days=700, seed=0):
+    rng = np.random.default_rng(seed)
+    idx = pd.bdate_range("2019-01-01", periods=n_days)
+    return pd.DataFrame(rng.normal(0.0004, 0.01, (n_days, 4)) * [0.5, 1.0, 1.5, 2.0], index=idx)
+
+
+def _naive(returns, w, rows, cost=0.0):
+    """Referencia día a día: deriva de tenencias y vuelta a pesos objetivo tras cada cierre de rebalanceo."""
+    holdings, values = w.copy(), []
+    for t, r in enumerate(returns.to_numpy()):
+        holdings = holdings * (1 + r)
+        value = holdings.sum()
+        values.append(value)
+        if t in rows:
+            turnover = 0.5 * np.abs(holdings / value - w).sum()
+            holdings = value * (1 - cost * turnover) * w
+    return 100 * np.array(values)
+
+
+def test_drifted_rebalancing_matches_day_by_day_reference():
+    returns = _returns()
+    w = np.array([0.4, 0.3, 0.2, 0.1])
+    res = simulate_rebalanced_portfolio(returns, w, cost_bps=10)
+
+    assert res["buy_and_hold"]["rebalances"] == 0
+    assert res["monthly"]["rebalances"] > res["quarterly"]["rebalances"] > res["annual"]["rebalances"] > 0
+    for freq in ("buy_and_hold", "monthly", "quarterly", "annual"):
+        rows = set(rebalance_rows(returns.index, freq))
+        np.testing.assert_allclose(res[freq]["values"].to_numpy(), _naive(returns, w, rows, cost=0.001), rtol=1e-12)
+
+    # "daily" reproduce la convención histórica returns.dot(w)
+    np.testing.assert_allclose(res["daily"]["values"].to_numpy(), 100 * np.cumprod(1 + returns.to_numpy() @ w), rtol=1e-12)
+
+
+def test_rebalance_rows_are_last_business_day_of_period():
+    idx = pd.bdate_range("2023-01-02", "2023-12-29")
+    quarter_ends = idx[rebalance_rows(idx, "quarterly")]
+    assert [d.strftime("%Y-%m-%d") for d in quarter_ends] == ["2023-03-31", "2023-06-30", "2023-09-29"]
+    assert len(rebalance_rows(idx, "annual")) == 0  # el cierre final no cuenta como rebalanceo
@@ -0,0 +1,64 @@
+import numpy as np
+from unittest.mock import patch
+
+from conftest import mock_db, mock_fetcher, synthetic_universe
+from services.portfolio.optimizer_core import run_optimization
+from services.portfolio.resampling_engine import resampled_optimization
+
+
+def test_resampling_is_deterministic_across_workers_and_feasible():
+    rng = np.random.default_rng(0)
+    n = 12
+    returns = rng.normal(0.0004, 0.01, (600, n)) * np.linspace(0.3, 1.5, n)
+    eq = (np.arange(n) % 2 == 0).astype(float)
+    specs = [{"vec": eq, "sense": ">=", "rhs": 0.4}, {"vec": eq, "sense": "<=", "rhs": 0.6}]
+
+    serial = resampled_optimization(returns, "max_sharpe", None, 0.02, 0.0, 0.25, specs, n_resamples=16, seed=3, max_workers=1)
+    pooled = resampled_optimization(returns, "max_sharpe", None, 0.02, 0.0, 0.25, specs, n_resamples=16, seed=3, max_workers=2)
+
+    assert serial["mode"] == "serial" and pooled["mode"] == "process_pool"
+    assert serial["solved"] == pooled["solved"] == 16
+    np.testing.assert_allclose(serial["weights"], pooled["weights"], atol=1e-10)
+
+    w = serial["weights"]
+    assert abs(w.sum() - 1.0) < 1e-9
+    assert w.max() <= 0.25 + 1e-6
+    assert 0.4 - 1e-6 <= eq @ w <= 0.6 + 1e-6
+
+
+def _profile_setup():
+    prices, metadata = synthetic_universe(12)
+    return prices, metadata, mock_db(), mock_fetcher(prices)
+
+
+def test_run_optimization_resampled_mode_keeps_profile_bands():
+    prices, metadata, db, fetcher = _profile_setup()
+    with patch("services.portfolio.optimizer_core.DataFetcher", return_value=fetcher):
+        res = run_optimization(list(prices), 5, db, constraints={"resamples": 20}, asset_metadata=metadata)
+
+    assert res["status"] == "optimal"
+    assert res["solver_path"].startswith("resampled_")
+    assert res["explainability"]["resampling"]["solved"] == 20
+    assert abs(sum(res["weights"].values()) - 1.0) < 1e-6
+    limits = res["explainability"]["profile_limits"]
+    for k in ("RV", "RF", "Monetario"):
+        assert limits[k][0] - 1e-4 <= res["portfolio_allocation"][k] <= limits[k][1] + 1e-4
+
+
+def test_run_optimization_resampled_mode_keeps_turnover_cap():
+    """Cada remuestreo lleva el mismo control de rotación: la media también respeta el cap."""
+    prices, metadata, db, fetcher = _profile_setup()
+    with patch("services.portfolio.optimizer_core.DataFetcher", return_value=fetcher):
+        # Cartera actual de otro perfil: sin cap, el remuestreo rotaría ~67%
+        current = run_optimization(list(prices), 7, db, asset_metadata=metadata)["weights"]
+        res = run_optimization(
+            list(prices), 5, db,
+            constraints={"resamples": 12, "current_weights": current, "turnover_cap": 0.5},
+            asset_metadata=metadata,
+        )
+
+    assert res["solver_path"].startswith("resampled_")
+    reb = res["explainability"]["rebalance"]
+    assert reb["turnover_cap_enforced"] is True
+    assert reb["turnover"] <= 0.5 + 0.02  # tolerancia del cutoff de limpieza
+    assert not any("turnover_cap" in w for w in res["warnings"])
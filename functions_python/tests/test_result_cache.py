@@ -0,0 +1,109 @@
+import json
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+
+from services.result_cache import ResultCache, build_cache_key
+
+
+def _firestore_doc(data):
+    doc = MagicMock()
+    doc.exists = data is not None
+    doc.to_dict.return_value = data
+    return doc
+
+
+def test_cache_key_is_canonical():
+    """El hash no depende del orden de claves, pero sí de los valores."""
+    a = {"risk": 5, "constraints": {"max_weight": 0.2, "apply_profile": True}}
+    b = {"constraints": {"apply_profile": True, "max_weight": 0.2}, "risk": 5}
+    c = {"risk": 6, "constraints": {"apply_profile": True, "max_weight": 0.2}}
+
+    assert build_cache_key(a) == build_cache_key(b)
+    assert build_cache_key(a) != build_cache_key(c)
+    # Tipos numpy se serializan igual que sus equivalentes nativos
+    assert build_cache_key({"w": np.float64(0.5)}) == build_cache_key({"w": 0.5})
+
+
+def test_ram_hit_returns_independent_copy():
+    cache = ResultCache("optimizer_cache", max_entries=2)
+    cache.set(None, "k1", {"weights": {"A": 1.0}})
+
+    first = cache.get(None, "k1")
+    first["weights"]["A"] = 0.0
+    assert cache.get(None, "k1") == {"weights": {"A": 1.0}}
+
+
+def test_lru_evicts_oldest_entry():
+    cache = ResultCache("optimizer_cache", max_entries=2)
+    cache.set(None, "k1", {"v": 1})
+    cache.set(None, "k2", {"v": 2})
+    cache.get(None, "k1")  # k1 pasa a ser el más reciente
+    cache.set(None, "k3", {"v": 3})
+
+    assert cache.get(None, "k2") is None
+    assert cache.get(None, "k1") == {"v": 1}
+    assert cache.get(None, "k3") == {"v": 3}
+
+
+def test_firestore_backing_and_ttl():
+    cache = ResultCache("optimizer_cache")
+    db = MagicMock()
+    now = datetime.now(timezone.utc)
+
+    # Entrada vigente en Firestore -> hit y se promociona a RAM
+    db.collection().document().get.return_value = _firestore_doc(
+        {"payload": json.dumps({"status": "optimal"}), "expires_at": now + timedelta(hours=1)}
+    )
+    assert cache.get(db, "fresh") == {"status": "optimal"}
+    assert cache.get(None, "fresh") == {"status": "optimal"}
+
+    # Entrada expirada -> miss
+    db.collection().document().get.return_value = _firestore_doc(
+        {"payload": json.dumps({"status": "optimal"}), "expires_at": now - timedelta(seconds=1)}
+    )
+    assert cache.get(db, "stale") is None
+
+
+def test_set_writes_firestore_document():
+    cache = ResultCache("optimizer_cache", ttl_seconds=60)
+    db = MagicMock()
+    cache.set(db, "abc", {"status": "optimal"}, meta={"risk_level": 5})
+
+    written = db.collection.return_value.document.return_value.set.call_args[0][0]
+    assert json.loads(written["payload"]) == {"status": "optimal"}
+    assert written["meta"] == {"risk_level": 5}
+    assert written["expires_at"] > written["created_at"]
+
+
+def test_storage_prefix_keeps_only_pointer_in_firestore():
+    """Payloads grandes (Σ de la frontera) van a Storage; Firestore guarda el puntero."""
+    cache = ResultCache("frontier_cache", ttl_seconds=60, storage_prefix="cache/frontier")
+    db = MagicMock()
+    blob = MagicMock()
+    blob.name = "cache/frontier/abc.json"
+
+    with patch.object(ResultCache, "_storage_blob", return_value=blob):
+        cache.set(db, "abc", {"frontier": [1, 2, 3]})
+        written = db.collection.return_value.document.return_value.set.call_args[0][0]
+        assert "payload" not in written and written["payload_blob"] == "cache/frontier/abc.json"
+
+        # Otra instancia (RAM vacía): lee el puntero y descarga el payload
+        cache.clear()
+        blob.download_as_string.return_value = blob.upload_from_string.call_args[0][0].encode("utf-8")
+        db.collection().document().get.return_value = _firestore_doc(written)
+        assert cache.get(db, "abc") == {"frontier": [1, 2, 3]}
+
+
+def test_optimizer_key_tracks_candidate_funds_metadata():
+    """Misma petición con candidatos auto-expand distintos -> otra entrada."""
+    from api.endpoints_portfolio import _build_optimizer_cache_key
+
+    request = {"effective_assets": ["A", "B"], "locked_assets_normalized": [], "challengers_added": []}
+    versions = {"risk_profiles": "t0", "price_data": "v1"}
+    base = _build_optimizer_cache_key(request, {}, {}, versions)
+    with_pool = _build_optimizer_cache_key(request, {}, {}, versions, {"C": {"asset_type": "EQUITY"}})
+    changed = _build_optimizer_cache_key(request, {}, {}, versions, {"C": {"asset_type": "MIXED"}})
+
+    assert len({base, with_pool, changed}) == 3
@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+import pytest
+from unittest.mock import patch
+
+from conftest import mock_db, mock_fetcher, synthetic_universe
+from services.portfolio.optimizer_core import run_optimization
+from services.portfolio.risk_parity_engine import (
+    erc_weights,
+    hrp_weights,
+    risk_contributions,
+    risk_parity_allocation,
+)
+
+def _factor_cov(n, seed=0):
+    rng = np.random.default_rng(seed)
+    B = rng.normal(0, 0.1, (5, n))
+    S = B.T @ B + np.diag(rng.uniform(0.01, 0.05, n))
+    names = [f"A{i}" for i in range(n)]
+    return pd.DataFrame(S, index=names, columns=names)
+
+
+def test_erc_equalizes_risk_contributions_and_hrp_is_long_only():
+    S = _factor_cov(40)
+    w_erc = erc_weights(S)
+    rc = risk_contributions(w_erc.values, S.values)
+    assert np.allclose(rc, 1.0 / 40, atol=1e-8)
+
+    w_hrp = hrp_weights(S)
+    assert abs(w_hrp.sum() - 1.0) < 1e-12
+    assert (w_hrp > 0).all()
+
+
+def test_full_universe_with_bands():
+    n = 700
+    S = _factor_cov(n, seed=3)
+    kind = np.arange(n) % 3
+    vectors = {"RV": (kind == 0).astype(float), "RF": (kind == 1).astype(float), "Monetario": (kind == 2).astype(float)}
+    bands = {"RV": (0.4, 0.6), "RF": (0.2, 0.4), "Monetario": (0.0, 0.1)}
+
+    for method in ("hrp", "erc"):
+        w, report = risk_parity_allocation(S, method, vectors, bands, max_weight=0.05, fixed_weights={"A1": 0.05})
+
+        assert abs(w.sum() - 1.0) < 1e-9
+        assert w.max() <= 0.05 + 1e-12
+        assert w["A1"] == pytest.approx(0.05)
+        for k, (lo, hi) in bands.items():
+            assert lo - 1e-9 <= report["bucket_exposure"][k] <= hi + 1e-9
+
+
+def test_bands_hold_after_capping_mixed_exposure_bucket():
+    # Fondo mixto 50/50 de baja varianza dentro de "RV": sin tope acapara el bucket;
+    # el tope lo desplaza a fondos 100% RV y cambia la exposición RV/RF del bucket.
+    names = ["M", "E1", "E2", "E3", "B1", "B2"]
+    S = pd.DataFrame(np.diag([1e-4, 0.04, 0.04, 0.04, 1e-3, 1e-3]), index=names, columns=names)
+    vectors = {"RV": np.array([0.5, 1.0, 1.0, 1.0, 0.0, 0.0]), "RF": np.array([0.5, 0.0, 0.0, 0.0, 1.0, 1.0])}
+    bands = {"RV": (0.4, 0.6), "RF": (0.4, 0.6)}
+
+    w, report = risk_parity_allocation(S, "hrp", vectors, bands, max_weight=0.3)
+
+    assert abs(w.sum() - 1.0) < 1e-9
+    assert w.max() <= 0.3 + 1e-9
+    assert w["M"] == pytest.approx(0.3)  # tope activo
+    for k, (lo, hi) in bands.items():
+        exposure = float(vectors[k] @ w.values)
+        assert exposure == pytest.approx(report["bucket_exposure"][k])
+        assert lo - 1e-9 <= exposure <= hi + 1e-9
+
+
+def test_run_optimization_erc_objective_respects_profile():
+    prices, metadata = synthetic_universe(16)
+    db, fetcher = mock_db(), mock_fetcher(prices)
+
+    with patch("services.portfolio.optimizer_core.DataFetcher", return_value=fetcher):
+        res = run_optimization(list(prices), 5, db, constraints={"objective": "erc"}, asset_metadata=metadata)
+
+    assert res["status"] == "optimal"
+    assert res["solver_path"] == "risk_parity_erc"
+    assert abs(sum(res["weights"].values()) - 1.0) < 1e-6
+    assert max(res["weights"].values()) <= 0.20 + 1e-9
+    limits = res["explainability"]["profile_limits"]
+    for k in ("RV", "RF", "Monetario"):
+        assert limits[k][0] - 1e-6 <= res["portfolio_allocation"][k] <= limits[k][1] + 1e-6
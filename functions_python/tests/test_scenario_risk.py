@@ -0,0 +1,48 @@
+import pandas as pd
+from unittest.mock import patch
+from pypfopt import EfficientCVaR
+
+from conftest import mock_db, mock_fetcher, synthetic_universe
+from services.portfolio.optimizer_core import run_optimization
+from services.quant_core import build_return_scenarios, calculate_scenario_risk
+
+
+def _prices(n_funds, n_days, seed=1):
+    return synthetic_universe(n_funds, n_days, seed=seed, start="2015-01-01")
+
+
+def test_scenario_reduction_and_cvar_match_lp_objective():
+    prices, _ = _prices(6, 2600)  # ~10 años diarios
+    df = pd.DataFrame(prices)
+
+    weekly, freq = build_return_scenarios(df, max_scenarios=520)
+    assert freq == "W-FRI" and len(weekly) <= 520
+    monthly, freq_m = build_return_scenarios(df, max_scenarios=200)
+    assert freq_m == "ME" and len(monthly) <= 200
+
+    ecv = EfficientCVaR(weekly.mean(), weekly, beta=0.95)
+    w = ecv.min_cvar()
+    _, cvar_lp = ecv.portfolio_performance()
+    risk = calculate_scenario_risk(weekly, dict(w), beta=0.95)
+    assert abs(risk["cvar"] - cvar_lp) < 1e-6
+    assert risk["cdar"] <= risk["max_drawdown"] + 1e-12
+
+
+def test_run_optimization_min_cvar_reduces_tail_risk():
+    prices, metadata = _prices(12, 1400)
+    db, fetcher = mock_db(), mock_fetcher(prices)
+
+    with patch("services.portfolio.optimizer_core.DataFetcher", return_value=fetcher):
+        res_cvar = run_optimization(list(prices), 5, db, constraints={"objective": "min_cvar"}, asset_metadata=metadata)
+        res_base = run_optimization(list(prices), 5, db, constraints={}, asset_metadata=metadata)
+
+    assert res_cvar["status"] == "optimal"
+    assert res_cvar["solver_path"] == "min_cvar_scenarios"
+    scen = res_cvar["explainability"]["scenario_risk"]
+    assert scen["frequency"] == "W-FRI" and scen["scenarios"] <= 520
+
+    weekly, _ = build_return_scenarios(pd.DataFrame(prices))
+    assert calculate_scenario_risk(weekly, res_cvar["weights"])["cvar"] <= calculate_scenario_risk(weekly, res_base["weights"])["cvar"] + 1e-4
+
+    rv_min, rv_max = res_cvar["explainability"]["profile_limits"]["RV"]
+    assert rv_min - 1e-4 <= res_cvar["portfolio_allocation"]["RV"] <= rv_max + 1e-4
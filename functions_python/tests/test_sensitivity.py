@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+from unittest.mock import MagicMock, patch
+from pypfopt import EfficientFrontier
+
+from services.config import RISK_BUCKETS_LABELS
+from services.portfolio.optimizer_core import (
+    _apply_standard_constraints,
+    _constraint_shadow_prices,
+    run_optimization,
+)
+from services.quant_core import calculate_portfolio_metrics, get_covariance_matrix, get_expected_returns
+
+TYPES = ["EQUITY", "FIXED_INCOME", "MONETARY"]
+EXPOSURE = {"EQUITY": {"equity": 100.0}, "FIXED_INCOME": {"bond": 100.0}, "MONETARY": {"cash": 100.0}}
+
+
+def _universe(n=9, seed=4):
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range("2019-01-01", periods=1400)
+    vols = {"EQUITY": 0.011, "FIXED_INCOME": 0.004, "MONETARY": 0.0006}
+    prices, meta = {}, {}
+    for i in range(n):
+        t = TYPES[i % 3]
+        prices[f"F{i}"] = pd.Series(100 * np.cumprod(1 + rng.normal(0.0003, vols[t], len(dates))), index=dates)
+        meta[f"F{i}"] = {
+            "classification_v2": {"asset_type": t, "risk_bucket": "MEDIUM", "is_suitable_low_risk": True},
+            "portfolio_exposure_v2": {"economic_exposure": EXPOSURE[t]},
+        }
+    return pd.DataFrame(prices), meta
+
+
+def _solve(mu, S, eq, bd, cs, overrides=None, kind="min_vol"):
+    ef = EfficientFrontier(mu, S, weight_bounds=(0.0, 0.4))
+    _apply_standard_constraints(
+        ef, {}, "keep_weight", True, 5, [], {}, {}, RISK_BUCKETS_LABELS,
+        eq, bd, cs, np.zeros(len(mu)), np.zeros(len(mu)), rhs_overrides=overrides,
+    )
+    ef.min_volatility() if kind == "min_vol" else ef.max_sharpe(risk_free_rate=0.0)
+    return ef
+
+
+def _vectors(universe):
+    eq = np.array([1.0 if i % 3 == 0 else 0.0 for i in range(len(universe))])
+    bd = np.array([1.0 if i % 3 == 1 else 0.0 for i in range(len(universe))])
+    cs = np.array([1.0 if i % 3 == 2 else 0.0 for i in range(len(universe))])
+    return eq, bd, cs
+
+
+def test_shadow_prices_match_finite_differences():
+    df, _ = _universe()
+    mu, S = get_expected_returns(df, method="mean"), get_covariance_matrix(df)
+    eq, bd, cs = _vectors(df.columns)
+
+    for kind, path, metric in (("min_vol", "fallback_min_vol", "volatility"), ("max_sharpe", "max_sharpe_custom", "sharpe")):
+        ef = _solve(mu, S, eq, bd, cs, kind=kind)
+        report = _constraint_shadow_prices(ef, path, {"objective": "max_sharpe"}, False, 5, 0.0)
+        binding = [r for r in report if r["binding"]]
+        assert binding and all(r["metric"] == metric for r in report)
+
+        top = max(binding, key=lambda r: abs(r["d_metric_d_rhs"]))
+        step = 1e-3 * (1 if top["relax_direction"] == "increase" else -1)
+        ef_fd = _solve(mu, S, eq, bd, cs, overrides={top["label"]: top["rhs"] + step}, kind=kind)
+        m0 = calculate_portfolio_metrics(dict(zip(df.columns, ef.weights)), mu, S, 0.0)[metric]
+        m1 = calculate_portfolio_metrics(dict(zip(df.columns, ef_fd.weights)), mu, S, 0.0)[metric]
+        fd = (m1 - m0) / step
+        assert abs(fd - top["d_metric_d_rhs"]) <= 0.05 * abs(fd) + 1e-4
+
+
+def test_shadow_prices_do_not_depend_on_constraint_order():
+    """Los duales se leen de la restricción reconstruida por max_sharpe, no de una posición fija."""
+    df, _ = _universe()
+    mu, S = get_expected_returns(df, method="mean"), get_covariance_matrix(df)
+    eq, bd, cs = _vectors(df.columns)
+
+    ef = _solve(mu, S, eq, bd, cs, kind="max_sharpe")
+    base = _constraint_shadow_prices(ef, "max_sharpe_custom", {"objective": "max_sharpe"}, False, 5, 0.0)
+    # Otra versión de pypfopt podría anteponer más restricciones propias
+    ef._constraints.insert(0, ef._constraints[0])
+    shifted = _constraint_shadow_prices(ef, "max_sharpe_custom", {"objective": "max_sharpe"}, False, 5, 0.0)
+    assert base and shifted == base
+
+
+def test_run_optimization_reports_sensitivity_and_grid():
+    df, meta = _universe()
+    fetcher = MagicMock()
+    fetcher.get_price_data.side_effect = lambda assets, **kw: ({a: df[a] for a in assets}, [])
+    fetcher.get_dynamic_risk_free_rate.return_value = 0.0
+    db = MagicMock()
+    db.collection().document().get.return_value = MagicMock(exists=False)  # Force default risk buckets
+
+    with patch("services.portfolio.optimizer_core.DataFetcher", return_value=fetcher):
+        res = run_optimization(
+            list(df.columns), 5, db,
+            constraints={"sensitivity_grid": [0.01, 0.05], "max_weight": 0.4},
+            asset_metadata=meta,
+        )
+
+    sens = res["explainability"]["sensitivity"]
+    labels = {r["label"] for r in sens["shadow_prices"]}
+    assert {"bucket:RV_min", "bucket:RV_max", "bucket:RF_max"} <= labels
+    assert all(r["metric"] == "regularized_return" for r in sens["shadow_prices"])
+
+    grid = sens["relaxation_grid"]
+    binding = {r["label"] for r in sens["shadow_prices"] if r["binding"]}
+    assert grid and {g["label"] for g in grid} <= binding
+    assert all("delta_sharpe" in g for g in grid if g["status"] == "optimal")
@@ -0,0 +1,95 @@
+import numpy as np
+import pandas as pd
+from unittest.mock import MagicMock
+
+from services.config import (
+    BENCHMARK_HISTORY_START,
+    BENCHMARK_PROXIES,
+    BENCHMARK_RF_ISIN,
+    BENCHMARK_RV_ISIN,
+    NAV_HISTORY_MAX_POINTS,
+    STRESS_SCENARIOS,
+)
+from services.stress_engine import resolve_scenarios, run_stress_test
+
+
+def _prices(seed=11):
+    rng = np.random.default_rng(seed)
+    idx = pd.bdate_range("2007-01-01", "2023-06-30")
+    data = {c: 100 * np.cumprod(1 + rng.normal(0.0002, 0.01, len(idx))) for c in ("F1", "F2", BENCHMARK_RF_ISIN, BENCHMARK_RV_ISIN)}
+    df = pd.DataFrame(data, index=idx)
+    df.loc[:"2018-12-31", "F2"] = np.nan  # F2 lanzado en 2019: sin historia en 2008
+    return df
+
+
+def _fetcher(df):
+    fetcher = MagicMock()
+    fetcher.get_price_data.return_value = (df, [])
+    fetcher.get_exposure_index.return_value = {
+        "row": {"F1": 0, "F2": 1},
+        "dims": {"asset_class": ["equity", "bond", "cash", "other"]},
+        "matrices": {"asset_class": np.array([[0.6, 0.4, 0.0, 0.0], [1.0, 0.0, 0.0, 0.0]])},
+    }
+    return fetcher
+
+
+def test_stress_scenarios_match_direct_backtest_and_proxy_missing_history():
+    df = _prices()
+    portfolio = [{"isin": "F1", "weight": 50}, {"isin": "F2", "weight": 50}]
+    res = run_stress_test(portfolio, None, scenarios=["gfc_2008", "covid_2020"], fetcher=_fetcher(df))
+
+    assert res["status"] == "ok"
+    gfc, covid = res["scenarios"]
+    rets = df.pct_change()
+
+    # COVID: ambos fondos con historia real -> rebalanceo diario 50/50
+    win = rets.loc["2020-02-20":"2020-03-23"]
+    expected = np.prod(1 + 0.5 * win["F1"] + 0.5 * win["F2"]) - 1
+    assert covid["proxied"] == [] and covid["coverage"]["history"] == 1.0
+    assert abs(covid["metrics"]["total_return"] - round(expected, 4)) < 1e-9
+
+    # 2008: F2 (100% RV) se aproxima con la pata RV
+    win = rets.loc["2008-09-02":"2009-03-09"]
+    expected = np.prod(1 + 0.5 * win["F1"] + 0.5 * win[BENCHMARK_RV_ISIN]) - 1
+    assert gfc["proxied"] == ["F2"] and gfc["coverage"]["proxy"] == 0.5
+    assert gfc["fund_returns"]["F2"] == gfc["benchmarks"]["aggressive"]["return"]
+    assert abs(gfc["metrics"]["total_return"] - round(expected, 4)) < 1e-9
+    assert gfc["metrics"]["max_drawdown"] <= min(gfc["metrics"]["total_return"], 0)
+
+
+def test_default_library_on_production_shaped_history():
+    # Fondos recortados a NAV_HISTORY_MAX_POINTS (arrancan ~2015); benchmarks y proxies desde
+    # BENCHMARK_HISTORY_START, como los deja la ingesta nocturna.
+    rng = np.random.default_rng(5)
+    idx = pd.bdate_range(BENCHMARK_HISTORY_START, "2026-10-16")
+    legs = [BENCHMARK_RF_ISIN, BENCHMARK_RV_ISIN] + [p["doc_id"] for p in BENCHMARK_PROXIES.values()]
+    df = pd.DataFrame(
+        {c: 100 * np.cumprod(1 + rng.normal(0.0002, 0.01, len(idx))) for c in ["F1", "F2"] + legs}, index=idx
+    )
+    df.iloc[:-NAV_HISTORY_MAX_POINTS, [0, 1]] = np.nan
+    assert df["F1"].first_valid_index() > pd.Timestamp("2015-01-01")
+
+    res = run_stress_test(
+        [{"isin": "F1", "weight": 50}, {"isin": "F2", "weight": 50}], None, fetcher=_fetcher(df)
+    )
+
+    assert res["status"] == "ok"
+    by_id = {s["id"]: s for s in res["scenarios"]}
+    assert list(by_id) == list(STRESS_SCENARIOS)
+    assert all("error" not in s for s in by_id.values())
+    for sid in ("gfc_2008", "euro_debt_2011"):
+        assert by_id[sid]["coverage"]["proxy"] == 1.0
+        assert by_id[sid]["proxied"] == ["F1", "F2"]
+    assert by_id["covid_2020"]["coverage"]["history"] == 1.0
+
+
+def test_custom_scenarios_and_validation():
+    specs = resolve_scenarios(["covid_2020", {"name": "Brexit", "start": "2016-06-23", "end": "2016-06-27"}])
+    assert [s["id"] for s in specs] == ["covid_2020", "custom_2"]
+    assert "error" in run_stress_test([{"isin": "F1", "weight": 100}], None, scenarios=["unknown"])
+
+    res = run_stress_test(
+        [{"isin": "F1", "weight": 100}], None,
+        scenarios=[{"id": "old", "start": "1990-01-01", "end": "1990-06-30"}], fetcher=_fetcher(_prices()),
+    )
+    assert res["scenarios"][0]["error"] == "Sin datos en el calendario para el episodio."
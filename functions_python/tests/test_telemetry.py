@@ -0,0 +1,62 @@
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+import pandas as pd
+from pypfopt import EfficientFrontier
+
+from services.config import PRICE_CACHE
+from services.data_fetcher import DataFetcher
+from services.quant_core import get_covariance_matrix, get_expected_returns
+from services.telemetry import PipelineTelemetry
+
+
+def _prices(n_assets=3, n_days=300, seed=7):
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range("2022-01-03", periods=n_days)
+    rets = rng.normal(0.0003, 0.008, size=(n_days, n_assets))
+    return pd.DataFrame(100 * np.cumprod(1 + rets, axis=0), index=dates, columns=[f"F{i}" for i in range(n_assets)])
+
+
+def test_phase_timer_and_counters():
+    tel = PipelineTelemetry()
+    with tel.phase("fase_1"):
+        tel.count("firestore_reads", 3)
+    try:
+        with tel.phase("fase_2"):
+            raise RuntimeError("boom")
+    except RuntimeError:
+        pass
+
+    out = tel.to_dict()
+    assert [p["phase"] for p in out["phases"]] == ["fase_1", "fase_2"]
+    assert all(p["ms"] >= 0 for p in out["phases"])
+    assert out["io"]["firestore_reads"] == 3
+    assert out["total_ms"] >= 0
+
+
+def test_record_solver_extracts_cvxpy_stats():
+    df = _prices()
+    ef = EfficientFrontier(get_expected_returns(df, method="mean"), get_covariance_matrix(df))
+    ef.min_volatility()
+
+    tel = PipelineTelemetry()
+    tel.record_solver(ef, "fallback_min_vol")
+    tel.record_solver(None, "fallback_equal_weight", succeeded=False)
+
+    runs = tel.to_dict()["solver_runs"]
+    assert runs[0]["solver_path"] == "fallback_min_vol"
+    assert runs[0]["solver"]
+    assert runs[1] == {"solver_path": "fallback_equal_weight", "succeeded": False}
+
+
+def test_data_fetcher_counts_ram_hits():
+    df = _prices(n_assets=2)
+    tel = PipelineTelemetry()
+    fetcher = DataFetcher(MagicMock(), telemetry=tel)
+
+    with patch.dict(PRICE_CACHE, {c: df[c].to_dict() for c in df.columns}, clear=True):
+        out, _ = fetcher.get_price_data(list(df.columns), strict=False)
+
+    assert list(out.columns) == list(df.columns)
+    assert tel.counters["ram_cache_hits"] == 2
+    assert tel.counters["firestore_reads"] == 0
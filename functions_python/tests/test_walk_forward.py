@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+from unittest.mock import MagicMock
+
+from services.portfolio.walk_forward_engine import RollingMoments, run_walk_forward
+from services.quant_core import get_covariance_matrix, get_expected_returns
+
+
+def _prices(n_days=1400, n_assets=6, seed=5):
+    rng = np.random.default_rng(seed)
+    idx = pd.bdate_range("2018-01-01", periods=n_days)
+    market = rng.normal(0.0003, 0.008, (n_days, 1))
+    rets = 0.7 * market + rng.normal(0.0001, 0.005, (n_days, n_assets))
+    return pd.DataFrame(100 * np.cumprod(1 + rets, axis=0), index=idx, columns=[f"F{i}" for i in range(n_assets)])
+
+
+def test_rolling_moments_match_full_window_estimators():
+    px = _prices()
+    moments = RollingMoments(px.pct_change().iloc[1:], 500)
+    for end in (499, 560, 900, 1398, 700):  # avance, salto y retroceso
+        moments.move_to(end)
+        window = px.iloc[end - 499: end + 2]
+        np.testing.assert_allclose(moments.cov().values, get_covariance_matrix(window).values, atol=1e-14)
+        np.testing.assert_allclose(moments.mu().values, get_expected_returns(window, method="mean").values, atol=1e-12)
+
+
+def test_walk_forward_chains_out_of_sample_returns():
+    px = _prices()
+    db = MagicMock()
+    db.collection.return_value.document.return_value.get.return_value.exists = False
+    fetcher = MagicMock()
+    fetcher.get_price_data.return_value = ({c: px[c] for c in px.columns}, [])
+    fetcher.get_dynamic_risk_free_rate.return_value = 0.02
+
+    res = run_walk_forward(
+        list(px.columns) + ["GHOST"], 5, db, constraints={"apply_profile": False, "max_weight": 0.4},
+        estimation_window=500, rebalance="quarterly", cost_bps=0.0, fetcher=fetcher,
+    )
+
+    assert res["status"] == "ok" and res["missing_assets"] == ["GHOST"]
+    rebalances = res["rebalances"]
+    assert rebalances[0]["date"] == res["oos_start_date"] == px.index[500].strftime("%Y-%m-%d")
+    assert rebalances[0]["turnover"] == 0.0 and len(rebalances) > 5
+
+    # Reconstrucción día a día: pesos fijos con deriva entre fechas de rebalanceo
+    rets = px.pct_change().iloc[1:]
+    series = pd.Series({p["x"]: p["y"] for p in res["portfolioSeries"]})
+    dates = [r["date"] for r in rebalances] + [rets.index[-1].strftime("%Y-%m-%d")]
+    level = 100.0
+    for rec, start, end in zip(rebalances, dates[:-1], dates[1:]):
+        w = pd.Series(rec["weights"]).reindex(px.columns, fill_value=0.0)
+        seg = rets.loc[start:end].iloc[1:]
+        level = level * float((np.cumprod(1 + seg) * w).sum(axis=1).iloc[-1]) / float(w.sum())
+        assert abs(series[end] - level) < 0.011  # serie redondeada a 2 decimales
+    assert series.index[-1] == dates[-1]
+    assert res["benchmarkSeries"]["equal_weight"][0] == {"x": dates[0], "y": 100.0}